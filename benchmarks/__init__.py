@@ -0,0 +1,6 @@
+"""
+ARIA benchmark suite.
+
+Runs the real FastAPI app and crew against local stand-ins for the LLM provider
+and the external tool APIs, so throughput and latency can be measured offline.
+"""
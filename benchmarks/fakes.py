@@ -0,0 +1,335 @@
+"""
+Local stand-ins for every external service the crew talks to.
+
+- FakeLLMServer: an OpenAI-compatible /v1/chat/completions endpoint that drives
+  the crewAI ReAct loop (one tool call per agent, then a final answer).
+- FakeUpstreamServer: news search (FactCheckerTool), HF inference
+  (SummarizerTool / WriterTool), LanguageTool (ReviewerTool) and a JSON
+  Google Scholar replacement used by patch_scholarly().
+- FixtureServer: the same routes, answered from recorded responses in
+  benchmarks/fixtures/ (see serve_fixtures_in_subprocess()).
+
+Both servers run in background threads and take a configurable latency, so the
+benchmarks measure ARIA's own overhead plus a controlled amount of "network" time.
+"""
+
+import json
+import multiprocessing
+import random
+import re
+import threading
+import time
+import urllib.parse
+import urllib.request
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from pathlib import Path
+from typing import Any, Callable, Dict, Iterator, Optional, Tuple
+
+FIXTURES = Path(__file__).resolve().parent / "fixtures"
+
+_LOREM = (
+    "Large language models continue to improve on reasoning benchmarks while "
+    "inference costs fall as quantisation and distillation techniques mature. "
+)
+
+
+class _JSONServer:
+    """Threaded HTTP server that dispatches requests to a route function."""
+
+    def __init__(self, latency: float = 0.0, jitter: float = 0.0, host: str = "127.0.0.1", port: int = 0):
+        self.latency = latency
+        self.jitter = jitter
+        self.requests_served = 0
+        self._lock = threading.Lock()
+        server = self
+
+        class Handler(BaseHTTPRequestHandler):
+            protocol_version = "HTTP/1.1"
+
+            def log_message(self, *args):  # keep benchmark output clean
+                pass
+
+            def _handle(self, method: str):
+                length = int(self.headers.get("Content-Length") or 0)
+                body = self.rfile.read(length) if length else b""
+                parsed = urllib.parse.urlparse(self.path)
+                server._sleep()
+                status, payload = server.route(method, parsed.path, urllib.parse.parse_qs(parsed.query), body)
+                data = json.dumps(payload).encode()
+                self.send_response(status)
+                self.send_header("Content-Type", "application/json")
+                self.send_header("Content-Length", str(len(data)))
+                self.end_headers()
+                self.wfile.write(data)
+                with server._lock:
+                    server.requests_served += 1
+
+            def do_GET(self):
+                self._handle("GET")
+
+            def do_POST(self):
+                self._handle("POST")
+
+        self._httpd = ThreadingHTTPServer((host, port), Handler)
+        self._httpd.daemon_threads = True
+        self._thread: Optional[threading.Thread] = None
+
+    @property
+    def url(self) -> str:
+        host, port = self._httpd.server_address[:2]
+        return f"http://{host}:{port}"
+
+    def _sleep(self):
+        delay = self.latency + (random.uniform(0, self.jitter) if self.jitter else 0.0)
+        if delay > 0:
+            time.sleep(delay)
+
+    def route(self, method: str, path: str, query: Dict[str, list], body: bytes) -> Tuple[int, Any]:
+        raise NotImplementedError
+
+    def start(self) -> "_JSONServer":
+        self._thread = threading.Thread(target=self._httpd.serve_forever, daemon=True)
+        self._thread.start()
+        return self
+
+    def stop(self):
+        if self._thread is not None:
+            self._httpd.shutdown()
+        self._httpd.server_close()
+
+    def __enter__(self):
+        return self.start()
+
+    def __exit__(self, *exc):
+        self.stop()
+
+
+class FakeLLMServer(_JSONServer):
+    """
+    OpenAI-compatible chat completions endpoint.
+
+    The first call of an agent that has tools answers with an Action for its
+    first tool; any later call (an Observation is already in the conversation)
+    returns a Final Answer of roughly `answer_words` words.
+    """
+
+    _TOOL_NAMES = re.compile(r"only one name of \[(.*?)\]")
+    _TOOL_ARG = re.compile(r"Tool Name: (?P<name>[^\n]+)\nTool Arguments: \{'(?P<arg>\w+)'")
+
+    def __init__(self, latency: float = 0.0, jitter: float = 0.0, answer_words: int = 150, **kwargs):
+        super().__init__(latency=latency, jitter=jitter, **kwargs)
+        self.answer_words = answer_words
+        self.prompt_tokens = 0
+        self.completion_tokens = 0
+
+    def route(self, method, path, query, body):
+        if not path.endswith("/chat/completions"):
+            return 404, {"error": {"message": f"unknown path {path}"}}
+        request = json.loads(body or b"{}")
+        messages = request.get("messages", [])
+        content = self._reply(messages)
+        prompt_tokens = sum(len(str(m.get("content", ""))) for m in messages) // 4
+        completion_tokens = len(content) // 4
+        with self._lock:
+            self.prompt_tokens += prompt_tokens
+            self.completion_tokens += completion_tokens
+        return 200, {
+            "id": f"chatcmpl-{random.getrandbits(48):x}",
+            "object": "chat.completion",
+            "created": int(time.time()),
+            "model": request.get("model", "fake-model"),
+            "choices": [{
+                "index": 0,
+                "message": {"role": "assistant", "content": content},
+                "finish_reason": "stop",
+            }],
+            "usage": {
+                "prompt_tokens": prompt_tokens,
+                "completion_tokens": completion_tokens,
+                "total_tokens": prompt_tokens + completion_tokens,
+            },
+        }
+
+    def _reply(self, messages) -> str:
+        system = next((str(m.get("content", "")) for m in messages if m.get("role") == "system"), "")
+        has_observation = any(m.get("role") == "assistant" for m in messages)
+        tools = self._TOOL_NAMES.search(system)
+        if tools and not has_observation:
+            tool_name = tools.group(1).split(",")[0].strip()
+            arg = next((m.group("arg") for m in self._TOOL_ARG.finditer(system)
+                        if m.group("name").strip() == tool_name), "query")
+            return (
+                "Thought: I should gather supporting material first.\n"
+                f"Action: {tool_name}\n"
+                f"Action Input: {json.dumps({arg: 'recent advances in AI LLMs'})}"
+            )
+        words = _LOREM.split()
+        text = " ".join(words[i % len(words)] for i in range(self.answer_words))
+        bullets = "\n".join(f"- {text[j:j + 120]}" for j in range(0, len(text), 120))
+        return f"Thought: I now know the final answer\nFinal Answer: ## Findings\n{bullets}"
+
+
+class FakeUpstreamServer(_JSONServer):
+    """News search, HF inference, LanguageTool and Scholar stand-ins on one port."""
+
+    def route(self, method, path, query, body):
+        if path == "/news/search":
+            q = (query.get("q") or [""])[0]
+            return 200, {"value": [
+                {"name": f"Report on {q[:40]} #{i}", "provider": [{"name": f"Source {i}"}],
+                 "url": f"https://news.example.com/{i}"}
+                for i in range(5)
+            ]}
+        if path == "/hf/summarize":
+            return 200, [{"summary_text": _LOREM * 2}]
+        if path == "/hf/generate":
+            return 200, [{"generated_text": "## Overview\n\n" + _LOREM * 6}]
+        if path == "/v2/languages":
+            return 200, [{"name": "English (US)", "code": "en", "longCode": "en-US"}]
+        if path == "/v2/check":
+            return 200, {"matches": self._languagetool_matches(body)}
+        if path == "/scholar/search":
+            q = (query.get("q") or [""])[0]
+            return 200, [
+                {"bib": {"title": f"{q.title()} study {i}", "author": ["A. Author", "B. Author"],
+                         "pub_year": str(2020 + i)}}
+                for i in range(5)
+            ]
+        return 404, {"error": f"unknown path {path}"}
+
+    @staticmethod
+    def _languagetool_matches(body: bytes):
+        form = urllib.parse.parse_qs(body.decode())
+        text = (form.get("text") or [""])[0]
+        matches = []
+        for m in re.finditer(r"\b(\w+) \1\b", text):
+            matches.append({
+                "message": "Possible typo: you repeated a word",
+                "shortMessage": "Word repetition",
+                "replacements": [{"value": m.group(1)}],
+                "offset": m.start(),
+                "length": m.end() - m.start(),
+                "context": {"text": text[max(0, m.start() - 20):m.end() + 20], "offset": 0, "length": 0},
+                "sentence": text[max(0, m.start() - 20):m.end() + 20],
+                "rule": {"id": "ENGLISH_WORD_REPEAT_RULE", "description": "Word repetition",
+                         "issueType": "duplication", "category": {"id": "MISC", "name": "Miscellaneous"}},
+            })
+        return matches
+
+
+class FixtureServer(FakeUpstreamServer):
+    """
+    Replays recorded upstream responses from `fixture_dir`.
+
+    LanguageTool matches were recorded against fixtures/report.md; for longer
+    reports built by repeating that page they are tiled across every copy, so the
+    reviewer sees a realistic match density at any size.
+    """
+
+    PAGE_SEPARATOR = "\n\n"
+    _ROUTES = {
+        "/news/search": "news_search.json",
+        "/hf/summarize": "hf_summarize.json",
+        "/hf/generate": "hf_generate.json",
+        "/v2/languages": "languagetool_languages.json",
+        "/scholar/search": "scholar_search.json",
+    }
+
+    def __init__(self, fixture_dir: Path = FIXTURES, **kwargs):
+        super().__init__(**kwargs)
+        self.fixtures = {path: json.loads((fixture_dir / name).read_text(encoding="utf-8"))
+                         for path, name in self._ROUTES.items()}
+        self.languagetool = json.loads((fixture_dir / "languagetool_check.json").read_text(encoding="utf-8"))
+
+    def route(self, method, path, query, body):
+        if path in self.fixtures:
+            return 200, self.fixtures[path]
+        if path == "/v2/check":
+            text_length = len((urllib.parse.parse_qs(body.decode()).get("text") or [""])[0])
+            return 200, self._tiled_check(text_length)
+        return 404, {"error": f"no fixture for {path}"}
+
+    def _tiled_check(self, text_length: int) -> Dict[str, Any]:
+        recorded = self.languagetool
+        stride = recorded["text_length"] + len(self.PAGE_SEPARATOR)
+        matches = []
+        for page_start in range(0, text_length, stride):
+            for match in recorded["matches"]:
+                if page_start + match["offset"] + match["length"] <= text_length:
+                    matches.append(dict(match, offset=page_start + match["offset"]))
+        return {key: value for key, value in recorded.items() if key != "text_length"} | {"matches": matches}
+
+
+def _serve_fixtures(fixture_dir: str, latency: float, ready, stop) -> None:
+    with FixtureServer(Path(fixture_dir), latency=latency) as server:
+        ready.put(server.url)
+        stop.wait()
+
+
+class serve_fixtures_in_subprocess:
+    """
+    Run a FixtureServer in a child process and yield its base URL.
+
+    Keeping the server out of the measured process means tracemalloc and RSS
+    numbers only reflect the tool under test.
+    """
+
+    def __init__(self, fixture_dir: Path = FIXTURES, latency: float = 0.0):
+        ctx = multiprocessing.get_context()
+        self._ready = ctx.Queue()
+        self._stop = ctx.Event()
+        self._process = ctx.Process(target=_serve_fixtures, args=(str(fixture_dir), latency, self._ready, self._stop),
+                                    daemon=True)
+
+    def __enter__(self) -> str:
+        self._process.start()
+        return self._ready.get(timeout=30)
+
+    def __exit__(self, *exc):
+        self._stop.set()
+        self._process.join(timeout=10)
+
+
+def patch_scholarly(base_url: str) -> Callable[[], None]:
+    """
+    Point SearchScholar at the fake Scholar endpoint.
+
+    `scholarly` scrapes Google Scholar HTML and has no configurable base URL, so
+    search_pubs is swapped for a JSON client against `base_url`. Returns a
+    function that restores the original.
+    """
+    from scholarly import scholarly
+
+    original = scholarly.search_pubs
+
+    def search_pubs(query: str, *args, **kwargs) -> Iterator[Dict[str, Any]]:
+        url = f"{base_url}/scholar/search?" + urllib.parse.urlencode({"q": query})
+        with urllib.request.urlopen(url) as response:
+            yield from json.loads(response.read())
+
+    scholarly.search_pubs = search_pubs
+
+    def restore():
+        scholarly.search_pubs = original
+
+    return restore
+
+
+def stand_in_environment(llm_url: str, upstream_url: str) -> Dict[str, str]:
+    """Environment variables that route the crew and its tools to the stand-ins."""
+    return {
+        "OPENAI_API_BASE": f"{llm_url}/v1",
+        "OPENAI_API_KEY": "fake-key",
+        "MODEL": "gpt-4o-mini",
+        "HF_TOKEN": "fake-token",
+        "HF_API_KEY": "fake-token",
+        "RAPIDAPI_KEY": "fake-key",
+        "FACT_CHECK_API_URL": f"{upstream_url}/news/search",
+        "HF_SUMMARIZER_URL": f"{upstream_url}/hf/summarize",
+        "HF_WRITER_URL": f"{upstream_url}/hf/generate",
+        "LANGUAGETOOL_URL": upstream_url,
+        # Keep crewAI / litellm from reaching out to the network.
+        "LITELLM_LOCAL_MODEL_COST_MAP": "True",
+        "CREWAI_DISABLE_TELEMETRY": "true",
+        "OTEL_SDK_DISABLED": "true",
+    }
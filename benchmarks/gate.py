@@ -0,0 +1,73 @@
+"""
+Regression gate shared by the benchmark runners.
+
+A result file is a flat JSON object of metric name -> number. Metrics listed in
+HIGHER_IS_BETTER regress when they drop; every other numeric metric regresses
+when it grows. A metric only fails the gate when it moves by more than the
+tolerance (relative) *and* by more than its absolute floor, so tiny numbers
+(e.g. sub-millisecond latencies) don't flap.
+"""
+
+import json
+import math
+from pathlib import Path
+from typing import Dict, Iterable, List, Optional, Sequence
+
+HIGHER_IS_BETTER = {"throughput_rps", "success_rate"}
+
+# Minimum absolute change before a metric can count as a regression.
+ABSOLUTE_FLOORS = {
+    "_ms": 5.0,
+    "_mb": 8.0,
+    "_kb": 64.0,
+    "_rps": 0.05,
+    "_allocs": 50.0,
+}
+
+
+def percentile(values: Sequence[float], pct: float) -> float:
+    """Nearest-rank percentile (pct in 0-100). Returns 0.0 for empty input."""
+    if not values:
+        return 0.0
+    ordered = sorted(values)
+    rank = max(1, math.ceil(pct / 100.0 * len(ordered)))
+    return float(ordered[min(rank, len(ordered)) - 1])
+
+
+def _floor_for(metric: str) -> float:
+    for suffix, floor in ABSOLUTE_FLOORS.items():
+        if metric.endswith(suffix):
+            return floor
+    return 0.0
+
+
+def compare(current: Dict[str, float], baseline: Dict[str, float], tolerance: float = 0.10,
+            metrics: Optional[Iterable[str]] = None) -> List[str]:
+    """Return a human readable line for every metric that regressed past `tolerance`."""
+    regressions = []
+    names = metrics if metrics is not None else baseline.keys()
+    for name in names:
+        base, cur = baseline.get(name), current.get(name)
+        if not isinstance(base, (int, float)) or not isinstance(cur, (int, float)):
+            continue
+        delta = cur - base
+        if name in HIGHER_IS_BETTER:
+            delta = -delta
+        if delta <= _floor_for(name):
+            continue
+        relative = delta / abs(base) if base else math.inf
+        if relative > tolerance:
+            regressions.append(f"{name}: {base:.3f} -> {cur:.3f} ({relative:+.1%}, tolerance {tolerance:.0%})")
+    return regressions
+
+
+def load_results(path: Path) -> Dict[str, float]:
+    with open(path, "r", encoding="utf-8") as f:
+        return json.load(f)
+
+
+def save_results(path: Path, results: Dict[str, float]) -> None:
+    path.parent.mkdir(parents=True, exist_ok=True)
+    with open(path, "w", encoding="utf-8") as f:
+        json.dump(results, f, indent=2, sort_keys=True)
+        f.write("\n")
@@ -0,0 +1,188 @@
+"""
+End-to-end load benchmark for the /run-crew API.
+
+Starts the stand-ins from benchmarks.fakes, serves the real FastAPI app with
+uvicorn in a background thread and drives concurrent POST /run-crew requests
+against it. Reports p50/p95/p99 latency, throughput and process memory, and
+fails (exit code 1) when the numbers regress against the stored baseline.
+
+Usage:
+    python -m benchmarks.load --requests 40 --concurrency 8 --llm-latency 0.05
+    python -m benchmarks.load --update-baseline
+"""
+
+import argparse
+import contextlib
+import os
+import socket
+import sys
+import tempfile
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from pathlib import Path
+from typing import Dict, List
+
+ROOT = Path(__file__).resolve().parent.parent
+sys.path.insert(0, str(ROOT / "src"))
+
+from benchmarks.fakes import FakeLLMServer, FakeUpstreamServer, patch_scholarly, stand_in_environment  # noqa: E402
+from benchmarks.gate import compare, load_results, percentile, save_results  # noqa: E402
+
+BASELINE = ROOT / "benchmarks" / "baselines" / "load.json"
+GATED_METRICS = ("p50_ms", "p95_ms", "p99_ms", "throughput_rps", "success_rate", "peak_rss_mb")
+
+
+class _RSSSampler(threading.Thread):
+    """Samples this process's RSS until stopped; keeps start and peak values."""
+
+    def __init__(self, interval: float = 0.05):
+        super().__init__(daemon=True)
+        import psutil
+
+        self._process = psutil.Process()
+        self.interval = interval
+        self.start_rss = self._process.memory_info().rss
+        self.peak_rss = self.start_rss
+        self._stop_event = threading.Event()
+
+    def run(self):
+        while not self._stop_event.wait(self.interval):
+            self.peak_rss = max(self.peak_rss, self._process.memory_info().rss)
+
+    def stop(self) -> int:
+        self._stop_event.set()
+        self.join()
+        end = self._process.memory_info().rss
+        self.peak_rss = max(self.peak_rss, end)
+        return end
+
+
+def _free_port() -> int:
+    with socket.socket() as s:
+        s.bind(("127.0.0.1", 0))
+        return s.getsockname()[1]
+
+
+@contextlib.contextmanager
+def serve_app(app):
+    """Run `app` under uvicorn in a daemon thread and yield its base URL."""
+    import uvicorn
+
+    port = _free_port()
+    server = uvicorn.Server(uvicorn.Config(app, host="127.0.0.1", port=port, log_level="warning", access_log=False))
+    thread = threading.Thread(target=server.run, daemon=True)
+    thread.start()
+    while not server.started:
+        time.sleep(0.01)
+    try:
+        yield f"http://127.0.0.1:{port}"
+    finally:
+        server.should_exit = True
+        thread.join(timeout=10)
+
+
+def run_load(requests_total: int = 20, concurrency: int = 4, llm_latency: float = 0.02,
+             tool_latency: float = 0.01, answer_words: int = 150, warmup: int = 1,
+             topic: str = "AI LLMs", endpoint: str = "/run-crew") -> Dict[str, float]:
+    """Drive `requests_total` requests at `concurrency` and return the metrics."""
+    import requests
+
+    with FakeLLMServer(latency=llm_latency, answer_words=answer_words) as llm, \
+            FakeUpstreamServer(latency=tool_latency) as upstream:
+        os.environ.update(stand_in_environment(llm.url, upstream.url))
+        restore_scholarly = patch_scholarly(upstream.url)
+        from aria.main import app
+
+        workdir = tempfile.mkdtemp(prefix="aria-bench-")
+        previous_cwd = os.getcwd()
+        os.chdir(workdir)  # crew output files land here, not in the repo
+        try:
+            with serve_app(app) as base_url, open(os.devnull, "w") as devnull, \
+                    contextlib.redirect_stdout(devnull):
+                def one(i: int):
+                    started = time.perf_counter()
+                    response = requests.post(f"{base_url}{endpoint}", json={"topic": f"{topic} {i}"}, timeout=600)
+                    return time.perf_counter() - started, response.status_code
+
+                for i in range(warmup):
+                    one(-1 - i)
+
+                llm_calls_before, upstream_calls_before = llm.requests_served, upstream.requests_served
+                sampler = _RSSSampler()
+                sampler.start()
+                started = time.perf_counter()
+                with ThreadPoolExecutor(max_workers=concurrency) as pool:
+                    outcomes = list(pool.map(one, range(requests_total)))
+                elapsed = time.perf_counter() - started
+                end_rss = sampler.stop()
+        finally:
+            os.chdir(previous_cwd)
+            restore_scholarly()
+
+    latencies = [latency * 1000.0 for latency, _ in outcomes]
+    ok = [status for _, status in outcomes if status == 200]
+    mb = 1024.0 * 1024.0
+    return {
+        "requests": requests_total,
+        "concurrency": concurrency,
+        "p50_ms": percentile(latencies, 50),
+        "p95_ms": percentile(latencies, 95),
+        "p99_ms": percentile(latencies, 99),
+        "mean_ms": sum(latencies) / len(latencies) if latencies else 0.0,
+        "throughput_rps": len(ok) / elapsed if elapsed else 0.0,
+        "success_rate": len(ok) / requests_total if requests_total else 0.0,
+        "peak_rss_mb": sampler.peak_rss / mb,
+        "rss_growth_mb": (end_rss - sampler.start_rss) / mb,
+        "llm_calls_per_run": (llm.requests_served - llm_calls_before) / requests_total if requests_total else 0.0,
+        "upstream_calls_per_run": (upstream.requests_served - upstream_calls_before) / requests_total if requests_total else 0.0,
+    }
+
+
+def report(results: Dict[str, float]) -> str:
+    return "\n".join(
+        f"  {name:<20} {value:>12.3f}" if isinstance(value, float) else f"  {name:<20} {value:>12}"
+        for name, value in results.items()
+    )
+
+
+def main(argv: List[str] = None) -> int:
+    parser = argparse.ArgumentParser(description="ARIA /run-crew load benchmark")
+    parser.add_argument("--requests", type=int, default=20)
+    parser.add_argument("--concurrency", type=int, default=4)
+    parser.add_argument("--llm-latency", type=float, default=0.02, help="seconds per fake LLM call")
+    parser.add_argument("--tool-latency", type=float, default=0.01, help="seconds per fake upstream call")
+    parser.add_argument("--answer-words", type=int, default=150, help="words per fake LLM final answer")
+    parser.add_argument("--warmup", type=int, default=1)
+    parser.add_argument("--output", type=Path, help="write results JSON here")
+    parser.add_argument("--baseline", type=Path, default=BASELINE)
+    parser.add_argument("--tolerance", type=float, default=0.15, help="allowed relative regression")
+    parser.add_argument("--update-baseline", action="store_true")
+    parser.add_argument("--no-gate", action="store_true")
+    args = parser.parse_args(argv)
+
+    results = run_load(args.requests, args.concurrency, args.llm_latency, args.tool_latency,
+                       args.answer_words, args.warmup)
+    print("📊 /run-crew load benchmark")
+    print(report(results))
+    if args.output:
+        save_results(args.output, results)
+
+    if args.update_baseline:
+        save_results(args.baseline, results)
+        print(f"✅ Baseline written to {args.baseline}")
+        return 0
+    if args.no_gate or not args.baseline.exists():
+        return 0
+
+    regressions = compare(results, load_results(args.baseline), args.tolerance, GATED_METRICS)
+    if regressions:
+        print("❌ Regressions against baseline:")
+        print("\n".join(f"  {line}" for line in regressions))
+        return 1
+    print("✅ No regressions against baseline.")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
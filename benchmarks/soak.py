@@ -0,0 +1,129 @@
+"""
+Soak test: process memory over thousands of crew runs.
+
+Runs the real crew in-process against the stand-ins from benchmarks.fakes,
+back to back, and samples RSS every `--sample-every` runs once the warm-up is
+done. The growth rate is the least-squares slope of those samples, reported
+per 1000 runs; the soak fails (exit code 1) when it exceeds `--max-growth-mb`.
+
+Usage:
+    python -m benchmarks.soak --runs 2000 --concurrency 4
+    python -m benchmarks.soak --runs 300 --output soak.json
+"""
+
+import argparse
+import contextlib
+import gc
+import logging
+import os
+import sys
+import tempfile
+import time
+from concurrent.futures import ThreadPoolExecutor
+from pathlib import Path
+from typing import Dict, List, Sequence, Tuple
+
+ROOT = Path(__file__).resolve().parent.parent
+sys.path.insert(0, str(ROOT / "src"))
+
+from benchmarks.fakes import FakeLLMServer, FakeUpstreamServer, patch_scholarly, stand_in_environment  # noqa: E402
+from benchmarks.gate import save_results  # noqa: E402
+from benchmarks.load import report  # noqa: E402
+
+MB = 1024.0 * 1024.0
+
+
+def slope(samples: Sequence[Tuple[float, float]]) -> float:
+    """Least-squares slope of (x, y) samples; 0.0 with fewer than two."""
+    if len(samples) < 2:
+        return 0.0
+    n = len(samples)
+    mean_x = sum(x for x, _ in samples) / n
+    mean_y = sum(y for _, y in samples) / n
+    var = sum((x - mean_x) ** 2 for x, _ in samples)
+    return sum((x - mean_x) * (y - mean_y) for x, y in samples) / var if var else 0.0
+
+
+def run_soak(runs: int = 2000, concurrency: int = 4, warmup: int = 20, sample_every: int = 50,
+             answer_words: int = 150) -> Dict[str, float]:
+    """Run `runs` crews and return RSS figures with the growth per 1000 runs."""
+    import psutil
+
+    with FakeLLMServer(answer_words=answer_words) as llm, FakeUpstreamServer() as upstream:
+        os.environ.update(stand_in_environment(llm.url, upstream.url))
+        os.environ["SCHOLAR_REQUEST_DELAY"] = "0"
+        restore_scholarly = patch_scholarly(upstream.url)
+        from aria.batch import kickoff_crew
+
+        process = psutil.Process()
+        previous_cwd = os.getcwd()
+        os.chdir(tempfile.mkdtemp(prefix="aria-soak-"))
+        logging.disable(logging.INFO)
+        samples: List[Tuple[float, float]] = []
+        failures = 0
+        peak_run_bytes = 0
+        try:
+            with open(os.devnull, "w") as devnull, contextlib.redirect_stdout(devnull), \
+                    ThreadPoolExecutor(max_workers=concurrency) as pool:
+                def one(i: int):
+                    # A handful of recurring topics, like a real session.
+                    return kickoff_crew({"topic": f"soak topic {i % 13}", "current_year": "2026",
+                                         "output_path": "/tmp"})
+
+                list(pool.map(one, range(-warmup, 0)))
+                started = time.perf_counter()
+                for done in range(0, runs, sample_every):
+                    for result in pool.map(one, range(done, min(runs, done + sample_every))):
+                        if result.memory:
+                            peak_run_bytes = max(peak_run_bytes, result.memory["peak_bytes"])
+                        else:
+                            failures += 1
+                    gc.collect()
+                    samples.append((min(runs, done + sample_every), process.memory_info().rss / MB))
+                elapsed = time.perf_counter() - started
+        finally:
+            logging.disable(logging.NOTSET)
+            os.chdir(previous_cwd)
+            restore_scholarly()
+
+    rss = [value for _, value in samples]
+    return {
+        "runs": runs,
+        "concurrency": concurrency,
+        "runs_per_s": runs / elapsed if elapsed else 0.0,
+        "start_rss_mb": rss[0] if rss else 0.0,
+        "end_rss_mb": rss[-1] if rss else 0.0,
+        "peak_rss_mb": max(rss) if rss else 0.0,
+        "growth_mb_per_1000_runs": slope(samples) * 1000.0,
+        "peak_run_output_kb": peak_run_bytes / 1024.0,
+        "failed_runs": failures,
+    }
+
+
+def main(argv: List[str] = None) -> int:
+    parser = argparse.ArgumentParser(description="ARIA crew soak test (RSS over many runs)")
+    parser.add_argument("--runs", type=int, default=2000)
+    parser.add_argument("--concurrency", type=int, default=4)
+    parser.add_argument("--warmup", type=int, default=20)
+    parser.add_argument("--sample-every", type=int, default=50)
+    parser.add_argument("--answer-words", type=int, default=150, help="words per fake LLM final answer")
+    parser.add_argument("--max-growth-mb", type=float, default=5.0, help="allowed RSS growth per 1000 runs")
+    parser.add_argument("--output", type=Path, help="write results JSON here")
+    args = parser.parse_args(argv)
+
+    results = run_soak(args.runs, args.concurrency, args.warmup, args.sample_every, args.answer_words)
+    print("📊 Crew soak test")
+    print(report(results))
+    if args.output:
+        save_results(args.output, results)
+
+    if results["growth_mb_per_1000_runs"] > args.max_growth_mb:
+        print(f"❌ RSS grows {results['growth_mb_per_1000_runs']:.1f} MB per 1000 runs "
+              f"(limit {args.max_growth_mb:.1f} MB).")
+        return 1
+    print("✅ RSS is flat.")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
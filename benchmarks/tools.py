@@ -0,0 +1,175 @@
+"""
+Tool-level microbenchmarks with recorded fixtures.
+
+Each tool in aria.tools runs in isolation against a FixtureServer (in a child
+process) that replays the recorded responses in benchmarks/fixtures/, so the
+numbers cover request building, the HTTP client, response parsing and output
+formatting - but no real network.
+
+For every case the harness reports per-call latency (p50/p95/mean), the net
+number of allocated blocks and the peak traced memory of one call. Results are
+stored per commit under benchmarks/results/tools/ so two commits can be
+compared with the same gate as the load benchmark.
+
+Usage:
+    python -m benchmarks.tools                       # run and store for HEAD
+    python -m benchmarks.tools --pages 1,10,50,200   # reviewer report sizes
+    python -m benchmarks.tools --compare abc1234     # gate against a stored commit
+"""
+
+import argparse
+import contextlib
+import gc
+import os
+import subprocess
+import sys
+import tempfile
+import time
+import tracemalloc
+from pathlib import Path
+from typing import Callable, Dict, List, Optional, Tuple
+
+ROOT = Path(__file__).resolve().parent.parent
+sys.path.insert(0, str(ROOT / "src"))
+
+from benchmarks.fakes import FIXTURES, FixtureServer, patch_scholarly, serve_fixtures_in_subprocess  # noqa: E402
+from benchmarks.gate import compare, load_results, percentile, save_results  # noqa: E402
+
+RESULTS_DIR = ROOT / "benchmarks" / "results" / "tools"
+GATED_SUFFIXES = ("p50_ms", "p95_ms", "net_allocs", "peak_kb")
+
+
+def git_revision() -> str:
+    """Short HEAD hash, suffixed with -dirty when the tree has local changes."""
+    try:
+        sha = subprocess.check_output(["git", "rev-parse", "--short", "HEAD"], cwd=ROOT, text=True).strip()
+        dirty = subprocess.run(["git", "diff", "--quiet", "HEAD", "--", "src"], cwd=ROOT).returncode != 0
+        return f"{sha}-dirty" if dirty else sha
+    except (OSError, subprocess.CalledProcessError):
+        return "unknown"
+
+
+def measure(call: Callable[[], object], iterations: int, warmup: int = 2) -> Dict[str, float]:
+    """Time `call` `iterations` times, then trace a single call for memory."""
+    for _ in range(warmup):
+        call()
+
+    latencies = []
+    for _ in range(iterations):
+        started = time.perf_counter()
+        call()
+        latencies.append((time.perf_counter() - started) * 1000.0)
+
+    gc.collect()
+    tracemalloc.start()
+    before = tracemalloc.take_snapshot()
+    baseline, _ = tracemalloc.get_traced_memory()
+    tracemalloc.reset_peak()
+    call()
+    _, peak = tracemalloc.get_traced_memory()
+    after = tracemalloc.take_snapshot()
+    tracemalloc.stop()
+    net_allocs = sum(stat.count_diff for stat in after.compare_to(before, "lineno") if stat.count_diff > 0)
+
+    return {
+        "p50_ms": percentile(latencies, 50),
+        "p95_ms": percentile(latencies, 95),
+        "mean_ms": sum(latencies) / len(latencies),
+        "net_allocs": float(net_allocs),
+        "peak_kb": (peak - baseline) / 1024.0,
+    }
+
+
+def report_of_pages(pages: int) -> str:
+    page = (FIXTURES / "report.md").read_text(encoding="utf-8")
+    return FixtureServer.PAGE_SEPARATOR.join([page] * pages)
+
+
+def build_cases(pages: List[int]) -> List[Tuple[str, Callable[[], object], int]]:
+    """(name, zero-arg call, iterations) for every tool benchmark."""
+    from aria.tools.fact_check_tool import FactCheckerTool
+    from aria.tools.review_tools import ReviewerTool
+    from aria.tools.scholar_tool import SearchScholar
+    from aria.tools.summarizer import SummarizerTool
+    from aria.tools.writer_tools import WriterTool
+
+    notes = report_of_pages(1)
+    scholar, fact_checker, summarizer, writer = SearchScholar(), FactCheckerTool(), SummarizerTool(), WriterTool()
+    cases = [
+        ("scholar", lambda: scholar.run(query="large language models"), 50),
+        ("fact_check", lambda: fact_checker.run(statement="Mixture-of-experts models are now standard"), 50),
+        ("summarizer", lambda: summarizer.run(text=notes), 50),
+        ("writer", lambda: writer.run(content=notes), 50),
+    ]
+    # The reviewer streams the corrected report to its output file.
+    reviewer = ReviewerTool(output_file=str(Path(tempfile.mkdtemp(prefix="aria-bench-")) / "report_corrected.md"))
+    for n in pages:
+        report = report_of_pages(n)
+        cases.append((f"reviewer[{n}p]", lambda report=report: reviewer.run(report=report), max(3, 50 // n)))
+    return cases
+
+
+def run_benchmarks(pages: List[int], only: Optional[str] = None) -> Dict[str, float]:
+    results: Dict[str, float] = {}
+    with serve_fixtures_in_subprocess() as url:
+        os.environ.update({
+            "RAPIDAPI_KEY": "fixture-key",
+            "HF_API_KEY": "fixture-key",
+            "FACT_CHECK_API_URL": f"{url}/news/search",
+            "HF_SUMMARIZER_URL": f"{url}/hf/summarize",
+            "HF_WRITER_URL": f"{url}/hf/generate",
+            "LANGUAGETOOL_URL": url,
+            "SCHOLAR_REQUEST_DELAY": "0",
+            "CREWAI_DISABLE_TELEMETRY": "true",
+            "OTEL_SDK_DISABLED": "true",
+        })
+        restore_scholarly = patch_scholarly(url)
+        try:
+            with open(os.devnull, "w") as devnull, contextlib.redirect_stdout(devnull):
+                cases = build_cases(pages)
+                for name, call, iterations in cases:
+                    if only and not name.startswith(only):
+                        continue
+                    for metric, value in measure(call, iterations).items():
+                        results[f"{name}.{metric}"] = value
+        finally:
+            restore_scholarly()
+    return results
+
+
+def main(argv: List[str] = None) -> int:
+    parser = argparse.ArgumentParser(description="ARIA tool microbenchmarks")
+    parser.add_argument("--pages", default="1,10,50", help="comma separated reviewer report sizes in pages")
+    parser.add_argument("--only", help="run only cases whose name starts with this prefix")
+    parser.add_argument("--compare", metavar="REV", help="gate against results stored for this revision")
+    parser.add_argument("--tolerance", type=float, default=0.20)
+    parser.add_argument("--no-store", action="store_true", help="don't write results for this revision")
+    args = parser.parse_args(argv)
+
+    results = run_benchmarks([int(p) for p in args.pages.split(",") if p], args.only)
+    revision = git_revision()
+
+    print(f"📊 Tool microbenchmarks @ {revision}")
+    print(f"  {'case':<16} {'p50 ms':>10} {'p95 ms':>10} {'net allocs':>11} {'peak KB':>10}")
+    for case in sorted({key.rsplit('.', 1)[0] for key in results}):
+        print(f"  {case:<16} {results[f'{case}.p50_ms']:>10.3f} {results[f'{case}.p95_ms']:>10.3f} "
+              f"{results[f'{case}.net_allocs']:>11.0f} {results[f'{case}.peak_kb']:>10.1f}")
+
+    if not args.no_store:
+        save_results(RESULTS_DIR / f"{revision}.json", results)
+        print(f"💾 Stored in {RESULTS_DIR / f'{revision}.json'}")
+
+    if args.compare:
+        baseline = load_results(RESULTS_DIR / f"{args.compare}.json")
+        gated = [key for key in baseline if key.endswith(GATED_SUFFIXES)]
+        regressions = compare(results, baseline, args.tolerance, gated)
+        if regressions:
+            print(f"❌ Regressions against {args.compare}:")
+            print("\n".join(f"  {line}" for line in regressions))
+            return 1
+        print(f"✅ No regressions against {args.compare}.")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,284 @@
+"""
+Admission control and fair scheduling of crew runs.
+
+Every crew run needs one of `capacity` execution slots. Requests that cannot
+start right away wait in a weighted fair queue, or are rejected up front
+(429 + Retry-After) when the queue is full or the estimated completion time
+exceeds ARIA_MAX_WAIT_SECONDS. Rejecting early is cheaper for everyone than
+accepting work that will end in a timeout.
+
+Waiting runs are grouped into flows - one per (lane, client) - and served
+in order of virtual finish time (start-time fair queuing). A flow's weight
+is its lane weight (interactive runs outrank batch topics, 4:1 by default)
+times its client weight (ARIA_API_KEY_WEIGHTS). A client that submits
+hundreds of topics only gets its own flow's share, and everyone else keeps
+theirs.
+
+A run with a deadline (see aria/deadline.py) is rejected rather than queued
+when the estimated wait is longer than the time it has left, and stops
+waiting - rejected - once its deadline passes.
+
+The resource monitor (see monitoring.py) can pause admission under memory or
+CPU pressure - new runs are rejected, and under memory pressure waiting runs
+are held too - and shed waiting runs of a lane before the container runs out
+of memory.
+"""
+
+import contextlib
+import heapq
+import itertools
+import logging
+import math
+import os
+import threading
+import time
+from typing import Any, Dict, Iterator, List, Optional, Tuple
+
+logger = logging.getLogger(__name__)
+
+INTERACTIVE, BATCH = "interactive", "batch"
+
+
+def _parse_weights(spec: str) -> Dict[str, float]:
+    """'key-a:2,key-b:0.5' -> {'key-a': 2.0, 'key-b': 0.5}"""
+    weights = {}
+    for item in filter(None, (part.strip() for part in spec.split(","))):
+        name, _, weight = item.rpartition(":")
+        if name:
+            weights[name] = float(weight)
+    return weights
+
+
+def _default_capacity() -> int:
+    workers = int(os.getenv("ARIA_WORKERS", "0"))
+    return workers if workers > 0 else int(os.getenv("MAX_CONCURRENT_TASKS", "5"))
+
+
+CAPACITY = int(os.getenv("ARIA_ADMISSION_CAPACITY", "0")) or _default_capacity()
+MAX_QUEUE = int(os.getenv("ARIA_MAX_QUEUE", "50"))
+MAX_WAIT_SECONDS = float(os.getenv("ARIA_MAX_WAIT_SECONDS", "300"))
+ESTIMATED_RUN_SECONDS = float(os.getenv("ARIA_ESTIMATED_RUN_SECONDS", "60"))
+LANE_WEIGHTS = {INTERACTIVE: 4.0, BATCH: 1.0, **_parse_weights(os.getenv("ARIA_LANE_WEIGHTS", ""))}
+CLIENT_WEIGHTS = _parse_weights(os.getenv("ARIA_API_KEY_WEIGHTS", ""))
+
+# Smoothing of the observed run duration used for completion estimates.
+DURATION_EWMA_ALPHA = 0.2
+
+
+class AdmissionRejected(Exception):
+    """The run was not admitted; retry after `retry_after` seconds."""
+
+    def __init__(self, reason: str, retry_after: int):
+        super().__init__(reason)
+        self.reason = reason
+        self.retry_after = retry_after
+
+
+class _Waiter:
+    def __init__(self, flow: Tuple[str, str], start_tag: float, finish_tag: float):
+        self.flow = flow
+        self.start_tag = start_tag
+        self.finish_tag = finish_tag
+        self.granted = threading.Event()
+        self.rejected: Optional[AdmissionRejected] = None
+
+
+class AdmissionController:
+    """Slot-limited scheduler with queue-depth/ETA admission and weighted fair queuing."""
+
+    def __init__(self, capacity: int = CAPACITY, max_queue: int = MAX_QUEUE,
+                 max_wait_seconds: float = MAX_WAIT_SECONDS, estimated_run_seconds: float = ESTIMATED_RUN_SECONDS,
+                 lane_weights: Optional[Dict[str, float]] = None, client_weights: Optional[Dict[str, float]] = None):
+        self.capacity = max(1, capacity)
+        self.max_queue = max_queue
+        self.max_wait_seconds = max_wait_seconds
+        self.avg_run_seconds = estimated_run_seconds
+        self.lane_weights = dict(LANE_WEIGHTS if lane_weights is None else lane_weights)
+        self.client_weights = dict(CLIENT_WEIGHTS if client_weights is None else client_weights)
+        self._lock = threading.Lock()
+        self._heap: List[Tuple[float, int, _Waiter]] = []
+        self._seq = itertools.count()
+        self._virtual_time = 0.0
+        self._last_finish: Dict[Tuple[str, str], float] = {}
+        self.running = 0
+        self.admitted = 0
+        self.rejected = 0
+        self.shed_count = 0
+        self.served: Dict[str, int] = {}
+        self.paused: Optional[str] = None
+        self.holding = False
+        self._pause_retry_after = 1
+
+    def weight(self, client: str, lane: str) -> float:
+        return self.lane_weights.get(lane, 1.0) * self.client_weights.get(client, 1.0)
+
+    def estimated_wait(self) -> float:
+        """Seconds until a run submitted now would start."""
+        with self._lock:
+            return self._estimated_wait()
+
+    def _estimated_wait(self) -> float:
+        ahead = self.running + len(self._heap) - self.capacity + 1
+        return max(0.0, ahead / self.capacity * self.avg_run_seconds)
+
+    def has_room(self) -> bool:
+        """Whether a run would start right away: admission not paused, a slot free and no run waiting."""
+        with self._lock:
+            return not self.paused and not self.holding and self.running < self.capacity and not self._heap
+
+    def check(self) -> None:
+        """Raise AdmissionRejected if a new run should not be queued now."""
+        with self._lock:
+            self._check()
+
+    def _check(self) -> None:
+        if self.paused:
+            self.rejected += 1
+            raise AdmissionRejected(f"Admission paused: {self.paused}.", self._pause_retry_after)
+        if self.running < self.capacity and not self._heap:
+            return
+        per_slot = max(1, math.ceil(self.avg_run_seconds / self.capacity))
+        if len(self._heap) >= self.max_queue:
+            self.rejected += 1
+            raise AdmissionRejected(f"Queue is full ({len(self._heap)} runs waiting).", per_slot)
+        wait = self._estimated_wait()
+        if wait > self.max_wait_seconds:
+            self.rejected += 1
+            raise AdmissionRejected(
+                f"Estimated wait {wait:.0f}s exceeds {self.max_wait_seconds:.0f}s.",
+                max(per_slot, math.ceil(wait - self.max_wait_seconds)),
+            )
+
+    def acquire(self, client: str, lane: str = INTERACTIVE, admit: bool = True, deadline: Optional[Any] = None) -> None:
+        """
+        Block until a slot is granted. With `admit`, reject instead of queueing past
+        the limits; with a `deadline`, instead of waiting past it.
+        """
+        flow = (lane, client)
+        with self._lock:
+            if admit:
+                self._check()
+            if deadline is not None:
+                self._check_deadline(deadline)
+            self.admitted += 1
+            if self.running < self.capacity and not self._heap and not self.holding:
+                self._start(flow)
+                return
+            start = max(self._virtual_time, self._last_finish.get(flow, 0.0))
+            waiter = _Waiter(flow, start, start + 1.0 / self.weight(client, lane))
+            self._last_finish[flow] = waiter.finish_tag
+            heapq.heappush(self._heap, (waiter.finish_tag, next(self._seq), waiter))
+        if not waiter.granted.wait(None if deadline is None else max(0.0, deadline.remaining())):
+            self._give_up(waiter)
+        if waiter.rejected is not None:
+            raise waiter.rejected
+
+    def _check_deadline(self, deadline: Any) -> None:
+        remaining = deadline.remaining()
+        if remaining <= 0:
+            self.rejected += 1
+            raise AdmissionRejected("Deadline reached before the run could start.", 1)
+        if self.running < self.capacity and not self._heap and not self.holding:
+            return
+        wait = self._estimated_wait()
+        if wait >= remaining:
+            self.rejected += 1
+            raise AdmissionRejected(f"Estimated wait {wait:.0f}s exceeds the run's deadline ({remaining:.0f}s left).",
+                                    max(1, math.ceil(wait)))
+
+    def _give_up(self, waiter: _Waiter) -> None:
+        """Take a waiter whose deadline passed out of the queue, unless it was granted meanwhile."""
+        with self._lock:
+            if waiter.granted.is_set():
+                return
+            self._heap = [entry for entry in self._heap if entry[2] is not waiter]
+            heapq.heapify(self._heap)
+            self.rejected += 1
+            waiter.rejected = AdmissionRejected("Deadline reached while waiting for a slot.",
+                                                max(1, math.ceil(self.avg_run_seconds / self.capacity)))
+            waiter.granted.set()
+
+    def _start(self, flow: Tuple[str, str]) -> None:
+        self.running += 1
+        self.served[flow[0]] = self.served.get(flow[0], 0) + 1
+
+    def release(self, duration: Optional[float] = None) -> None:
+        """Free a slot, record the run's duration and start the next waiter."""
+        with self._lock:
+            self.running -= 1
+            if duration is not None:
+                self.avg_run_seconds += DURATION_EWMA_ALPHA * (duration - self.avg_run_seconds)
+            self._dispatch()
+
+    def _dispatch(self) -> None:
+        while self._heap and self.running < self.capacity and not self.holding:
+            _, _, waiter = heapq.heappop(self._heap)
+            self._virtual_time = waiter.start_tag
+            self._start(waiter.flow)
+            waiter.granted.set()
+        if not self._heap and not self.running:
+            # Idle: forget old finish tags so tags stay small.
+            self._virtual_time = 0.0
+            self._last_finish.clear()
+
+    def pause(self, reason: str, retry_after: int = 1, hold: bool = True) -> None:
+        """Reject new runs until resume(); with `hold`, waiting runs do not start either."""
+        with self._lock:
+            self.paused = reason
+            self._pause_retry_after = retry_after
+            self.holding = hold
+            self._dispatch()
+
+    def resume(self) -> None:
+        with self._lock:
+            if self.paused is None:
+                return
+            self.paused = None
+            self.holding = False
+            self._dispatch()
+
+    def shed(self, lane: str, reason: str) -> int:
+        """Reject every waiting run in `lane`; returns how many were shed."""
+        with self._lock:
+            kept, shed = [], []
+            for entry in self._heap:
+                (shed if entry[2].flow[0] == lane else kept).append(entry)
+            if not shed:
+                return 0
+            heapq.heapify(kept)
+            self._heap = kept
+            retry_after = max(1, math.ceil(self.avg_run_seconds / self.capacity))
+            for _, _, waiter in shed:
+                waiter.rejected = AdmissionRejected(f"Run {reason}.", retry_after)
+                waiter.granted.set()
+            self.shed_count += len(shed)
+            self.rejected += len(shed)
+            return len(shed)
+
+    @contextlib.contextmanager
+    def slot(self, client: str, lane: str = INTERACTIVE, admit: bool = True,
+             deadline: Optional[Any] = None) -> Iterator[None]:
+        self.acquire(client, lane, admit, deadline)
+        started = time.monotonic()
+        try:
+            yield
+        finally:
+            self.release(time.monotonic() - started)
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            waiting: Dict[str, int] = {}
+            for _, _, waiter in self._heap:
+                waiting[waiter.flow[0]] = waiting.get(waiter.flow[0], 0) + 1
+            return {
+                "capacity": self.capacity,
+                "running": self.running,
+                "waiting": waiting,
+                "admitted": self.admitted,
+                "rejected": self.rejected,
+                "shed": self.shed_count,
+                "paused": self.paused,
+                "served": dict(self.served),
+                "avg_run_seconds": round(self.avg_run_seconds, 2),
+                "estimated_wait_seconds": round(self._estimated_wait(), 2),
+            }
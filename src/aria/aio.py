@@ -0,0 +1,133 @@
+"""
+Shared event loop and HTTP connection pool for async tool calls.
+
+Tools implement `_arun` natively on asyncio (see aria/tools/). Every process
+runs one event loop in a daemon thread, with one aiohttp session whose
+connector pools up to ARIA_TOOL_HTTP_CONNECTIONS connections. An outstanding
+HTTP call then costs a coroutine, not a thread, so one process can keep
+hundreds of tool calls in flight.
+
+- submit(coro) schedules a coroutine on the loop and returns a
+  concurrent.futures.Future; the coroutine runs in a copy of the caller's
+  context, so the active tool cache (a ContextVar) follows it.
+- run_sync(coro) is the sync shim the tools' `_run` use: submit and wait.
+- run_blocking(func, ...) runs a blocking library call (scholarly has no
+  async API) on a small thread pool without blocking the loop.
+
+The loop, session and pool are created on first use and again after a fork.
+"""
+
+import asyncio
+import atexit
+import concurrent.futures
+import contextvars
+import logging
+import os
+import threading
+from typing import Any, Callable, Coroutine, Optional
+
+import aiohttp
+
+logger = logging.getLogger(__name__)
+
+HTTP_CONNECTIONS = int(os.getenv("ARIA_TOOL_HTTP_CONNECTIONS", "100"))
+BLOCKING_THREADS = int(os.getenv("ARIA_TOOL_BLOCKING_THREADS", "8"))
+
+
+class _Runtime:
+    def __init__(self):
+        self.pid = os.getpid()
+        self.loop = asyncio.new_event_loop()
+        self.thread = threading.Thread(target=self.loop.run_forever, name="aria-tools-loop", daemon=True)
+        self.blocking = concurrent.futures.ThreadPoolExecutor(max_workers=max(1, BLOCKING_THREADS),
+                                                              thread_name_prefix="aria-tools-blocking")
+        self.session: Optional[aiohttp.ClientSession] = None
+        self.thread.start()
+
+    def close(self) -> None:
+        async def close_session():
+            if self.session is not None:
+                await self.session.close()
+
+        if self.loop.is_running():
+            closing = asyncio.run_coroutine_threadsafe(close_session(), self.loop)
+            try:
+                closing.result(timeout=5)
+            except Exception as e:
+                logger.debug("Closing the tool HTTP session failed: %s", e)
+            self.loop.call_soon_threadsafe(self.loop.stop)
+        self.blocking.shutdown(wait=False)
+
+
+_runtime: Optional[_Runtime] = None
+_lock = threading.Lock()
+
+
+def _current() -> _Runtime:
+    global _runtime
+    with _lock:
+        if _runtime is None or _runtime.pid != os.getpid():
+            # A forked child inherits the object but not the loop thread.
+            _runtime = _Runtime()
+        return _runtime
+
+
+def event_loop() -> asyncio.AbstractEventLoop:
+    return _current().loop
+
+
+def in_loop_thread() -> bool:
+    return _runtime is not None and threading.current_thread() is _runtime.thread
+
+
+async def http_session() -> aiohttp.ClientSession:
+    """The process-wide aiohttp session; call from the shared loop."""
+    runtime = _current()
+    if runtime.session is None or runtime.session.closed:
+        runtime.session = aiohttp.ClientSession(connector=aiohttp.TCPConnector(limit=HTTP_CONNECTIONS))
+    return runtime.session
+
+
+def submit(coro: Coroutine[Any, Any, Any]) -> concurrent.futures.Future:
+    """Schedule `coro` on the shared loop, in a copy of the caller's context."""
+    loop = event_loop()
+    context = contextvars.copy_context()
+    future: concurrent.futures.Future = concurrent.futures.Future()
+
+    def copy_outcome(task: asyncio.Task) -> None:
+        if task.cancelled():
+            future.set_exception(concurrent.futures.CancelledError())
+        elif task.exception() is not None:
+            future.set_exception(task.exception())
+        else:
+            future.set_result(task.result())
+
+    def start() -> None:
+        # Like an executor: a future cancelled before it starts never runs.
+        if not future.set_running_or_notify_cancel():
+            coro.close()
+            return
+        context.run(loop.create_task, coro).add_done_callback(copy_outcome)
+
+    loop.call_soon_threadsafe(start)
+    return future
+
+
+def run_sync(coro: Coroutine[Any, Any, Any]) -> Any:
+    """Run `coro` on the shared loop and wait for its result."""
+    if in_loop_thread():
+        coro.close()
+        raise RuntimeError("run_sync() called from the tool event loop; await the coroutine instead")
+    return submit(coro).result()
+
+
+async def run_blocking(func: Callable[..., Any], *args: Any) -> Any:
+    """Run a blocking call on the tool thread pool, in the caller's context."""
+    context = contextvars.copy_context()
+    return await asyncio.get_running_loop().run_in_executor(_current().blocking, context.run, func, *args)
+
+
+@atexit.register
+def _shutdown() -> None:
+    if _runtime is not None and _runtime.pid == os.getpid():
+        _runtime.close()
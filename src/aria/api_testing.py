@@ -0,0 +1,434 @@
+"""
+API connectivity testing and protection of external tool endpoints.
+
+- CircuitBreaker: stops calling an endpoint after repeated failures and lets a
+  single trial call through once `recovery_timeout` has passed.
+- AdaptiveTimeout: per-endpoint timeout derived from observed latency
+  percentiles (p99 x margin, clamped), instead of waiting indefinitely.
+- guarded_request: the requests wrapper for blocking callers. It applies both
+  and raises EndpointUnavailable right away while a breaker is open, so tools
+  can return a degraded result without touching the network.
+- guarded_request_async: the same on the shared aiohttp session (see
+  aria/aio.py); the tools use it, and it shares breakers and timeouts with
+  guarded_request.
+- TimeoutHandler: timeout + retry with backoff for arbitrary callables.
+- APIConnectivityTester / test_api_connectivity: probe the configured
+  endpoints and report reachability, latency and breaker state.
+
+Both guarded requests cut their timeout to the run's deadline, if any (see
+aria/deadline.py), and raise EndpointUnavailable without a request once it
+has passed.
+
+Breaker and timeout state per endpoint is exposed through endpoint_states(),
+which /health and /metrics include.
+"""
+
+import asyncio
+import json
+import logging
+import os
+import threading
+import time
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+from concurrent.futures import TimeoutError as FutureTimeout
+from dataclasses import dataclass
+from typing import Any, Callable, Deque, Dict, Optional, Tuple
+
+import aiohttp
+import requests
+
+from aria.deadline import current_deadline
+
+logger = logging.getLogger(__name__)
+
+API_TIMEOUT = float(os.getenv("API_TIMEOUT", "30"))
+MAX_RETRY_ATTEMPTS = int(os.getenv("MAX_RETRY_ATTEMPTS", "3"))
+RETRY_DELAY = float(os.getenv("RETRY_DELAY", "2.0"))
+CIRCUIT_BREAKER_THRESHOLD = int(os.getenv("CIRCUIT_BREAKER_THRESHOLD", "5"))
+CIRCUIT_BREAKER_RECOVERY_TIMEOUT = float(os.getenv("CIRCUIT_BREAKER_RECOVERY_TIMEOUT", "60"))
+
+# Adaptive timeouts: p99 of recent latencies times a margin, within [floor, API_TIMEOUT].
+TIMEOUT_PERCENTILE = 0.99
+TIMEOUT_MARGIN = float(os.getenv("ADAPTIVE_TIMEOUT_MARGIN", "2.0"))
+TIMEOUT_FLOOR = float(os.getenv("ADAPTIVE_TIMEOUT_FLOOR", "2.0"))
+LATENCY_WINDOW = 200
+MIN_SAMPLES = 10
+
+CLOSED, OPEN, HALF_OPEN = "closed", "open", "half_open"
+
+
+class CircuitBreakerOpen(Exception):
+    """Raised instead of calling an endpoint whose breaker is open."""
+
+
+class EndpointUnavailable(Exception):
+    """An external endpoint failed, timed out or is cut off by its breaker."""
+
+
+class CircuitBreaker:
+    """Closed -> open after `failure_threshold` consecutive failures -> half-open after `recovery_timeout`."""
+
+    def __init__(self, failure_threshold: int = CIRCUIT_BREAKER_THRESHOLD,
+                 recovery_timeout: float = CIRCUIT_BREAKER_RECOVERY_TIMEOUT, name: str = "default"):
+        self.name = name
+        self.failure_threshold = failure_threshold
+        self.recovery_timeout = recovery_timeout
+        self.failures = 0
+        self.opened_at: Optional[float] = None
+        self.times_opened = 0
+        self.rejected = 0
+        self._trial_in_flight = False
+        self._lock = threading.Lock()
+
+    @property
+    def state(self) -> str:
+        with self._lock:
+            return self._state()
+
+    def _state(self) -> str:
+        if self.opened_at is None:
+            return CLOSED
+        if time.monotonic() - self.opened_at >= self.recovery_timeout:
+            return HALF_OPEN
+        return OPEN
+
+    def allow(self) -> bool:
+        """Whether a call may go through now (one trial call at a time when half-open)."""
+        with self._lock:
+            state = self._state()
+            if state == CLOSED:
+                return True
+            if state == HALF_OPEN and not self._trial_in_flight:
+                self._trial_in_flight = True
+                return True
+            self.rejected += 1
+            return False
+
+    def record_success(self) -> None:
+        with self._lock:
+            if self.opened_at is not None:
+                logger.info("Circuit %s closed again", self.name)
+            self.failures = 0
+            self.opened_at = None
+            self._trial_in_flight = False
+
+    def record_failure(self) -> None:
+        with self._lock:
+            self.failures += 1
+            trial_failed = self._trial_in_flight
+            self._trial_in_flight = False
+            if trial_failed or (self.opened_at is None and self.failures >= self.failure_threshold):
+                if self.opened_at is None:
+                    self.times_opened += 1
+                    logger.warning("Circuit %s opened after %d failures", self.name, self.failures)
+                self.opened_at = time.monotonic()
+
+    def release(self) -> None:
+        """End a half-open trial without an outcome, so the next call may try again."""
+        with self._lock:
+            self._trial_in_flight = False
+
+    def call(self, func: Callable[..., Any], *args, **kwargs) -> Any:
+        """Call `func` through the breaker; exceptions count as failures."""
+        if not self.allow():
+            raise CircuitBreakerOpen(f"Circuit {self.name} is open")
+        settled = False
+        try:
+            result = func(*args, **kwargs)
+            settled = True
+        except Exception:
+            self.record_failure()
+            settled = True
+            raise
+        finally:
+            # Interrupted (KeyboardInterrupt, cancellation): no outcome, but the trial ends.
+            if not settled:
+                self.release()
+        self.record_success()
+        return result
+
+    def snapshot(self) -> Dict[str, Any]:
+        with self._lock:
+            state = self._state()
+            return {
+                "state": state,
+                "consecutive_failures": self.failures,
+                "times_opened": self.times_opened,
+                "rejected_calls": self.rejected,
+                "retry_in_s": round(max(0.0, self.recovery_timeout - (time.monotonic() - self.opened_at)), 1)
+                if state == OPEN else 0.0,
+            }
+
+
+class AdaptiveTimeout:
+    """Timeout that follows the observed latency distribution of one endpoint."""
+
+    def __init__(self, ceiling: float = API_TIMEOUT, floor: float = TIMEOUT_FLOOR,
+                 margin: float = TIMEOUT_MARGIN, percentile: float = TIMEOUT_PERCENTILE):
+        self.ceiling = ceiling
+        self.floor = min(floor, ceiling)
+        self.margin = margin
+        self.percentile = percentile
+        self._samples: Deque[float] = deque(maxlen=LATENCY_WINDOW)
+        self._lock = threading.Lock()
+
+    def observe(self, seconds: float) -> None:
+        with self._lock:
+            self._samples.append(seconds)
+
+    def sample_count(self) -> int:
+        with self._lock:
+            return len(self._samples)
+
+    def quantile(self, q: float) -> Optional[float]:
+        with self._lock:
+            if not self._samples:
+                return None
+            ordered = sorted(self._samples)
+        return ordered[min(len(ordered) - 1, int(q * len(ordered)))]
+
+    def timeout(self) -> float:
+        """Ceiling until enough samples are seen, then p99 x margin clamped to [floor, ceiling]."""
+        with self._lock:
+            if len(self._samples) < MIN_SAMPLES:
+                return self.ceiling
+        return max(self.floor, min(self.ceiling, self.quantile(self.percentile) * self.margin))
+
+    def snapshot(self) -> Dict[str, Any]:
+        p50, p99 = self.quantile(0.5), self.quantile(self.percentile)
+        return {
+            "timeout_s": round(self.timeout(), 3),
+            "p50_ms": round(p50 * 1000, 1) if p50 is not None else None,
+            "p99_ms": round(p99 * 1000, 1) if p99 is not None else None,
+            "samples": len(self._samples),
+        }
+
+
+class EndpointGuard:
+    """Circuit breaker plus adaptive timeout for one external endpoint."""
+
+    def __init__(self, name: str):
+        self.name = name
+        self.breaker = CircuitBreaker(name=name)
+        self.timeout = AdaptiveTimeout()
+
+    def snapshot(self) -> Dict[str, Any]:
+        return {"circuit": self.breaker.snapshot(), **self.timeout.snapshot()}
+
+
+_guards: Dict[str, EndpointGuard] = {}
+_guards_lock = threading.Lock()
+
+
+def endpoint_guard(name: str) -> EndpointGuard:
+    with _guards_lock:
+        if name not in _guards:
+            _guards[name] = EndpointGuard(name)
+        return _guards[name]
+
+
+def endpoint_states() -> Dict[str, Dict[str, Any]]:
+    """Breaker and timeout state of every endpoint used so far."""
+    with _guards_lock:
+        guards = list(_guards.values())
+    return {guard.name: guard.snapshot() for guard in guards}
+
+
+def open_circuits() -> list:
+    return [name for name, state in endpoint_states().items() if state["circuit"]["state"] == OPEN]
+
+
+def _request_timeout(endpoint: str, guard: EndpointGuard) -> Tuple[float, bool]:
+    """
+    The guard's timeout cut to the run's deadline (see aria/deadline.py), and
+    whether it was cut - a request timed out by the deadline says nothing
+    about the endpoint, so it does not count against its breaker and only
+    releases a half-open trial.
+    """
+    timeout = guard.timeout.timeout()
+    deadline = current_deadline()
+    if deadline is None:
+        return timeout, False
+    if deadline.expired():
+        raise EndpointUnavailable(f"{endpoint} not called: run deadline reached")
+    clipped = deadline.clip(timeout)
+    return clipped, clipped < timeout
+
+
+def guarded_request(endpoint: str, method: str, url: str, **kwargs) -> requests.Response:
+    """
+    requests.request through the endpoint's breaker with an adaptive timeout.
+    Raises EndpointUnavailable when the breaker is open, on timeouts/connection
+    errors and on 5xx/429 responses; other responses are returned as-is.
+    """
+    guard = endpoint_guard(endpoint)
+    # The deadline first: a call it stops must not take a half-open breaker's trial.
+    timeout, clipped = _request_timeout(endpoint, guard)
+    if not guard.breaker.allow():
+        raise EndpointUnavailable(f"{endpoint} is unavailable (circuit open)")
+    started, settled = time.monotonic(), False
+    try:
+        response = requests.request(method, url, timeout=timeout, **kwargs)
+        settled = True
+    except requests.RequestException as e:
+        if not clipped:
+            guard.breaker.record_failure()
+            settled = True
+        raise EndpointUnavailable(f"{endpoint} request failed: {e}") from e
+    finally:
+        # Deadline-clipped timeouts and unexpected errors say nothing about the
+        # endpoint; a half-open trial still ends, so the next call may try.
+        if not settled:
+            guard.breaker.release()
+    guard.timeout.observe(time.monotonic() - started)
+    if response.status_code >= 500 or response.status_code == 429:
+        guard.breaker.record_failure()
+        raise EndpointUnavailable(f"{endpoint} returned {response.status_code}")
+    guard.breaker.record_success()
+    return response
+
+
+@dataclass
+class AsyncResponse:
+    """Status and body of a finished guarded_request_async call."""
+
+    status_code: int
+    text: str
+
+    def json(self) -> Any:
+        return json.loads(self.text)
+
+
+async def guarded_request_async(endpoint: str, method: str, url: str, **kwargs) -> AsyncResponse:
+    """guarded_request on the shared aiohttp session; same breaker, timeout and errors."""
+    from aria.aio import http_session
+
+    guard = endpoint_guard(endpoint)
+    # The deadline first: a call it stops must not take a half-open breaker's trial.
+    timeout, clipped = _request_timeout(endpoint, guard)
+    if not guard.breaker.allow():
+        raise EndpointUnavailable(f"{endpoint} is unavailable (circuit open)")
+    started, settled = time.monotonic(), False
+    try:
+        session = await http_session()
+        async with session.request(method, url, timeout=aiohttp.ClientTimeout(total=timeout), **kwargs) as response:
+            result = AsyncResponse(response.status, await response.text())
+        settled = True
+    except (aiohttp.ClientError, asyncio.TimeoutError) as e:
+        if not clipped:
+            guard.breaker.record_failure()
+            settled = True
+        raise EndpointUnavailable(f"{endpoint} request failed: {e!r}") from e
+    finally:
+        if not settled:
+            guard.breaker.release()
+    guard.timeout.observe(time.monotonic() - started)
+    if result.status_code >= 500 or result.status_code == 429:
+        guard.breaker.record_failure()
+        raise EndpointUnavailable(f"{endpoint} returned {result.status_code}")
+    guard.breaker.record_success()
+    return result
+
+
+class TimeoutHandler:
+    """Runs callables with a hard timeout and retries with exponential backoff."""
+
+    def __init__(self, default_timeout: float = API_TIMEOUT, max_retries: int = MAX_RETRY_ATTEMPTS,
+                 retry_delay: float = RETRY_DELAY):
+        self.default_timeout = default_timeout
+        self.max_retries = max_retries
+        self.retry_delay = retry_delay
+
+    def with_timeout_and_retry(self, func: Callable[..., Any], *args, timeout: Optional[float] = None,
+                               retries: Optional[int] = None, **kwargs) -> Any:
+        timeout = self.default_timeout if timeout is None else timeout
+        retries = self.max_retries if retries is None else retries
+        last_error: Optional[Exception] = None
+        for attempt in range(retries + 1):
+            if attempt:
+                time.sleep(self.retry_delay * 2 ** (attempt - 1))
+            # Not a `with` block: leaving it would wait for the timed-out call.
+            executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix="aria-timeout")
+            future = executor.submit(func, *args, **kwargs)
+            executor.shutdown(wait=False)
+            try:
+                return future.result(timeout=timeout)
+            except FutureTimeout:
+                last_error = TimeoutError(f"{getattr(func, '__name__', 'call')} timed out after {timeout}s")
+            except Exception as e:
+                last_error = e
+            logger.warning("Attempt %d/%d failed: %s", attempt + 1, retries + 1, last_error)
+        raise last_error
+
+
+class APIConnectivityTester:
+    """Probes the external APIs ARIA depends on."""
+
+    def __init__(self, timeout: float = API_TIMEOUT, retry_attempts: int = MAX_RETRY_ATTEMPTS):
+        self.timeout = timeout
+        self.retry_attempts = retry_attempts
+        self.handler = TimeoutHandler(default_timeout=timeout, max_retries=retry_attempts, retry_delay=0.5)
+        llm_base = (os.getenv("OPENAI_API_BASE") or "https://api.openai.com/v1").rstrip("/")
+        self.api_endpoints: Dict[str, Dict[str, Any]] = {
+            "openai": {"url": f"{llm_base}/models", "key": os.getenv("OPENAI_API_KEY"), "auth": "bearer"},
+            "huggingface": {
+                "url": os.getenv("HF_SUMMARIZER_URL", "https://api-inference.huggingface.co/models/facebook/bart-large-cnn"),
+                "key": os.getenv("HF_API_KEY") or os.getenv("HF_TOKEN"),
+                "auth": "bearer",
+            },
+            "fact_check": {
+                "url": os.getenv("FACT_CHECK_API_URL", "https://bing-news-search1.p.rapidapi.com/news/search"),
+                "key": os.getenv("RAPIDAPI_KEY"),
+                "auth": "rapidapi",
+            },
+        }
+        if os.getenv("LANGUAGETOOL_URL"):
+            self.api_endpoints["languagetool"] = {
+                "url": os.getenv("LANGUAGETOOL_URL").rstrip("/") + "/v2/languages", "key": None, "auth": None,
+            }
+
+    def _headers(self, endpoint: Dict[str, Any]) -> Dict[str, str]:
+        if endpoint["auth"] == "bearer" and endpoint["key"]:
+            return {"Authorization": f"Bearer {endpoint['key']}"}
+        if endpoint["auth"] == "rapidapi" and endpoint["key"]:
+            return {"x-rapidapi-key": endpoint["key"]}
+        return {}
+
+    def test_endpoint(self, name: str) -> Dict[str, Any]:
+        endpoint = self.api_endpoints[name]
+        result: Dict[str, Any] = {"url": endpoint["url"], "configured": endpoint["auth"] is None or bool(endpoint["key"])}
+        started = time.monotonic()
+        try:
+            response = self.handler.with_timeout_and_retry(
+                lambda: requests.get(endpoint["url"], headers=self._headers(endpoint), timeout=self.timeout),
+                timeout=self.timeout + 1, retries=max(0, self.retry_attempts - 1),
+            )
+            result["status_code"] = response.status_code
+            # Reachable; a 4xx (e.g. missing key) still means the service itself is up.
+            result["status"] = "ok" if response.status_code < 400 else (
+                "failed" if response.status_code >= 500 else "degraded")
+        except Exception as e:
+            result["status"] = "failed"
+            result["error"] = str(e)
+        result["latency_ms"] = round((time.monotonic() - started) * 1000, 1)
+        return result
+
+    def test_all(self) -> Dict[str, Any]:
+        with ThreadPoolExecutor(max_workers=len(self.api_endpoints)) as pool:
+            futures = {name: pool.submit(self.test_endpoint, name) for name in self.api_endpoints}
+            results = {name: future.result() for name, future in futures.items()}
+        counts = {status: sum(1 for r in results.values() if r["status"] == status)
+                  for status in ("ok", "degraded", "failed")}
+        overall = "healthy" if counts["failed"] == 0 and counts["degraded"] == 0 else (
+            "unhealthy" if counts["ok"] == 0 and counts["degraded"] == 0 else "degraded")
+        return {
+            "summary": {"total": len(results), **counts, "overall_status": overall},
+            "results": results,
+            "circuit_breakers": endpoint_states(),
+        }
+
+
+def test_api_connectivity(timeout: float = 5.0, retry_attempts: int = 1) -> Dict[str, Any]:
+    """Probe all configured external APIs once and summarise the results."""
+    return APIConnectivityTester(timeout=timeout, retry_attempts=retry_attempts).test_all()
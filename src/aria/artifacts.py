@@ -0,0 +1,231 @@
+"""
+Bounded-memory crew runs.
+
+A sequential crew keeps every finished task's output - and, through the task,
+its agent and that agent's whole conversation - alive until the run ends.
+RunArtifacts moves finished outputs out of memory: each one is written to the
+run's artifact directory and the in-memory TaskOutput keeps only a short
+reference, which CompactingCrew resolves when the next task's context is built.
+
+Each run may hold at most ARIA_RUN_MEMORY_MB of output text at a time (the
+context being read plus the output just produced). Context loaded from
+artifacts is cut to the cap, and the cut is reported with the run's memory
+figures. Artifacts are deleted when the run ends unless ARIA_KEEP_ARTIFACTS
+is set or the run was profiled (see aria/profiling.py). Files a tool writes for
+the run through output_path() - the reviewer's corrected report - stay.
+
+A few crewAI and litellm globals would otherwise keep every finished run alive for the life
+of the process; release_run_references, release_memoized and
+serialise_console_output deal with them.
+"""
+
+import contextlib
+import functools
+import logging
+import os
+import re
+import shutil
+import tempfile
+import threading
+import uuid
+from contextlib import contextmanager
+from contextvars import ContextVar
+from pathlib import Path
+from typing import Any, Dict, Iterator, List, Optional
+
+logger = logging.getLogger(__name__)
+
+ARTIFACT_DIR = Path(os.getenv("ARIA_ARTIFACT_DIR") or Path(tempfile.gettempdir()) / "aria-artifacts")
+RUN_MEMORY_MB = float(os.getenv("ARIA_RUN_MEMORY_MB", "16"))
+KEEP_ARTIFACTS = os.getenv("ARIA_KEEP_ARTIFACTS", "false").lower() in ("1", "true", "yes")
+
+CAP_MARKER = "[… output cut at the per-run memory cap]"
+
+_REFERENCE = re.compile(r"^\[artifact ([0-9a-f]{32})/(\w+)\.md: \d+ bytes\]$")
+
+_console_lock = threading.Lock()
+
+
+def _size(text: str) -> int:
+    return len(text.encode("utf-8"))
+
+
+class RunArtifacts:
+    """Spills one run's finished task outputs to disk and accounts its memory."""
+
+    def __init__(self, root: Optional[Path] = None, cap_mb: float = RUN_MEMORY_MB, keep: bool = KEEP_ARTIFACTS):
+        self.run_id = uuid.uuid4().hex
+        self.directory = Path(root or ARTIFACT_DIR) / self.run_id
+        self.cap_bytes = int(cap_mb * 1024 * 1024)
+        self.keep = keep
+        self.spilled = 0
+        self.spilled_bytes = 0
+        self.peak_bytes = 0
+        self.capped: List[str] = []
+        self.outputs: List[Path] = []
+        self._spilled_names: set = set()
+        self._context_bytes = 0
+
+    def is_reference(self, text: str) -> bool:
+        match = _REFERENCE.match(text or "")
+        return bool(match) and match.group(1) == self.run_id
+
+    def spill(self, name: str, text: str) -> str:
+        """Write `text` to disk and return the reference that replaces it in memory."""
+        size = _size(text)
+        self.peak_bytes = max(self.peak_bytes, self._context_bytes + size)
+        self._context_bytes = 0
+        if not text or self.is_reference(text):
+            return text
+        self.directory.mkdir(parents=True, exist_ok=True)
+        (self.directory / f"{name}.md").write_text(text, encoding="utf-8")
+        self._spilled_names.add(name)
+        self.spilled += 1
+        self.spilled_bytes += size
+        return f"[artifact {self.run_id}/{name}.md: {size} bytes]"
+
+    def load(self, text: str) -> str:
+        """Full output for a reference from this run; any other text is returned as is."""
+        if not self.is_reference(text):
+            return text
+        name = _REFERENCE.match(text).group(2)
+        return (self.directory / f"{name}.md").read_text(encoding="utf-8")
+
+    def load_context(self, task_name: str, outputs: List[Any]) -> List[Any]:
+        """
+        Load upstream outputs for a task, newest first, within the per-run cap.
+        Task payloads (see aria/payloads.py) are kept in memory and passed through.
+        """
+        loaded: List[Any] = []
+        remaining = self.cap_bytes
+        for text in reversed(outputs):
+            if not isinstance(text, str):
+                loaded.append(text)
+                continue
+            text = self.load(text)
+            size = _size(text)
+            if size > remaining:
+                # Cut on a character boundary; the marker's own size is not worth counting.
+                text = text.encode("utf-8")[:max(0, remaining)].decode("utf-8", "ignore") + CAP_MARKER
+                size = remaining
+                if task_name not in self.capped:
+                    self.capped.append(task_name)
+                    logger.warning("Context for %s cut at the %.0f MB per-run memory cap",
+                                   task_name, self.cap_bytes / (1024 * 1024))
+            remaining -= size
+            loaded.append(text)
+        self._context_bytes = self.cap_bytes - remaining
+        return list(reversed(loaded))
+
+    def output_path(self, filename: str) -> Path:
+        """Where a tool writes a file for this run; kept when the run ends."""
+        self.directory.mkdir(parents=True, exist_ok=True)
+        path = self.directory / filename
+        if path not in self.outputs:
+            self.outputs.append(path)
+        return path
+
+    def report(self) -> Dict[str, Any]:
+        return {
+            "run_id": self.run_id,
+            "spilled_outputs": self.spilled,
+            "spilled_bytes": self.spilled_bytes,
+            "peak_bytes": self.peak_bytes,
+            "cap_bytes": self.cap_bytes,
+            "capped_tasks": list(self.capped),
+            "outputs": [str(path) for path in self.outputs],
+        }
+
+    def close(self) -> None:
+        if self.keep:
+            return
+        if not self.outputs:
+            shutil.rmtree(self.directory, ignore_errors=True)
+            return
+        for name in self._spilled_names:
+            (self.directory / f"{name}.md").unlink(missing_ok=True)
+
+
+_run_artifacts: ContextVar[Optional[RunArtifacts]] = ContextVar("aria_run_artifacts", default=None)
+
+
+@contextmanager
+def use_run_artifacts(artifacts: Optional[RunArtifacts]) -> Iterator[Optional[RunArtifacts]]:
+    token = _run_artifacts.set(artifacts)
+    try:
+        yield artifacts
+    finally:
+        _run_artifacts.reset(token)
+
+
+def current_run_artifacts() -> Optional[RunArtifacts]:
+    """The artifacts of the run in this context, if it has any."""
+    return _run_artifacts.get()
+
+
+def release_run_references(crew: Any) -> None:
+    """
+    Drop the process-wide references crewAI and litellm keep to a finished run.
+
+    crewAI's EventListener singleton keys its telemetry spans by Task and never
+    removes them, and every agent's token counter is appended to
+    litellm.input_callback for good. Either keeps the run's tasks, agents,
+    conversations and outputs alive for the life of the process.
+    """
+    import litellm
+    from crewai.events.event_listener import event_listener
+
+    for task in crew.tasks:
+        event_listener.execution_spans.pop(task, None)
+    processes = {id(getattr(agent, "_token_process", None)) for agent in crew.agents}
+    for callback in list(litellm.input_callback):
+        if id(getattr(callback, "token_cost_process", None)) in processes:
+            with contextlib.suppress(ValueError):
+                litellm.input_callback.remove(callback)
+
+
+def release_memoized(instance: Any) -> None:
+    """
+    Drop the agents, tasks and crew memoized for a CrewBase instance.
+
+    crewAI's @agent, @task and @crew decorators cache their results in a dict
+    keyed by the instance that is never cleared, so every Aria() ever built
+    would stay reachable along with everything its crew produced.
+    """
+    cls = type(instance)
+    for name in dir(cls):
+        func = getattr(cls, name, None)
+        code = getattr(func, "__code__", None)
+        if code is None or "cache" not in code.co_freevars or not func.__closure__:
+            continue
+        cache = func.__closure__[code.co_freevars.index("cache")].cell_contents
+        if not isinstance(cache, dict):
+            continue
+        for key in list(cache):
+            if isinstance(key, tuple) and key and key[0] and key[0][0] is instance:
+                cache.pop(key, None)
+
+
+def serialise_console_output() -> None:
+    """
+    Make crewAI's shared console formatter safe for concurrent crews.
+
+    The formatter starts a rich Live display for the first tree it prints.
+    Two crews doing that at once both start one; the loser is never stopped
+    and stays on the console's live stack - with its refresh thread and every
+    tree it rendered - for the life of the process.
+    """
+    from crewai.events.event_listener import event_listener
+
+    formatter = event_listener.formatter
+    if getattr(formatter.print, "serialised", False):
+        return
+    unsafe_print = formatter.print
+
+    @functools.wraps(unsafe_print)
+    def serialised_print(*args, **kwargs):
+        with _console_lock:
+            return unsafe_print(*args, **kwargs)
+
+    serialised_print.serialised = True
+    formatter.print = serialised_print
@@ -0,0 +1,187 @@
+"""
+Batch topic runs with shared research work.
+
+BatchRunner schedules a list of topics across a pool of worker threads. All
+topics of a batch share one ToolResultCache, so overlapping Scholar queries
+and claims that were already fact-checked are only sent upstream once. In
+worker mode each worker process keeps a cache for the batch (see
+aria/tools/cache.py), so a query is sent upstream once per worker, and the
+summary's `shared_tool_cache` covers only topics run in this process. Results
+are yielded as events in completion order, followed by a summary with total
+and per-topic token usage and cost.
+"""
+
+import contextlib
+import logging
+import os
+import tempfile
+import time
+from collections import namedtuple
+from concurrent.futures import FIRST_COMPLETED, Future, ThreadPoolExecutor, wait
+from datetime import datetime
+from pathlib import Path
+from typing import Any, Callable, Dict, Iterator, List, Optional
+
+from aria.deadline import split_deadline, use_deadline
+from aria.prefetch import start_prefetch
+from aria.profiling import RunProfiler, split_profile
+from aria.prompts import use_prompt_stats
+from aria.refresh import split_refresh, use_baseline
+from aria.tools.cache import ToolResultCache, active_cache, shared_cache, split_cache, use_cache
+from aria.usage import add_usage, estimate_cost, usage_dict
+
+logger = logging.getLogger(__name__)
+
+MAX_BATCH_TOPICS = int(os.getenv("MAX_BATCH_TOPICS", "200"))
+DEFAULT_WORKERS = int(os.getenv("MAX_CONCURRENT_TASKS", "5"))
+
+# Result of a crew run: the final report, token usage, the run's memory
+# figures (see aria/artifacts.py) and per-task records, plus the run's id in
+# the run history once recorded (see aria/history.py) and its prefetch report
+# (see aria/prefetch.py). `partial` marks a run cut short by its deadline,
+# whose report is the last task output it reached; `skipped_tasks` lists the
+# tasks it dropped for lack of time (see aria/deadline.py). `profile`
+# describes the run's profile, if one was taken (see aria/profiling.py).
+# `claims` are the claims the run verified, stored for later refreshes, and
+# `refresh` what a refresh changed (see aria/refresh.py). `prompts` counts
+# the run's prompt prefix cache lookups (see aria/prompts.py).
+# Picklable, so workers can return it too.
+CrewResult = namedtuple("CrewResult", ["raw", "token_usage", "memory", "tasks", "run_id", "reused", "prefetch",
+                                       "partial", "skipped_tasks", "profile", "claims", "refresh", "prompts"],
+                        defaults=(None, None, None, False, None, False, None, None, None, None, None))
+
+
+def kickoff_crew(inputs: Dict[str, Any]) -> CrewResult:
+    """
+    Run one full crew for `inputs`. Tool results are shared through the active
+    cache, the process's cache named by aria.tools.cache.with_cache (a batch
+    run in a worker process), or a fresh per-run cache, and likely ones are
+    prefetched into it while the crew starts. A deadline added to `inputs` by
+    aria.deadline.with_deadline applies to the whole run, and one asked for
+    by aria.profiling.with_profile profiles it, and a baseline added by
+    aria.refresh.with_refresh makes it a refresh of that run. Only the final
+    report is kept; the crew and its intermediate outputs are released when
+    this returns.
+    """
+    from aria.artifacts import release_memoized
+    from aria.crew import Aria
+
+    inputs, deadline = split_deadline(inputs)
+    inputs, profile_mode = split_profile(inputs)
+    inputs, baseline = split_refresh(inputs)
+    inputs, cache_id = split_cache(inputs)
+    cache = active_cache() or (shared_cache(cache_id) if cache_id else ToolResultCache())
+    profiler = None
+    with use_deadline(deadline), use_baseline(baseline), use_prompt_stats() as prompt_stats:
+        prefetch = start_prefetch(inputs, cache)
+        aria = Aria()
+        try:
+            with use_cache(cache):
+                crew = aria.crew()
+                if profile_mode:
+                    profiler = _profiler(crew, profile_mode)
+                with profiler or contextlib.nullcontext():
+                    output = crew.kickoff(inputs=inputs)
+        finally:
+            release_memoized(aria)
+            prefetched = prefetch.finish() if prefetch is not None else None
+    memory = crew.artifacts.report() if getattr(crew, "artifacts", None) is not None else None
+    refresher = getattr(crew, "refresher", None)
+    return CrewResult(output.raw, usage_dict(output.token_usage), memory, getattr(crew, "task_records", None),
+                      prefetch=prefetched, partial=getattr(crew, "partial", False),
+                      skipped_tasks=getattr(crew, "skipped_tasks", None) or None,
+                      profile=profiler.result if profiler is not None else None,
+                      claims=refresher.verified_claims() if refresher is not None else None,
+                      refresh=refresher.stats() if refresher is not None else None, prompts=prompt_stats)
+
+
+def _profiler(crew: Any, mode: str) -> RunProfiler:
+    """A profiler writing to the run's artifact directory, which is then kept."""
+    artifacts = getattr(crew, "artifacts", None)
+    if artifacts is None:
+        return RunProfiler(mode, Path(tempfile.mkdtemp(prefix="aria-profile-")))
+    artifacts.keep = True
+    return RunProfiler(mode, artifacts.directory)
+
+
+class BatchRunner:
+    """Runs many topics concurrently with a batch-wide tool cache."""
+
+    def __init__(self, topics: List[str], workers: Optional[int] = None,
+                 kickoff: Callable[[Dict[str, Any]], Any] = kickoff_crew):
+        # Keep order, drop exact duplicates - they would produce the same report.
+        self.topics = list(dict.fromkeys(t.strip() for t in topics if t and t.strip()))
+        if not self.topics:
+            raise ValueError("At least one topic is required.")
+        if len(self.topics) > MAX_BATCH_TOPICS:
+            raise ValueError(f"A batch accepts at most {MAX_BATCH_TOPICS} topics, got {len(self.topics)}.")
+        self.workers = max(1, min(workers or DEFAULT_WORKERS, len(self.topics)))
+        self.kickoff = kickoff
+        self.cache = ToolResultCache()
+        self.current_year = str(datetime.now().year)
+
+    def _run_topic(self, topic: str) -> Dict[str, Any]:
+        inputs = {"topic": topic, "current_year": self.current_year, "output_path": "/app/output"}
+        started = time.perf_counter()
+        with use_cache(self.cache):
+            try:
+                output = self.kickoff(inputs)
+            except Exception as e:
+                logger.warning("Batch topic %r failed: %s", topic, e)
+                return {"event": "topic", "topic": topic, "status": "error", "error": str(e),
+                        "duration_s": round(time.perf_counter() - started, 3),
+                        "usage": usage_dict(None), "cost_usd": 0.0}
+        usage = usage_dict(getattr(output, "token_usage", None))
+        return {
+            "event": "topic",
+            "topic": topic,
+            "status": "success",
+            "duration_s": round(time.perf_counter() - started, 3),
+            "usage": usage,
+            "cost_usd": estimate_cost(usage),
+            "report": getattr(output, "raw", str(output)),
+            "memory": getattr(output, "memory", None),
+            "run_id": getattr(output, "run_id", None),
+            "reused": getattr(output, "reused", False),
+            "partial": getattr(output, "partial", False),
+            "refresh": getattr(output, "refresh", None),
+        }
+
+    def run(self) -> Iterator[Dict[str, Any]]:
+        """Yield one event per topic as it completes, then a summary event."""
+        started = time.perf_counter()
+        totals: Dict[str, int] = {}
+        per_topic: List[Dict[str, Any]] = []
+        pool = ThreadPoolExecutor(max_workers=self.workers, thread_name_prefix="aria-batch")
+        pending: Dict[Future, str] = {pool.submit(self._run_topic, t): t for t in self.topics}
+        try:
+            while pending:
+                done, _ = wait(pending, return_when=FIRST_COMPLETED)
+                for future in done:
+                    pending.pop(future)
+                    result = future.result()
+                    add_usage(totals, result["usage"])
+                    per_topic.append({"topic": result["topic"], "status": result["status"],
+                                      "cost_usd": result["cost_usd"], "total_tokens": result["usage"]["total_tokens"]})
+                    result["completed"] = len(per_topic)
+                    result["total"] = len(self.topics)
+                    yield result
+        finally:
+            # Closed early (the client went away): topics not started are dropped, and
+            # the caller does not wait for those in flight.
+            for future in pending:
+                future.cancel()
+            pool.shutdown(wait=not pending, cancel_futures=True)
+
+        yield {
+            "event": "summary",
+            "topics": len(self.topics),
+            "succeeded": sum(1 for t in per_topic if t["status"] == "success"),
+            "failed": sum(1 for t in per_topic if t["status"] != "success"),
+            "workers": self.workers,
+            "duration_s": round(time.perf_counter() - started, 3),
+            "usage": totals,
+            "cost_usd": estimate_cost(totals),
+            "per_topic": per_topic,
+            "shared_tool_cache": self.cache.stats(),
+        }
@@ -0,0 +1,247 @@
+"""
+Near-duplicate claim elimination.
+
+The researcher's bullets often restate one claim several ways, and the fact
+checker would verify each of them. Claims are compared as normalised token
+sets - lower-cased, stop words dropped, plural/verb endings stripped - by
+Jaccard similarity; claims whose numbers differ, or of which one is negated
+("not", "no", "never", "without", "n't") and the other is not, are never
+merged. A claim joins the earlier cluster whose first claim it is most
+similar to, if that is at least ARIA_CLAIM_DEDUP_THRESHOLD; it is compared
+with first claims only, so one paraphrase cannot chain two different claims
+together. With the 10-15 claims of a research output, exact comparison of
+every pair is cheaper than MinHash signatures would be.
+
+Two places use the clusters:
+
+- ClaimDeduplicator removes all but the first claim of each cluster from the
+  upstream context of tasks with `dedup_claims: true` in tasks.yaml, before
+  the context is compacted. Claims of a task payload (see aria/payloads.py)
+  are merged as records, and the cluster's sources go with its first claim.
+- @shared_verdicts on a tool's _run (or _arun) maps a statement to the
+  first claim of its cluster within the run's tool cache, so a
+  near-duplicate gets the verdict already fetched for its representative
+  instead of another check.
+"""
+
+import functools
+import inspect
+import logging
+import os
+import re
+import threading
+import weakref
+from typing import Any, Callable, Dict, FrozenSet, List, Optional, Tuple
+
+from aria.tools.cache import active_cache
+
+logger = logging.getLogger(__name__)
+
+CLAIM_DEDUP = os.getenv("ARIA_CLAIM_DEDUP", "true").lower() not in ("0", "false", "no")
+DEDUP_THRESHOLD = float(os.getenv("ARIA_CLAIM_DEDUP_THRESHOLD", "0.6"))
+
+_TOKEN = re.compile(r"[a-z0-9]+(?:[.,][0-9]+)*")
+_NUMBER = re.compile(r"^[0-9][0-9.,]*$")
+_BULLET = re.compile(r"^\s*(?:[-*•+]|\d+[.)])\s+")
+_NOT = re.compile(r"n't\b")
+_SUFFIXES = ("ing", "ies", "ed", "s")
+NEGATIONS = frozenset(("not", "no", "never", "without", "nor", "neither", "none"))
+
+STOP_WORDS = frozenset("""
+    a an and are as at be been being but by can could do does for from had has have in into is it its
+    more most of on or over that the their them these they this those to under was were which while who
+    will with within would also than very much many such recent recently new now increasingly becoming
+""".split())
+
+
+def _stem(word: str) -> str:
+    """Crude stem: 'reduce', 'reduces' and 'reduced' all become 'reduc'."""
+    for suffix in _SUFFIXES:
+        if len(word) > len(suffix) + 3 and word.endswith(suffix) and not word.endswith("ss"):
+            word = word[:-len(suffix)] + ("y" if suffix == "ies" else "")
+            break
+    return word[:-1] if len(word) > 4 and word.endswith("e") else word
+
+
+def claim_tokens(claim: str) -> FrozenSet[str]:
+    """Normalised token set of a claim."""
+    return frozenset(
+        token if _NUMBER.match(token) else _stem(token)
+        for token in _TOKEN.findall(_NOT.sub(" not", _BULLET.sub("", claim).lower().replace("\u2019", "'")))
+        if token not in STOP_WORDS
+    )
+
+
+def similarity(a: FrozenSet[str], b: FrozenSet[str]) -> float:
+    """Jaccard similarity of two token sets; 0.0 when their numbers or their polarity differ."""
+    if not a or not b:
+        return 0.0
+    if {t for t in a if _NUMBER.match(t)} != {t for t in b if _NUMBER.match(t)}:
+        return 0.0
+    if bool(a & NEGATIONS) != bool(b & NEGATIONS):
+        return 0.0
+    return len(a & b) / len(a | b)
+
+
+def contradicts(a: FrozenSet[str], b: FrozenSet[str], threshold: float = DEDUP_THRESHOLD) -> bool:
+    """Whether two token sets make the same claim, one of them negated."""
+    return bool(a & NEGATIONS) != bool(b & NEGATIONS) and similarity(a - NEGATIONS, b - NEGATIONS) >= threshold
+
+
+def cluster_claims(claims: List[str], threshold: float = DEDUP_THRESHOLD) -> List[List[int]]:
+    """Indices of `claims` grouped into near-duplicate clusters, first claim first."""
+    clusters: List[List[int]] = []
+    leaders: List[FrozenSet[str]] = []
+    for index, claim in enumerate(claims):
+        tokens = claim_tokens(claim)
+        best, best_score = None, threshold
+        for position, leader in enumerate(leaders):
+            score = similarity(tokens, leader)
+            if score >= best_score:
+                best, best_score = position, score
+        if best is None:
+            clusters.append([index])
+            leaders.append(tokens)
+        else:
+            clusters[best].append(index)
+    return clusters
+
+
+def dedup_claims(text: str, threshold: float = DEDUP_THRESHOLD) -> Tuple[str, List[List[str]]]:
+    """
+    Drop bullets of `text` that restate an earlier bullet. Returns the text
+    and the clusters of more than one claim (representative first).
+    """
+    lines = text.splitlines()
+    bullets = [index for index, line in enumerate(lines) if _BULLET.match(line)]
+    clusters = cluster_claims([lines[index] for index in bullets], threshold)
+    dropped = {bullets[member] for cluster in clusters for member in cluster[1:]}
+    merged = [[_BULLET.sub("", lines[bullets[member]]).strip() for member in cluster]
+              for cluster in clusters if len(cluster) > 1]
+    return "\n".join(line for index, line in enumerate(lines) if index not in dropped), merged
+
+
+class ClaimIndex:
+    """Representative claims seen by one tool cache; maps statements to their cluster's first claim."""
+
+    def __init__(self, threshold: float = DEDUP_THRESHOLD):
+        self.threshold = threshold
+        self._lock = threading.Lock()
+        self._claims: List[Tuple[FrozenSet[str], str]] = []
+        self.copied = 0
+
+    def add_clusters(self, clusters: List[List[str]]) -> None:
+        """Register deduplicated clusters so their members resolve to the representative."""
+        with self._lock:
+            for cluster in clusters:
+                self._claims.extend((claim_tokens(member), cluster[0]) for member in cluster)
+
+    def representative(self, statement: str) -> str:
+        tokens = claim_tokens(statement)
+        with self._lock:
+            best, best_score = None, self.threshold
+            for claim_tokens_, claim in self._claims:
+                score = similarity(tokens, claim_tokens_)
+                if score >= best_score:
+                    best, best_score = claim, score
+            if best is None:
+                self._claims.append((tokens, statement))
+                return statement
+            if best != statement:
+                self.copied += 1
+            return best
+
+
+_indexes: "weakref.WeakKeyDictionary[Any, ClaimIndex]" = weakref.WeakKeyDictionary()
+_indexes_lock = threading.Lock()
+
+
+def claim_index(cache: Any) -> ClaimIndex:
+    """The ClaimIndex of a ToolResultCache; created on first use."""
+    with _indexes_lock:
+        index = _indexes.get(cache)
+        if index is None:
+            index = _indexes[cache] = ClaimIndex()
+        return index
+
+
+def shared_verdicts(run: Callable[..., Any]) -> Callable[..., Any]:
+    """
+    Decorator for a fact-checking tool's _run(statement), or its async _arun:
+    within the active tool cache, a near-duplicate of an earlier statement is
+    checked as that statement, so it is answered from the cache.
+    """
+
+    def resolve(statement: str) -> Optional[str]:
+        cache = active_cache()
+        if cache is None or not CLAIM_DEDUP:
+            return None
+        representative = claim_index(cache).representative(statement)
+        if representative == statement:
+            return None
+        logger.debug("Copying the verdict for %r to %r", representative, statement)
+        return representative
+
+    def copied(result: Any, statement: str, representative: str) -> Any:
+        if isinstance(result, str):
+            return f"Same claim as '{representative}'; verdict copied.\n" + result
+        # A record (aria.payloads.Evidence): the same sources, for this statement.
+        return result.model_copy(update={"statement": statement, "same_as": representative})
+
+    if inspect.iscoroutinefunction(run):
+        @functools.wraps(run)
+        async def async_wrapper(self, statement: str) -> Any:
+            representative = resolve(statement)
+            if representative is None:
+                return await run(self, statement=statement)
+            return copied(await run(self, statement=representative), statement, representative)
+
+        return async_wrapper
+
+    @functools.wraps(run)
+    def wrapper(self, statement: str) -> Any:
+        representative = resolve(statement)
+        if representative is None:
+            return run(self, statement=statement)
+        return copied(run(self, statement=representative), statement, representative)
+
+    return wrapper
+
+
+class ClaimDeduplicator:
+    """Removes near-duplicate claims from the upstream context of selected tasks."""
+
+    def __init__(self, tasks: Optional[List[str]] = None, threshold: float = DEDUP_THRESHOLD,
+                 enabled: Optional[bool] = None):
+        self.tasks = set(tasks or [])
+        self.threshold = threshold
+        self.enabled = CLAIM_DEDUP if enabled is None else enabled
+        self.last_stats: Dict[str, Dict[str, int]] = {}
+
+    @classmethod
+    def from_tasks_config(cls, tasks_config: Dict[str, dict], **kwargs) -> "ClaimDeduplicator":
+        tasks = [name for name, config in tasks_config.items() if isinstance(config, dict) and config.get("dedup_claims")]
+        return cls(tasks, **kwargs)
+
+    def dedupe(self, task_name: str, outputs: List[Any]) -> List[Any]:
+        """Dedupe the bullets of text outputs and the claims of payloads (see aria/payloads.py)."""
+        if not self.enabled or task_name not in self.tasks:
+            return outputs
+        deduped, claims, merged = [], 0, 0
+        for text in outputs:
+            if isinstance(text, str):
+                kept, clusters = dedup_claims(text, self.threshold)
+                claims += sum(1 for line in text.splitlines() if _BULLET.match(line))
+            else:
+                kept, clusters = text.dedupe(self.threshold)
+                claims += text.claim_count()
+            merged += sum(len(cluster) - 1 for cluster in clusters)
+            deduped.append(kept)
+            cache = active_cache()
+            if cache is not None and clusters:
+                claim_index(cache).add_clusters(clusters)
+        self.last_stats[task_name] = {"claims": claims, "kept": claims - merged}
+        if merged:
+            logger.info("Claims for %s: %d -> %d (%d near-duplicates merged, threshold %.2f)",
+                        task_name, claims, claims - merged, merged, self.threshold)
+        return deduped
@@ -0,0 +1,153 @@
+"""
+Inter-task context compaction.
+
+In the sequential crew every task receives the raw output of *all* upstream
+tasks, so the prompt grows at every stage. ContextCompactor sits between tasks
+and shrinks that context to a per-task token budget:
+
+1. strip agent/tool boilerplate (ReAct markers, tool banners, rules, fences),
+2. drop lines that repeat an earlier line (after normalising bullets/case),
+3. if still over budget, shorten paragraphs to their first sentence and then
+   truncate - older outputs first, since later stages already condense them.
+
+Budgets come from `context_budget` in tasks.yaml; tasks without one are passed
+through untouched.
+"""
+
+import logging
+import os
+import re
+from typing import Dict, List, Optional, Set
+
+from aria.tokens import count_tokens
+
+logger = logging.getLogger(__name__)
+
+# Divider crewAI puts between upstream task outputs.
+DIVIDER = "\n\n----------\n\n"
+
+# Share of the remaining budget reserved for the newest output when older ones remain.
+NEWEST_SHARE = 0.6
+
+TRUNCATION_MARKER = "[…]"
+
+_BOILERPLATE = [
+    re.compile(pattern, re.IGNORECASE)
+    for pattern in (
+        r"^\s*(thought|action|action input|observation)\s*:.*$",
+        r"^\s*final answer\s*:\s*$",
+        r"^\s*i now (can give a great answer|know the final answer)\.?\s*$",
+        r"^\s*✅ reviewed report:\s*$",
+        r"^\s*\*\*suggestions:\*\*\s*$",
+        r"^\s*_end of report_\s*$",
+        r"^\s*(summary|top results)\s*:\s*$",
+        r"^\s*```[\w-]*\s*$",
+        r"^\s*([-*_=])\1{2,}\s*$",
+    )
+]
+_FINAL_ANSWER_PREFIX = re.compile(r"^\s*final answer\s*:\s*", re.IGNORECASE)
+_NORMALISE = re.compile(r"[\W_]+")
+_BULLET = re.compile(r"^\s*(?:[-*•+]|\d+[.)])\s+")
+_SENTENCE_END = re.compile(r"(?<=[.!?])\s+")
+
+
+def _is_heading(line: str) -> bool:
+    return line.lstrip().startswith("#")
+
+
+def _normalise(line: str) -> str:
+    return _NORMALISE.sub(" ", _BULLET.sub("", line)).strip().lower()
+
+
+def clean_lines(text: str, seen: Set[str]) -> List[str]:
+    """Strip boilerplate and lines already in `seen` (which is updated in place)."""
+    lines = []
+    for raw in text.splitlines():
+        line = _FINAL_ANSWER_PREFIX.sub("", raw.rstrip())
+        if any(p.match(line) for p in _BOILERPLATE):
+            continue
+        if not line.strip():
+            if lines and lines[-1]:
+                lines.append("")
+            continue
+        key = _normalise(line)
+        if key and not _is_heading(line):
+            if key in seen:
+                continue
+            seen.add(key)
+        lines.append(line)
+    while lines and not lines[-1]:
+        lines.pop()
+    return lines
+
+
+def _first_sentence(line: str) -> str:
+    if _is_heading(line):
+        return line
+    head = _SENTENCE_END.split(line, maxsplit=1)[0]
+    return head if len(head) < len(line) else line
+
+
+def fit_to_budget(lines: List[str], budget: int) -> List[str]:
+    """Shorten `lines` until they fit in `budget` tokens."""
+    text = "\n".join(lines)
+    if count_tokens(text) <= budget:
+        return lines
+
+    lines = [_first_sentence(line) for line in lines]
+    if count_tokens("\n".join(lines)) <= budget:
+        return lines
+
+    kept, used = [], count_tokens(TRUNCATION_MARKER)
+    for line in lines:
+        cost = count_tokens(line) + 1
+        if used + cost > budget:
+            break
+        kept.append(line)
+        used += cost
+    return kept + [TRUNCATION_MARKER] if kept or budget > 0 else []
+
+
+class ContextCompactor:
+    """Compacts upstream task outputs to each task's token budget."""
+
+    def __init__(self, budgets: Optional[Dict[str, int]] = None, enabled: Optional[bool] = None):
+        self.budgets = dict(budgets or {})
+        if enabled is None:
+            enabled = os.getenv("ARIA_CONTEXT_COMPACTION", "true").lower() not in ("0", "false", "no")
+        self.enabled = enabled
+        self.last_stats: Dict[str, Dict[str, int]] = {}
+
+    @classmethod
+    def from_tasks_config(cls, tasks_config: Dict[str, dict], **kwargs) -> "ContextCompactor":
+        budgets = {
+            name: int(config["context_budget"])
+            for name, config in tasks_config.items()
+            if isinstance(config, dict) and config.get("context_budget")
+        }
+        return cls(budgets, **kwargs)
+
+    def compact(self, task_name: str, outputs: List[str]) -> str:
+        """Return the context string for `task_name` built from upstream `outputs`."""
+        raw = DIVIDER.join(outputs)
+        budget = self.budgets.get(task_name)
+        if not self.enabled or budget is None or not outputs:
+            return raw
+
+        seen: Set[str] = set()
+        remaining = max(0, budget - count_tokens(DIVIDER) * (len(outputs) - 1))
+        compacted: List[str] = []
+        # Newest first: it already condenses everything before it.
+        for index in range(len(outputs) - 1, -1, -1):
+            share = remaining if index == 0 else int(remaining * NEWEST_SHARE)
+            lines = fit_to_budget(clean_lines(outputs[index], seen), share)
+            block = "\n".join(lines)
+            remaining = max(0, remaining - count_tokens(block))
+            if block:
+                compacted.append(block)
+        context = DIVIDER.join(reversed(compacted))
+
+        before, after = count_tokens(raw), count_tokens(context)
+        self.last_stats[task_name] = {"before": before, "after": after, "budget": budget}
+        logger.info("Context for %s: %d -> %d tokens (budget %d)", task_name, before, after, budget)
+        return context
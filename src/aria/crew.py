@@ -65,19 +65,35 @@
 
 
 
-from typing import List
+import logging
+from typing import Any, Dict, List, Optional
 
 from crewai import Agent, Crew, Process, Task
 from crewai.project import CrewBase, agent, crew, task
 from crewai.agents.agent_builder.base_agent import BaseAgent
+from crewai.crews.crew_output import CrewOutput
+from crewai.tasks.task_output import TaskOutput
+from crewai.utilities.constants import NOT_SPECIFIED
+from pydantic import Field
+
+from aria.artifacts import RunArtifacts, release_run_references, serialise_console_output, use_run_artifacts
+from aria.claims import ClaimDeduplicator
+from aria.context import DIVIDER, ContextCompactor
+from aria.deadline import (LATE_NOTE, SLACK_S, Deadline, DeadlineExceeded, current_deadline,
+                           min_times_from_tasks_config)
+from aria.governor import use_flow
+from aria.payloads import PayloadBuilder, TaskPayload, ToolRecords, render, use_tool_records
+from aria.prompts import AGENT_FIELDS, TASK_FIELDS, interpolate, stable_prompt_file
+from aria.refresh import ReportRefresher, current_baseline
+from aria.routed_llm import RoutedLLM, routed_llm
 
 # from crewai_tools import CodeInterpreterTool
 
-# from tools.scholar_tool import SearchScholar
-# from tools.summarizer import SummarizerTool
-# from tools.fact_check_tool import FactCheckerTool
-# from tools.writer_tools import WriterTool
-# from tools.review_tools import ReviewerTool
+from aria.tools.scholar_tool import SearchScholar
+from aria.tools.summarizer import SummarizerTool
+from aria.tools.fact_check_tool import FactCheckerTool
+from aria.tools.writer_tools import WriterTool
+from aria.tools.review_tools import ReviewerTool
 from dotenv import load_dotenv
 import os
 from crewai import LLM
@@ -88,9 +104,197 @@ elif not os.getenv("HF_TKN") and not os.getenv("HF_TOKEN"):
     print("❌ Error: HuggingFace token not found. Please set HF_TKN or HF_TOKEN in .env")
 
 
+logger = logging.getLogger(__name__)
+
+
+class _SkipRemainingTasks(Exception):
+    """Ends a run whose remaining tasks need more time than its deadline leaves, or have nothing to do."""
+
+
+class CompactingCrew(Crew):
+    """
+    Crew that runs every task's upstream context through a ContextCompactor
+    before it is added to the prompt (see aria/context.py). With
+    `claim_deduplicator` set, near-duplicate claims are removed from it first
+    (see aria/claims.py).
+
+    With `artifacts` set, finished task outputs are spilled to disk and passed
+    on by reference, and each agent's conversation is dropped once its task is
+    done (see aria/artifacts.py). Tools write their files for the run, such as
+    the reviewer's corrected report, to the run's artifact directory.
+
+    With `payload_builder` set, the outputs of tasks with `payload` in
+    tasks.yaml are turned into typed records (kept as the task output's
+    `pydantic`), which later tasks receive in their compact rendering (see
+    aria/payloads.py).
+
+    After a run, `task_records` holds each task's agent, timings and full
+    output for the run history (see aria/history.py), and the model and
+    routing reason of each LLM call of agents with routed LLMs (see
+    aria/routing.py). The run's LLM calls queue for the LLM governor as one
+    flow (see aria/governor.py).
+
+    Under a run deadline (see aria/deadline.py) tasks are asked for brief
+    output once the run is late, tasks with a `min_time_s` longer than the
+    time left are skipped with the tasks after them, and a run that reaches
+    the deadline ends with the last task output it has: `partial` is set and
+    `skipped_tasks` names the tasks that did not run.
+
+    With `refresher` set, a run refreshing an earlier report verifies only
+    new claims and rewrites only the sections they touch, and stops early
+    with the earlier report when nothing changed (see aria/refresh.py).
+
+    The run's inputs are interpolated into agents and tasks from templates
+    compiled once per process (see aria/prompts.py).
+    """
+
+    context_compactor: Optional[Any] = Field(default=None, exclude=True)
+    claim_deduplicator: Optional[Any] = Field(default=None, exclude=True)
+    artifacts: Optional[Any] = Field(default=None, exclude=True)
+    payload_builder: Optional[Any] = Field(default=None, exclude=True)
+    task_min_times: Dict[str, float] = Field(default_factory=dict, exclude=True)
+    refresher: Optional[Any] = Field(default=None, exclude=True)
+    task_records: List[Dict[str, Any]] = Field(default_factory=list, exclude=True)
+    partial: bool = Field(default=False, exclude=True)
+    skipped_tasks: List[str] = Field(default_factory=list, exclude=True)
+
+    def kickoff(self, inputs: Optional[Dict[str, Any]] = None) -> CrewOutput:
+        serialise_console_output()
+        try:
+            try:
+                with use_tool_records(self.payload_builder.records if self.payload_builder else ToolRecords()), \
+                        use_run_artifacts(self.artifacts), use_flow(str(self.id)):
+                    output = super().kickoff(inputs=inputs)
+            except Exception as e:
+                output = self._stopped_output(e)
+            self.task_records = [self._task_record(task) for task in self.tasks]
+            return output
+        finally:
+            release_run_references(self)
+            if self.artifacts is not None:
+                self.artifacts.close()
+
+    def _interpolate_inputs(self, inputs: Dict[str, Any]) -> None:
+        if "crew_chat_messages" in inputs:
+            # crewAI adds the conversation history to the task descriptions.
+            return super()._interpolate_inputs(inputs)
+        interpolate(self.tasks, TASK_FIELDS, inputs)
+        interpolate(self.agents, AGENT_FIELDS, inputs)
+
+    def _task_record(self, task: Task) -> Dict[str, Any]:
+        text = task.output.raw if task.output is not None else None
+        if text and self.artifacts is not None:
+            text = self.artifacts.load(text)
+        record = {
+            "name": task.name,
+            "agent": task.agent.role.strip() if task.agent is not None else None,
+            "started_at": task.start_time.timestamp() if task.start_time else None,
+            "finished_at": task.end_time.timestamp() if task.end_time else None,
+            "duration_s": task.execution_duration,
+            "output": text,
+        }
+        llm = getattr(task.agent, "llm", None)
+        if isinstance(llm, RoutedLLM):
+            record["llm_calls"] = llm.policy.calls_between(record["started_at"], record["finished_at"])
+        return record
+
+    def _stopped_output(self, error: Exception) -> CrewOutput:
+        """The output of a run stopped for lack of time, from the tasks it finished; re-raises other errors."""
+        deadline = current_deadline()
+        skipped = isinstance(error, _SkipRemainingTasks)
+        if not skipped and (deadline is None or not deadline.expired(slack=SLACK_S)):
+            raise error
+        finished = [task.output for task in self.tasks if task.output is not None and task.output.raw]
+        if not finished:
+            raise DeadlineExceeded(f"Deadline reached before any task finished: {error}") from error
+        done = {id(task) for task in self.tasks if task.output is not None and task.output.raw}
+        self.skipped_tasks = [task.name for task in self.tasks if id(task) not in done]
+        self.partial = not skipped
+        logger.warning("Run stopped early (%s); returning %s, skipped %s",
+                       error, "a partial report" if self.partial else "the report", ", ".join(self.skipped_tasks))
+        output = self._create_crew_output(finished)
+        if skipped and self.refresher is not None and self.refresher.unchanged():
+            output.raw = self.refresher.report
+        return output
+
+    def _deadline_context(self, task: Task, deadline: Deadline) -> str:
+        """Checks before `task` starts under a deadline; the note to add to its context."""
+        deadline.check(task.name)
+        index = self.tasks.index(task)
+        remaining = deadline.remaining()
+        if index and all(self.task_min_times.get(later.name) for later in self.tasks[index:]) \
+                and remaining < self.task_min_times[task.name]:
+            raise _SkipRemainingTasks(f"{remaining:.0f}s left, {task.name} needs {self.task_min_times[task.name]:g}s")
+        return LATE_NOTE if deadline.late() else ""
+
+    def _get_context(self, task: Task, task_outputs: List[TaskOutput]) -> str:
+        # Called right before the task runs: its tool calls are noted under its name.
+        if self.payload_builder is not None:
+            self.payload_builder.records.task = task.name
+        deadline = current_deadline()
+        note = self._deadline_context(task, deadline) if deadline is not None else ""
+        refresher = self.refresher if self.refresher is not None and self.refresher.active else None
+        if refresher is not None and refresher.replaces_context(task.name):
+            context = ""
+        else:
+            context = self._task_context(task, task_outputs)
+        if refresher is not None:
+            reason = refresher.skip(task.name)
+            if reason:
+                raise _SkipRemainingTasks(reason)
+            context = refresher.context(task.name, context)
+        return f"{context}\n\n{note}" if context and note else context or note
+
+    def _task_context(self, task: Task, task_outputs: List[TaskOutput]) -> str:
+        if not task.context:
+            return ""
+        if task.context is NOT_SPECIFIED:
+            upstream_outputs = task_outputs
+        else:
+            upstream_outputs = [upstream.output for upstream in task.context if upstream.output is not None]
+        outputs = [output.pydantic if isinstance(output.pydantic, TaskPayload) else output.raw
+                   for output in upstream_outputs]
+        if self.artifacts is not None:
+            outputs = self.artifacts.load_context(task.name, outputs)
+        if self.refresher is not None:
+            outputs = self.refresher.filter_upstream(task.name, outputs)
+        if self.claim_deduplicator is not None:
+            outputs = self.claim_deduplicator.dedupe(task.name, outputs)
+        outputs = [render(output) for output in outputs]
+        if self.context_compactor is None or task.context is not NOT_SPECIFIED:
+            return DIVIDER.join(outputs)
+        return self.context_compactor.compact(task.name, outputs)
+
+    def _process_task_result(self, task: Task, output: TaskOutput) -> None:
+        super()._process_task_result(task, output)
+        if self.payload_builder is not None:
+            payload = self.payload_builder.build(task.name, output.raw)
+            if payload is not None:
+                output.pydantic = payload
+        if self.refresher is not None:
+            text = self.refresher.finished(task.name, output.raw, output.pydantic)
+            if text != output.raw:
+                output.raw = text
+                if task.output_file:
+                    # The file holds the sections the agent returned; the run's report is the merged one.
+                    task._save_file(text)
+        if self.artifacts is None:
+            return
+        output.raw = self.artifacts.spill(task.name, output.raw)
+        task.prompt_context = None
+        executor = getattr(task.agent, "agent_executor", None)
+        if executor is not None:
+            executor.messages = []
+
+    def _create_crew_output(self, task_outputs: List[TaskOutput]) -> CrewOutput:
+        if self.artifacts is not None:
+            # Only the final answer comes back into memory.
+            final = next((output for output in reversed(task_outputs) if output.raw), None)
+            if final is not None:
+                final.raw = self.artifacts.load(final.raw)
+        return super()._create_crew_output(task_outputs)
 
 
-    
 @CrewBase
 class Aria():
     """
@@ -111,6 +315,8 @@ class Aria():
         """Researcher: uses scholar search + (optionally) summarizer tool to fetch raw findings."""
         return Agent(
             config=self.agents_config['researcher'],  # must match key in agents.yaml            
+            llm=routed_llm('researcher', self.agents_config['researcher']),
+            tools=[SearchScholar()],
             verbose=True,
         )
 
@@ -119,8 +325,9 @@ class Aria():
         """FactChecker: validates researcher's claims using external sources / news."""
         return Agent(
             config=self.agents_config['fact_checker'],
+            llm=routed_llm('fact_checker', self.agents_config['fact_checker']),
             
-            # tools=[FactCheckerTool()],
+            tools=[FactCheckerTool()],
             # tools=[CodeInterpreterTool()],
             verbose=True,
         )
@@ -130,8 +337,9 @@ class Aria():
         """Summarizer: condenses verified findings into structured notes."""
         return Agent(
             config=self.agents_config['summarizer'],
+            llm=routed_llm('summarizer', self.agents_config['summarizer']),
             
-            # tools=[SummarizerTool()],
+            tools=[SummarizerTool()],
             
             verbose=True,
         )
@@ -141,8 +349,9 @@ class Aria():
         """Writer: expands summaries into a full markdown report."""
         return Agent(
             config=self.agents_config['writer'],
+            llm=routed_llm('writer', self.agents_config['writer']),
             
-            # tools=[WriterTool()],
+            tools=[WriterTool()],
             
             verbose=True,
         )
@@ -152,8 +361,9 @@ class Aria():
         """Reviewer: performs grammar / clarity / style checks and final polishing."""
         return Agent(
             config=self.agents_config['reviewer'],
+            llm=routed_llm('reviewer', self.agents_config['reviewer']),
             
-            # tools=[ReviewerTool()],
+            tools=[ReviewerTool()],
             
             verbose=True,
         )
@@ -205,9 +415,23 @@ class Aria():
         use sequential. If you want a manager-driven workflow, switch to Process.hierarchical.
         """
         print("⚡ Crew is being created...")
-        return Crew(
+        return CompactingCrew(
             agents=self.agents,   # created by @agent decorators
             tasks=self.tasks,     # created by @task decorators (order matches definitions above)
             process=Process.sequential,
             verbose=True,
+            # agents' system prompts stay the same for every run, for provider-side prompt caching
+            prompt_file=stable_prompt_file(),
+            # trims each task's upstream context to its `context_budget` in tasks.yaml
+            context_compactor=ContextCompactor.from_tasks_config(self.tasks_config),
+            # verifies one claim per near-duplicate cluster for tasks with `dedup_claims` in tasks.yaml
+            claim_deduplicator=ClaimDeduplicator.from_tasks_config(self.tasks_config),
+            # finished task outputs go to disk; the run holds at most ARIA_RUN_MEMORY_MB of them
+            artifacts=RunArtifacts(),
+            # tasks with `payload` in tasks.yaml hand typed records to the next task
+            payload_builder=PayloadBuilder.from_tasks_config(self.tasks_config),
+            # under a run deadline, tasks with `min_time_s` in tasks.yaml are skipped when less is left
+            task_min_times=min_times_from_tasks_config(self.tasks_config),
+            # tasks with `refresh` in tasks.yaml build on the topic's previous run when refreshing
+            refresher=ReportRefresher.from_tasks_config(self.tasks_config, current_baseline()),
         )
@@ -0,0 +1,127 @@
+"""
+End-to-end deadlines for crew runs.
+
+A caller can give a run a deadline (`deadline_s` on POST /run-crew). It is
+carried in a ContextVar, so it reaches every task, LLM call and tool call of
+the run - including calls on the shared tool loop - and it travels to worker
+processes with the run's inputs. Each stage works with the time that is left:
+
+- HTTP tool requests time out at the deadline at the latest, and are not
+  sent once it has passed (the tool returns its degraded result).
+- LLM calls of routed agents time out at the deadline, and fail at once
+  after it (see aria/routed_llm.py).
+- Once less than ARIA_DEADLINE_LATE_FRACTION of the time is left the run is
+  late: Scholar returns fewer results and every following task is asked to
+  keep its output brief. A task with `min_time_s` in tasks.yaml (the review)
+  is skipped, with the tasks after it, when less than that is left.
+- A run that reaches its deadline returns the last task output it has,
+  marked partial, instead of failing.
+"""
+
+import os
+import time
+from contextlib import contextmanager
+from contextvars import ContextVar
+from typing import Any, Dict, Iterator, Optional, Tuple
+
+LATE_FRACTION = float(os.getenv("ARIA_DEADLINE_LATE_FRACTION", "0.33"))
+# A call cut short by the deadline may fail just before it: treat that as reaching it.
+SLACK_S = float(os.getenv("ARIA_DEADLINE_SLACK_S", "1"))
+
+# Key of the deadline in a run's inputs on the way to kickoff_crew (see aria/batch.py).
+INPUT_KEY = "_deadline"
+
+LATE_NOTE = ("Time for this run is running out: keep your output brief - short sections, "
+             "only the most important points - and do not start new research.")
+
+
+class DeadlineExceeded(Exception):
+    """Raised by a stage that would start after its run's deadline."""
+
+
+class Deadline:
+    """Wall-clock deadline of one run, so it means the same in every process."""
+
+    def __init__(self, at: float, started: Optional[float] = None):
+        self.at = at
+        self.started = time.time() if started is None else started
+
+    @classmethod
+    def after(cls, seconds: float) -> "Deadline":
+        now = time.time()
+        return cls(now + seconds, started=now)
+
+    def remaining(self) -> float:
+        return max(0.0, self.at - time.time())
+
+    def expired(self, slack: float = 0.0) -> bool:
+        return self.remaining() <= slack
+
+    def fraction_left(self) -> float:
+        total = self.at - self.started
+        return self.remaining() / total if total > 0 else 0.0
+
+    def late(self) -> bool:
+        return self.fraction_left() < LATE_FRACTION
+
+    def clip(self, timeout: Optional[float]) -> float:
+        """`timeout`, or less if the deadline comes first."""
+        remaining = self.remaining()
+        return remaining if timeout is None else min(timeout, remaining)
+
+    def check(self, what: str) -> None:
+        if self.expired():
+            raise DeadlineExceeded(f"Deadline reached before {what}")
+
+    def __repr__(self) -> str:
+        return f"Deadline({self.remaining():.1f}s left)"
+
+
+_current: ContextVar[Optional[Deadline]] = ContextVar("aria_deadline", default=None)
+
+
+def current_deadline() -> Optional[Deadline]:
+    return _current.get()
+
+
+@contextmanager
+def use_deadline(deadline: Optional[Deadline]) -> Iterator[Optional[Deadline]]:
+    """Make `deadline` the current one in this context; None means no deadline."""
+    token = _current.set(deadline)
+    try:
+        yield deadline
+    finally:
+        _current.reset(token)
+
+
+def running_late() -> bool:
+    deadline = current_deadline()
+    return deadline is not None and deadline.late()
+
+
+def clip_timeout(timeout: Optional[float]) -> Optional[float]:
+    """`timeout` cut to the current deadline, if there is one."""
+    deadline = current_deadline()
+    return timeout if deadline is None else deadline.clip(timeout)
+
+
+def with_deadline(inputs: Dict[str, Any], deadline: Optional[Deadline]) -> Dict[str, Any]:
+    """A copy of a run's inputs carrying `deadline` (picklable, for worker processes)."""
+    if deadline is None:
+        return inputs
+    return {**inputs, INPUT_KEY: (deadline.started, deadline.at)}
+
+
+def split_deadline(inputs: Dict[str, Any]) -> Tuple[Dict[str, Any], Optional[Deadline]]:
+    """The crew inputs and the deadline added by with_deadline()."""
+    if INPUT_KEY not in inputs:
+        return inputs, None
+    inputs = dict(inputs)
+    started, at = inputs.pop(INPUT_KEY)
+    return inputs, Deadline(at, started=started)
+
+
+def min_times_from_tasks_config(tasks_config: Dict[str, Any]) -> Dict[str, float]:
+    """`min_time_s` of each task in tasks.yaml that has one."""
+    return {name: float(config["min_time_s"]) for name, config in (tasks_config or {}).items()
+            if isinstance(config, dict) and config.get("min_time_s") is not None}
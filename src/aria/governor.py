@@ -0,0 +1,555 @@
+"""
+Process-wide governor of LLM calls.
+
+Every call of a routed agent (see aria/routed_llm.py) takes a slot of its
+model first. A model has at most ARIA_LLM_MAX_IN_FLIGHT calls in flight and,
+with ARIA_LLM_TPM set, spends at most that many tokens per minute (per-model
+limits in ARIA_LLM_MODEL_LIMITS). The token budget is a bucket that refills
+continuously: a call reserves its prompt tokens plus the completion it may
+produce (`max_tokens`, or ARIA_LLM_COMPLETION_TOKENS) and gives back what it
+did not use once it returns.
+
+Calls that cannot start wait per model, and runs take turns: waiting calls are
+served by start-time fair queuing over runs (as in aria/admission.py, with a
+call's cost its reserved tokens), so a run with a long backlog of calls does
+not hold back the others. A 429 from the provider holds back every call to the
+model for its Retry-After (or ARIA_LLM_RATE_LIMIT_COOLDOWN_S) instead of
+letting each caller retry on its own; the client's retries are turned off for
+that reason, and the routed LLM retries the call itself (ARIA_LLM_RETRIES
+times) once the cooldown is over, and a 5xx or connection error after a short
+backoff. Calls waiting under a run deadline give up at the deadline.
+
+The counters and the token bucket live in the process, or - with
+ARIA_LLM_GOVERNOR_URL (e.g. `sqlite:///data/governor.db`) - in a database
+shared by worker processes and instances on one host, so the limits hold for
+all of them together. Time spent waiting is reported per call (`queued_s` in
+the run's `llm_calls`) and per model under `llm_governor` in GET /metrics.
+A hedged duplicate (see aria/hedging.py) takes a slot of its own and is only
+sent when one is free without waiting (try_acquire).
+"""
+
+import abc
+import heapq
+import itertools
+import logging
+import math
+import os
+import sqlite3
+import threading
+import time
+import uuid
+from collections import deque
+from contextlib import contextmanager
+from contextvars import ContextVar
+from dataclasses import dataclass
+from typing import Any, Callable, Deque, Dict, Iterator, List, Optional, Tuple
+
+from aria.deadline import DeadlineExceeded, current_deadline
+
+logger = logging.getLogger(__name__)
+
+GOVERNOR = os.getenv("ARIA_LLM_GOVERNOR", "true").lower() in ("1", "true", "yes")
+MAX_IN_FLIGHT = int(os.getenv("ARIA_LLM_MAX_IN_FLIGHT", "8"))
+TPM = int(os.getenv("ARIA_LLM_TPM", "0"))
+COMPLETION_TOKENS = int(os.getenv("ARIA_LLM_COMPLETION_TOKENS", "1000"))
+RATE_LIMIT_COOLDOWN_S = float(os.getenv("ARIA_LLM_RATE_LIMIT_COOLDOWN_S", "10"))
+GOVERNOR_URL = os.getenv("ARIA_LLM_GOVERNOR_URL", "")
+LLM_RETRIES = int(os.getenv("ARIA_LLM_RETRIES", "2"))
+RETRY_BACKOFF_S = float(os.getenv("ARIA_LLM_RETRY_BACKOFF_S", "1"))
+
+# Errors of a provider that is briefly unavailable (openai and litellm class names).
+TRANSIENT_ERRORS = ("APIConnectionError", "APITimeoutError", "InternalServerError", "ServiceUnavailableError",
+                    "BadGatewayError", "Timeout")
+# A shared slot whose holder died is freed after this long.
+LEASE_SECONDS = 600.0
+# How often a call waiting on a shared governor looks for slots freed by other processes.
+SHARED_POLL_S = 0.05
+MAX_WAIT_SAMPLES = 1000
+
+
+@dataclass(frozen=True)
+class ModelLimits:
+    """Calls in flight and tokens per minute allowed for one model; 0 = no limit."""
+
+    max_in_flight: int = MAX_IN_FLIGHT
+    tpm: int = TPM
+
+
+def _parse_limits(spec: str) -> Dict[str, ModelLimits]:
+    """'gpt-4o-mini:16:200000,gpt-4o:4:30000' -> {model: ModelLimits(in flight, tokens per minute)}"""
+    limits = {}
+    for item in filter(None, (part.strip() for part in spec.split(","))):
+        model, in_flight, tpm = item.rsplit(":", 2)
+        limits[model] = ModelLimits(int(in_flight), int(tpm))
+    return limits
+
+
+MODEL_LIMITS = _parse_limits(os.getenv("ARIA_LLM_MODEL_LIMITS", ""))
+
+
+def _refill(level: float, updated: float, now: float, tpm: int) -> float:
+    return min(float(tpm), level + (now - updated) * tpm / 60.0)
+
+
+def _tokens_wait(level: float, tokens: int, tpm: int) -> float:
+    """Seconds until the bucket holds `tokens` (a call larger than the budget waits for a full bucket)."""
+    need = min(tokens, tpm)
+    return 0.0 if level >= need else (need - level) * 60.0 / tpm
+
+
+class GovernorState(abc.ABC):
+    """Slots in use, token buckets and cooldowns of the governed models."""
+
+    shared = False
+
+    @abc.abstractmethod
+    def try_acquire(self, model: str, tokens: int, limits: ModelLimits, holder: str) -> float:
+        """Take a slot and reserve `tokens` for `holder`: 0 if done, else seconds until it may succeed."""
+
+    @abc.abstractmethod
+    def release(self, model: str, holder: str, unused: int, limits: ModelLimits) -> None:
+        """Free `holder`'s slot and give back `unused` reserved tokens (negative: spent more)."""
+
+    @abc.abstractmethod
+    def cool_down(self, model: str, seconds: float, limits: ModelLimits) -> None:
+        """Start no call to `model` for `seconds`."""
+
+    @abc.abstractmethod
+    def snapshot(self, model: str, limits: ModelLimits) -> Dict[str, Any]:
+        """Slots in use, tokens left in the bucket and cooldown of `model`."""
+
+
+class _Bucket:
+    def __init__(self, tpm: int):
+        self.in_flight = 0
+        self.level = float(tpm)
+        self.updated = time.monotonic()
+        self.blocked_until = 0.0
+
+
+class LocalGovernorState(GovernorState):
+    """State of this process only. Callers hold the governor's lock."""
+
+    def __init__(self):
+        self._buckets: Dict[str, _Bucket] = {}
+
+    def _bucket(self, model: str, limits: ModelLimits) -> _Bucket:
+        bucket = self._buckets.get(model)
+        if bucket is None:
+            bucket = self._buckets[model] = _Bucket(limits.tpm)
+        now = time.monotonic()
+        if limits.tpm:
+            bucket.level = _refill(bucket.level, bucket.updated, now, limits.tpm)
+        bucket.updated = now
+        return bucket
+
+    def try_acquire(self, model: str, tokens: int, limits: ModelLimits, holder: str) -> float:
+        bucket = self._bucket(model, limits)
+        if bucket.blocked_until > bucket.updated:
+            return bucket.blocked_until - bucket.updated
+        if limits.max_in_flight and bucket.in_flight >= limits.max_in_flight:
+            # A release wakes the waiters.
+            return math.inf
+        wait = _tokens_wait(bucket.level, tokens, limits.tpm) if limits.tpm else 0.0
+        if wait:
+            return wait
+        bucket.in_flight += 1
+        bucket.level -= tokens if limits.tpm else 0
+        return 0.0
+
+    def release(self, model: str, holder: str, unused: int, limits: ModelLimits) -> None:
+        bucket = self._bucket(model, limits)
+        bucket.in_flight -= 1
+        if limits.tpm:
+            bucket.level = min(float(limits.tpm), bucket.level + unused)
+
+    def cool_down(self, model: str, seconds: float, limits: ModelLimits) -> None:
+        bucket = self._bucket(model, limits)
+        bucket.blocked_until = max(bucket.blocked_until, time.monotonic() + seconds)
+
+    def snapshot(self, model: str, limits: ModelLimits) -> Dict[str, Any]:
+        bucket = self._bucket(model, limits)
+        return {"in_flight": bucket.in_flight, "tokens_left": round(bucket.level) if limits.tpm else None,
+                "cooldown_s": round(max(0.0, bucket.blocked_until - bucket.updated), 2)}
+
+
+class SQLiteGovernorState(GovernorState):
+    """
+    State shared through a SQLite file by every process that opens it. Slots
+    are leases, so the slots of a process that dies are freed after
+    LEASE_SECONDS.
+    """
+
+    shared = True
+
+    SCHEMA = """
+        CREATE TABLE IF NOT EXISTS llm_buckets (
+            model TEXT PRIMARY KEY,
+            level REAL NOT NULL,
+            updated REAL NOT NULL,
+            blocked_until REAL NOT NULL DEFAULT 0
+        );
+        CREATE TABLE IF NOT EXISTS llm_slots (
+            holder TEXT PRIMARY KEY,
+            model TEXT NOT NULL,
+            expires_at REAL NOT NULL
+        );
+        CREATE INDEX IF NOT EXISTS llm_slots_model ON llm_slots (model, expires_at);
+    """
+
+    def __init__(self, path: str):
+        self.path = path
+        os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+        self._local = threading.local()
+        with self._connect() as db:
+            db.executescript(self.SCHEMA)
+
+    def _connect(self) -> sqlite3.Connection:
+        db = getattr(self._local, "db", None)
+        if db is None:
+            db = sqlite3.connect(self.path, timeout=30, isolation_level=None)
+            db.execute("PRAGMA journal_mode=WAL")
+            db.execute("PRAGMA busy_timeout=30000")
+            self._local.db = db
+        return db
+
+    @contextmanager
+    def _transaction(self) -> Iterator[sqlite3.Connection]:
+        db = self._connect()
+        db.execute("BEGIN IMMEDIATE")
+        try:
+            yield db
+        except BaseException:
+            db.execute("ROLLBACK")
+            raise
+        db.execute("COMMIT")
+
+    @staticmethod
+    def _bucket(db: sqlite3.Connection, model: str, limits: ModelLimits, now: float) -> Tuple[float, float]:
+        """(tokens in the bucket, blocked until) of `model`, refilled up to `now`."""
+        row = db.execute("SELECT level, updated, blocked_until FROM llm_buckets WHERE model = ?", (model,)).fetchone()
+        if row is None:
+            db.execute("INSERT INTO llm_buckets (model, level, updated) VALUES (?, ?, ?)", (model, limits.tpm, now))
+            return float(limits.tpm), 0.0
+        level, updated, blocked_until = row
+        return (_refill(level, updated, now, limits.tpm) if limits.tpm else level), blocked_until
+
+    def try_acquire(self, model: str, tokens: int, limits: ModelLimits, holder: str) -> float:
+        now = time.time()
+        with self._transaction() as db:
+            level, blocked_until = self._bucket(db, model, limits, now)
+            if blocked_until > now:
+                return blocked_until - now
+            if limits.max_in_flight:
+                db.execute("DELETE FROM llm_slots WHERE model = ? AND expires_at < ?", (model, now))
+                (in_flight,) = db.execute("SELECT COUNT(*) FROM llm_slots WHERE model = ?", (model,)).fetchone()
+                if in_flight >= limits.max_in_flight:
+                    return SHARED_POLL_S
+            wait = _tokens_wait(level, tokens, limits.tpm) if limits.tpm else 0.0
+            if wait:
+                return wait
+            db.execute("INSERT INTO llm_slots (holder, model, expires_at) VALUES (?, ?, ?)",
+                       (holder, model, now + LEASE_SECONDS))
+            db.execute("UPDATE llm_buckets SET level = ?, updated = ? WHERE model = ?",
+                       (level - (tokens if limits.tpm else 0), now, model))
+        return 0.0
+
+    def release(self, model: str, holder: str, unused: int, limits: ModelLimits) -> None:
+        now = time.time()
+        with self._transaction() as db:
+            db.execute("DELETE FROM llm_slots WHERE holder = ?", (holder,))
+            if limits.tpm:
+                level, _ = self._bucket(db, model, limits, now)
+                db.execute("UPDATE llm_buckets SET level = ?, updated = ? WHERE model = ?",
+                           (min(float(limits.tpm), level + unused), now, model))
+
+    def cool_down(self, model: str, seconds: float, limits: ModelLimits) -> None:
+        now = time.time()
+        with self._transaction() as db:
+            self._bucket(db, model, limits, now)
+            db.execute("UPDATE llm_buckets SET blocked_until = MAX(blocked_until, ?) WHERE model = ?",
+                       (now + seconds, model))
+
+    def snapshot(self, model: str, limits: ModelLimits) -> Dict[str, Any]:
+        now = time.time()
+        db = self._connect()
+        (in_flight,) = db.execute("SELECT COUNT(*) FROM llm_slots WHERE model = ? AND expires_at >= ?",
+                                  (model, now)).fetchone()
+        row = db.execute("SELECT level, updated, blocked_until FROM llm_buckets WHERE model = ?", (model,)).fetchone()
+        level, updated, blocked_until = row if row is not None else (limits.tpm, now, 0.0)
+        return {"in_flight": in_flight,
+                "tokens_left": round(_refill(level, updated, now, limits.tpm)) if limits.tpm else None,
+                "cooldown_s": round(max(0.0, blocked_until - now), 2)}
+
+
+STATES: Dict[str, Callable[[str], GovernorState]] = {
+    "sqlite": SQLiteGovernorState,
+}
+
+
+def state_from_url(url: str) -> GovernorState:
+    """Shared state for a governor URL, e.g. `sqlite:///data/governor.db`; no URL keeps it in the process."""
+    if not url:
+        return LocalGovernorState()
+    scheme, _, location = url.partition(":///")
+    if scheme not in STATES or not location:
+        raise ValueError(f"Unsupported LLM governor URL {url!r}; supported schemes: {', '.join(sorted(STATES))}")
+    return STATES[scheme](location)
+
+
+_flow: ContextVar[Optional[str]] = ContextVar("aria_llm_flow", default=None)
+
+
+@contextmanager
+def use_flow(flow: Optional[str]) -> Iterator[Optional[str]]:
+    """Queue the LLM calls made in this context as the calls of `flow` (one crew run)."""
+    token = _flow.set(flow)
+    try:
+        yield flow
+    finally:
+        _flow.reset(token)
+
+
+class _Waiter:
+    def __init__(self, flow: Optional[str], start_tag: float, finish_tag: float):
+        self.flow = flow
+        self.start_tag = start_tag
+        self.finish_tag = finish_tag
+        self.holder = uuid.uuid4().hex
+
+
+class Slot:
+    """A call's hold on its model: what it reserved, and how long it waited for it."""
+
+    def __init__(self, model: str, holder: str, reserved: int, queued_s: float):
+        self.model = model
+        self.holder = holder
+        self.reserved = reserved
+        self.queued_s = queued_s
+        # Tokens the call spent; what it reserved unless told otherwise.
+        self.used = reserved
+
+
+class ModelQueueStats:
+    """Calls of one model and the time they waited for a slot."""
+
+    def __init__(self):
+        self.calls = 0
+        self.waited = 0
+        self.queued_s = 0.0
+        self.max_queued_s = 0.0
+        self.rate_limited = 0
+        self.timed_out = 0
+        self.tokens = 0
+        self._recent_waits: Deque[float] = deque(maxlen=MAX_WAIT_SAMPLES)
+        self._minute: Deque[Tuple[float, int]] = deque()
+
+    def started(self, queued_s: float) -> None:
+        self.calls += 1
+        self.waited += queued_s > 0.001
+        self.queued_s += queued_s
+        self.max_queued_s = max(self.max_queued_s, queued_s)
+        self._recent_waits.append(queued_s)
+
+    def spent(self, tokens: int) -> None:
+        now = time.monotonic()
+        self.tokens += tokens
+        self._minute.append((now, tokens))
+        while self._minute and self._minute[0][0] < now - 60.0:
+            self._minute.popleft()
+
+    def snapshot(self) -> Dict[str, Any]:
+        waits = sorted(self._recent_waits)
+        cutoff = time.monotonic() - 60.0
+        return {
+            "calls": self.calls,
+            "waited": self.waited,
+            "mean_queued_s": round(self.queued_s / self.calls, 3) if self.calls else 0.0,
+            "p95_queued_s": round(waits[min(len(waits) - 1, int(0.95 * len(waits)))], 3) if waits else 0.0,
+            "max_queued_s": round(self.max_queued_s, 3),
+            "rate_limited": self.rate_limited,
+            "timed_out": self.timed_out,
+            "tokens": self.tokens,
+            "tokens_last_minute": sum(tokens for at, tokens in self._minute if at >= cutoff),
+        }
+
+
+class LLMGovernor:
+    """In-flight and tokens-per-minute limits per model, with fair queuing of the calls of concurrent runs."""
+
+    def __init__(self, state: Optional[GovernorState] = None, limits: Optional[Dict[str, ModelLimits]] = None,
+                 default: Optional[ModelLimits] = None):
+        self.state = state or LocalGovernorState()
+        self.limits = dict(MODEL_LIMITS if limits is None else limits)
+        self.default = default or ModelLimits()
+        self._cond = threading.Condition()
+        self._queues: Dict[str, List[Tuple[float, int, _Waiter]]] = {}
+        self._virtual_time: Dict[str, float] = {}
+        self._last_finish: Dict[Tuple[str, Optional[str]], float] = {}
+        self._in_flight: Dict[str, int] = {}
+        self._seq = itertools.count()
+        self._stats: Dict[str, ModelQueueStats] = {}
+
+    def limits_of(self, model: str) -> ModelLimits:
+        return self.limits.get(model, self.default)
+
+    def _model_stats(self, model: str) -> ModelQueueStats:
+        if model not in self._stats:
+            self._stats[model] = ModelQueueStats()
+        return self._stats[model]
+
+    def acquire(self, model: str, tokens: int) -> Slot:
+        """Wait for a slot of `model` and reserve `tokens`; raises DeadlineExceeded at the run's deadline."""
+        limits, flow, deadline = self.limits_of(model), _flow.get(), current_deadline()
+        started = time.monotonic()
+        with self._cond:
+            queue = self._queues.setdefault(model, [])
+            start = max(self._virtual_time.get(model, 0.0), self._last_finish.get((model, flow), 0.0))
+            waiter = _Waiter(flow, start, start + max(1, tokens))
+            self._last_finish[(model, flow)] = waiter.finish_tag
+            heapq.heappush(queue, (waiter.finish_tag, next(self._seq), waiter))
+            try:
+                while True:
+                    wait = math.inf
+                    if queue[0][2] is waiter:
+                        wait = self.state.try_acquire(model, tokens, limits, waiter.holder)
+                        if wait <= 0:
+                            break
+                    if deadline is not None:
+                        if deadline.expired():
+                            self._model_stats(model).timed_out += 1
+                            raise DeadlineExceeded(f"Deadline reached waiting for a {model} slot")
+                        wait = min(wait, deadline.remaining())
+                    if self.state.shared:
+                        wait = min(wait, SHARED_POLL_S)
+                    self._cond.wait(None if wait == math.inf else wait)
+            except BaseException:
+                self._drop(model, waiter)
+                raise
+            heapq.heappop(queue)
+            self._virtual_time[model] = waiter.start_tag
+            self._in_flight[model] = self._in_flight.get(model, 0) + 1
+            queued_s = time.monotonic() - started
+            self._model_stats(model).started(queued_s)
+            # The next waiter may fit as well (tokens left, slots free).
+            self._cond.notify_all()
+        if queued_s > 1.0:
+            logger.info("LLM call to %s waited %.1fs for a slot", model, queued_s)
+        return Slot(model, waiter.holder, tokens, queued_s)
+
+    def try_acquire(self, model: str, tokens: int) -> Optional[Slot]:
+        """A slot of `model` reserving `tokens` if one is free now and no call waits for one; None otherwise."""
+        limits, holder = self.limits_of(model), uuid.uuid4().hex
+        with self._cond:
+            if self._queues.get(model) or self.state.try_acquire(model, tokens, limits, holder) > 0:
+                return None
+            self._in_flight[model] = self._in_flight.get(model, 0) + 1
+            self._model_stats(model).started(0.0)
+        return Slot(model, holder, tokens, 0.0)
+
+    def _drop(self, model: str, waiter: _Waiter) -> None:
+        queue = self._queues[model]
+        queue[:] = [entry for entry in queue if entry[2] is not waiter]
+        heapq.heapify(queue)
+        self._cond.notify_all()
+
+    def release(self, slot: Slot, used: int) -> None:
+        """Free `slot`; `used` is the tokens the call actually spent."""
+        with self._cond:
+            self.state.release(slot.model, slot.holder, slot.reserved - used, self.limits_of(slot.model))
+            self._model_stats(slot.model).spent(used)
+            self._in_flight[slot.model] -= 1
+            if not self._queues.get(slot.model) and not self._in_flight[slot.model]:
+                # Idle: forget old finish tags so tags stay small.
+                self._virtual_time.pop(slot.model, None)
+                for key in [key for key in self._last_finish if key[0] == slot.model]:
+                    del self._last_finish[key]
+            self._cond.notify_all()
+
+    def rate_limited(self, model: str, retry_after: Optional[float] = None) -> None:
+        """The provider answered 429: hold back every call to `model` for a while."""
+        seconds = retry_after if retry_after is not None else RATE_LIMIT_COOLDOWN_S
+        with self._cond:
+            self.state.cool_down(model, seconds, self.limits_of(model))
+            self._model_stats(model).rate_limited += 1
+            self._cond.notify_all()
+        logger.warning("%s is rate limited; holding its calls for %.1fs", model, seconds)
+
+    @contextmanager
+    def slot(self, model: str, tokens: int) -> Iterator[Slot]:
+        """A slot for one call; set `used` on it to the tokens spent (default: all reserved)."""
+        slot = self.acquire(model, tokens)
+        try:
+            yield slot
+        finally:
+            self.release(slot, slot.used)
+
+    def stats(self) -> Dict[str, Any]:
+        with self._cond:
+            models = {}
+            for model, stats in self._stats.items():
+                limits = self.limits_of(model)
+                models[model] = {
+                    "max_in_flight": limits.max_in_flight or None,
+                    "tpm": limits.tpm or None,
+                    "queued": len(self._queues.get(model, [])),
+                    **self.state.snapshot(model, limits),
+                    **stats.snapshot(),
+                }
+            return {"enabled": GOVERNOR, "shared": self.state.shared, "models": models}
+
+
+def is_rate_limit(error: BaseException) -> bool:
+    """Whether an LLM call failed with HTTP 429 (litellm and openai raise RateLimitError)."""
+    return getattr(error, "status_code", None) == 429 or type(error).__name__ == "RateLimitError"
+
+
+def retry_after(error: BaseException) -> Optional[float]:
+    """The Retry-After of a 429, in seconds, if the provider sent one."""
+    headers = getattr(getattr(error, "response", None), "headers", None) or {}
+    try:
+        return float(headers.get("retry-after"))
+    except (TypeError, ValueError):
+        return None
+
+
+def is_transient(error: BaseException) -> bool:
+    """Whether an LLM call failed with a 5xx or a connection error, which a retry may not hit."""
+    status = getattr(error, "status_code", None)
+    return (isinstance(status, int) and status >= 500) or type(error).__name__ in TRANSIENT_ERRORS
+
+
+def retry_delay(error: BaseException, attempt: int, governed: bool) -> Optional[float]:
+    """
+    Seconds to wait before calling the model again after its `attempt`-th retry
+    failed with `error`, or None to give up on it. A governed call waits out a
+    429 in the governor, which holds back the model until its cooldown is over.
+    """
+    if attempt >= LLM_RETRIES:
+        return None
+    if is_rate_limit(error):
+        return 0.0 if governed else (retry_after(error) or RATE_LIMIT_COOLDOWN_S)
+    if is_transient(error):
+        return RETRY_BACKOFF_S * 2 ** attempt
+    return None
+
+
+_governor: Optional[LLMGovernor] = None
+_lock = threading.Lock()
+
+
+def llm_governor() -> Optional[LLMGovernor]:
+    """The process's governor, or None with ARIA_LLM_GOVERNOR off."""
+    global _governor
+    if not GOVERNOR:
+        return None
+    with _lock:
+        if _governor is None:
+            _governor = LLMGovernor(state_from_url(GOVERNOR_URL))
+        return _governor
+
+
+def governor_stats() -> Dict[str, Any]:
+    """Slots, token buckets and queueing per model, for /metrics."""
+    governor = _governor
+    return governor.stats() if governor is not None else {"enabled": GOVERNOR, "models": {}}
@@ -0,0 +1,170 @@
+"""
+Health and readiness checks.
+
+Liveness (/healthz) and readiness (/readyz) are answered in-process without
+touching the crew, so they stay cheap enough for frequent orchestrator probes.
+The expensive deep check - YAML configs, environment variables, system
+resources and upstream reachability - runs on a background thread every
+HEALTH_CHECK_INTERVAL seconds and is served from its cached result.
+"""
+
+import logging
+import os
+import threading
+import time
+from pathlib import Path
+from typing import Any, Dict, List, Optional, Tuple
+
+import psutil
+import yaml
+
+logger = logging.getLogger(__name__)
+
+HEALTH_CHECK_INTERVAL = float(os.getenv("HEALTH_CHECK_INTERVAL", "30"))
+DEFAULT_CONFIG_DIR = Path(os.getenv("ARIA_CONFIG_DIR") or Path(__file__).parent / "config")
+
+REQUIRED_CONFIGS = ("agents.yaml", "tasks.yaml")
+# Tools degrade (and warn) without these, but the crew still runs.
+RECOMMENDED_ENV = ("OPENAI_API_KEY", "HF_API_KEY", "RAPIDAPI_KEY")
+
+HEALTHY, DEGRADED, UNHEALTHY = "healthy", "degraded", "unhealthy"
+
+_started = time.time()
+
+
+class HealthChecker:
+    """Individual checks plus the combined basic and deep health checks."""
+
+    def __init__(self, config_dir: Optional[str] = None):
+        self.config_dir = Path(config_dir) if config_dir else DEFAULT_CONFIG_DIR
+        self.warnings: List[str] = []
+        self.errors: List[str] = []
+
+    def validate_yaml_configs(self) -> bool:
+        """Both config files exist, parse, and map names to config dicts."""
+        ok = True
+        for name in REQUIRED_CONFIGS:
+            path = self.config_dir / name
+            try:
+                with open(path, encoding="utf-8") as f:
+                    config = yaml.safe_load(f)
+            except FileNotFoundError:
+                self.errors.append(f"Missing config file {path}")
+                ok = False
+                continue
+            except yaml.YAMLError as e:
+                self.errors.append(f"Invalid YAML in {path}: {e}")
+                ok = False
+                continue
+            if not isinstance(config, dict) or not config or not all(isinstance(v, dict) for v in config.values()):
+                self.errors.append(f"{path} must map names to config sections")
+                ok = False
+        return ok
+
+    def validate_env_variables(self) -> bool:
+        """Missing API keys only produce warnings; the crew runs with degraded tools."""
+        if not (os.getenv("HF_TOKEN") or os.getenv("HF_TKN")):
+            self.warnings.append("HF_TOKEN/HF_TKN not set")
+        for name in RECOMMENDED_ENV:
+            if not os.getenv(name):
+                self.warnings.append(f"{name} not set")
+        return True
+
+    def check_system_resources(self) -> Dict[str, Any]:
+        memory = psutil.virtual_memory()
+        disk = psutil.disk_usage(str(Path.cwd()))
+        return {
+            "cpu_percent": psutil.cpu_percent(interval=None),
+            "memory_percent": memory.percent,
+            "memory_available_mb": round(memory.available / (1024 * 1024), 1),
+            "disk_percent": disk.percent,
+        }
+
+    def check_upstreams(self) -> Dict[str, Any]:
+        from aria.api_testing import test_api_connectivity
+
+        return test_api_connectivity()
+
+    def health_check(self) -> Tuple[Dict[str, Any], int]:
+        """Liveness: the process is up and serving."""
+        return {"status": HEALTHY, "uptime_s": round(time.time() - _started, 1), "pid": os.getpid()}, 200
+
+    def deep_health_check(self, include_upstreams: bool = True) -> Tuple[Dict[str, Any], int]:
+        """Every check; unhealthy (503) when the crew configuration is unusable."""
+        self.warnings, self.errors = [], []
+        started = time.monotonic()
+        configs_ok = self.validate_yaml_configs()
+        self.validate_env_variables()
+        result: Dict[str, Any] = {"configs_valid": configs_ok, "resources": self.check_system_resources()}
+        if include_upstreams:
+            try:
+                result["api_connectivity"] = self.check_upstreams()
+                if result["api_connectivity"]["summary"]["overall_status"] != HEALTHY:
+                    self.warnings.append("Some upstream APIs are unreachable")
+            except Exception as e:
+                self.warnings.append(f"Upstream check failed: {e}")
+        status = UNHEALTHY if self.errors else (DEGRADED if self.warnings else HEALTHY)
+        result.update({
+            "status": status,
+            "errors": self.errors,
+            "warnings": self.warnings,
+            "checked_at": time.time(),
+            "duration_ms": round((time.monotonic() - started) * 1000, 1),
+        })
+        return result, 503 if status == UNHEALTHY else 200
+
+
+def health_check() -> Tuple[Dict[str, Any], int]:
+    return HealthChecker().health_check()
+
+
+def deep_health_check() -> Tuple[Dict[str, Any], int]:
+    return HealthChecker().deep_health_check()
+
+
+class CachedDeepHealthCheck:
+    """Runs the deep check on a background thread and serves the last result."""
+
+    def __init__(self, interval: float = HEALTH_CHECK_INTERVAL, checker: Optional[HealthChecker] = None):
+        self.interval = interval
+        self.checker = checker or HealthChecker()
+        self._result: Optional[Tuple[Dict[str, Any], int]] = None
+        self._lock = threading.Lock()
+        self._stop = threading.Event()
+        self._ready = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+
+    def start(self) -> "CachedDeepHealthCheck":
+        self._thread = threading.Thread(target=self._loop, name="aria-deep-health", daemon=True)
+        self._thread.start()
+        return self
+
+    def _loop(self) -> None:
+        while not self._stop.is_set():
+            self.refresh()
+            self._stop.wait(self.interval)
+
+    def refresh(self) -> Tuple[Dict[str, Any], int]:
+        try:
+            result = self.checker.deep_health_check()
+        except Exception as e:
+            logger.warning("Deep health check failed: %s", e)
+            result = ({"status": UNHEALTHY, "errors": [f"Deep health check failed: {e}"], "checked_at": time.time()}, 503)
+        with self._lock:
+            self._result = result
+        self._ready.set()
+        return result
+
+    def latest(self) -> Optional[Tuple[Dict[str, Any], int]]:
+        """Last deep check with its age, or None before the first one finished."""
+        with self._lock:
+            if self._result is None:
+                return None
+            body, code = self._result
+        return {**body, "age_s": round(time.time() - body["checked_at"], 1)}, code
+
+    def wait_ready(self, timeout: Optional[float] = None) -> bool:
+        return self._ready.wait(timeout)
+
+    def stop(self) -> None:
+        self._stop.set()
@@ -0,0 +1,238 @@
+"""
+Hedged requests for the calls that make up a run's tail latency.
+
+A hedged call that has not returned after the rolling p95 latency of its
+endpoint is sent a second time, and whichever response arrives first wins.
+A typical call is never duplicated; a call stuck behind a slow replica or
+a cold model gets a second chance at p95 instead of running to the timeout.
+
+Hedging is opt-in: ARIA_HEDGE_LLM for the crew's LLM calls (through each
+agent's RoutedLLM, keyed by model) and ARIA_HEDGE_TOOLS for the Hugging Face
+requests of SummarizerTool and WriterTool. An endpoint is hedged once it has
+ARIA_HEDGE_MIN_SAMPLES latency samples.
+
+All endpoints share one budget: every call earns ARIA_HEDGE_BUDGET of a hedge
+(0.05 = at most one extra request per 20 calls, up to ARIA_HEDGE_BURST saved
+up), so hedging cannot double the load on a struggling upstream. An LLM
+hedge also needs a free slot of the LLM governor (see aria/governor.py): it
+is not sent when the model is at its in-flight or token limit. The losing
+request is not cancelled - it is already being served - and its latency
+gives the time the hedge saved. Hedge rate, wins and savings are reported
+under `hedging` in GET /metrics.
+"""
+
+import asyncio
+import concurrent.futures
+import contextvars
+import logging
+import os
+import threading
+import time
+from typing import Any, Awaitable, Callable, Dict, Optional
+
+from aria.api_testing import AsyncResponse, endpoint_guard, guarded_request_async
+from aria.routing import model_stats
+
+logger = logging.getLogger(__name__)
+
+HEDGE_LLM = os.getenv("ARIA_HEDGE_LLM", "false").lower() in ("1", "true", "yes")
+HEDGE_TOOLS = os.getenv("ARIA_HEDGE_TOOLS", "false").lower() in ("1", "true", "yes")
+HEDGE_BUDGET = float(os.getenv("ARIA_HEDGE_BUDGET", "0.05"))
+HEDGE_BURST = float(os.getenv("ARIA_HEDGE_BURST", "5"))
+MIN_SAMPLES = int(os.getenv("ARIA_HEDGE_MIN_SAMPLES", "20"))
+
+
+class HedgeBudget:
+    """Token bucket: each call adds `ratio` of a hedge, each hedge spends one."""
+
+    def __init__(self, ratio: float = HEDGE_BUDGET, burst: float = HEDGE_BURST):
+        self.ratio = ratio
+        self.burst = burst
+        self.tokens = 0.0
+        self.denied = 0
+        self._lock = threading.Lock()
+
+    def earn(self) -> None:
+        with self._lock:
+            self.tokens = min(self.burst, self.tokens + self.ratio)
+
+    def spend(self) -> bool:
+        with self._lock:
+            if self.tokens >= 1.0:
+                self.tokens -= 1.0
+                return True
+            self.denied += 1
+            return False
+
+    def refund(self) -> None:
+        """Give back a hedge that was not sent after all."""
+        with self._lock:
+            self.tokens = min(self.burst, self.tokens + 1.0)
+
+
+class HedgeStats:
+    """Counters of one endpoint."""
+
+    def __init__(self):
+        self.calls = 0
+        self.hedged = 0
+        self.hedge_wins = 0
+        self.no_slot = 0
+        self.saved_s = 0.0
+
+    def snapshot(self) -> Dict[str, Any]:
+        return {
+            "calls": self.calls,
+            "hedged": self.hedged,
+            "hedge_rate": self.hedged / self.calls if self.calls else 0.0,
+            "hedge_wins": self.hedge_wins,
+            "no_slot": self.no_slot,
+            "saved_s": round(self.saved_s, 3),
+        }
+
+
+budget = HedgeBudget()
+_stats: Dict[str, HedgeStats] = {}
+_lock = threading.Lock()
+
+
+def _endpoint(name: str) -> HedgeStats:
+    with _lock:
+        if name not in _stats:
+            _stats[name] = HedgeStats()
+        return _stats[name]
+
+
+def _count(name: str, field: str, amount: float = 1) -> None:
+    stats = _endpoint(name)
+    with _lock:
+        setattr(stats, field, getattr(stats, field) + amount)
+
+
+def hedging_stats() -> Dict[str, Any]:
+    with _lock:
+        endpoints = {name: stats.snapshot() for name, stats in _stats.items()}
+    calls = sum(stats["calls"] for stats in endpoints.values())
+    hedged = sum(stats["hedged"] for stats in endpoints.values())
+    return {
+        "llm": HEDGE_LLM,
+        "tools": HEDGE_TOOLS,
+        "budget": budget.ratio,
+        "budget_denied": budget.denied,
+        "calls": calls,
+        "hedged": hedged,
+        "hedge_rate": hedged / calls if calls else 0.0,
+        "hedge_wins": sum(stats["hedge_wins"] for stats in endpoints.values()),
+        "saved_s": round(sum(stats["saved_s"] for stats in endpoints.values()), 3),
+        "endpoints": endpoints,
+    }
+
+
+def _record_savings(name: str, started: float, won_at: float) -> Callable[[Any], None]:
+    """Done-callback for the losing primary: the hedge saved the time it kept running."""
+
+    def record(_: Any) -> None:
+        _count(name, "saved_s", max(0.0, time.monotonic() - won_at))
+        logger.debug("Hedge for %s won after %.2fs", name, won_at - started)
+
+    return record
+
+
+def _start(call: Callable[[], Any]) -> concurrent.futures.Future:
+    """Run `call` on its own thread, in the caller's context."""
+    future: concurrent.futures.Future = concurrent.futures.Future()
+    context = contextvars.copy_context()
+
+    def run() -> None:
+        try:
+            future.set_result(context.run(call))
+        except BaseException as e:
+            future.set_exception(e)
+
+    threading.Thread(target=run, name="aria-hedge", daemon=True).start()
+    return future
+
+
+def hedged(name: str, call: Callable[[], Any], delay: Optional[float],
+           hedge: Optional[Callable[[], Optional[Callable[[], Any]]]] = None) -> Any:
+    """
+    Call `call`; if it has not returned after `delay` seconds and the budget
+    allows, call it again and return whichever finishes first. With no
+    `delay` (not enough samples yet) this is a plain call. `hedge`, if given,
+    makes the second call instead: it returns the call to send, or None when
+    none may be sent now.
+    """
+    _count(name, "calls")
+    budget.earn()
+    if delay is None:
+        return call()
+    started = time.monotonic()
+    primary = _start(call)
+    try:
+        return primary.result(timeout=delay)
+    except concurrent.futures.TimeoutError:
+        pass
+    if not budget.spend():
+        return primary.result()
+    duplicate = hedge() if hedge is not None else call
+    if duplicate is None:
+        budget.refund()
+        _count(name, "no_slot")
+        return primary.result()
+    _count(name, "hedged")
+    hedge = _start(duplicate)
+    pending = {primary, hedge}
+    winner = None
+    while pending and winner is None:
+        done, pending = concurrent.futures.wait(pending, return_when=concurrent.futures.FIRST_COMPLETED)
+        winner = next((future for future in done if future.exception() is None), None)
+    if winner is hedge:
+        _count(name, "hedge_wins")
+        primary.add_done_callback(_record_savings(name, started, time.monotonic()))
+    if winner is None:
+        # Both failed: report the primary's error.
+        return primary.result()
+    return winner.result()
+
+
+async def hedged_async(name: str, call: Callable[[], Awaitable[Any]], delay: Optional[float]) -> Any:
+    """hedged() for coroutines; `call` creates a new coroutine per attempt."""
+    _count(name, "calls")
+    budget.earn()
+    if delay is None:
+        return await call()
+    started = time.monotonic()
+    primary = asyncio.ensure_future(call())
+    done, _ = await asyncio.wait({primary}, timeout=delay)
+    if done or not budget.spend():
+        return await primary
+    _count(name, "hedged")
+    hedge = asyncio.ensure_future(call())
+    pending = {primary, hedge}
+    winner = None
+    while pending and winner is None:
+        done, pending = await asyncio.wait(pending, return_when=asyncio.FIRST_COMPLETED)
+        winner = next((task for task in done if task.exception() is None), None)
+    for task in pending:
+        # Keep the loser's error from being logged as never retrieved.
+        task.add_done_callback(lambda task: task.cancelled() or task.exception())
+    if winner is hedge:
+        _count(name, "hedge_wins")
+        primary.add_done_callback(_record_savings(name, started, time.monotonic()))
+    if winner is None:
+        return primary.result()
+    return winner.result()
+
+
+def llm_delay(model: str) -> Optional[float]:
+    """When to hedge a call to `model`: its rolling p95, once it has enough samples."""
+    return model_stats(model).p95(min_samples=MIN_SAMPLES)
+
+
+async def hedged_request_async(endpoint: str, method: str, url: str, **kwargs) -> AsyncResponse:
+    """guarded_request_async, hedged at the endpoint's rolling p95 when ARIA_HEDGE_TOOLS is on."""
+    if not HEDGE_TOOLS:
+        return await guarded_request_async(endpoint, method, url, **kwargs)
+    timeout = endpoint_guard(endpoint).timeout
+    delay = timeout.quantile(0.95) if timeout.sample_count() >= MIN_SAMPLES else None
+    return await hedged_async(endpoint, lambda: guarded_request_async(endpoint, method, url, **kwargs), delay)
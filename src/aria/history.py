@@ -0,0 +1,275 @@
+"""
+Indexed history of crew runs.
+
+Every run is recorded in a local SQLite database: topic, inputs, status,
+timings, token usage and cost, the final report and each task's agent,
+timings, output and routed LLM calls (model and reason, see aria/routing.py),
+and the claims the run verified, which a later refresh of the topic builds
+on (see aria/refresh.py). Reports are indexed with FTS5 for full-text search.
+
+Listing pages by keyset (`before` the last id of the previous page) rather
+than by offset, and listing, filtering and the per-topic lookup all use an
+index, so they stay fast with hundreds of thousands of runs.
+
+The history also answers repeated topics: a successful run for the same
+topic (case and whitespace-insensitive) that finished within
+ARIA_HISTORY_REUSE_HOURS is returned instead of running the crew again,
+unless the caller asks for a fresh run. Runs cut short by their deadline
+are recorded as partial and never reused.
+"""
+
+import json
+import logging
+import os
+import re
+import sqlite3
+import threading
+import time
+import uuid
+from typing import Any, Dict, List, Optional
+
+from aria.tools.cache import normalise
+from aria.usage import estimate_cost, usage_dict
+
+logger = logging.getLogger(__name__)
+
+HISTORY_DB = os.getenv("ARIA_HISTORY_DB", "data/history.db")
+REUSE_HOURS = float(os.getenv("ARIA_HISTORY_REUSE_HOURS", "24"))
+
+SUCCESS, PARTIAL, ERROR = "success", "partial", "error"
+
+MAX_PAGE = 100
+
+_TERM = re.compile(r"\w+", re.UNICODE)
+
+
+def topic_key(topic: str) -> str:
+    return normalise(topic or "")
+
+
+def match_query(text: str) -> str:
+    """
+    FTS5 query matching every word of `text`. Words are quoted, so FTS syntax
+    in user input (quotes, NEAR, column filters, ...) is searched as text.
+    A trailing `*` keeps its prefix meaning.
+    """
+    terms = []
+    for raw in text.split():
+        words = _TERM.findall(raw)
+        if words:
+            terms.append(" ".join(f'"{word}"' for word in words) + ("*" if raw.endswith("*") else ""))
+    return " AND ".join(terms)
+
+
+class RunHistory:
+    """SQLite store of finished runs with full-text search over topics and reports."""
+
+    SCHEMA = """
+        CREATE TABLE IF NOT EXISTS runs (
+            id INTEGER PRIMARY KEY,
+            run_id TEXT NOT NULL UNIQUE,
+            topic TEXT NOT NULL,
+            topic_key TEXT NOT NULL,
+            inputs TEXT NOT NULL,
+            status TEXT NOT NULL,
+            started_at REAL NOT NULL,
+            finished_at REAL NOT NULL,
+            duration_s REAL NOT NULL,
+            usage TEXT NOT NULL,
+            total_tokens INTEGER NOT NULL DEFAULT 0,
+            cost_usd REAL NOT NULL DEFAULT 0,
+            memory TEXT,
+            report TEXT,
+            error TEXT,
+            claims TEXT
+        );
+        CREATE INDEX IF NOT EXISTS runs_topic ON runs (topic_key, id);
+        CREATE INDEX IF NOT EXISTS runs_status ON runs (status, id);
+        CREATE TABLE IF NOT EXISTS run_tasks (
+            run INTEGER NOT NULL REFERENCES runs (id) ON DELETE CASCADE,
+            position INTEGER NOT NULL,
+            name TEXT,
+            agent TEXT,
+            started_at REAL,
+            finished_at REAL,
+            duration_s REAL,
+            output TEXT,
+            llm_calls TEXT,
+            PRIMARY KEY (run, position)
+        ) WITHOUT ROWID;
+        CREATE VIRTUAL TABLE IF NOT EXISTS runs_fts USING fts5(
+            topic, report, content = 'runs', content_rowid = 'id', tokenize = 'porter unicode61'
+        );
+        CREATE TRIGGER IF NOT EXISTS runs_fts_insert AFTER INSERT ON runs BEGIN
+            INSERT INTO runs_fts (rowid, topic, report) VALUES (new.id, new.topic, new.report);
+        END;
+        CREATE TRIGGER IF NOT EXISTS runs_fts_delete AFTER DELETE ON runs BEGIN
+            INSERT INTO runs_fts (runs_fts, rowid, topic, report) VALUES ('delete', old.id, old.topic, old.report);
+        END;
+    """
+
+    # Columns of a run in listings and search results; reports and tasks only come with get().
+    SUMMARY = "id, run_id, topic, status, started_at, finished_at, duration_s, total_tokens, cost_usd, error"
+
+    def __init__(self, path: str = HISTORY_DB, reuse_hours: float = REUSE_HOURS):
+        self.path = path
+        self.reuse_seconds = reuse_hours * 3600.0
+        os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+        self._local = threading.local()
+        self.reused = 0
+        with self._connect() as db:
+            db.executescript(self.SCHEMA)
+            # Databases created before per-call routing records.
+            if "llm_calls" not in {row["name"] for row in db.execute("PRAGMA table_info(run_tasks)")}:
+                db.execute("ALTER TABLE run_tasks ADD COLUMN llm_calls TEXT")
+            # Databases created before refreshes.
+            if "claims" not in {row["name"] for row in db.execute("PRAGMA table_info(runs)")}:
+                db.execute("ALTER TABLE runs ADD COLUMN claims TEXT")
+
+    def _connect(self) -> sqlite3.Connection:
+        db = getattr(self._local, "db", None)
+        if db is None:
+            db = sqlite3.connect(self.path, timeout=30, isolation_level=None)
+            db.row_factory = sqlite3.Row
+            db.execute("PRAGMA journal_mode=WAL")
+            db.execute("PRAGMA busy_timeout=30000")
+            db.execute("PRAGMA foreign_keys=ON")
+            self._local.db = db
+        return db
+
+    @staticmethod
+    def _summary(row: sqlite3.Row) -> Dict[str, Any]:
+        run = {key: row[key] for key in row.keys() if key != "id"}
+        run["cursor"] = row["id"]
+        return run
+
+    def record(self, inputs: Dict[str, Any], started_at: float, finished_at: float, result: Any = None,
+               error: Optional[str] = None) -> str:
+        """Store a finished run (a CrewResult, or an error) and return its run id."""
+        run_id = uuid.uuid4().hex
+        usage = usage_dict(getattr(result, "token_usage", None))
+        db = self._connect()
+        db.execute("BEGIN IMMEDIATE")
+        try:
+            cursor = db.execute(
+                "INSERT INTO runs (run_id, topic, topic_key, inputs, status, started_at, finished_at, duration_s, "
+                "usage, total_tokens, cost_usd, memory, report, error, claims) "
+                "VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)",
+                (
+                    run_id,
+                    inputs.get("topic", ""),
+                    topic_key(inputs.get("topic", "")),
+                    json.dumps(inputs),
+                    ERROR if error is not None else PARTIAL if getattr(result, "partial", False) else SUCCESS,
+                    started_at,
+                    finished_at,
+                    round(finished_at - started_at, 3),
+                    json.dumps(usage),
+                    usage["total_tokens"],
+                    estimate_cost(usage),
+                    json.dumps(getattr(result, "memory", None)),
+                    getattr(result, "raw", None),
+                    error,
+                    json.dumps(result.claims) if getattr(result, "claims", None) is not None else None,
+                ),
+            )
+            db.executemany(
+                "INSERT INTO run_tasks (run, position, name, agent, started_at, finished_at, duration_s, output, "
+                "llm_calls) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)",
+                [
+                    (cursor.lastrowid, position, task.get("name"), task.get("agent"), task.get("started_at"),
+                     task.get("finished_at"), task.get("duration_s"), task.get("output"),
+                     json.dumps(task["llm_calls"]) if task.get("llm_calls") is not None else None)
+                    for position, task in enumerate(getattr(result, "tasks", None) or [])
+                ],
+            )
+            db.execute("COMMIT")
+        except BaseException:
+            db.execute("ROLLBACK")
+            raise
+        return run_id
+
+    def list_runs(self, limit: int = 20, before: Optional[int] = None, topic: Optional[str] = None,
+                  status: Optional[str] = None) -> Dict[str, Any]:
+        """Newest runs first. Pass the returned `next_cursor` as `before` for the next page."""
+        limit = max(1, min(limit, MAX_PAGE))
+        where, params = [], []
+        if before is not None:
+            where.append("id < ?")
+            params.append(before)
+        if topic:
+            where.append("topic_key = ?")
+            params.append(topic_key(topic))
+        if status:
+            where.append("status = ?")
+            params.append(status)
+        # A topic has few runs; its index beats scanning all runs of a status.
+        table = "runs INDEXED BY runs_topic" if topic else "runs"
+        rows = self._connect().execute(
+            f"SELECT {self.SUMMARY} FROM {table} {'WHERE ' + ' AND '.join(where) if where else ''} "
+            "ORDER BY id DESC LIMIT ?",
+            (*params, limit + 1),
+        ).fetchall()
+        runs = [self._summary(row) for row in rows[:limit]]
+        return {"runs": runs, "next_cursor": runs[-1]["cursor"] if len(rows) > limit else None}
+
+    def search(self, query: str, limit: int = 20, offset: int = 0) -> Dict[str, Any]:
+        """Runs whose topic or report matches every word of `query`, best match first."""
+        match = match_query(query)
+        if not match:
+            return {"query": query, "runs": []}
+        limit = max(1, min(limit, MAX_PAGE))
+        columns = ", ".join(f"runs.{column.strip()}" for column in self.SUMMARY.split(","))
+        rows = self._connect().execute(
+            f"SELECT {columns}, snippet(runs_fts, 1, '**', '**', '…', 16) AS snippet, bm25(runs_fts) AS score "
+            "FROM runs_fts JOIN runs ON runs.id = runs_fts.rowid "
+            "WHERE runs_fts MATCH ? ORDER BY score LIMIT ? OFFSET ?",
+            (match, limit, max(0, offset)),
+        ).fetchall()
+        return {"query": query, "runs": [self._summary(row) for row in rows]}
+
+    def get(self, run_id: str) -> Optional[Dict[str, Any]]:
+        """Everything stored for a run, including its tasks; None if unknown."""
+        db = self._connect()
+        row = db.execute("SELECT * FROM runs WHERE run_id = ?", (run_id,)).fetchone()
+        if row is None:
+            return None
+        run = self._summary(row)
+        del run["topic_key"]
+        for key in ("inputs", "usage", "memory", "claims"):
+            run[key] = json.loads(row[key]) if row[key] else None
+        run["tasks"] = [
+            dict(task, llm_calls=json.loads(task["llm_calls"]) if task["llm_calls"] else None)
+            for task in db.execute(
+                "SELECT name, agent, started_at, finished_at, duration_s, output, llm_calls FROM run_tasks "
+                "WHERE run = ? ORDER BY position", (row["id"],))
+        ]
+        return run
+
+    def latest(self, topic: str) -> Optional[Dict[str, Any]]:
+        """The latest successful run for `topic`, however old (what a refresh builds on); None if there is none."""
+        row = self._connect().execute(
+            "SELECT run_id FROM runs INDEXED BY runs_topic WHERE topic_key = ? AND status = ? ORDER BY id DESC LIMIT 1",
+            (topic_key(topic), SUCCESS),
+        ).fetchone()
+        return self.get(row["run_id"]) if row is not None else None
+
+    def warm(self, topic: str) -> Optional[Dict[str, Any]]:
+        """The latest successful run for `topic` within the reuse window, if any."""
+        if self.reuse_seconds <= 0:
+            return None
+        row = self._connect().execute(
+            "SELECT run_id, report, finished_at FROM runs INDEXED BY runs_topic "
+            "WHERE topic_key = ? AND status = ? ORDER BY id DESC LIMIT 1",
+            (topic_key(topic), SUCCESS),
+        ).fetchone()
+        if row is None or row["finished_at"] < time.time() - self.reuse_seconds:
+            return None
+        self.reused += 1
+        return {"run_id": row["run_id"], "report": row["report"]}
+
+    def stats(self) -> Dict[str, Any]:
+        counts = {SUCCESS: 0, PARTIAL: 0, ERROR: 0}
+        for row in self._connect().execute("SELECT status, COUNT(*) AS n FROM runs GROUP BY status"):
+            counts[row["status"]] = row["n"]
+        return {"runs": counts, "reused": self.reused, "reuse_hours": self.reuse_seconds / 3600.0}
@@ -0,0 +1,371 @@
+"""
+Distributed crew job queue.
+
+Any number of `aria` instances can share one queue: POST /jobs enqueues a
+topic on whichever node receives it, and every node with a QueueConsumer pulls
+jobs as it has capacity, so work spreads by free capacity instead of by where
+the load balancer sent the request. Results are stored in the queue, so
+GET /jobs/{id} works on any node.
+
+Jobs are claimed under a lease that the consumer extends with heartbeats while
+the crew runs. If a node crashes its leases expire and the job is claimed
+again (up to `max_attempts` times). Every claim gets a lease token of its own,
+which heartbeats and results must present: a consumer whose lease expired -
+even on the node that reclaimed the job - cannot overwrite the new attempt.
+
+A node takes jobs only while its admission controller (see aria/admission.py)
+would start a run right away. A job its admission rejects anyway - shed under
+memory pressure, or out of time to wait for a slot - goes back to the queue
+for any node, without using up an attempt.
+
+The backend is pluggable (JobQueueBackend). SQLiteJobQueue is the file-based
+backend for local testing and single-host deployments (a shared volume works
+for several containers on one host); networked backends plug in through
+backend_from_url.
+"""
+
+import abc
+import json
+import logging
+import os
+import socket
+import sqlite3
+import threading
+import time
+import uuid
+from dataclasses import asdict, dataclass
+from typing import Any, Callable, Dict, List, Optional
+
+from aria.admission import AdmissionRejected
+from aria.usage import usage_dict
+
+logger = logging.getLogger(__name__)
+
+QUEUE_URL = os.getenv("ARIA_JOB_QUEUE_URL", "")
+NODE_ID = os.getenv("ARIA_NODE_ID") or f"{socket.gethostname()}-{os.getpid()}"
+LEASE_SECONDS = float(os.getenv("ARIA_JOB_LEASE_SECONDS", "60"))
+MAX_ATTEMPTS = int(os.getenv("ARIA_JOB_MAX_ATTEMPTS", "3"))
+
+QUEUED, RUNNING, SUCCEEDED, FAILED = "queued", "running", "succeeded", "failed"
+
+
+@dataclass
+class Job:
+    id: str
+    payload: Dict[str, Any]
+    status: str
+    attempts: int
+    max_attempts: int
+    node: Optional[str] = None
+    result: Optional[Dict[str, Any]] = None
+    error: Optional[str] = None
+    created_at: float = 0.0
+    updated_at: float = 0.0
+    lease_expires_at: Optional[float] = None
+    # Token of the current claim; only its holder may renew the lease or finish the job.
+    lease: Optional[str] = None
+
+    def to_dict(self) -> Dict[str, Any]:
+        job = asdict(self)
+        del job["lease"]
+        return job
+
+
+class JobQueueBackend(abc.ABC):
+    """Storage and leasing of crew jobs shared by all nodes."""
+
+    @abc.abstractmethod
+    def enqueue(self, payload: Dict[str, Any], max_attempts: int = MAX_ATTEMPTS) -> str:
+        """Add a job and return its id."""
+
+    @abc.abstractmethod
+    def claim(self, node: str, lease_seconds: float = LEASE_SECONDS) -> Optional[Job]:
+        """
+        Lease the oldest runnable job (queued, or running with an expired lease)
+        to `node`, under a new lease token (Job.lease).
+        """
+
+    @abc.abstractmethod
+    def heartbeat(self, job_id: str, lease: str, lease_seconds: float = LEASE_SECONDS) -> bool:
+        """Extend the lease with token `lease` on a job; False if the lease was lost."""
+
+    @abc.abstractmethod
+    def complete(self, job_id: str, lease: str, result: Dict[str, Any]) -> bool:
+        """Store the result of a job whose lease `lease` still holds."""
+
+    @abc.abstractmethod
+    def fail(self, job_id: str, lease: str, error: str) -> bool:
+        """Mark a job whose lease `lease` still holds as failed."""
+
+    @abc.abstractmethod
+    def release(self, job_id: str, lease: str) -> bool:
+        """Put a job whose lease `lease` still holds back in the queue, without counting the attempt."""
+
+    @abc.abstractmethod
+    def get(self, job_id: str) -> Optional[Job]:
+        """Current state of a job, from any node."""
+
+    @abc.abstractmethod
+    def stats(self) -> Dict[str, int]:
+        """Number of jobs per status."""
+
+
+class SQLiteJobQueue(JobQueueBackend):
+    """File-based backend. Claims take a write lock, so one job goes to one node."""
+
+    SCHEMA = """
+        CREATE TABLE IF NOT EXISTS jobs (
+            id TEXT PRIMARY KEY,
+            payload TEXT NOT NULL,
+            status TEXT NOT NULL,
+            attempts INTEGER NOT NULL DEFAULT 0,
+            max_attempts INTEGER NOT NULL,
+            node TEXT,
+            result TEXT,
+            error TEXT,
+            created_at REAL NOT NULL,
+            updated_at REAL NOT NULL,
+            lease_expires_at REAL,
+            lease TEXT
+        );
+        CREATE INDEX IF NOT EXISTS jobs_runnable ON jobs (status, lease_expires_at, created_at);
+    """
+
+    def __init__(self, path: str):
+        self.path = path
+        os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+        self._local = threading.local()
+        with self._connect() as db:
+            db.executescript(self.SCHEMA)
+            # Queues created before per-claim lease tokens.
+            if "lease" not in {row["name"] for row in db.execute("PRAGMA table_info(jobs)")}:
+                db.execute("ALTER TABLE jobs ADD COLUMN lease TEXT")
+
+    def _connect(self) -> sqlite3.Connection:
+        db = getattr(self._local, "db", None)
+        if db is None:
+            db = sqlite3.connect(self.path, timeout=30, isolation_level=None)
+            db.row_factory = sqlite3.Row
+            db.execute("PRAGMA journal_mode=WAL")
+            db.execute("PRAGMA busy_timeout=30000")
+            self._local.db = db
+        return db
+
+    @staticmethod
+    def _job(row: sqlite3.Row) -> Job:
+        return Job(
+            id=row["id"],
+            payload=json.loads(row["payload"]),
+            status=row["status"],
+            attempts=row["attempts"],
+            max_attempts=row["max_attempts"],
+            node=row["node"],
+            result=json.loads(row["result"]) if row["result"] else None,
+            error=row["error"],
+            created_at=row["created_at"],
+            updated_at=row["updated_at"],
+            lease_expires_at=row["lease_expires_at"],
+            lease=row["lease"],
+        )
+
+    def enqueue(self, payload: Dict[str, Any], max_attempts: int = MAX_ATTEMPTS) -> str:
+        job_id, now = uuid.uuid4().hex, time.time()
+        self._connect().execute(
+            "INSERT INTO jobs (id, payload, status, max_attempts, created_at, updated_at) VALUES (?, ?, ?, ?, ?, ?)",
+            (job_id, json.dumps(payload), QUEUED, max_attempts, now, now),
+        )
+        return job_id
+
+    def claim(self, node: str, lease_seconds: float = LEASE_SECONDS) -> Optional[Job]:
+        db, now = self._connect(), time.time()
+        db.execute("BEGIN IMMEDIATE")
+        try:
+            # Expired leases on their last attempt are not retried again.
+            db.execute(
+                "UPDATE jobs SET status = ?, error = ?, node = NULL, lease_expires_at = NULL, lease = NULL, "
+                "updated_at = ? WHERE status = ? AND lease_expires_at < ? AND attempts >= max_attempts",
+                (FAILED, "Lease expired on the last attempt (node lost).", now, RUNNING, now),
+            )
+            row = db.execute(
+                "SELECT * FROM jobs WHERE status = ? OR (status = ? AND lease_expires_at < ?) "
+                "ORDER BY created_at LIMIT 1",
+                (QUEUED, RUNNING, now),
+            ).fetchone()
+            if row is None:
+                db.execute("COMMIT")
+                return None
+            if row["status"] == RUNNING:
+                logger.warning("Reclaiming job %s from node %s (lease expired)", row["id"], row["node"])
+            db.execute(
+                "UPDATE jobs SET status = ?, node = ?, attempts = attempts + 1, lease_expires_at = ?, lease = ?, "
+                "updated_at = ? WHERE id = ?",
+                (RUNNING, node, now + lease_seconds, uuid.uuid4().hex, now, row["id"]),
+            )
+            db.execute("COMMIT")
+        except BaseException:
+            db.execute("ROLLBACK")
+            raise
+        return self.get(row["id"])
+
+    def heartbeat(self, job_id: str, lease: str, lease_seconds: float = LEASE_SECONDS) -> bool:
+        now = time.time()
+        cursor = self._connect().execute(
+            "UPDATE jobs SET lease_expires_at = ?, updated_at = ? WHERE id = ? AND lease = ? AND status = ?",
+            (now + lease_seconds, now, job_id, lease, RUNNING),
+        )
+        return cursor.rowcount == 1
+
+    def _finish(self, job_id: str, lease: str, status: str, result: Optional[Dict[str, Any]],
+                error: Optional[str]) -> bool:
+        cursor = self._connect().execute(
+            "UPDATE jobs SET status = ?, result = ?, error = ?, lease_expires_at = NULL, lease = NULL, updated_at = ? "
+            "WHERE id = ? AND lease = ? AND status = ?",
+            (status, json.dumps(result) if result is not None else None, error, time.time(), job_id, lease, RUNNING),
+        )
+        return cursor.rowcount == 1
+
+    def complete(self, job_id: str, lease: str, result: Dict[str, Any]) -> bool:
+        return self._finish(job_id, lease, SUCCEEDED, result, None)
+
+    def fail(self, job_id: str, lease: str, error: str) -> bool:
+        return self._finish(job_id, lease, FAILED, None, error)
+
+    def release(self, job_id: str, lease: str) -> bool:
+        cursor = self._connect().execute(
+            "UPDATE jobs SET status = ?, node = NULL, attempts = MAX(attempts - 1, 0), lease_expires_at = NULL, "
+            "lease = NULL, updated_at = ? WHERE id = ? AND lease = ? AND status = ?",
+            (QUEUED, time.time(), job_id, lease, RUNNING),
+        )
+        return cursor.rowcount == 1
+
+    def get(self, job_id: str) -> Optional[Job]:
+        row = self._connect().execute("SELECT * FROM jobs WHERE id = ?", (job_id,)).fetchone()
+        return self._job(row) if row else None
+
+    def stats(self) -> Dict[str, int]:
+        counts = {QUEUED: 0, RUNNING: 0, SUCCEEDED: 0, FAILED: 0}
+        for row in self._connect().execute("SELECT status, COUNT(*) AS n FROM jobs GROUP BY status"):
+            counts[row["status"]] = row["n"]
+        return counts
+
+
+# URL scheme -> backend factory. Networked backends register here.
+BACKENDS: Dict[str, Callable[[str], JobQueueBackend]] = {
+    "sqlite": SQLiteJobQueue,
+}
+
+
+def backend_from_url(url: str) -> JobQueueBackend:
+    """Backend for a queue URL, e.g. `sqlite:///data/jobs.db` (relative) or `sqlite:////var/aria/jobs.db`."""
+    scheme, _, location = url.partition(":///")
+    if scheme not in BACKENDS or not location:
+        raise ValueError(f"Unsupported job queue URL {url!r}; supported schemes: {', '.join(sorted(BACKENDS))}")
+    return BACKENDS[scheme](location)
+
+
+def result_of(output: Any) -> Dict[str, Any]:
+    """JSON-serialisable result of a crew run (a CrewResult)."""
+    return {
+        "report": getattr(output, "raw", str(output)),
+        "usage": usage_dict(getattr(output, "token_usage", None)),
+        "memory": getattr(output, "memory", None),
+        "run_id": getattr(output, "run_id", None),
+        "reused": getattr(output, "reused", False),
+        "partial": getattr(output, "partial", False),
+        "profile": getattr(output, "profile", None),
+        "refresh": getattr(output, "refresh", None),
+    }
+
+
+class QueueConsumer:
+    """Pulls jobs from a shared queue and runs them on this node."""
+
+    def __init__(self, queue: JobQueueBackend, run: Callable[[Dict[str, Any]], Any], node: str = NODE_ID,
+                 concurrency: int = 1, lease_seconds: float = LEASE_SECONDS, poll_interval: float = 1.0,
+                 ready: Optional[Callable[[], bool]] = None):
+        self.queue = queue
+        self.run = run
+        # Whether this node can start a job now; no job is claimed while it cannot.
+        self.ready = ready
+        self.node = node
+        self.concurrency = max(1, concurrency)
+        self.lease_seconds = lease_seconds
+        self.poll_interval = poll_interval
+        self._stop = threading.Event()
+        self._threads: List[threading.Thread] = []
+        self.processed = 0
+
+    def start(self) -> "QueueConsumer":
+        for index in range(self.concurrency):
+            thread = threading.Thread(target=self._loop, name=f"aria-queue-{index}", daemon=True)
+            thread.start()
+            self._threads.append(thread)
+        logger.info("Node %s consuming jobs with concurrency %d", self.node, self.concurrency)
+        return self
+
+    def _loop(self) -> None:
+        while not self._stop.is_set():
+            if self.ready is not None and not self.ready():
+                self._stop.wait(self.poll_interval)
+                continue
+            try:
+                job = self.queue.claim(self.node, self.lease_seconds)
+            except Exception as e:
+                logger.warning("Claiming a job failed: %s", e)
+                job = None
+            if job is None:
+                self._stop.wait(self.poll_interval)
+                continue
+            self.process(job)
+
+    def process(self, job: Job) -> None:
+        """Run one claimed job, heartbeating its lease until it finishes."""
+        finished = threading.Event()
+
+        def heartbeat():
+            # Renew at a third of the lease so one missed beat does not lose it;
+            # a failed beat (e.g. "database is locked") is retried on the next one.
+            while not finished.wait(self.lease_seconds / 3):
+                try:
+                    renewed = self.queue.heartbeat(job.id, job.lease, self.lease_seconds)
+                except Exception as e:
+                    logger.warning("Heartbeat for job %s failed, retrying: %s", job.id, e)
+                    continue
+                if not renewed:
+                    logger.warning("Lost lease on job %s; its result will be discarded", job.id)
+                    return
+
+        beater = threading.Thread(target=heartbeat, name=f"aria-lease-{job.id[:8]}", daemon=True)
+        beater.start()
+        try:
+            output = self.run(job.payload)
+        except AdmissionRejected as e:
+            finished.set()
+            self._record(job, "release", lambda: self.queue.release(job.id, job.lease))
+            logger.info("Job %s returned to the queue by %s: %s", job.id, self.node, e.reason)
+        except Exception as e:
+            finished.set()
+            self._record(job, "failure", lambda: self.queue.fail(job.id, job.lease, f"{type(e).__name__}: {e}"))
+            logger.warning("Job %s failed on %s: %s", job.id, self.node, e)
+        else:
+            finished.set()
+            self._record(job, "result", lambda: self.queue.complete(job.id, job.lease, result_of(output)))
+        beater.join()
+        self.processed += 1
+
+    def _record(self, job: Job, what: str, store: Callable[[], bool]) -> None:
+        """
+        Store a job's outcome. If that fails (e.g. "database is locked") the
+        consumer carries on; the lease expires and the job runs again.
+        """
+        try:
+            if not store():
+                logger.warning("Lost lease on job %s; its %s was discarded", job.id, what)
+        except Exception as e:
+            logger.error("Storing the %s of job %s failed; it will run again once its lease expires: %s",
+                         what, job.id, e)
+
+    def stop(self, timeout: float = 30.0) -> None:
+        self._stop.set()
+        for thread in self._threads:
+            thread.join(timeout)
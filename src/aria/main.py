@@ -92,35 +92,474 @@
 
 # if __name__ == "__main__":
 #     run()
+import hashlib
+import json
+import logging
+import os
+import threading
+import time
 import warnings
+from contextlib import asynccontextmanager, nullcontext
 from datetime import datetime
-from fastapi import FastAPI, HTTPException, Query
-from pydantic import BaseModel
-from aria.crew import Aria
+from typing import List, Literal, Optional
+from fastapi import FastAPI, Header, HTTPException, Query, Request
+from fastapi.responses import JSONResponse, StreamingResponse
+from pydantic import BaseModel, Field
+from aria.api_testing import endpoint_states, open_circuits
+from aria.admission import BATCH, INTERACTIVE, AdmissionController, AdmissionRejected
+from aria.batch import BatchRunner, CrewResult, kickoff_crew
+from aria.deadline import Deadline, DeadlineExceeded, split_deadline, with_deadline
+from aria.health import HEALTH_CHECK_INTERVAL, UNHEALTHY, CachedDeepHealthCheck, health_check
+from aria.governor import governor_stats
+from aria.hedging import hedging_stats
+from aria.history import HISTORY_DB, RunHistory
+from aria.monitoring import RESOURCE_MONITOR_INTERVAL, ComprehensiveMonitor
+from aria.prefetch import prefetch_stats, record_prefetch
+from aria.profiling import control as profiling
+from aria.profiling import split_profile, with_profile
+from aria.prompts import prompt_stats, record_prompts
+from aria.refresh import Baseline, with_refresh
+from aria.routing import record_routing, routing_stats
+from aria.jobqueue import NODE_ID, QUEUE_URL, JobQueueBackend, QueueConsumer, backend_from_url
+from aria.tools.cache import active_cache, with_cache
+from aria.usage import usage_dict
+from aria.workers import WORKERS, WorkerPool
 
 warnings.filterwarnings("ignore", category=SyntaxWarning, module="pysbd")
-
-app = FastAPI(title="ARIA Crew API")
+logging.basicConfig(level=os.getenv("LOG_LEVEL", "INFO").upper(),
+                    format="%(asctime)s %(levelname)s %(name)s: %(message)s")
+for noisy in ("LiteLLM", "httpx"):
+    logging.getLogger(noisy).setLevel(logging.WARNING)
+logger = logging.getLogger(__name__)
+
+# Set at startup when ARIA_WORKERS > 0; crews then run in worker processes.
+worker_pool: Optional[WorkerPool] = None
+# Set at startup when ARIA_JOB_QUEUE_URL is configured; shared by all nodes.
+job_queue: Optional[JobQueueBackend] = None
+queue_consumer: Optional[QueueConsumer] = None
+# Background deep health check, served from cache by /health/deep and /readyz.
+deep_health: Optional[CachedDeepHealthCheck] = None
+# Set at startup unless ARIA_HISTORY_DB is empty; every run on this node is recorded.
+run_history: Optional[RunHistory] = None
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    global worker_pool, job_queue, queue_consumer, deep_health, run_history
+    if HISTORY_DB:
+        run_history = RunHistory(HISTORY_DB)
+    if HEALTH_CHECK_INTERVAL > 0:
+        deep_health = CachedDeepHealthCheck().start()
+    if RESOURCE_MONITOR_INTERVAL > 0:
+        monitor.start()
+    if WORKERS > 0:
+        worker_pool = WorkerPool(WORKERS)
+        worker_pool.job_monitor = monitor.resources
+        worker_pool.start()
+    if QUEUE_URL:
+        job_queue = backend_from_url(QUEUE_URL)
+        concurrency = int(os.getenv("ARIA_QUEUE_CONCURRENCY", str(max(WORKERS, 1))))
+        if concurrency > 0:
+            queue_consumer = QueueConsumer(job_queue, run_queued_job, concurrency=concurrency,
+                                           ready=admission.has_room).start()
+    try:
+        yield
+    finally:
+        if queue_consumer is not None:
+            queue_consumer.stop()
+            queue_consumer = None
+        if worker_pool is not None:
+            worker_pool.shutdown()
+            worker_pool = None
+        if deep_health is not None:
+            deep_health.stop()
+            deep_health = None
+        monitor.stop()
+
+app = FastAPI(title="ARIA Crew API", lifespan=lifespan)
+
+# Every crew run on this node takes one of its execution slots.
+admission = AdmissionController()
+# Samples CPU/RSS/connections and pauses or sheds admission under pressure.
+monitor = ComprehensiveMonitor(admission)
+
+@app.middleware("http")
+async def record_request_metrics(request: Request, call_next):
+    started = time.perf_counter()
+    with monitor.metrics.active_request():
+        try:
+            response = await call_next(request)
+        except Exception:
+            monitor.metrics.record_request((time.perf_counter() - started) * 1000, success=False)
+            raise
+    monitor.metrics.record_request((time.perf_counter() - started) * 1000, success=response.status_code < 500)
+    return response
+
+def run_inputs(inputs, fresh=False, deadline=None, profile=None, refresh=False, slot=nullcontext):
+    """
+    Run one crew on a worker process when the pool is enabled, in-process otherwise.
+    A recent run of the same topic in the run history is returned instead, unless `fresh`.
+    The crew runs under `slot()` (an admission slot); a run from the history takes none.
+    With a `deadline` (aria.deadline.Deadline) the run returns what it has when it is reached.
+    With `profile` ("cprofile" or "sampling"), or when an admin armed profiling, the run is profiled.
+    With `refresh`, the latest successful run of the topic is updated rather than redone (see aria/refresh.py).
+    """
+    baseline = None
+    if run_history is not None and refresh:
+        baseline = Baseline.from_run(run_history.latest(inputs["topic"]))
+    elif run_history is not None and not fresh:
+        warm = run_history.warm(inputs["topic"])
+        if warm is not None:
+            return CrewResult(warm["report"], usage_dict(None), run_id=warm["run_id"], reused=True)
+    with slot():
+        run_args = with_refresh(with_profile(with_deadline(inputs, deadline), profile or profiling.take()), baseline)
+        # A batch's cache is the active one; a worker process runs the topic with its own copy of it.
+        run_args = with_cache(run_args, active_cache())
+        started, started_at, success = time.perf_counter(), time.time(), False
+        try:
+            if worker_pool is not None:
+                result = worker_pool.run(run_args)
+            else:
+                with monitor.resources.track_job(f"{inputs.get('topic', 'job')}@{threading.get_ident()}"):
+                    result = kickoff_crew(run_args)
+            success = True
+        except Exception as e:
+            record_run(inputs, started_at, error=str(e))
+            raise
+        finally:
+            monitor.metrics.record_crew_execution(time.perf_counter() - started, success)
+    record_prefetch(getattr(result, "prefetch", None))
+    record_routing(getattr(result, "tasks", None))
+    record_prompts(getattr(result, "prompts", None), usage_dict(getattr(result, "token_usage", None)))
+    profiling.record(inputs.get("topic"), getattr(result, "profile", None))
+    run_id = record_run(inputs, started_at, result=result)
+    return result._replace(run_id=run_id) if run_id and isinstance(result, CrewResult) else result
+
+def record_run(inputs, started_at, result=None, error=None):
+    # A history write failure must not fail the run itself.
+    if run_history is None:
+        return None
+    try:
+        return run_history.record(inputs, started_at, time.time(), result=result, error=error)
+    except Exception as e:
+        logger.warning("Could not record run of %r in the history: %s", inputs.get("topic"), e)
+        return None
+
+# Input key under which a queued job carries the client that submitted it.
+JOB_CLIENT_KEY = "_client"
+
+def job_client(request: Request, api_key: Optional[str]) -> str:
+    """The submitting client as stored with a job: API keys only as a digest, since GET /jobs/{id} shows it."""
+    return f"key-{hashlib.sha256(api_key.encode()).hexdigest()[:16]}" if api_key else client_key(request, None)
+
+def queued_client(stored: str) -> str:
+    """The fair-queuing identity of a job's client; API keys with a weight map back to the key."""
+    weighted = {job_client(None, key): key for key in admission.client_weights}
+    return weighted.get(stored, stored)
+
+def run_queued_job(inputs):
+    # Jobs pulled from the shared queue were admitted on submission; they share
+    # this node's slots with the batch lane, fair-queued by the client that
+    # submitted them. One rejected while waiting for a slot (shed, or out of
+    # time) goes back to the queue; see QueueConsumer.
+    inputs, deadline = split_deadline(inputs)
+    if deadline is not None and deadline.expired():
+        # No node can run it any more; failing it beats returning it to the queue.
+        raise DeadlineExceeded("Deadline reached while the job was queued")
+    inputs, profile = split_profile(inputs)
+    inputs = dict(inputs)
+    fresh = inputs.pop("fresh", False)
+    refresh = inputs.pop("refresh", False)
+    client = queued_client(inputs.pop(JOB_CLIENT_KEY, "job-queue"))
+    return run_inputs(inputs, fresh=fresh, deadline=deadline, profile=profile, refresh=refresh,
+                      slot=lambda: admission.slot(client, BATCH, admit=False, deadline=deadline))
+
+def client_key(request: Request, api_key: Optional[str]) -> str:
+    """Fair-queuing identity: the API key, or the client address without one."""
+    return api_key or (request.client.host if request.client else "anonymous")
+
+def too_busy(e: AdmissionRejected) -> HTTPException:
+    return HTTPException(status_code=429, detail=e.reason, headers={"Retry-After": str(e.retry_after)})
 
 class CrewInput(BaseModel):
     topic: str
+    # Run the crew even if the run history has a recent report for this topic.
+    fresh: bool = False
+    # Seconds the caller can wait; the run returns its best report so far, marked partial, when they are up.
+    deadline_s: Optional[float] = Field(default=None, gt=0)
+    # Profile the run: "sampling" (low overhead) or "cprofile"; see GET /admin/profiling.
+    profile: Optional[Literal["cprofile", "sampling"]] = None
+    # Update the topic's latest report with what is new since, instead of starting over.
+    refresh: bool = False
 
 @app.post("/run-crew")
-def run_crew(input_data: CrewInput):
+def run_crew(input_data: CrewInput, request: Request, x_api_key: Optional[str] = Header(None)):
     """
     Run the ARIA crew for a given topic.
+    Answers 429 with Retry-After when the node is too busy to start it in time.
+    With `deadline_s`, the time spent waiting for a slot counts against it, and
+    the run is rejected rather than started after its deadline.
     """
+    deadline = Deadline.after(input_data.deadline_s) if input_data.deadline_s else None
     inputs = {
         "topic": input_data.topic,
         "current_year": str(datetime.now().year),
         "output_path": "/app/output"
     }
     try:
-        Aria().crew().kickoff(inputs=inputs)
-        return {"status": "success", "message": "Crew finished! Check for output files (report.md, reviewed_report.md)."}
+        result = run_inputs(inputs, fresh=input_data.fresh, deadline=deadline, profile=input_data.profile,
+                            refresh=input_data.refresh,
+                            slot=lambda: admission.slot(client_key(request, x_api_key), INTERACTIVE, deadline=deadline))
+        response = {"status": "success", "message": "Crew finished! Check for output files (report.md, reviewed_report.md).",
+                    "memory": getattr(result, "memory", None), "run_id": getattr(result, "run_id", None),
+                    "reused": getattr(result, "reused", False), "partial": getattr(result, "partial", False),
+                    "skipped_tasks": getattr(result, "skipped_tasks", None),
+                    "profile": getattr(result, "profile", None), "refresh": getattr(result, "refresh", None)}
+        if response["reused"]:
+            # Served from the run history: no output files were written for this request.
+            response["message"] = "A recent report for this topic was found in the run history; it is returned."
+            response["report"] = result.raw
+        elif response["partial"]:
+            # The output files of the unfinished tasks were not written.
+            response["message"] = "Deadline reached; the report so far is returned."
+            response["report"] = result.raw
+        elif (response["refresh"] or {}).get("unchanged"):
+            response["message"] = "Nothing new since the last report; it is returned unchanged."
+            response["report"] = result.raw
+        return response
+    except AdmissionRejected as e:
+        raise too_busy(e)
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"Error occurred: {e}")
 
+class BatchInput(BaseModel):
+    topics: List[str]
+    workers: Optional[int] = None
+    fresh: bool = False
+    refresh: bool = False
+
+@app.post("/run-crew/batch")
+def run_crew_batch(input_data: BatchInput, request: Request, x_api_key: Optional[str] = Header(None)):
+    """
+    Run the ARIA crew for many topics, sharing tool results within the batch.
+    Streams one JSON line per finished topic, then a summary line with costs.
+    Topics run in the batch lane, fair-queued against other clients.
+    """
+    client = client_key(request, x_api_key)
+
+    def kickoff(inputs):
+        return run_inputs(inputs, fresh=input_data.fresh, refresh=input_data.refresh,
+                          slot=lambda: admission.slot(client, BATCH, admit=False))
+
+    try:
+        runner = BatchRunner(input_data.topics, workers=input_data.workers, kickoff=kickoff)
+        admission.check()
+    except ValueError as e:
+        raise HTTPException(status_code=422, detail=str(e))
+    except AdmissionRejected as e:
+        raise too_busy(e)
+    events = (json.dumps(event) + "\n" for event in runner.run())
+    return StreamingResponse(events, media_type="application/x-ndjson")
+
+def require_job_queue() -> JobQueueBackend:
+    if job_queue is None:
+        raise HTTPException(status_code=404, detail="Job queue is disabled; set ARIA_JOB_QUEUE_URL.")
+    return job_queue
+
+@app.post("/jobs", status_code=202)
+def submit_job(input_data: CrewInput, request: Request, x_api_key: Optional[str] = Header(None)):
+    """
+    Queue a crew run. Any node sharing the queue may run it; poll GET /jobs/{job_id}.
+    Answers 429 with Retry-After when this node is too busy to take more work.
+    The job is fair-queued with the submitting client's other runs.
+    """
+    queue = require_job_queue()
+    try:
+        admission.check()
+    except AdmissionRejected as e:
+        raise too_busy(e)
+    inputs = {
+        "topic": input_data.topic,
+        "current_year": str(datetime.now().year),
+        "output_path": "/app/output",
+        JOB_CLIENT_KEY: job_client(request, x_api_key),
+    }
+    if input_data.fresh:
+        inputs["fresh"] = True
+    if input_data.refresh:
+        inputs["refresh"] = True
+    if input_data.deadline_s:
+        # Counted from submission: time in the queue uses it up.
+        inputs = with_deadline(inputs, Deadline.after(input_data.deadline_s))
+    inputs = with_profile(inputs, input_data.profile)
+    job_id = queue.enqueue(inputs)
+    return {"job_id": job_id, "status": "queued", "submitted_by": NODE_ID}
+
+@app.get("/jobs/{job_id}")
+def get_job(job_id: str):
+    """
+    Status and (once finished) result of a queued job, from any node.
+    """
+    job = require_job_queue().get(job_id)
+    if job is None:
+        raise HTTPException(status_code=404, detail=f"Unknown job {job_id}")
+    return job.to_dict()
+
+@app.get("/jobs")
+def job_stats():
+    """
+    Jobs per status in the shared queue, and this node's consumer.
+    """
+    return {
+        "node": NODE_ID,
+        "consuming": queue_consumer is not None,
+        "processed_here": queue_consumer.processed if queue_consumer else 0,
+        "jobs": require_job_queue().stats(),
+    }
+
+def require_run_history() -> RunHistory:
+    if run_history is None:
+        raise HTTPException(status_code=404, detail="Run history is disabled; set ARIA_HISTORY_DB.")
+    return run_history
+
+@app.get("/runs")
+def list_runs(limit: int = Query(20, ge=1, le=100),
+              before: Optional[int] = Query(None, description="`next_cursor` of the previous page"),
+              topic: Optional[str] = None, status: Optional[str] = None):
+    """
+    Past runs, newest first. Page with `before=<next_cursor>`.
+    """
+    return require_run_history().list_runs(limit=limit, before=before, topic=topic, status=status)
+
+@app.get("/runs/search")
+def search_runs(q: str = Query(..., min_length=1), limit: int = Query(20, ge=1, le=100), offset: int = Query(0, ge=0)):
+    """
+    Full-text search over the topics and reports of past runs, best match first.
+    """
+    return require_run_history().search(q, limit=limit, offset=offset)
+
+@app.get("/runs/{run_id}")
+def get_run(run_id: str):
+    """
+    A past run with its inputs, usage, report and every task's output and timings.
+    """
+    run = require_run_history().get(run_id)
+    if run is None:
+        raise HTTPException(status_code=404, detail=f"Unknown run {run_id}")
+    return run
+
+# Probes are async so they run on the event loop, not in the threadpool that
+# blocking crew runs can exhaust.
+@app.get("/healthz")
+async def healthz():
+    """
+    Liveness: the process is up and serving. Never touches the crew.
+    """
+    body, _ = health_check()
+    return body
+
+@app.get("/readyz")
+async def readyz():
+    """
+    Readiness: configs valid (cached deep check), workers up and the run queue not full.
+    """
+    reasons = []
+    if deep_health is not None:
+        latest = deep_health.latest()
+        if latest is None:
+            reasons.append("deep health check pending")
+        elif latest[0]["status"] == UNHEALTHY:
+            reasons.extend(latest[0]["errors"])
+    if worker_pool is not None and worker_pool.stats()["alive"] == 0:
+        reasons.append("no crew workers alive")
+    stats = admission.stats()
+    if sum(stats["waiting"].values()) >= admission.max_queue:
+        reasons.append("run queue full")
+    if reasons:
+        return JSONResponse(status_code=503, content={"status": "not_ready", "reasons": reasons})
+    return {"status": "ready"}
+
+@app.get("/health/deep")
+def deep_health_endpoint(refresh: bool = Query(False, description="Run the deep check now instead of serving the cached result")):
+    """
+    Config, environment, resource and upstream checks, refreshed in the background every HEALTH_CHECK_INTERVAL seconds.
+    """
+    if deep_health is None:
+        raise HTTPException(status_code=404, detail="Deep health checks are disabled (HEALTH_CHECK_INTERVAL=0).")
+    latest = deep_health.refresh() if refresh else deep_health.latest()
+    if latest is None:
+        return JSONResponse(status_code=503, content={"status": "pending"})
+    body, code = latest
+    return JSONResponse(status_code=code, content=body)
+
+@app.get("/health")
+def health():
+    """
+    Basic health for load balancers: degraded while an external tool endpoint's circuit is open.
+    """
+    circuits = open_circuits()
+    return {"status": "degraded" if circuits else "healthy", "open_circuits": circuits}
+
+@app.get("/metrics")
+def metrics():
+    """
+    Scheduler, worker and external endpoint metrics (circuit state, latency, adaptive timeout).
+    """
+    return {
+        "admission": admission.stats(),
+        "monitor": monitor.get_status(),
+        "workers": worker_pool.stats() if worker_pool is not None else {"mode": "in-process"},
+        "endpoints": endpoint_states(),
+        "history": run_history.stats() if run_history is not None else None,
+        "prefetch": prefetch_stats(),
+        "routing": routing_stats(),
+        "hedging": hedging_stats(),
+        "llm_governor": governor_stats(),
+        "prompts": prompt_stats(),
+    }
+
+class ProfilingInput(BaseModel):
+    # None disarms.
+    mode: Optional[Literal["cprofile", "sampling"]] = "sampling"
+    runs: int = Field(default=1, ge=0, le=100)
+
+def require_admin(x_api_key: Optional[str]):
+    admin_key = os.getenv("ARIA_ADMIN_KEY")
+    if admin_key and x_api_key != admin_key:
+        raise HTTPException(status_code=403, detail="Admin key required (X-API-Key).")
+
+@app.post("/admin/profiling")
+def arm_profiling(input_data: ProfilingInput, x_api_key: Optional[str] = Header(None)):
+    """
+    Profile the next `runs` runs on this node (any lane), in `mode`.
+    """
+    require_admin(x_api_key)
+    profiling.arm(input_data.mode, input_data.runs)
+    return profiling.status()
+
+@app.get("/admin/profiling")
+def profiling_status(x_api_key: Optional[str] = Header(None)):
+    """
+    Armed profiling and the latest profiles: where they were written and, for sampling, LLM/tool/Python shares.
+    """
+    require_admin(x_api_key)
+    return profiling.status()
+
+@app.get("/admission")
+def admission_stats():
+    """
+    Execution slots, waiting runs per lane, admitted/rejected counts and the current wait estimate.
+    """
+    return admission.stats()
+
+@app.get("/workers")
+def workers():
+    """
+    Worker pool status: liveness, busy/queued jobs, restarts and per-worker RSS.
+    """
+    if worker_pool is None:
+        return {"mode": "in-process"}
+    return {"mode": "multi-process", **worker_pool.stats()}
+
 @app.get("/")
 def root():
     return {"message": "Send a POST request to /run-crew with JSON: {'topic': 'Your topic here'}"}
@@ -0,0 +1,431 @@
+"""
+Resource monitoring and load-aware throttling.
+
+ResourceMonitor samples the API process and its children (crew workers, a
+local LanguageTool server) with psutil every RESOURCE_MONITOR_INTERVAL
+seconds: CPU, RSS and open connections per process, with memory measured
+against the container's cgroup limit when there is one (docker-compose caps
+the service at 2G / 1 CPU). Container memory leaves out inactive page cache,
+as the kubelet and docker stats do: the SQLite databases and artifacts the
+service writes fill the cache, which the kernel reclaims before an OOM kill.
+It also attributes CPU time and peak RSS to the crew run (job) that a process
+is executing.
+
+ComprehensiveMonitor turns the samples into throttling decisions for the
+AdmissionController before the container is OOM-killed:
+
+- memory >= ARIA_MEMORY_HIGH_PERCENT: admission is paused - new runs get 429
+  and waiting runs stay queued instead of adding to the memory footprint;
+- memory >= ARIA_MEMORY_CRITICAL_PERCENT: waiting batch-lane runs are shed;
+- CPU averaged over CPU_WINDOW samples >= ARIA_CPU_HIGH_PERCENT (off by
+  default): new runs get 429, waiting runs still start - a busy CPU only
+  slows them down;
+- admission resumes once usage falls RESUME_MARGIN points below the limits.
+"""
+
+import contextlib
+import logging
+import os
+import threading
+import time
+from collections import deque
+from dataclasses import asdict, dataclass, field
+from pathlib import Path
+from typing import Any, Deque, Dict, Iterator, List, Optional, Tuple
+
+import psutil
+
+from aria.admission import BATCH
+
+logger = logging.getLogger(__name__)
+
+RESOURCE_MONITOR_INTERVAL = float(os.getenv("RESOURCE_MONITOR_INTERVAL", "5"))
+MEMORY_HIGH_PERCENT = float(os.getenv("ARIA_MEMORY_HIGH_PERCENT", "80"))
+MEMORY_CRITICAL_PERCENT = float(os.getenv("ARIA_MEMORY_CRITICAL_PERCENT", "90"))
+CPU_HIGH_PERCENT = float(os.getenv("ARIA_CPU_HIGH_PERCENT", "0"))  # 0 = no CPU-based throttling
+CPU_WINDOW = 3
+# Hysteresis: resume admission this many percentage points below the limits.
+RESUME_MARGIN = 5.0
+
+CGROUP_ROOT = Path("/sys/fs/cgroup")
+_MB = 1024 * 1024
+
+
+def _read_int(path: Path) -> Optional[int]:
+    try:
+        value = path.read_text().strip()
+    except OSError:
+        return None
+    return int(value) if value.isdigit() else None
+
+
+def _read_stat(path: Path, key: str) -> Optional[int]:
+    """One counter of a cgroup memory.stat file."""
+    try:
+        lines = path.read_text().splitlines()
+    except OSError:
+        return None
+    for line in lines:
+        name, _, value = line.partition(" ")
+        if name == key and value.strip().isdigit():
+            return int(value)
+    return None
+
+
+def container_memory() -> Tuple[Optional[int], Optional[int]]:
+    """
+    (usage, limit) in bytes from cgroup v2 or v1; None where unavailable or
+    unlimited. Usage is the working set: inactive file cache is not counted.
+    """
+    usage = _read_int(CGROUP_ROOT / "memory.current")
+    if usage is not None:
+        inactive = _read_stat(CGROUP_ROOT / "memory.stat", "inactive_file")
+    else:
+        usage = _read_int(CGROUP_ROOT / "memory" / "memory.usage_in_bytes")
+        inactive = _read_stat(CGROUP_ROOT / "memory" / "memory.stat", "total_inactive_file")
+    if usage is not None and inactive is not None:
+        usage = max(0, usage - inactive)
+    limit = _read_int(CGROUP_ROOT / "memory.max") or _read_int(CGROUP_ROOT / "memory" / "memory.limit_in_bytes")
+    # cgroup v1 reports "unlimited" as a huge number.
+    if limit is not None and limit >= psutil.virtual_memory().total:
+        limit = None
+    return usage, limit
+
+
+def container_cpus() -> float:
+    """CPUs available to the container (cgroup quota, else the CPU count)."""
+    try:
+        quota, period = (CGROUP_ROOT / "cpu.max").read_text().split()
+        if quota != "max":
+            return int(quota) / int(period)
+    except (OSError, ValueError):
+        pass
+    quota, period = _read_int(CGROUP_ROOT / "cpu" / "cpu.cfs_quota_us"), _read_int(CGROUP_ROOT / "cpu" / "cpu.cfs_period_us")
+    if quota and period:
+        return quota / period
+    return float(psutil.cpu_count() or 1)
+
+
+@dataclass
+class ResourceSnapshot:
+    timestamp: float
+    cpu_percent: float          # of the container's CPU quota
+    memory_percent: float       # of the container memory limit (host memory without one)
+    rss_mb: float               # API process + children
+    memory_limit_mb: float
+    open_connections: int
+    processes: Dict[str, Dict[str, Any]] = field(default_factory=dict)
+
+
+@dataclass
+class JobUsage:
+    job: str
+    pid: int
+    started: float
+    cpu_seconds: float = 0.0
+    peak_rss_mb: float = 0.0
+    duration_s: float = 0.0
+
+
+class ResourceMonitor:
+    """Low-overhead psutil sampler of this process tree, with per-job attribution."""
+
+    def __init__(self, collection_interval: float = RESOURCE_MONITOR_INTERVAL, history_hours: float = 1):
+        self.collection_interval = collection_interval
+        self.history_hours = history_hours
+        self.history: Deque[ResourceSnapshot] = deque(
+            maxlen=max(1, int(history_hours * 3600 / max(collection_interval, 0.1))))
+        self.is_monitoring = False
+        self.cpus = container_cpus()
+        self._root = psutil.Process()
+        self._procs: Dict[int, psutil.Process] = {}
+        self._jobs: Dict[str, JobUsage] = {}
+        self.finished_jobs: Deque[JobUsage] = deque(maxlen=100)
+        self._listeners: List[Any] = []
+        self._lock = threading.Lock()
+        self._stop = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+
+    def add_listener(self, callback) -> None:
+        """`callback(snapshot)` runs after every sample."""
+        self._listeners.append(callback)
+
+    def _process_tree(self) -> List[psutil.Process]:
+        try:
+            current = [self._root] + self._root.children(recursive=True)
+        except psutil.Error:
+            current = [self._root]
+        procs = []
+        for proc in current:
+            # Reuse Process objects: cpu_percent() measures since the previous call.
+            known = self._procs.get(proc.pid)
+            if known is None:
+                known = self._procs[proc.pid] = proc
+                known.cpu_percent(None)
+            procs.append(known)
+        for pid in set(self._procs) - {p.pid for p in procs}:
+            del self._procs[pid]
+        return procs
+
+    def _collect_resource_snapshot(self) -> ResourceSnapshot:
+        processes: Dict[str, Dict[str, Any]] = {}
+        total_rss, total_cpu, connections = 0.0, 0.0, 0
+        for proc in self._process_tree():
+            try:
+                with proc.oneshot():
+                    rss = proc.memory_info().rss / _MB
+                    cpu = proc.cpu_percent(None)
+                    conns = len(proc.net_connections(kind="inet"))
+                    name = proc.name()
+            except psutil.Error:
+                continue
+            total_rss += rss
+            total_cpu += cpu
+            connections += conns
+            processes[str(proc.pid)] = {"name": name, "rss_mb": round(rss, 1), "cpu_percent": cpu,
+                                        "connections": conns}
+            self._attribute(proc.pid, rss)
+
+        usage, limit = container_memory()
+        if limit:
+            used_mb = (usage or total_rss * _MB) / _MB
+            memory_percent = 100.0 * used_mb * _MB / limit
+            limit_mb = limit / _MB
+        else:
+            memory_percent = psutil.virtual_memory().percent
+            limit_mb = psutil.virtual_memory().total / _MB
+        return ResourceSnapshot(
+            timestamp=time.time(),
+            cpu_percent=round(total_cpu / self.cpus, 1),
+            memory_percent=round(memory_percent, 1),
+            rss_mb=round(total_rss, 1),
+            memory_limit_mb=round(limit_mb, 1),
+            open_connections=connections,
+            processes=processes,
+        )
+
+    def _attribute(self, pid: int, rss_mb: float) -> None:
+        with self._lock:
+            for usage in self._jobs.values():
+                if usage.pid == pid:
+                    usage.peak_rss_mb = max(usage.peak_rss_mb, rss_mb)
+
+    @contextlib.contextmanager
+    def track_job(self, job: str, pid: Optional[int] = None) -> Iterator[JobUsage]:
+        """Attribute `pid`'s CPU time and peak RSS (this process by default) to `job` while it runs."""
+        pid = pid or os.getpid()
+        try:
+            proc = psutil.Process(pid)
+            cpu_start = sum(proc.cpu_times()[:2])
+            rss = proc.memory_info().rss / _MB
+        except psutil.Error:
+            proc, cpu_start, rss = None, 0.0, 0.0
+        usage = JobUsage(job=job, pid=pid, started=time.time(), peak_rss_mb=round(rss, 1))
+        with self._lock:
+            self._jobs[job] = usage
+        try:
+            yield usage
+        finally:
+            with self._lock:
+                self._jobs.pop(job, None)
+            try:
+                if proc is not None:
+                    usage.cpu_seconds = round(sum(proc.cpu_times()[:2]) - cpu_start, 3)
+                    usage.peak_rss_mb = round(max(usage.peak_rss_mb, proc.memory_info().rss / _MB), 1)
+            except psutil.Error:
+                pass
+            usage.duration_s = round(time.time() - usage.started, 3)
+            self.finished_jobs.append(usage)
+
+    def sample(self) -> ResourceSnapshot:
+        snapshot = self._collect_resource_snapshot()
+        self.history.append(snapshot)
+        for callback in self._listeners:
+            try:
+                callback(snapshot)
+            except Exception as e:
+                logger.warning("Resource listener failed: %s", e)
+        return snapshot
+
+    def _loop(self) -> None:
+        while not self._stop.wait(self.collection_interval):
+            self.sample()
+
+    def start_monitoring(self) -> None:
+        if self.is_monitoring:
+            return
+        self._stop.clear()
+        self.sample()
+        self._thread = threading.Thread(target=self._loop, name="aria-resource-monitor", daemon=True)
+        self._thread.start()
+        self.is_monitoring = True
+
+    def stop_monitoring(self) -> None:
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join(self.collection_interval + 1)
+        self.is_monitoring = False
+
+    def latest(self) -> Optional[ResourceSnapshot]:
+        return self.history[-1] if self.history else None
+
+    def get_summary(self) -> Dict[str, Any]:
+        latest = self.latest()
+        with self._lock:
+            running = [asdict(u) for u in self._jobs.values()]
+        return {
+            "current": asdict(latest) if latest else None,
+            "peak_memory_percent": max((s.memory_percent for s in self.history), default=0.0),
+            "samples": len(self.history),
+            "running_jobs": running,
+            "recent_jobs": [asdict(u) for u in list(self.finished_jobs)[-10:]],
+        }
+
+
+@dataclass
+class ApplicationMetrics:
+    requests_total: int = 0
+    requests_success: int = 0
+    requests_error: int = 0
+    avg_response_ms: float = 0.0
+    p95_response_ms: float = 0.0
+    active_requests: int = 0
+    crew_executions_total: int = 0
+    crew_executions_success: int = 0
+    crew_executions_error: int = 0
+    avg_crew_seconds: float = 0.0
+
+
+class ApplicationMetricsCollector:
+    """Request and crew execution counters with recent latency percentiles."""
+
+    def __init__(self, window: int = 1000):
+        self._lock = threading.Lock()
+        self._response_ms: Deque[float] = deque(maxlen=window)
+        self._crew_seconds: Deque[float] = deque(maxlen=window)
+        self.metrics = ApplicationMetrics()
+
+    @contextlib.contextmanager
+    def active_request(self) -> Iterator[None]:
+        with self._lock:
+            self.metrics.active_requests += 1
+        try:
+            yield
+        finally:
+            with self._lock:
+                self.metrics.active_requests -= 1
+
+    def record_request(self, duration_ms: float, success: bool = True) -> None:
+        with self._lock:
+            self.metrics.requests_total += 1
+            if success:
+                self.metrics.requests_success += 1
+            else:
+                self.metrics.requests_error += 1
+            self._response_ms.append(duration_ms)
+
+    def record_crew_execution(self, duration_s: float, success: bool = True) -> None:
+        with self._lock:
+            self.metrics.crew_executions_total += 1
+            if success:
+                self.metrics.crew_executions_success += 1
+            else:
+                self.metrics.crew_executions_error += 1
+            self._crew_seconds.append(duration_s)
+
+    def get_current_metrics(self) -> ApplicationMetrics:
+        with self._lock:
+            response = sorted(self._response_ms)
+            current = ApplicationMetrics(**asdict(self.metrics))
+            crew = list(self._crew_seconds)
+        if response:
+            current.avg_response_ms = round(sum(response) / len(response), 1)
+            current.p95_response_ms = round(response[min(len(response) - 1, int(0.95 * len(response)))], 1)
+        if crew:
+            current.avg_crew_seconds = round(sum(crew) / len(crew), 2)
+        return current
+
+    def get_metrics_summary(self, resources: Optional[ResourceSnapshot] = None) -> Dict[str, Any]:
+        m = self.get_current_metrics()
+        return {
+            "requests": {"total": m.requests_total, "success": m.requests_success, "error": m.requests_error,
+                         "avg_ms": m.avg_response_ms, "p95_ms": m.p95_response_ms},
+            "crew_executions": {"total": m.crew_executions_total, "success": m.crew_executions_success,
+                                "error": m.crew_executions_error, "avg_s": m.avg_crew_seconds},
+            "connections": {"active_requests": m.active_requests,
+                            "open_sockets": resources.open_connections if resources else None},
+        }
+
+
+class ComprehensiveMonitor:
+    """Resource sampling + application metrics, throttling admission under pressure."""
+
+    def __init__(self, admission=None, resource_monitor: Optional[ResourceMonitor] = None,
+                 metrics: Optional[ApplicationMetricsCollector] = None,
+                 memory_high: float = MEMORY_HIGH_PERCENT, memory_critical: float = MEMORY_CRITICAL_PERCENT,
+                 cpu_high: float = CPU_HIGH_PERCENT):
+        self.admission = admission
+        self.resources = resource_monitor or ResourceMonitor()
+        self.metrics = metrics or ApplicationMetricsCollector()
+        self.memory_high = memory_high
+        self.memory_critical = memory_critical
+        self.cpu_high = cpu_high
+        self.pressure: Optional[str] = None
+        self.shed_runs = 0
+        self._cpu: Deque[float] = deque(maxlen=CPU_WINDOW)
+        self.resources.add_listener(self.evaluate)
+
+    def evaluate(self, snapshot: ResourceSnapshot) -> Optional[str]:
+        """Pause, shed or resume admission for `snapshot`; returns the active pressure reason."""
+        memory = snapshot.memory_percent
+        self._cpu.append(snapshot.cpu_percent)
+        # Only a full window of busy samples counts as sustained CPU load.
+        cpu = sum(self._cpu) / len(self._cpu) if len(self._cpu) == CPU_WINDOW else 0.0
+        cpu_limit = self.cpu_high if self.cpu_high > 0 else float("inf")
+        hold = True
+        if memory >= self.memory_high:
+            reason = f"memory at {memory:.0f}% of {snapshot.memory_limit_mb:.0f} MB"
+        elif cpu >= cpu_limit:
+            reason, hold = f"CPU at {cpu:.0f}%", False
+        elif self.pressure and (memory > self.memory_high - RESUME_MARGIN or cpu > cpu_limit - RESUME_MARGIN):
+            reason, hold = self.pressure, self.admission is not None and self.admission.holding
+        else:
+            reason = None
+
+        if reason != self.pressure:
+            if reason:
+                logger.warning("Pausing admission: %s", reason)
+            else:
+                logger.info("Resuming admission (memory %.0f%%, CPU %.0f%%)", memory, cpu)
+        self.pressure = reason
+        if self.admission is not None:
+            if reason:
+                self.admission.pause(reason, retry_after=max(1, round(self.resources.collection_interval * 2)),
+                                     hold=hold)
+            else:
+                self.admission.resume()
+            if memory >= self.memory_critical:
+                shed = self.admission.shed(BATCH, f"shed under memory pressure ({memory:.0f}%)")
+                if shed:
+                    self.shed_runs += shed
+                    logger.warning("Shed %d waiting batch runs (memory %.0f%%)", shed, memory)
+        return reason
+
+    def start(self) -> "ComprehensiveMonitor":
+        self.resources.start_monitoring()
+        return self
+
+    def stop(self) -> None:
+        self.resources.stop_monitoring()
+
+    def get_status(self) -> Dict[str, Any]:
+        latest = self.resources.latest()
+        return {
+            "throttled": self.pressure is not None,
+            "pressure": self.pressure,
+            "shed_runs": self.shed_runs,
+            "thresholds": {"memory_high": self.memory_high, "memory_critical": self.memory_critical,
+                           "cpu_high": self.cpu_high},
+            "resources": self.resources.get_summary(),
+            "application": self.metrics.get_metrics_summary(latest),
+        }
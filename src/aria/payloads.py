@@ -0,0 +1,330 @@
+"""
+Typed records passed between tools and tasks.
+
+Tools return records instead of formatted text: Scholar search a list of
+Publications and the fact checker the Evidence (news sources) for a
+statement. They are cached as records and rendered to text only for the
+agent that called the tool.
+
+Tasks with `payload` in tasks.yaml hand the next task a record instead of
+free text:
+
+- `findings`: the task's bullets as Claims, with the Publications its Scholar
+  calls returned and, for each claim, the Sources the fact checker found for
+  it (matched without the LLM, as near-duplicate statements, see
+  aria/claims.py). Lines under a bullet - wrapped text, indented or linked
+  `Source: ...` lines - stay with its claim, and any other text (such as the
+  fact checker's notes on claims it removed) is kept as notes.
+- `summary`: the task's headings and points as Sections.
+
+The output is parsed once, when the task finishes (PayloadBuilder), and kept
+on the task output (`TaskOutput.pydantic`). Downstream stages work on the
+records - claim deduplication merges duplicate claims and their sources -
+and they are rendered compactly (render()) only when they reach a prompt.
+Outputs without bullets or sections are passed on as text.
+"""
+
+import logging
+import os
+import re
+import threading
+from collections import defaultdict
+from contextlib import contextmanager
+from contextvars import ContextVar
+from typing import Any, Dict, Iterator, List, Optional, Tuple, Type
+
+from pydantic import BaseModel
+
+from aria.claims import DEDUP_THRESHOLD, claim_tokens, cluster_claims, similarity
+from aria.tokens import count_tokens
+
+logger = logging.getLogger(__name__)
+
+TASK_PAYLOADS = os.getenv("ARIA_TASK_PAYLOADS", "true").lower() not in ("0", "false", "no")
+
+# Sources shown per claim in a prompt.
+MAX_CLAIM_SOURCES = 2
+
+_BULLET = re.compile(r"^\s*(?:[-*•+]|\d+[.)])\s+")
+_HEADING = re.compile(r"^\s*#+\s*")
+_URL = re.compile(r"https?://")
+# A claim ending like this is complete; a plain line after it is not a continuation.
+_SENTENCE_END = (".", "!", "?", ":", ";")
+_FINAL_ANSWER = re.compile(r"^\s*(?:thought\s*:.*|final answer\s*:\s*)", re.IGNORECASE)
+
+
+class Publication(BaseModel):
+    title: str
+    year: Optional[str] = None
+    authors: Optional[str] = None
+
+    def render(self) -> str:
+        return f"{self.title} ({self.year or 'N/A'}) - {self.authors or 'Unknown authors'}"
+
+
+class Publications(BaseModel):
+    """Result of a Scholar search."""
+
+    query: str
+    items: List[Publication]
+
+    def render(self) -> str:
+        return "Top results:\n• " + "\n• ".join(item.render() for item in self.items)
+
+    def __str__(self) -> str:
+        return self.render()
+
+
+class Source(BaseModel):
+    title: str
+    provider: str
+    url: str
+
+    def render(self) -> str:
+        return f"{self.title} ({self.provider}): {self.url}"
+
+
+class Evidence(BaseModel):
+    """Result of a fact check: news sources for a statement."""
+
+    statement: str
+    sources: List[Source]
+    # The earlier, near-identical statement whose sources these are.
+    same_as: Optional[str] = None
+
+    def render(self) -> str:
+        copied = f"Same claim as '{self.same_as}'; verdict copied.\n" if self.same_as else ""
+        lines = "\n".join(f"- {source.render()}" for source in self.sources)
+        return f"{copied}Fact-check results for '{self.same_as or self.statement}':\n{lines}"
+
+    def __str__(self) -> str:
+        return self.render()
+
+
+class TaskPayload(BaseModel):
+    """Record a task hands to the next one."""
+
+    def render(self) -> str:
+        raise NotImplementedError
+
+    def claim_count(self) -> int:
+        return 0
+
+    def dedupe(self, threshold: float = DEDUP_THRESHOLD) -> Tuple["TaskPayload", List[List[str]]]:
+        """The payload without near-duplicate claims, and the merged clusters."""
+        return self, []
+
+    def __str__(self) -> str:
+        return self.render()
+
+
+class Claim(BaseModel):
+    text: str
+    sources: List[Source] = []
+    # Lines the task wrote under the claim, such as where it is from.
+    details: List[str] = []
+
+    def render(self) -> str:
+        text = f"- {self.text}"
+        if self.sources:
+            cited = "; ".join(f"{source.provider} {source.url}" for source in self.sources[:MAX_CLAIM_SOURCES])
+            text += f" [{cited}]"
+        return "".join([text] + [f"\n  {detail}" for detail in self.details])
+
+
+class Findings(TaskPayload):
+    claims: List[Claim]
+    publications: List[Publication] = []
+    # Text of the output that is not part of a claim.
+    notes: List[str] = []
+
+    def render(self) -> str:
+        text = "Claims:\n" + "\n".join(claim.render() for claim in self.claims)
+        if self.notes:
+            text += "\nNotes:\n" + "\n".join(self.notes)
+        if self.publications:
+            # Title and year are enough to cite; the authors stay in the record.
+            text += "\nPublications:\n" + "\n".join(f"• {item.title} ({item.year or 'N/A'})"
+                                                      for item in self.publications)
+        return text
+
+    def claim_count(self) -> int:
+        return len(self.claims)
+
+    def dedupe(self, threshold: float = DEDUP_THRESHOLD) -> Tuple["Findings", List[List[str]]]:
+        clusters = cluster_claims([claim.text for claim in self.claims], threshold)
+        if all(len(cluster) == 1 for cluster in clusters):
+            return self, []
+        claims = []
+        for cluster in clusters:
+            members = [self.claims[index] for index in cluster]
+            sources = {source.url: source for member in members for source in member.sources}
+            details = list(dict.fromkeys(detail for member in members for detail in member.details))
+            claims.append(Claim(text=members[0].text, sources=list(sources.values()), details=details))
+        merged = [[self.claims[index].text for index in cluster] for cluster in clusters if len(cluster) > 1]
+        return self.model_copy(update={"claims": claims}), merged
+
+    @classmethod
+    def parse(cls, text: str) -> Optional["Findings"]:
+        """
+        A claim per bullet. Lines indented under a bullet are its details, and a
+        plain line right after it continues it - a link as a detail, otherwise
+        as wrapped text if the claim has not ended. Everything else is a note.
+        """
+        claims: List[Claim] = []
+        notes: List[str] = []
+        indent, follows = 0, False
+        for raw in text.splitlines():
+            line = _FINAL_ANSWER.sub("", raw)
+            if not line.strip():
+                follows = False
+                continue
+            depth = len(line) - len(line.lstrip())
+            if _BULLET.match(line) and (not claims or depth <= indent):
+                if not claims:
+                    indent = depth
+                claims.append(Claim(text=_BULLET.sub("", line).strip()))
+                follows = True
+            elif claims and depth > indent:
+                claims[-1].details.append(line.strip())
+            elif claims and follows and _URL.search(line):
+                claims[-1].details.append(line.strip())
+            elif claims and follows and not claims[-1].text.endswith(_SENTENCE_END):
+                claims[-1].text += " " + line.strip()
+            else:
+                notes.append(line.strip())
+                follows = False
+        claims = [claim for claim in claims if claim.text]
+        return cls(claims=claims, notes=notes) if claims else None
+
+
+class Section(BaseModel):
+    heading: str
+    points: List[str]
+
+    def render(self) -> str:
+        points = "\n".join(f"- {point}" for point in self.points)
+        return f"## {self.heading}\n{points}" if self.heading else points
+
+
+class Summary(TaskPayload):
+    sections: List[Section]
+
+    def render(self) -> str:
+        return "\n".join(section.render() for section in self.sections)
+
+    @classmethod
+    def parse(cls, text: str) -> Optional["Summary"]:
+        sections: List[Section] = []
+        for line in _answer_lines(text):
+            if _HEADING.match(line):
+                sections.append(Section(heading=_HEADING.sub("", line).strip(), points=[]))
+                continue
+            point = _BULLET.sub("", line).strip()
+            if not point:
+                continue
+            if not sections:
+                sections.append(Section(heading="", points=[]))
+            sections[-1].points.append(point)
+        sections = [section for section in sections if section.points]
+        return cls(sections=sections) if sections else None
+
+
+PAYLOADS: Dict[str, Type[TaskPayload]] = {"findings": Findings, "summary": Summary}
+
+
+def _answer_lines(text: str) -> List[str]:
+    return [_FINAL_ANSWER.sub("", line) for line in text.splitlines() if line.strip()]
+
+
+def render(output: Any) -> str:
+    """Prompt text of a task output: a payload's compact rendering, or the text itself."""
+    return output if isinstance(output, str) else output.render()
+
+
+class ToolRecords:
+    """The records the tools returned during each task of one run."""
+
+    def __init__(self):
+        self.task: Optional[str] = None
+        self._records: Dict[Optional[str], List[BaseModel]] = defaultdict(list)
+        self._lock = threading.Lock()
+
+    def add(self, record: BaseModel) -> None:
+        with self._lock:
+            self._records[self.task].append(record)
+
+    def of(self, task_name: str, kind: Type[BaseModel]) -> List[Any]:
+        with self._lock:
+            return [record for record in self._records.get(task_name, []) if isinstance(record, kind)]
+
+
+_tool_records: ContextVar[Optional[ToolRecords]] = ContextVar("aria_tool_records", default=None)
+
+
+@contextmanager
+def use_tool_records(records: ToolRecords) -> Iterator[ToolRecords]:
+    token = _tool_records.set(records)
+    try:
+        yield records
+    finally:
+        _tool_records.reset(token)
+
+
+def tool_output(result: Any) -> str:
+    """What a tool's _run returns for `result`: records are noted for the current task and rendered."""
+    if isinstance(result, str):
+        return result
+    records = _tool_records.get()
+    if records is not None:
+        records.add(result)
+    return result.render()
+
+
+def attach_sources(claims: List[Claim], evidence: List[Evidence], threshold: float = DEDUP_THRESHOLD) -> None:
+    """Give each claim the sources found for the most similar checked statement."""
+    checked = [(claim_tokens(item.statement), item) for item in evidence if item.sources]
+    for claim in claims:
+        tokens = claim_tokens(claim.text)
+        score, best = max(((similarity(tokens, statement), item) for statement, item in checked),
+                          key=lambda pair: pair[0], default=(0.0, None))
+        if best is not None and score >= threshold:
+            claim.sources = list(best.sources)
+
+
+class PayloadBuilder:
+    """Turns the outputs of tasks with `payload` in tasks.yaml into typed records."""
+
+    def __init__(self, kinds: Optional[Dict[str, str]] = None, enabled: Optional[bool] = None):
+        unknown = set((kinds or {}).values()) - set(PAYLOADS)
+        if unknown:
+            raise ValueError(f"Unknown task payload {', '.join(sorted(unknown))}; known: {', '.join(PAYLOADS)}")
+        self.kinds = dict(kinds or {})
+        self.enabled = TASK_PAYLOADS if enabled is None else enabled
+        self.records = ToolRecords()
+        self.last_stats: Dict[str, Dict[str, int]] = {}
+
+    @classmethod
+    def from_tasks_config(cls, tasks_config: Dict[str, dict], **kwargs) -> "PayloadBuilder":
+        kinds = {name: config["payload"] for name, config in tasks_config.items()
+                 if isinstance(config, dict) and config.get("payload")}
+        return cls(kinds, **kwargs)
+
+    def build(self, task_name: str, text: str) -> Optional[TaskPayload]:
+        """The payload of a finished task's output, or None to pass the text on."""
+        kind = self.kinds.get(task_name) if self.enabled else None
+        payload = PAYLOADS[kind].parse(text or "") if kind else None
+        if payload is None:
+            return None
+        if isinstance(payload, Findings):
+            titles = {}
+            for result in self.records.of(task_name, Publications):
+                for item in result.items:
+                    titles.setdefault(item.title.lower(), item)
+            payload.publications = list(titles.values())
+            attach_sources(payload.claims, self.records.of(task_name, Evidence))
+        stats = {"text_tokens": count_tokens(text), "payload_tokens": count_tokens(payload.render())}
+        self.last_stats[task_name] = stats
+        logger.info("Payload of %s: %s, %d -> %d prompt tokens", task_name, type(payload).__name__,
+                    stats["text_tokens"], stats["payload_tokens"])
+        return payload
@@ -0,0 +1,140 @@
+"""
+Speculative prefetch of tool results.
+
+The researcher only searches Scholar after its first LLM round trip, and the
+fact checker only queries the news after research is done; until then the
+upstreams sit idle. When a run starts, start_prefetch derives likely queries
+from the run's inputs and fetches them into the run's ToolResultCache in the
+background: tools with a native async _arun on the shared tool event loop
+(aria/aio.py), others on a small thread pool. An agent that then asks for
+the same (normalised) query gets the result from the cache - or waits for
+the call already in flight - instead of starting it from scratch.
+
+Queries are templates over the run inputs, '|'-separated:
+ARIA_PREFETCH_SCHOLAR_QUERIES and ARIA_PREFETCH_FACT_CHECK_QUERIES (empty
+disables a tool). Each run reports how many prefetched results an agent
+used; the totals (prefetch_stats, under `prefetch` in GET /metrics) show
+whether the speculation pays for its upstream calls.
+"""
+
+import inspect
+import logging
+import os
+import threading
+from concurrent.futures import Future, ThreadPoolExecutor
+from typing import Any, Dict, List, Optional, Tuple
+
+from aria.aio import submit
+from aria.refresh import refresh_since
+from aria.tools.cache import ToolResultCache, cache_key, normalise, prefetch_tool, prefetch_tool_async
+
+logger = logging.getLogger(__name__)
+
+PREFETCH = os.getenv("ARIA_PREFETCH", "true").lower() in ("1", "true", "yes")
+PREFETCH_WORKERS = int(os.getenv("ARIA_PREFETCH_WORKERS", "4"))
+SCHOLAR_QUERIES = os.getenv("ARIA_PREFETCH_SCHOLAR_QUERIES", "{topic}|recent advances in {topic}")
+FACT_CHECK_QUERIES = os.getenv("ARIA_PREFETCH_FACT_CHECK_QUERIES", "{topic}")
+
+_lock = threading.Lock()
+_pool: Optional[ThreadPoolExecutor] = None
+_tools: Dict[str, Any] = {}
+_totals = {"runs": 0, "issued": 0, "used": 0, "skipped": 0, "cancelled": 0, "failed": 0}
+
+
+def _templates(spec: str) -> List[str]:
+    return [template.strip() for template in spec.split("|") if template.strip()]
+
+
+def _tool(name: str) -> Any:
+    with _lock:
+        if name not in _tools:
+            if name == "scholar":
+                from aria.tools.scholar_tool import SearchScholar
+                _tools[name] = SearchScholar()
+            else:
+                from aria.tools.fact_check_tool import FactCheckerTool
+                _tools[name] = FactCheckerTool()
+        return _tools[name]
+
+
+def speculative_calls(inputs: Dict[str, Any]) -> List[Tuple[Any, Dict[str, Any]]]:
+    """(tool, kwargs) pairs likely to be requested by a run with `inputs`, without duplicates."""
+    calls, seen = [], set()
+    # A refresh's Scholar searches carry the baseline's year (see SearchScholar._run).
+    since = refresh_since()
+    for name, arg, spec in (("scholar", "query", SCHOLAR_QUERIES), ("fact_check", "statement", FACT_CHECK_QUERIES)):
+        for template in _templates(spec):
+            try:
+                value = template.format(**inputs).strip()
+            except (KeyError, IndexError, ValueError):
+                logger.warning("Skipping prefetch query template %r", template)
+                continue
+            if value and (name, normalise(value)) not in seen:
+                seen.add((name, normalise(value)))
+                kwargs = {arg: value, "since": since} if name == "scholar" and since is not None else {arg: value}
+                calls.append((_tool(name), kwargs))
+    return calls
+
+
+def _executor() -> ThreadPoolExecutor:
+    global _pool
+    with _lock:
+        if _pool is None:
+            _pool = ThreadPoolExecutor(max_workers=max(1, PREFETCH_WORKERS), thread_name_prefix="aria-prefetch")
+        return _pool
+
+
+class Prefetch:
+    """The speculative calls of one run."""
+
+    def __init__(self, cache: ToolResultCache, calls: List[Tuple[Tuple, Future]]):
+        self.cache = cache
+        self.calls = calls
+
+    def finish(self) -> Dict[str, int]:
+        """Cancel calls that have not started and report how the speculation went."""
+        report = {"issued": 0, "used": 0, "skipped": 0, "cancelled": 0, "failed": 0}
+        for key, future in self.calls:
+            if future.cancel():
+                report["cancelled"] += 1
+            elif future.done() and future.exception() is not None:
+                report["failed"] += 1
+            elif future.done() and not future.result():
+                # Already cached or in flight when the prefetch got to it.
+                report["skipped"] += 1
+            else:
+                report["issued"] += 1
+                report["used"] += self.cache.was_used(key)
+        return report
+
+
+def start_prefetch(inputs: Dict[str, Any], cache: ToolResultCache) -> Optional[Prefetch]:
+    """Start fetching the likely tool results of a run into `cache`; None when disabled."""
+    if not PREFETCH or not inputs.get("topic"):
+        return None
+    calls = []
+    for tool, kwargs in speculative_calls(inputs):
+        if inspect.iscoroutinefunction(getattr(type(tool), "_arun", None)):
+            future = submit(prefetch_tool_async(cache, tool, **kwargs))
+        else:
+            future = _executor().submit(prefetch_tool, cache, tool, **kwargs)
+        calls.append((cache_key(tool.name, (), kwargs), future))
+    return Prefetch(cache, calls)
+
+
+def record_prefetch(report: Optional[Dict[str, int]]) -> None:
+    """Add one run's prefetch report to the process-wide totals."""
+    if not report:
+        return
+    with _lock:
+        _totals["runs"] += 1
+        for key, value in report.items():
+            _totals[key] = _totals.get(key, 0) + value
+
+
+def prefetch_stats() -> Dict[str, Any]:
+    with _lock:
+        totals = dict(_totals)
+    totals["enabled"] = PREFETCH
+    totals["hit_rate"] = totals["used"] / totals["issued"] if totals["issued"] else 0.0
+    return totals
@@ -0,0 +1,216 @@
+"""
+On-demand profiling of crew runs.
+
+A run is profiled when its request asks for it (`profile` on POST /run-crew
+or /jobs) or when an admin has armed profiling for the next runs
+(POST /admin/profiling). Two profilers are available:
+
+- `cprofile`: deterministic cProfile of the crew thread, written as a pstats
+  file (`python -m pstats`, snakeviz). Exact call counts, but it slows
+  Python-heavy code down noticeably.
+- `sampling`: a background thread samples the crew thread's stack every
+  ARIA_PROFILE_INTERVAL_MS and writes collapsed stacks (one `frame;frame;...
+  count` line per stack, for flamegraph.pl or speedscope). Its overhead is
+  small enough for production runs.
+
+Both attach to the thread that runs the crew - tools on the shared tool loop
+show up as that thread waiting in run_sync. The sampling profiler also
+reports how the samples split between LLM calls, tool calls and the rest
+(Python overhead) in the run's result. Profiles are written to the run's
+artifact directory (see aria/artifacts.py), which is then kept after the
+run. Runs that are not profiled only pay for one check of the run's inputs.
+"""
+
+import cProfile
+import io
+import logging
+import os
+import pstats
+import sys
+import threading
+import time
+from collections import Counter, deque
+from pathlib import Path
+from typing import Any, Deque, Dict, List, Optional, Tuple
+
+logger = logging.getLogger(__name__)
+
+INTERVAL_MS = float(os.getenv("ARIA_PROFILE_INTERVAL_MS", "10"))
+MAX_RECENT = 20
+
+CPROFILE, SAMPLING = "cprofile", "sampling"
+MODES = (CPROFILE, SAMPLING)
+
+# Key of the profiling mode in a run's inputs on the way to kickoff_crew (see aria/batch.py).
+INPUT_KEY = "_profile"
+
+# Where a sampled stack is waiting, by the first matching frame from the top.
+_CATEGORIES: List[Tuple[str, Tuple[str, ...]]] = [
+    ("tools", (os.sep + "aria" + os.sep + "tools" + os.sep, os.sep + "aria" + os.sep + "aio.py")),
+    ("llm", ("litellm", os.sep + "openai" + os.sep, os.sep + "httpx" + os.sep, "routed_llm.py", "hedging.py")),
+]
+
+
+def _frame_name(frame: Any) -> str:
+    code = frame.f_code
+    return f"{code.co_name} ({Path(code.co_filename).name}:{code.co_firstlineno})"
+
+
+def _category(frame: Any) -> str:
+    while frame is not None:
+        filename = frame.f_code.co_filename
+        for category, markers in _CATEGORIES:
+            if any(marker in filename for marker in markers):
+                return category
+        frame = frame.f_back
+    return "python"
+
+
+class SamplingProfiler:
+    """Samples one thread's stack at a fixed interval."""
+
+    def __init__(self, thread_id: int, interval_s: float = INTERVAL_MS / 1000.0):
+        self.thread_id = thread_id
+        self.interval_s = interval_s
+        self.stacks: Counter = Counter()
+        self.categories: Counter = Counter()
+        self.samples = 0
+        self._stop = threading.Event()
+        self._thread = threading.Thread(target=self._run, name="aria-profiler", daemon=True)
+
+    def start(self) -> "SamplingProfiler":
+        self._thread.start()
+        return self
+
+    def stop(self) -> None:
+        self._stop.set()
+        self._thread.join()
+
+    def _run(self) -> None:
+        while not self._stop.wait(self.interval_s):
+            frame = sys._current_frames().get(self.thread_id)
+            if frame is None:
+                continue
+            self.categories[_category(frame)] += 1
+            names: Deque[str] = deque()
+            while frame is not None:
+                names.appendleft(_frame_name(frame))
+                frame = frame.f_back
+            self.stacks[";".join(names)] += 1
+            self.samples += 1
+
+    def collapsed(self) -> str:
+        return "".join(f"{stack} {count}\n" for stack, count in self.stacks.most_common())
+
+    def summary(self) -> Dict[str, Any]:
+        return {
+            "samples": self.samples,
+            "interval_ms": self.interval_s * 1000.0,
+            "share": {name: round(self.categories[name] / self.samples, 3) if self.samples else 0.0
+                      for name in ("llm", "tools", "python")},
+        }
+
+
+class RunProfiler:
+    """Profiles the calling thread while the `with` block runs and writes the result to `directory`."""
+
+    def __init__(self, mode: str, directory: Path):
+        if mode not in MODES:
+            raise ValueError(f"Unknown profiling mode {mode!r}; use one of {', '.join(MODES)}")
+        self.mode = mode
+        self.directory = Path(directory)
+        self.result: Optional[Dict[str, Any]] = None
+        self._profile: Optional[cProfile.Profile] = None
+        self._sampler: Optional[SamplingProfiler] = None
+        self._started = 0.0
+
+    def __enter__(self) -> "RunProfiler":
+        self._started = time.perf_counter()
+        if self.mode == CPROFILE:
+            self._profile = cProfile.Profile()
+            self._profile.enable()
+        else:
+            self._sampler = SamplingProfiler(threading.get_ident()).start()
+        return self
+
+    def __exit__(self, *exc: Any) -> None:
+        seconds = time.perf_counter() - self._started
+        self.directory.mkdir(parents=True, exist_ok=True)
+        if self._profile is not None:
+            self._profile.disable()
+            path = self.directory / "profile.pstats"
+            self._profile.dump_stats(str(path))
+            summary = {"top": top_functions(self._profile)}
+        else:
+            self._sampler.stop()
+            path = self.directory / "profile.collapsed"
+            path.write_text(self._sampler.collapsed(), encoding="utf-8")
+            summary = self._sampler.summary()
+        self.result = {"mode": self.mode, "path": str(path), "seconds": round(seconds, 3), **summary}
+        logger.info("Run profile (%s, %.1fs) written to %s", self.mode, seconds, path)
+
+
+def top_functions(profile: cProfile.Profile, limit: int = 10) -> List[Dict[str, Any]]:
+    """The functions with the most time spent in themselves (waits show up as socket or lock calls)."""
+    stats = pstats.Stats(profile, stream=io.StringIO())
+    rows = sorted(stats.stats.items(), key=lambda item: item[1][2], reverse=True)[:limit]
+    return [{"function": f"{name} ({Path(filename).name}:{line})", "calls": calls, "own_s": round(own, 3),
+             "cumulative_s": round(cumulative, 3)}
+            for (filename, line, name), (_, calls, own, cumulative, _) in rows]
+
+
+def with_profile(inputs: Dict[str, Any], mode: Optional[str]) -> Dict[str, Any]:
+    """A copy of a run's inputs asking for a profile in `mode`."""
+    if not mode:
+        return inputs
+    if mode not in MODES:
+        raise ValueError(f"Unknown profiling mode {mode!r}; use one of {', '.join(MODES)}")
+    return {**inputs, INPUT_KEY: mode}
+
+
+def split_profile(inputs: Dict[str, Any]) -> Tuple[Dict[str, Any], Optional[str]]:
+    """The crew inputs and the profiling mode added by with_profile()."""
+    if INPUT_KEY not in inputs:
+        return inputs, None
+    inputs = dict(inputs)
+    return inputs, inputs.pop(INPUT_KEY)
+
+
+class ProfilingControl:
+    """Profiling armed from the admin endpoint, and the latest profiles."""
+
+    def __init__(self):
+        self.mode: Optional[str] = None
+        self.remaining = 0
+        self.recent: Deque[Dict[str, Any]] = deque(maxlen=MAX_RECENT)
+        self._lock = threading.Lock()
+
+    def arm(self, mode: Optional[str], runs: int = 1) -> None:
+        """Profile the next `runs` runs in `mode`; no mode disarms."""
+        if mode is not None and mode not in MODES:
+            raise ValueError(f"Unknown profiling mode {mode!r}; use one of {', '.join(MODES)}")
+        with self._lock:
+            self.mode, self.remaining = (mode, max(0, runs)) if mode else (None, 0)
+
+    def take(self) -> Optional[str]:
+        """The mode for the next run, if profiling is armed."""
+        with self._lock:
+            if not self.mode or self.remaining <= 0:
+                return None
+            self.remaining -= 1
+            mode = self.mode
+            if not self.remaining:
+                self.mode = None
+            return mode
+
+    def record(self, topic: Optional[str], profile: Optional[Dict[str, Any]]) -> None:
+        if profile:
+            with self._lock:
+                self.recent.appendleft({"topic": topic, "at": time.time(), **profile})
+
+    def status(self) -> Dict[str, Any]:
+        with self._lock:
+            return {"armed": self.mode, "remaining_runs": self.remaining, "recent": list(self.recent)}
+
+
+control = ProfilingControl()
@@ -0,0 +1,226 @@
+"""
+Precompiled prompt templates and a stable prompt layout.
+
+On every kickoff crewAI re-interpolates each agent's role, goal and
+backstory and each task's description and expected output: it validates
+the inputs and scans every string for `{name}` placeholders again.
+CompactingCrew renders them instead from PromptTemplates compiled once per
+process - the static text and the slots between it split up front - so a
+kickoff only joins strings.
+
+The layout of the prompts is kept stable for provider-side prompt caching,
+which reuses the longest prompt prefix a provider has already seen. crewAI
+opens every system prompt with the agent's role and goal, which name the
+topic, so no two topics share a prefix. With ARIA_STABLE_PROMPTS (the
+default) the crew uses stable_prompt_file(), which moves the role and goal
+into the task message: an agent's system prompt - its backstory, tools and
+answer format - is then the same for every run, as long as its backstory
+has no slot.
+
+System messages are therefore static prefixes. Each is tokenized once and
+its count cached, so counting a call's prompt tokens for the LLM governor
+(aria/governor.py) only tokenizes the messages that vary. How many lookups
+the cache served, and the share of prompt tokens providers report as
+cached, are under `prompts` in GET /metrics.
+"""
+
+import copy
+import hashlib
+import json
+import logging
+import os
+import re
+import tempfile
+import threading
+from collections import OrderedDict
+from contextlib import contextmanager
+from contextvars import ContextVar
+from functools import lru_cache
+from pathlib import Path
+from typing import Any, Dict, Iterable, Iterator, Optional, Tuple
+
+from aria.tokens import count_tokens
+
+logger = logging.getLogger(__name__)
+
+STABLE_PROMPTS = os.getenv("ARIA_STABLE_PROMPTS", "true").lower() in ("1", "true", "yes")
+PREFIX_CACHE_SIZE = int(os.getenv("ARIA_PROMPT_PREFIX_CACHE_SIZE", "256"))
+
+# crewAI's placeholder pattern (crewai.utilities.string_utils.interpolate_only).
+_SLOT = re.compile(r"\{([A-Za-z_][A-Za-z0-9_\-]*)\}")
+
+# The fields crewAI interpolates, with the attribute it keeps the template in.
+TASK_FIELDS = (("description", "_original_description"), ("expected_output", "_original_expected_output"),
+               ("output_file", "_original_output_file"))
+AGENT_FIELDS = (("role", "_original_role"), ("goal", "_original_goal"), ("backstory", "_original_backstory"))
+
+# Slices of crewAI's prompt file replaced by the stable layout.
+ROLE_PLAYING = "{backstory}\n"
+TASK_ROLE = "\nYou are {role}. Your personal goal is: {goal}\n"
+
+
+class PromptTemplate:
+    """A template split into its static parts and the slots between them."""
+
+    __slots__ = ("text", "parts", "slots")
+
+    def __init__(self, text: str):
+        self.text = text
+        pieces = _SLOT.split(text)
+        self.parts: Tuple[str, ...] = tuple(pieces[0::2])
+        self.slots: Tuple[str, ...] = tuple(pieces[1::2])
+
+    def render(self, inputs: Dict[str, Any]) -> str:
+        """The template with its slots filled from `inputs`; KeyError names a missing one."""
+        if not self.slots:
+            return self.text
+        rendered = [self.parts[0]]
+        for slot, part in zip(self.slots, self.parts[1:]):
+            rendered.append(str(inputs[slot]))
+            rendered.append(part)
+        return "".join(rendered)
+
+
+@lru_cache(maxsize=None)
+def compile_template(text: str) -> PromptTemplate:
+    return PromptTemplate(text)
+
+
+def interpolate(objects: Iterable[Any], fields: Tuple[Tuple[str, str], ...], inputs: Dict[str, Any]) -> None:
+    """
+    What crewAI's Task.interpolate_inputs_and_add_conversation_history and
+    Agent.interpolate_inputs do to `fields` of `objects`, from compiled templates.
+    """
+    for obj in objects:
+        # The templates are pydantic private attributes; reading them through
+        # getattr costs more than rendering them.
+        private = obj.__pydantic_private__
+        for field, original in fields:
+            if getattr(obj, field) is None:
+                continue
+            template = private.get(original)
+            if template is None:
+                template = private[original] = getattr(obj, field)
+            if not inputs:
+                continue
+            try:
+                setattr(obj, field, compile_template(template).render(inputs))
+            except KeyError as e:
+                raise ValueError(f"Missing required template variable '{e.args[0]}' in {field}") from e
+
+
+@lru_cache(maxsize=1)
+def stable_prompt_file() -> Optional[str]:
+    """
+    crewAI's prompt file with the agent's role and goal moved from the system
+    prompt to the task message (for Crew(prompt_file=...)); None when
+    ARIA_STABLE_PROMPTS is off.
+    """
+    if not STABLE_PROMPTS:
+        return None
+    from crewai.utilities.i18n import I18N
+
+    prompts = copy.deepcopy(I18N()._prompts)
+    slices = prompts["slices"]
+    slices["role_playing"] = ROLE_PLAYING
+    slices["task"] = TASK_ROLE + slices["task"]
+    text = json.dumps(prompts, ensure_ascii=False, indent=2)
+    # Named by content, so processes on one host share the file.
+    path = Path(tempfile.gettempdir()) / "aria-prompts" / f"{hashlib.sha256(text.encode()).hexdigest()[:16]}.json"
+    if not path.exists():
+        path.parent.mkdir(parents=True, exist_ok=True)
+        partial = path.with_name(f"{path.name}.{os.getpid()}")
+        partial.write_text(text, encoding="utf-8")
+        os.replace(partial, path)
+    return str(path)
+
+
+class PrefixTokenCache:
+    """Token counts of static prompt prefixes, computed once per process."""
+
+    def __init__(self, maxsize: int = PREFIX_CACHE_SIZE):
+        self.maxsize = maxsize
+        self.lookups = 0
+        self.hits = 0
+        self._counts: "OrderedDict[str, int]" = OrderedDict()
+        self._lock = threading.Lock()
+
+    def count(self, text: str) -> int:
+        run = _run_stats.get()
+        with self._lock:
+            self.lookups += 1
+            tokens = self._counts.get(text)
+            if tokens is not None:
+                self.hits += 1
+                self._counts.move_to_end(text)
+        if run is not None:
+            run["prefix_lookups"] += 1
+            run["prefix_hits"] += tokens is not None
+        if tokens is None:
+            tokens = count_tokens(text)
+            with self._lock:
+                self._counts[text] = tokens
+                while len(self._counts) > self.maxsize:
+                    self._counts.popitem(last=False)
+        return tokens
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            return {"entries": len(self._counts), "lookups": self.lookups, "hits": self.hits,
+                    "hit_rate": self.hits / self.lookups if self.lookups else 0.0}
+
+
+prefix_cache = PrefixTokenCache()
+
+_run_stats: ContextVar[Optional[Dict[str, int]]] = ContextVar("aria_prompt_stats", default=None)
+
+
+@contextmanager
+def use_prompt_stats() -> Iterator[Dict[str, int]]:
+    """Count the prefix cache lookups of the run in this context."""
+    stats = {"prefix_lookups": 0, "prefix_hits": 0}
+    token = _run_stats.set(stats)
+    try:
+        yield stats
+    finally:
+        _run_stats.reset(token)
+
+
+def message_tokens(messages: Any) -> int:
+    """Prompt tokens of an LLM call; system messages are counted through the prefix cache."""
+    if isinstance(messages, str):
+        return count_tokens(messages)
+    tokens = 0
+    for message in messages or []:
+        content = str(message.get("content", ""))
+        tokens += prefix_cache.count(content) if message.get("role") == "system" else count_tokens(content)
+    return tokens
+
+
+_lock = threading.Lock()
+_totals = {"runs": 0, "prefix_lookups": 0, "prefix_hits": 0, "prompt_tokens": 0, "cached_prompt_tokens": 0}
+
+
+def record_prompts(report: Optional[Dict[str, int]], usage: Optional[Dict[str, int]]) -> None:
+    """Add one run's prefix cache lookups and provider-cached prompt tokens to the process-wide totals."""
+    if not report:
+        return
+    with _lock:
+        _totals["runs"] += 1
+        for key in ("prefix_lookups", "prefix_hits"):
+            _totals[key] += report.get(key, 0)
+        for key in ("prompt_tokens", "cached_prompt_tokens"):
+            _totals[key] += (usage or {}).get(key, 0)
+
+
+def prompt_stats() -> Dict[str, Any]:
+    with _lock:
+        totals = dict(_totals)
+    totals["stable_layout"] = STABLE_PROMPTS
+    totals["templates_compiled"] = compile_template.cache_info().currsize
+    totals["prefix_cache"] = prefix_cache.stats()
+    totals["prefix_hit_rate"] = totals["prefix_hits"] / totals["prefix_lookups"] if totals["prefix_lookups"] else 0.0
+    # Share of prompt tokens the providers served from their prompt cache.
+    totals["provider_hit_rate"] = (totals["cached_prompt_tokens"] / totals["prompt_tokens"]
+                                   if totals["prompt_tokens"] else 0.0)
+    return totals
@@ -0,0 +1,342 @@
+"""
+Incremental refresh of topics researched before.
+
+A run with `refresh` (POST /run-crew, /jobs and /run-crew/batch) builds on
+the latest successful run of its topic in the run history - its baseline -
+instead of starting over:
+
+- The researcher is asked only for material published since the baseline's
+  date, and Scholar only returns publications from the baseline's
+  `current_year` on.
+- The claims the baseline verified (stored with each run, see
+  aria/history.py) are carried over. Only new claims - research bullets that
+  match none of them, as near-duplicates do in aria/claims.py - and claims
+  verified more than ARIA_REFRESH_CLAIM_TTL_DAYS ago reach the fact checker.
+  A claim matches only a claim of the same polarity, so one that contradicts
+  a carried-over claim is new. An expired claim the fact checker no longer
+  confirms is dropped, and so is a carried-over claim it verifies the
+  opposite of.
+- The report is updated section by section: the writer gets the new
+  findings and only the sections of the baseline report they (or the
+  dropped claims) touch, and its sections replace the originals; findings
+  that fit no section go under a new one. The reviewer polishes only the
+  updated sections.
+- When nothing changed - no new claim, none dropped - summarising, writing
+  and reviewing are skipped and the baseline report is returned.
+
+Tasks take part through `refresh` in tasks.yaml: `research`, `verify` (its
+output claims are the claims the run stores) and `sections`. A topic without
+a baseline runs in full.
+"""
+
+import logging
+import os
+import re
+import time
+from collections import Counter
+from contextlib import contextmanager
+from contextvars import ContextVar
+from typing import Any, Dict, Iterator, List, Optional, Tuple
+
+from pydantic import BaseModel
+
+from aria.claims import DEDUP_THRESHOLD, claim_tokens, contradicts, similarity
+from aria.payloads import Claim, Findings
+from aria.tools.cache import normalise
+
+logger = logging.getLogger(__name__)
+
+CLAIM_TTL_DAYS = float(os.getenv("ARIA_REFRESH_CLAIM_TTL_DAYS", "30"))
+# Share of a claim's words a section must contain to be updated for it.
+SECTION_OVERLAP = float(os.getenv("ARIA_REFRESH_SECTION_OVERLAP", "0.5"))
+
+RESEARCH, VERIFY, SECTIONS = "research", "verify", "sections"
+ROLES = (RESEARCH, VERIFY, SECTIONS)
+
+# Key of the baseline in a run's inputs on the way to kickoff_crew (see aria/batch.py).
+INPUT_KEY = "_refresh"
+
+NEW_SECTION = "Recent Developments"
+# New sections go before these closing sections.
+_CLOSING = re.compile(r"conclusion|references|sources|bibliography|further reading", re.IGNORECASE)
+_HEADING = re.compile(r"^(#{1,6})\s+(.*?)\s*#*\s*$")
+
+RESEARCH_NOTE = ("This refreshes a report from {date}. Research only papers and developments published in {since} "
+                 "or later - earlier work is already covered - and list only findings that are new.")
+VERIFY_NOTE = ("{carried} claims verified by the previous report are not listed again; verify only the claims "
+               "above.")
+SECTIONS_NOTE = ("This updates an existing report. Rewrite only the sections below, keeping their headings, to "
+                 "include the new findings above. Put new findings that fit none of them under '## {new_section}'. "
+                 "Return only these sections, in markdown.")
+DROPPED_NOTE = "Remove these claims, which are no longer confirmed:"
+REVIEW_NOTE = "Only these sections of the report changed; review them and return them with their headings."
+
+
+class VerifiedClaim(Claim):
+    verified_at: float
+
+
+class Baseline(BaseModel):
+    """The run a refresh builds on."""
+
+    run_id: str
+    finished_at: float
+    # The baseline's `current_year`: research starts there.
+    since: str
+    report: str
+    claims: List[VerifiedClaim] = []
+
+    @classmethod
+    def from_run(cls, run: Optional[Dict[str, Any]]) -> Optional["Baseline"]:
+        """Baseline from a run of the run history (RunHistory.get()); None if it has no report."""
+        if not run or not run.get("report"):
+            return None
+        since = (run.get("inputs") or {}).get("current_year") or time.strftime("%Y", time.gmtime(run["finished_at"]))
+        return cls(run_id=run["run_id"], finished_at=run["finished_at"], since=str(since), report=run["report"],
+                   claims=run.get("claims") or [])
+
+    def date(self) -> str:
+        return time.strftime("%Y-%m-%d", time.gmtime(self.finished_at))
+
+
+_current: ContextVar[Optional[Baseline]] = ContextVar("aria_refresh_baseline", default=None)
+
+
+def current_baseline() -> Optional[Baseline]:
+    return _current.get()
+
+
+@contextmanager
+def use_baseline(baseline: Optional[Baseline]) -> Iterator[Optional[Baseline]]:
+    """Refresh the run in this context from `baseline`; None runs it in full."""
+    token = _current.set(baseline)
+    try:
+        yield baseline
+    finally:
+        _current.reset(token)
+
+
+def refresh_since() -> Optional[int]:
+    """The first publication year research should cover in a refresh, or None."""
+    baseline = current_baseline()
+    try:
+        return int(baseline.since) if baseline is not None else None
+    except ValueError:
+        return None
+
+
+def with_refresh(inputs: Dict[str, Any], baseline: Optional[Baseline]) -> Dict[str, Any]:
+    """A copy of a run's inputs refreshing `baseline` (JSON-serialisable, for worker processes)."""
+    if baseline is None:
+        return inputs
+    return {**inputs, INPUT_KEY: baseline.model_dump()}
+
+
+def split_refresh(inputs: Dict[str, Any]) -> Tuple[Dict[str, Any], Optional[Baseline]]:
+    """The crew inputs and the baseline added by with_refresh()."""
+    if INPUT_KEY not in inputs:
+        return inputs, None
+    inputs = dict(inputs)
+    return inputs, Baseline.model_validate(inputs.pop(INPUT_KEY))
+
+
+def split_sections(text: str) -> List[Tuple[str, str]]:
+    """
+    (heading, markdown) of each top-level section of `text`: the level of
+    heading that occurs more than once (the title is usually alone at its
+    level). Text before the first section comes with heading "".
+    """
+    lines = text.strip().splitlines()
+    levels = Counter(len(match.group(1)) for match in map(_HEADING.match, lines) if match)
+    if not levels:
+        return [("", text.strip())] if text.strip() else []
+    level = min((level for level, count in levels.items() if count > 1), default=min(levels))
+    sections: List[Tuple[str, List[str]]] = [("", [])]
+    for line in lines:
+        match = _HEADING.match(line)
+        if match and len(match.group(1)) == level:
+            sections.append((match.group(2), [line]))
+        else:
+            sections[-1][1].append(line)
+    return [(heading, "\n".join(body).strip()) for heading, body in sections if heading or "\n".join(body).strip()]
+
+
+def merge_sections(report: str, updates: str) -> str:
+    """`report` with the sections of `updates` replacing those with the same heading, and the others added."""
+    new = [(heading, body) for heading, body in split_sections(updates) if heading]
+    if not new and updates.strip():
+        # Findings without a heading of their own.
+        new = [(NEW_SECTION, f"## {NEW_SECTION}\n\n{updates.strip()}")]
+    sections = split_sections(report)
+    index = {normalise(heading): position for position, (heading, _) in enumerate(sections) if heading}
+    added = []
+    for heading, body in new:
+        position = index.get(normalise(heading))
+        if position is None:
+            added.append((heading, body))
+        else:
+            sections[position] = (heading, body)
+    closing = next((position for position, (heading, _) in enumerate(sections)
+                    if heading and position and _CLOSING.search(heading)), len(sections))
+    sections[closing:closing] = added
+    return "\n\n".join(body for _, body in sections) + "\n"
+
+
+class ReportRefresher:
+    """
+    The roles of the tasks with `refresh` in tasks.yaml, and what one run
+    changed. Without a baseline it only collects the run's verified claims.
+    """
+
+    def __init__(self, roles: Optional[Dict[str, str]] = None, baseline: Optional[Baseline] = None,
+                 ttl_days: float = CLAIM_TTL_DAYS, threshold: float = DEDUP_THRESHOLD,
+                 overlap: float = SECTION_OVERLAP):
+        unknown = set((roles or {}).values()) - set(ROLES)
+        if unknown:
+            raise ValueError(f"Unknown refresh role {', '.join(sorted(unknown))}; known: {', '.join(ROLES)}")
+        self.roles = dict(roles or {})
+        self.baseline = baseline
+        self.threshold = threshold
+        self.overlap = overlap
+        self.report = baseline.report if baseline is not None else None
+        now = time.time()
+        prior = baseline.claims if baseline is not None else []
+        self.carried = [claim for claim in prior if now - claim.verified_at <= ttl_days * 86400.0]
+        self.expired = [claim for claim in prior if now - claim.verified_at > ttl_days * 86400.0]
+        self.claims: Optional[List[VerifiedClaim]] = None
+        # Claims the verify task gets, once its upstream is known.
+        self.to_verify: Optional[int] = None
+        self.new_claims: List[Claim] = []
+        self.dropped: List[VerifiedClaim] = []
+        self.reverified = 0
+        self.updated_sections: List[str] = []
+
+    @classmethod
+    def from_tasks_config(cls, tasks_config: Dict[str, dict], baseline: Optional[Baseline] = None,
+                          **kwargs) -> "ReportRefresher":
+        roles = {name: config["refresh"] for name, config in tasks_config.items()
+                 if isinstance(config, dict) and config.get("refresh")}
+        return cls(roles, baseline, **kwargs)
+
+    @property
+    def active(self) -> bool:
+        return self.baseline is not None
+
+    def unchanged(self) -> bool:
+        """Whether the claims are verified and none is new or dropped."""
+        return self.active and self.claims is not None and not self.new_claims and not self.dropped
+
+    def _matches(self, text: str, claims: List[Claim]) -> Optional[Claim]:
+        tokens = claim_tokens(text)
+        return next((claim for claim in claims if similarity(tokens, claim_tokens(claim.text)) >= self.threshold),
+                    None)
+
+    def filter_upstream(self, task_name: str, outputs: List[Any]) -> List[Any]:
+        """`outputs` without the claims the baseline verified; the verify task also gets the expired ones."""
+        if not self.active:
+            return outputs
+        known = self.carried + self.expired
+        filtered = []
+        for output in outputs:
+            if isinstance(output, Findings):
+                claims = [claim for claim in output.claims if self._matches(claim.text, known) is None]
+                if self.roles.get(task_name) == VERIFY:
+                    claims += [Claim(text=claim.text, sources=claim.sources) for claim in self.expired]
+                    self.to_verify = (self.to_verify or 0) + len(claims)
+                output = output.model_copy(update={"claims": claims})
+            filtered.append(output)
+        return filtered
+
+    def skip(self, task_name: str) -> Optional[str]:
+        """Why `task_name` and the tasks after it need not run, if they need not."""
+        if self.active and self.roles.get(task_name) == VERIFY and self.to_verify == 0:
+            self._verified([])
+        if self.unchanged():
+            return f"nothing changed since run {self.baseline.run_id}"
+        return None
+
+    def replaces_context(self, task_name: str) -> bool:
+        """Whether the task's upstream context is replaced (the review of updated sections)."""
+        return self.active and self.roles.get(task_name) == SECTIONS and bool(self.updated_sections)
+
+    def context(self, task_name: str, context: str) -> str:
+        """The task's context with what it needs to know about the refresh."""
+        role = self.roles.get(task_name) if self.active else None
+        if role == RESEARCH:
+            note = RESEARCH_NOTE.format(date=self.baseline.date(), since=self.baseline.since)
+        elif role == VERIFY:
+            note = VERIFY_NOTE.format(carried=len(self.carried))
+        elif role == SECTIONS and self.updated_sections:
+            wanted = {normalise(heading) for heading in self.updated_sections}
+            blocks = [body for heading, body in split_sections(self.report) if normalise(heading) in wanted]
+            return REVIEW_NOTE + "\n\n" + "\n\n".join(blocks)
+        elif role == SECTIONS:
+            note = SECTIONS_NOTE.format(new_section=NEW_SECTION)
+            if self.dropped:
+                note += "\n" + DROPPED_NOTE + "".join(f"\n- {claim.text}" for claim in self.dropped)
+            blocks = [body for _, body in self.affected_sections()]
+            note += "\n\n" + ("\n\n".join(blocks) if blocks else "(No existing section is affected.)")
+        else:
+            return context
+        return f"{context}\n\n{note}" if context else note
+
+    def affected_sections(self) -> List[Tuple[str, str]]:
+        """Sections of the report that mention a new or dropped claim."""
+        changed = [claim_tokens(claim.text) for claim in self.new_claims + self.dropped]
+        affected = []
+        for heading, body in split_sections(self.report or ""):
+            words = claim_tokens(body)
+            if heading and any(tokens and len(tokens & words) / len(tokens) >= self.overlap for tokens in changed):
+                affected.append((heading, body))
+        return affected
+
+    def finished(self, task_name: str, text: str, payload: Any = None) -> str:
+        """Note a finished task's output; returns the output to keep (the merged report for `sections`)."""
+        role = self.roles.get(task_name)
+        if role == VERIFY:
+            findings = payload if isinstance(payload, Findings) else Findings.parse(text or "")
+            self._verified(findings.claims if findings is not None else [])
+        elif role == SECTIONS and self.active and text:
+            if not self.updated_sections:
+                self.updated_sections = [heading for heading, _ in split_sections(text) if heading]
+            self.report = merge_sections(self.report, text)
+            return self.report
+        return text
+
+    def _verified(self, verified: List[Claim]) -> None:
+        now = time.time()
+        fresh = [VerifiedClaim(text=claim.text, sources=claim.sources, verified_at=now) for claim in verified]
+        if not self.active:
+            self.claims = fresh
+            return
+        expired = [claim for claim in self.expired if self._matches(claim.text, verified) is None]
+        self.reverified = len(self.expired) - len(expired)
+        known = self.carried + self.expired
+        self.new_claims = [claim for claim in verified if self._matches(claim.text, known) is None]
+        # A new claim that contradicts a carried-over one replaces it.
+        contradicted = [claim for claim in self.carried if any(
+            contradicts(claim_tokens(claim.text), claim_tokens(new.text), self.threshold) for new in self.new_claims)]
+        self.carried = [claim for claim in self.carried if claim not in contradicted]
+        self.dropped = expired + contradicted
+        self.claims = self.carried + [claim for claim in fresh if self._matches(claim.text, self.carried) is None]
+        logger.info("Refresh of %s: %d claims carried over, %d re-verified, %d new, %d dropped",
+                    self.baseline.run_id, len(self.carried), self.reverified, len(self.new_claims),
+                    len(self.dropped))
+
+    def verified_claims(self) -> Optional[List[Dict[str, Any]]]:
+        """The run's verified claims, to store with it; None if no task verified any."""
+        return [claim.model_dump() for claim in self.claims] if self.claims is not None else None
+
+    def stats(self) -> Optional[Dict[str, Any]]:
+        if not self.active:
+            return None
+        return {
+            "previous_run_id": self.baseline.run_id,
+            "since": self.baseline.since,
+            "carried_claims": len(self.carried),
+            "reverified_claims": self.reverified,
+            "new_claims": len(self.new_claims),
+            "dropped_claims": len(self.dropped),
+            "updated_sections": self.updated_sections,
+            "unchanged": self.unchanged(),
+        }
@@ -0,0 +1,184 @@
+"""
+The crewAI LLM of an agent with `llm_routing` in agents.yaml.
+
+RoutedLLM holds one crewAI LLM per model of the agent's RoutingPolicy (see
+aria/routing.py) and forwards every call to the model the policy picks.
+A call that gets a 429 or a transient error is retried on the same model
+(see retry_delay in aria/governor.py), then on the next one. Slow calls are
+hedged when ARIA_HEDGE_LLM is on (see aria/hedging.py). Every call first
+waits for a slot of its model from the process's LLM governor (see
+aria/governor.py); a hedge is only sent if it gets a slot without waiting.
+Under a run deadline (see aria/deadline.py) no call starts after it and every
+call times out at it.
+Models of the same provider as the default LLM use its endpoint and key
+(OPENAI_API_BASE, ...).
+"""
+
+import logging
+import time
+from typing import Any, Callable, Dict, List, Optional
+
+from crewai import LLM
+from crewai.llms.base_llm import BaseLLM
+from crewai.utilities.exceptions.context_window_exceeding_exception import LLMContextLengthExceededException
+from crewai.utilities.llm_utils import create_llm
+
+from aria.deadline import current_deadline
+from aria.governor import COMPLETION_TOKENS, is_rate_limit, llm_governor, retry_after, retry_delay
+from aria.hedging import HEDGE_LLM, hedged, llm_delay
+from aria.prompts import message_tokens
+from aria.routing import FAILOVER, RETRY, ROUTING, RoutingPolicy
+from aria.tokens import count_tokens
+
+logger = logging.getLogger(__name__)
+
+
+def default_llm() -> BaseLLM:
+    """The LLM crewAI gives an agent without one (MODEL, OPENAI_API_BASE, ... from the environment)."""
+    return create_llm(None) or LLM(model="gpt-4o-mini")
+
+
+def _provider(model: str) -> str:
+    return model.partition("/")[0] if "/" in model else "openai"
+
+
+def build_llm(model: str, default: BaseLLM) -> BaseLLM:
+    """An LLM for `model`, on the endpoint of `default` when both use the same provider."""
+    if model == default.model:
+        return default
+    if _provider(model) != _provider(default.model):
+        return LLM(model=model)
+    return LLM(model=model, base_url=getattr(default, "base_url", None), api_base=getattr(default, "api_base", None),
+               api_key=getattr(default, "api_key", None))
+
+
+class RoutedLLM(BaseLLM):
+    """Forwards each call to the model its RoutingPolicy picks."""
+
+    def __init__(self, policy: RoutingPolicy, llms: Dict[str, BaseLLM]):
+        primary = llms[policy.models[0]]
+        super().__init__(model=primary.model, temperature=primary.temperature)
+        self.policy = policy
+        self.llms = llms
+        self.timeouts = {model: getattr(llm, "timeout", None) for model, llm in llms.items()}
+
+    def call(self, messages: Any, tools: Optional[List[dict]] = None, callbacks: Optional[List[Any]] = None,
+             available_functions: Optional[Dict[str, Any]] = None, from_task: Optional[Any] = None,
+             from_agent: Optional[Any] = None) -> Any:
+        tried: List[str] = []
+        retry: Optional[str] = None
+        attempt = 0
+        while True:
+            if retry is not None:
+                model, reason, detail = tried.pop(), RETRY, retry
+            else:
+                model, reason, detail = self.policy.choose(exclude=tried)
+                if tried:
+                    reason, detail = FAILOVER, f"{tried[-1]} failed"
+                attempt = 0
+            retry = None
+            llm = self.llms[model]
+            llm.stop = self.stop
+            deadline, governor = current_deadline(), llm_governor()
+            if deadline is not None:
+                deadline.check(f"{self.policy.agent} LLM call")
+            if (deadline is not None or governor is not None) and isinstance(getattr(llm, "additional_params", None),
+                                                                              dict):
+                # The client's own retries would run past the deadline, and retry 429s behind the governor's back;
+                # the loop here retries instead.
+                llm.additional_params["max_retries"] = 0
+            prompt_tokens = message_tokens(messages)
+            reserved = prompt_tokens + (getattr(llm, "max_tokens", None) or COMPLETION_TOKENS)
+            slot = governor.acquire(model, reserved) if governor is not None else None
+            queued_s = slot.queued_s if slot is not None else 0.0
+            if hasattr(llm, "timeout"):
+                llm.timeout = deadline.clip(self.timeouts[model]) if deadline is not None else self.timeouts[model]
+            started = time.monotonic()
+            try:
+                result = self._call(llm, messages, model, prompt_tokens, reserved, tools=tools, callbacks=callbacks,
+                                    available_functions=available_functions, from_task=from_task, from_agent=from_agent)
+            except Exception as e:
+                if slot is not None:
+                    # A rejected call spent nothing; one that failed later was probably charged for its prompt.
+                    governor.release(slot, 0 if is_rate_limit(e) else prompt_tokens)
+                    if is_rate_limit(e):
+                        governor.rate_limited(model, retry_after(e))
+                self.policy.record(model, reason, detail, time.monotonic() - started, ok=False, queued_s=queued_s)
+                tried.append(model)
+                # An over-long prompt is crewAI's to handle: it summarises the context and retries.
+                if isinstance(e, LLMContextLengthExceededException):
+                    raise
+                # A 429 or an outage of the provider usually passes: the same model again before another one.
+                delay = retry_delay(e, attempt, governed=slot is not None)
+                if delay is not None and (deadline is None or delay < deadline.remaining()):
+                    logger.warning("%s call to %s failed (%s); retrying in %.1fs", self.policy.agent, model, e, delay)
+                    time.sleep(delay)
+                    retry, attempt = f"{type(e).__name__} from {model}", attempt + 1
+                    continue
+                if len(tried) == len(self.llms):
+                    raise
+                logger.warning("%s call to %s failed (%s); trying another model", self.policy.agent, model, e)
+                continue
+            tokens = prompt_tokens + count_tokens(str(result or ""))
+            if slot is not None:
+                governor.release(slot, tokens)
+            self.policy.record(model, reason, detail, time.monotonic() - started, ok=True, tokens=tokens,
+                               queued_s=queued_s)
+            return result
+
+    @classmethod
+    def _call(cls, llm: BaseLLM, messages: Any, model: str, prompt_tokens: int, reserved: int, **kwargs) -> Any:
+        if not HEDGE_LLM:
+            return llm.call(messages, **kwargs)
+        # A hedge's tokens reach the agent's usage callbacks like any other call's.
+        return hedged(f"llm:{llm.model}", lambda: llm.call(messages, **kwargs), llm_delay(llm.model),
+                      hedge=lambda: cls._hedge(llm, messages, model, prompt_tokens, reserved, kwargs))
+
+    @staticmethod
+    def _hedge(llm: BaseLLM, messages: Any, model: str, prompt_tokens: int, reserved: int,
+               kwargs: Dict[str, Any]) -> Optional[Callable[[], Any]]:
+        """The duplicate of a slow call, on a governor slot of its own; None when no slot is free right now."""
+        governor = llm_governor()
+        if governor is None:
+            return lambda: llm.call(messages, **kwargs)
+        slot = governor.try_acquire(model, reserved)
+        if slot is None:
+            return None
+
+        def call() -> Any:
+            try:
+                result = llm.call(messages, **kwargs)
+            except Exception as e:
+                governor.release(slot, 0 if is_rate_limit(e) else prompt_tokens)
+                if is_rate_limit(e):
+                    governor.rate_limited(model, retry_after(e))
+                raise
+            governor.release(slot, prompt_tokens + count_tokens(str(result or "")))
+            return result
+
+        return call
+
+    def supports_stop_words(self) -> bool:
+        return all(llm.supports_stop_words() for llm in self.llms.values())
+
+    def supports_function_calling(self) -> bool:
+        return all(getattr(llm, "supports_function_calling", lambda: False)() for llm in self.llms.values())
+
+    def get_context_window_size(self) -> int:
+        return min(llm.get_context_window_size() for llm in self.llms.values())
+
+
+def routed_llm(agent: str, agent_config: Dict[str, Any]) -> Optional[RoutedLLM]:
+    """
+    A RoutedLLM for an agent with `llm_routing` in agents.yaml (or for the
+    default model alone, to govern or hedge its calls or bound them by the
+    run's deadline); None leaves crewAI's default LLM.
+    """
+    routing = agent_config.get("llm_routing") if ROUTING else None
+    if not routing:
+        if not HEDGE_LLM and current_deadline() is None and llm_governor() is None:
+            return None
+        routing = {}
+    default = default_llm()
+    policy = RoutingPolicy.from_config(agent, routing, default.model)
+    return RoutedLLM(policy, {model: build_llm(model, default) for model in policy.models})
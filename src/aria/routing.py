@@ -0,0 +1,209 @@
+"""
+Per-agent model routing with latency-aware fallback.
+
+An agent in agents.yaml can name a primary model and fallbacks in an
+`llm_routing` section (the `llm` key itself is resolved by CrewBase and only
+takes a model name):
+
+    llm_routing:
+      primary: cheap              # "cheap" = ARIA_CHEAP_MODEL, or "default" without it
+      fallbacks: [default]        # "default" (or omitted) = MODEL / crewAI's default
+      p95_threshold_s: 8          # optional, ARIA_ROUTING_P95_S
+      max_error_rate: 0.5         # optional, ARIA_ROUTING_MAX_ERROR_RATE
+      token_budget: 50000         # optional: tokens per model per run
+
+The agent's LLM is then a RoutedLLM (aria/routed_llm.py), and its
+RoutingPolicy sends each call to the first model in that order that is
+healthy: its p95 latency and error rate over the last
+ARIA_ROUTING_WINDOW_S are within the limits (a model with fewer than
+ARIA_ROUTING_MIN_SAMPLES calls there counts as healthy, so a model skipped
+for being slow is tried again once its slow samples age out) and it is still
+within the run's token budget. When none is, the model with the lowest p95
+is used. A call that fails is retried on the next model (after a 429 or a
+transient error, on the same model first; see aria/routed_llm.py).
+
+Latency and errors are tracked per model for the whole process, so every
+agent routes on what all runs observe. Each call's model, reason and time
+waiting for the LLM governor (see aria/governor.py) are recorded with its task (`llm_calls` in the run's task records) and counted
+under `routing` in GET /metrics.
+"""
+
+import logging
+import os
+import threading
+import time
+from collections import Counter, deque
+from typing import Any, Deque, Dict, Iterable, List, Optional, Tuple
+
+logger = logging.getLogger(__name__)
+
+ROUTING = os.getenv("ARIA_LLM_ROUTING", "true").lower() in ("1", "true", "yes")
+P95_THRESHOLD_S = float(os.getenv("ARIA_ROUTING_P95_S", "20"))
+MAX_ERROR_RATE = float(os.getenv("ARIA_ROUTING_MAX_ERROR_RATE", "0.5"))
+WINDOW_S = float(os.getenv("ARIA_ROUTING_WINDOW_S", "300"))
+MIN_SAMPLES = int(os.getenv("ARIA_ROUTING_MIN_SAMPLES", "5"))
+CHEAP_MODEL = os.getenv("ARIA_CHEAP_MODEL", "")
+
+DEFAULT, CHEAP = "default", "cheap"
+MAX_SAMPLES = 500
+MAX_CALL_RECORDS = 1000
+
+# Why a call went to the model it did.
+PRIMARY, SLOW, ERRORS, BUDGET, FASTEST, FAILOVER, RETRY = ("primary", "slow", "errors", "budget", "fastest",
+                                                           "failover", "retry")
+
+
+class ModelStats:
+    """Latency and outcome of recent calls to one model."""
+
+    def __init__(self, model: str, window_s: float = WINDOW_S, min_samples: int = MIN_SAMPLES):
+        self.model = model
+        self.window_s = window_s
+        self.min_samples = min_samples
+        self._samples: Deque[Tuple[float, float, bool]] = deque(maxlen=MAX_SAMPLES)
+        self._lock = threading.Lock()
+
+    def observe(self, seconds: float, ok: bool) -> None:
+        with self._lock:
+            self._samples.append((time.monotonic(), seconds, ok))
+
+    def _recent(self) -> List[Tuple[float, float, bool]]:
+        cutoff = time.monotonic() - self.window_s
+        with self._lock:
+            while self._samples and self._samples[0][0] < cutoff:
+                self._samples.popleft()
+            return list(self._samples)
+
+    def p95(self, min_samples: Optional[int] = None) -> Optional[float]:
+        """p95 latency of recent successful calls; None until there are enough of them."""
+        latencies = sorted(seconds for _, seconds, ok in self._recent() if ok)
+        if len(latencies) < (self.min_samples if min_samples is None else min_samples):
+            return None
+        return latencies[min(len(latencies) - 1, int(0.95 * len(latencies)))]
+
+    def error_rate(self) -> Optional[float]:
+        recent = self._recent()
+        if len(recent) < self.min_samples:
+            return None
+        return sum(not ok for _, _, ok in recent) / len(recent)
+
+
+_stats: Dict[str, ModelStats] = {}
+_lock = threading.Lock()
+_totals: Dict[str, Any] = {"calls": 0, "models": {}, "reasons": Counter()}
+
+
+def model_stats(model: str) -> ModelStats:
+    with _lock:
+        if model not in _stats:
+            _stats[model] = ModelStats(model)
+        return _stats[model]
+
+
+class RoutingPolicy:
+    """
+    Model choice for one agent in one run: the agent's models in preference
+    order, its limits, the tokens it spent per model and a record of its calls.
+    """
+
+    def __init__(self, agent: str, models: List[str], p95_threshold_s: float = P95_THRESHOLD_S,
+                 max_error_rate: float = MAX_ERROR_RATE, token_budget: Optional[int] = None):
+        self.models = list(dict.fromkeys(models))
+        if not self.models:
+            raise ValueError(f"No models to route between for {agent}")
+        self.agent = agent
+        self.p95_threshold_s = p95_threshold_s
+        self.max_error_rate = max_error_rate
+        self.token_budget = token_budget
+        self.tokens: Counter = Counter()
+        self.calls: List[Dict[str, Any]] = []
+        self._lock = threading.Lock()
+
+    @classmethod
+    def from_config(cls, agent: str, routing: Dict[str, Any], default_model: str) -> "RoutingPolicy":
+        """
+        Policy for an `llm_routing` section of agents.yaml; "default" names
+        `default_model`, "cheap" ARIA_CHEAP_MODEL (or `default_model`).
+        """
+        aliases = {DEFAULT: default_model, CHEAP: CHEAP_MODEL or default_model}
+        models = [routing.get("primary") or DEFAULT] + list(routing.get("fallbacks") or [])
+        return cls(
+            agent,
+            list(dict.fromkeys(aliases.get(model, model) for model in models)),
+            p95_threshold_s=float(routing.get("p95_threshold_s", P95_THRESHOLD_S)),
+            max_error_rate=float(routing.get("max_error_rate", MAX_ERROR_RATE)),
+            token_budget=routing.get("token_budget"),
+        )
+
+    def _unhealthy(self, model: str) -> Optional[Tuple[str, str]]:
+        """(reason, detail) why `model` should be skipped, or None."""
+        stats = model_stats(model)
+        p95 = stats.p95()
+        if p95 is not None and p95 > self.p95_threshold_s:
+            return SLOW, f"{model} p95 {p95:.1f}s > {self.p95_threshold_s:g}s"
+        error_rate = stats.error_rate()
+        if error_rate is not None and error_rate > self.max_error_rate:
+            return ERRORS, f"{model} error rate {error_rate:.0%} > {self.max_error_rate:.0%}"
+        with self._lock:
+            used = self.tokens[model]
+        if self.token_budget is not None and used >= self.token_budget:
+            return BUDGET, f"{model} used {used} of {self.token_budget} tokens"
+        return None
+
+    def choose(self, exclude: Iterable[str] = ()) -> Tuple[str, str, str]:
+        """(model, reason, detail) for the next call, skipping the models in `exclude`."""
+        candidates = [model for model in self.models if model not in exclude]
+        skipped = None
+        for model in candidates:
+            problem = self._unhealthy(model)
+            if problem is None:
+                return (model, PRIMARY, "") if skipped is None else (model, *skipped)
+            skipped = skipped or problem
+        # Every model is degraded: the fastest one known.
+        fastest = min(candidates, key=lambda model: model_stats(model).p95() or 0.0)
+        return fastest, FASTEST, skipped[1]
+
+    def record(self, model: str, reason: str, detail: str, seconds: float, ok: bool, tokens: int = 0,
+               queued_s: float = 0.0) -> None:
+        model_stats(model).observe(seconds, ok)
+        with self._lock:
+            self.tokens[model] += tokens
+            if len(self.calls) < MAX_CALL_RECORDS:
+                self.calls.append({"at": time.time(), "model": model, "reason": reason, "detail": detail,
+                                   "latency_s": round(seconds, 3), "ok": ok, "tokens": tokens,
+                                   "queued_s": round(queued_s, 3)})
+        if reason != PRIMARY:
+            logger.info("%s routed to %s (%s%s)", self.agent, model, reason, f": {detail}" if detail else "")
+
+    def calls_between(self, started: Optional[float], finished: Optional[float]) -> List[Dict[str, Any]]:
+        """Recorded calls made between two timestamps (a task's start and end)."""
+        with self._lock:
+            return [call for call in self.calls
+                    if (started is None or call["at"] >= started) and (finished is None or call["at"] <= finished)]
+
+
+def record_routing(tasks: Optional[List[Dict[str, Any]]]) -> None:
+    """Add the `llm_calls` of one run's task records to the process-wide totals."""
+    with _lock:
+        for task in tasks or []:
+            for call in task.get("llm_calls") or []:
+                model = _totals["models"].setdefault(call["model"], {"calls": 0, "errors": 0, "seconds": 0.0,
+                                                                     "queued_s": 0.0})
+                model["calls"] += 1
+                model["errors"] += not call["ok"]
+                model["seconds"] += call["latency_s"]
+                model["queued_s"] += call.get("queued_s", 0.0)
+                _totals["reasons"][call["reason"]] += 1
+                _totals["calls"] += 1
+
+
+def routing_stats() -> Dict[str, Any]:
+    """Calls per model and how often each routing reason applied, for /metrics."""
+    with _lock:
+        models = {
+            name: {"calls": m["calls"], "errors": m["errors"],
+                   "mean_latency_s": round(m["seconds"] / m["calls"], 3) if m["calls"] else 0.0,
+                   "mean_queued_s": round(m["queued_s"] / m["calls"], 3) if m["calls"] else 0.0}
+            for name, m in _totals["models"].items()
+        }
+        return {"enabled": ROUTING, "calls": _totals["calls"], "models": models, "reasons": dict(_totals["reasons"])}
@@ -0,0 +1,28 @@
+"""
+Token counting shared by the context and prompt budgeting code.
+
+Uses tiktoken's cl100k_base encoding when it is installed (it ships with crewAI)
+and falls back to the usual ~4 characters per token estimate otherwise.
+"""
+
+from functools import lru_cache
+
+
+@lru_cache(maxsize=1)
+def _encoding():
+    try:
+        import tiktoken
+
+        return tiktoken.get_encoding("cl100k_base")
+    except Exception:
+        return None
+
+
+def count_tokens(text: str) -> int:
+    """Number of tokens in `text` (estimated when tiktoken is unavailable)."""
+    if not text:
+        return 0
+    encoding = _encoding()
+    if encoding is None:
+        return max(1, len(text) // 4)
+    return len(encoding.encode(text, disallowed_special=()))
@@ -0,0 +1,287 @@
+"""
+Shared tool result cache.
+
+Tools decorate `_arun` (or `_run`) with @cached_result. When a ToolResultCache is active in
+the current context (see use_cache), identical calls - same tool, same
+normalised arguments - are answered from the cache, and concurrent identical
+calls wait for the first one instead of hitting the upstream twice - sync
+callers block on it, coroutines await it. With no active cache the decorator
+is a plain pass-through.
+
+The batch endpoint activates one cache per batch, so overlapping Scholar
+queries and already-verified claims are shared between its topics. A run
+sent to a worker process (see aria/workers.py) carries the id of the active
+cache in its inputs (with_cache), and the worker runs it with its own cache
+of that id (shared_cache), so the topics of a batch a worker runs share
+results there too.
+
+Results can also be fetched ahead of need (see aria/prefetch.py). Speculative
+calls are not counted as hits or misses; the cache counts how many were made
+and how many an agent then asked for.
+"""
+
+import asyncio
+import contextlib
+import contextvars
+import functools
+import inspect
+import os
+import re
+import threading
+import uuid
+from collections import OrderedDict
+from concurrent.futures import Future
+from typing import Any, Awaitable, Callable, Dict, Hashable, Iterator, Optional, Set, Tuple
+
+_WHITESPACE = re.compile(r"\s+")
+
+# Batch caches a worker process keeps (see shared_cache).
+SHARED_CACHES = int(os.getenv("ARIA_WORKER_SHARED_CACHES", "8"))
+
+# Key of the active cache's id in a run's inputs on the way to a worker (see aria/batch.py).
+INPUT_KEY = "_tool_cache"
+
+# Prefix of the fallback results tools return while an upstream is unavailable.
+DEGRADED_PREFIX = "⚠️ Degraded result"
+
+# Results starting with these are failures and must not be cached.
+ERROR_PREFIXES = ("Error", "Search failed", "No results found", "No reliable news sources found", DEGRADED_PREFIX)
+
+_active_cache: contextvars.ContextVar[Optional["ToolResultCache"]] = contextvars.ContextVar(
+    "aria_tool_cache", default=None
+)
+
+
+def normalise(value: Any) -> Hashable:
+    """Case/whitespace-insensitive key for strings; other values as-is."""
+    if isinstance(value, str):
+        return _WHITESPACE.sub(" ", value).strip().lower()
+    return value
+
+
+# Outcomes of ToolResultCache._lookup.
+_HIT, _WAIT, _OWN, _SKIP = range(4)
+
+
+class ToolResultCache:
+    """Thread-safe single-flight cache of tool results with hit/miss counters."""
+
+    def __init__(self, cache_id: Optional[str] = None):
+        self.id = cache_id or uuid.uuid4().hex
+        self._lock = threading.Lock()
+        self._results: Dict[Tuple, Any] = {}
+        # Calls in flight; waiters block on (or await) the owner's future.
+        self._pending: Dict[Tuple, Future] = {}
+        # Prefetched keys no agent has asked for yet, and those one has.
+        self._speculative: Set[Tuple] = set()
+        self._prefetch_used: Set[Tuple] = set()
+        self.hits = 0
+        self.misses = 0
+        self.prefetched = 0
+        self.prefetch_hits = 0
+
+    def get_or_call(self, key: Tuple, call: Callable[[], Any],
+                    cacheable: Callable[[Any], bool] = lambda result: True) -> Any:
+        state, value = self._lookup(key)
+        if state == _HIT:
+            return value
+        if state == _WAIT:
+            return value.result()
+        return self._fill(key, value, call, cacheable)
+
+    async def get_or_call_async(self, key: Tuple, call: Callable[[], Awaitable[Any]],
+                                cacheable: Callable[[Any], bool] = lambda result: True) -> Any:
+        state, value = self._lookup(key)
+        if state == _HIT:
+            return value
+        if state == _WAIT:
+            # Shielded: a cancelled waiter must not cancel the owner's future.
+            return await asyncio.shield(asyncio.wrap_future(value))
+        return await self._fill_async(key, value, call, cacheable)
+
+    def prefetch(self, key: Tuple, call: Callable[[], Any],
+                 cacheable: Callable[[Any], bool] = lambda result: True) -> bool:
+        """Fetch `key` before anyone asks for it; False if it is already cached or in flight."""
+        state, pending = self._lookup(key, speculative=True)
+        if state == _SKIP:
+            return False
+        self._fill(key, pending, call, cacheable)
+        return True
+
+    async def prefetch_async(self, key: Tuple, call: Callable[[], Awaitable[Any]],
+                             cacheable: Callable[[Any], bool] = lambda result: True) -> bool:
+        """Coroutine version of prefetch()."""
+        state, pending = self._lookup(key, speculative=True)
+        if state == _SKIP:
+            return False
+        await self._fill_async(key, pending, call, cacheable)
+        return True
+
+    def _lookup(self, key: Tuple, speculative: bool = False) -> Tuple[int, Any]:
+        with self._lock:
+            if key in self._results or key in self._pending:
+                if speculative:
+                    return _SKIP, None
+                self.hits += 1
+                self._claim_prefetched(key)
+                if key in self._results:
+                    return _HIT, self._results[key]
+                return _WAIT, self._pending[key]
+            pending = self._pending[key] = Future()
+            if speculative:
+                self._speculative.add(key)
+                self.prefetched += 1
+            else:
+                self.misses += 1
+            return _OWN, pending
+
+    def was_used(self, key: Tuple) -> bool:
+        """Whether a prefetched result for `key` has been asked for."""
+        with self._lock:
+            return key in self._prefetch_used
+
+    def _claim_prefetched(self, key: Tuple) -> None:
+        if key in self._speculative:
+            self._speculative.discard(key)
+            self._prefetch_used.add(key)
+            self.prefetch_hits += 1
+
+    def _fill(self, key: Tuple, pending: Future, call: Callable[[], Any], cacheable: Callable[[Any], bool]) -> Any:
+        try:
+            result = call()
+        except BaseException as e:
+            self._settle(key, pending, None, e, cacheable)
+            raise
+        self._settle(key, pending, result, None, cacheable)
+        return result
+
+    async def _fill_async(self, key: Tuple, pending: Future, call: Callable[[], Awaitable[Any]],
+                          cacheable: Callable[[Any], bool]) -> Any:
+        try:
+            result = await call()
+        except BaseException as e:
+            self._settle(key, pending, None, e, cacheable)
+            raise
+        self._settle(key, pending, result, None, cacheable)
+        return result
+
+    def _settle(self, key: Tuple, pending: Future, result: Any, error: Optional[BaseException],
+                cacheable: Callable[[Any], bool]) -> None:
+        with self._lock:
+            del self._pending[key]
+            if error is None and cacheable(result):
+                self._results[key] = result
+            else:
+                self._speculative.discard(key)
+        if error is None:
+            pending.set_result(result)
+        else:
+            pending.set_exception(error)
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                "entries": len(self._results),
+                "hits": self.hits,
+                "misses": self.misses,
+                "hit_rate": self.hits / lookups if lookups else 0.0,
+                "prefetched": self.prefetched,
+                "prefetch_hits": self.prefetch_hits,
+                "prefetch_hit_rate": self.prefetch_hits / self.prefetched if self.prefetched else 0.0,
+            }
+
+
+def active_cache() -> Optional[ToolResultCache]:
+    return _active_cache.get()
+
+
+@contextlib.contextmanager
+def use_cache(cache: ToolResultCache) -> Iterator[ToolResultCache]:
+    """Make `cache` the active tool cache for the current context."""
+    token = _active_cache.set(cache)
+    try:
+        yield cache
+    finally:
+        _active_cache.reset(token)
+
+
+def with_cache(inputs: Dict[str, Any], cache: Optional[ToolResultCache]) -> Dict[str, Any]:
+    """A copy of a run's inputs naming `cache`, for a run in a worker process."""
+    if cache is None:
+        return inputs
+    return {**inputs, INPUT_KEY: cache.id}
+
+
+def split_cache(inputs: Dict[str, Any]) -> Tuple[Dict[str, Any], Optional[str]]:
+    """The crew inputs and the cache id added by with_cache()."""
+    if INPUT_KEY not in inputs:
+        return inputs, None
+    inputs = dict(inputs)
+    return inputs, inputs.pop(INPUT_KEY)
+
+
+_shared: "OrderedDict[str, ToolResultCache]" = OrderedDict()
+_shared_lock = threading.Lock()
+
+
+def shared_cache(cache_id: str) -> ToolResultCache:
+    """This process's cache for `cache_id`; the least recently used beyond SHARED_CACHES are dropped."""
+    with _shared_lock:
+        cache = _shared.get(cache_id)
+        if cache is None:
+            cache = _shared[cache_id] = ToolResultCache(cache_id)
+            while len(_shared) > max(1, SHARED_CACHES):
+                _shared.popitem(last=False)
+        _shared.move_to_end(cache_id)
+        return cache
+
+
+def is_cacheable(result: Any) -> bool:
+    return not (isinstance(result, str) and result.startswith(ERROR_PREFIXES))
+
+
+def cache_key(tool_name: str, args: Tuple = (), kwargs: Optional[Dict[str, Any]] = None) -> Tuple:
+    return (tool_name,) + tuple(normalise(a) for a in args) + tuple(
+        (k, normalise(v)) for k, v in sorted((kwargs or {}).items())
+    )
+
+
+def cached_result(run: Callable[..., Any]) -> Callable[..., Any]:
+    """Decorator for BaseTool._run, or a native async _arun, that consults the active ToolResultCache."""
+
+    if inspect.iscoroutinefunction(run):
+        @functools.wraps(run)
+        async def async_wrapper(self, *args, **kwargs):
+            cache = _active_cache.get()
+            if cache is None:
+                return await run(self, *args, **kwargs)
+            key = cache_key(self.name, args, kwargs)
+            return await cache.get_or_call_async(key, lambda: run(self, *args, **kwargs), is_cacheable)
+
+        return async_wrapper
+
+    @functools.wraps(run)
+    def wrapper(self, *args, **kwargs):
+        cache = _active_cache.get()
+        if cache is None:
+            return run(self, *args, **kwargs)
+        key = cache_key(self.name, args, kwargs)
+        return cache.get_or_call(key, lambda: run(self, *args, **kwargs), is_cacheable)
+
+    return wrapper
+
+
+def prefetch_tool(cache: ToolResultCache, tool: Any, **kwargs) -> bool:
+    """
+    Warm `cache` with tool._run(**kwargs), as an agent calling the tool with
+    the same arguments would look it up. The tool's _run must use @cached_result.
+    """
+    run = inspect.unwrap(type(tool)._run)
+    return cache.prefetch(cache_key(tool.name, (), kwargs), lambda: run(tool, **kwargs), is_cacheable)
+
+
+async def prefetch_tool_async(cache: ToolResultCache, tool: Any, **kwargs) -> bool:
+    """prefetch_tool() for tools with a native async _arun using @cached_result."""
+    arun = inspect.unwrap(type(tool)._arun)
+    return await cache.prefetch_async(cache_key(tool.name, (), kwargs), lambda: arun(tool, **kwargs), is_cacheable)
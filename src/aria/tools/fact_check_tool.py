@@ -1,9 +1,13 @@
 
 from crewai.tools import BaseTool
-from typing import Type
+from typing import Type, Union
 from pydantic import BaseModel, Field
-import requests
 import os
+from aria.aio import run_sync
+from aria.api_testing import EndpointUnavailable, guarded_request_async
+from aria.claims import shared_verdicts
+from aria.payloads import Evidence, Source, tool_output
+from aria.tools.cache import DEGRADED_PREFIX, cached_result
 
 class FactCheckInput(BaseModel):
     statement: str = Field(..., description="The statement to verify.")
@@ -14,11 +18,16 @@ class FactCheckerTool(BaseTool):
     args_schema: Type[BaseModel] = FactCheckInput
 
     def _run(self, statement: str) -> str:
+        return tool_output(run_sync(self._arun(statement=statement)))
+
+    @shared_verdicts
+    @cached_result
+    async def _arun(self, statement: str) -> Union[Evidence, str]:
         api_key = os.getenv("RAPIDAPI_KEY") 
         if not api_key:
             return "Error: Please set RAPIDAPI_KEY in your environment."
 
-        url = "https://bing-news-seZarch1.p.rapidapi.com/news/search"
+        url = os.getenv("FACT_CHECK_API_URL", "https://bing-news-search1.p.rapidapi.com/news/search")
         headers = {
             "x-bingapis-sdk": "true",
             "x-rapidapi-host": "bing-news-search1.p.rapidapi.com",
@@ -31,18 +40,21 @@ class FactCheckerTool(BaseTool):
         }
 
         try:
-            response = requests.get(url, headers=headers, params=params)
-            response.raise_for_status()
+            response = await guarded_request_async("fact_check", "GET", url, headers=headers, params=params)
+            if response.status_code >= 400:
+                return f"Error during fact-checking: {response.status_code} {response.text}"
             data = response.json()
 
             if "value" not in data or not data["value"]:
                 return f"No reliable news sources found for: {statement}"
 
-            results = [
-                f"- {item['name']} ({item['provider'][0]['name']}): {item['url']}"
+            sources = [
+                Source(title=item['name'], provider=item['provider'][0]['name'], url=item['url'])
                 for item in data["value"][:3]
             ]
-            return f"Fact-check results for '{statement}':\n" + "\n".join(results)
+            return Evidence(statement=statement, sources=sources)
 
+        except EndpointUnavailable as e:
+            return f"{DEGRADED_PREFIX} ({e}): the statement '{statement}' could not be verified and should be treated as unverified."
         except Exception as e:
             return f"Error during fact-checking: {e}"
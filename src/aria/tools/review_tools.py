@@ -1,37 +1,162 @@
+import os
+import re
+import tempfile
+from collections import Counter
+from functools import lru_cache
+from pathlib import Path
 from crewai.tools import BaseTool
-from typing import Type
-from pydantic import BaseModel, Field, PrivateAttr
+from typing import Iterator, List, NamedTuple, Optional, TextIO, Tuple, Type
+from pydantic import BaseModel, Field
 import language_tool_python
 
+from aria.artifacts import current_run_artifacts
+
+# LanguageTool is sent the report a section at a time, at most this many characters
+# (the public API rejects requests over 20 KB).
+CHUNK_CHARS = int(os.getenv("ARIA_REVIEW_CHUNK_CHARS", "20000"))
+# Corrections listed in the tool's answer; the corrected report on disk has all of them.
+MAX_PATCHES = int(os.getenv("ARIA_REVIEW_MAX_PATCHES", "20"))
+CORRECTED_REPORT = "report_corrected.md"
+
+_HEADING = re.compile(r"^#{1,6}\s", re.MULTILINE)
+_PARAGRAPH = re.compile(r"\n\s*\n")
+
 
 class ReviewerInput(BaseModel):
     report: str = Field(..., description="The full report to review.")
 
 
+class Patch(NamedTuple):
+    """One correction: `original` at `line` of the report became `replacement`."""
+    line: int
+    original: str
+    replacement: str
+    rule_id: str
+
+
+@lru_cache(maxsize=None)
+def shared_language_tool(remote_server: Optional[str] = None) -> language_tool_python.LanguageTool:
+    """
+    One LanguageTool client per process and server URL. Starting a client is
+    expensive (a local Java server, or a round trip to the remote one), so
+    every ReviewerTool shares it and worker processes start it up front.
+    """
+    return language_tool_python.LanguageTool('en-US', remote_server=remote_server)
+
+
+def sections(text: str, max_chars: int = CHUNK_CHARS) -> Iterator[Tuple[int, int]]:
+    """
+    (start, end) offsets of consecutive chunks of `text` of at most `max_chars`,
+    ending before a heading in their second half where there is one, else at
+    a paragraph break. Offsets rather than slices, so only the chunk being
+    checked is copied.
+    """
+    start = 0
+    while start < len(text):
+        end = len(text)
+        if end - start > max_chars:
+            limit = start + max_chars
+            cuts = [m.start() for m in _HEADING.finditer(text, start + max_chars // 2, limit)] or \
+                [m.end() for m in _PARAGRAPH.finditer(text, start, limit)]
+            end = cuts[-1] if cuts else limit
+        yield start, end
+        start = end
+
+
+def apply_matches(text: str, matches: List[language_tool_python.Match], first_line: int = 1,
+                  patches: Optional[List[Patch]] = None) -> Tuple[str, int]:
+    """
+    `text` with the first replacement of each non-overlapping match applied,
+    and the number applied. The first MAX_PATCHES corrections are added to
+    `patches` with their line in the whole report.
+    """
+    pieces, position, applied = [], 0, 0
+    for match in sorted(matches, key=lambda m: m.offset):
+        if not match.replacements or match.offset < position:
+            continue
+        original = text[match.offset:match.offset + match.error_length]
+        pieces.append(text[position:match.offset])
+        pieces.append(match.replacements[0])
+        position = match.offset + match.error_length
+        applied += 1
+        if patches is not None and len(patches) < MAX_PATCHES:
+            line = first_line + text.count("\n", 0, match.offset)
+            patches.append(Patch(line, original, match.replacements[0], match.rule_id))
+    pieces.append(text[position:])
+    return "".join(pieces), applied
+
+
 class ReviewerTool(BaseTool):
-    # declare private attributes so Pydantic doesn't treat them as model fields
-    _tool: language_tool_python.LanguageTool = PrivateAttr()
+    # Where the corrected report is written; by default the run's artifact directory
+    # (see aria/artifacts.py), so concurrent runs each keep their own.
+    output_file: Optional[str] = None
 
-    def __init__(self):
+    def __init__(self, output_file: Optional[str] = None):
         super().__init__(
             name="Report Reviewer",
             description="Reviews the report for grammar, clarity, and formatting.",
-            args_schema=ReviewerInput
+            args_schema=ReviewerInput,
+            output_file=output_file,
         )
-        # assign to private attr
-        self._tool = language_tool_python.LanguageTool('en-US')
+
+    def output_path(self) -> Path:
+        if self.output_file:
+            return Path(self.output_file)
+        artifacts = current_run_artifacts()
+        return artifacts.output_path(CORRECTED_REPORT) if artifacts is not None else Path(CORRECTED_REPORT)
+
+    @property
+    def language_tool(self) -> language_tool_python.LanguageTool:
+        # Started on first use so building the crew does not spawn a LanguageTool
+        # server. LANGUAGETOOL_URL points at a remote server instead of a local one.
+        return shared_language_tool(os.getenv("LANGUAGETOOL_URL") or None)
 
     def _run(self, report: str) -> str:
-        # use private attribute
-        matches = self._tool.check(report)
-        corrected_text = language_tool_python.utils.correct(report, matches)
+        # Corrected sections are streamed to the output file as they are checked;
+        # the answer only lists the corrections, not the report again.
+        path = self.output_path()
+        path.parent.mkdir(parents=True, exist_ok=True)
+        # A file of its own per review, renamed into place once complete.
+        out = tempfile.NamedTemporaryFile("w", encoding="utf-8", dir=path.parent, prefix=f"{path.name}.",
+                                          suffix=".part", delete=False)
+        try:
+            with out:
+                chunks, applied, patches, issues = self._review(report, out)
+            os.replace(out.name, path)
+        except Exception as e:
+            Path(out.name).unlink(missing_ok=True)
+            return f"Error during review: {e}"
+        return self._answer(path, len(report), chunks, applied, patches, issues)
+
+    def _review(self, report: str, out: TextIO) -> Tuple[int, int, List[Patch], Counter]:
+        chunks, applied, line = 0, 0, 1
+        patches: List[Patch] = []
+        issues: Counter = Counter()
+        for start, end in sections(report, CHUNK_CHARS):
+            chunk = report[start:end]
+            matches = self.language_tool.check(chunk)
+            corrected, count = apply_matches(chunk, matches, line, patches)
+            out.write(corrected)
+            issues.update((m.rule_id, m.message) for m in matches)
+            applied += count
+            chunks += 1
+            line += chunk.count("\n")
+        return chunks, applied, patches, issues
 
-        suggestions = [f"- {m.ruleId}: {m.message}" for m in matches[:5]]
+    @staticmethod
+    def _answer(path: Path, length: int, chunks: int, applied: int, patches: List[Patch],
+                issues: Counter) -> str:
+        corrections = [f'- line {p.line}: "{p.original}" → "{p.replacement}" ({p.rule_id})' for p in patches]
+        if applied > len(patches):
+            corrections.append(f"- … and {applied - len(patches)} more in the corrected report")
+        suggestions = [f"- {rule_id}: {message}" + (f" (×{count})" if count > 1 else "")
+                       for (rule_id, message), count in issues.most_common(5)]
+        corrections_text = "\n".join(corrections) if corrections else "None."
         suggestions_text = "\n".join(suggestions) if suggestions else "No major issues found."
 
         return (
-            f"✅ Reviewed Report:\n\n"
-            f"{corrected_text}\n\n"
-            f"---\n"
+            f"✅ Reviewed report: {length} characters in {chunks} sections, {applied} corrections applied.\n"
+            f"Corrected report written to {path}.\n\n"
+            f"**Corrections:**\n{corrections_text}\n\n"
             f"**Suggestions:**\n{suggestions_text}"
         )
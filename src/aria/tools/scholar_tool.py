@@ -1,8 +1,19 @@
 from crewai.tools import BaseTool
-from typing import Type
+from typing import Optional, Type, Union
 from pydantic import BaseModel, Field
 from scholarly import scholarly
-import time
+from aria.aio import run_blocking, run_sync
+from aria.deadline import running_late
+from aria.payloads import Publication, Publications, tool_output
+from aria.refresh import refresh_since
+from aria.tools.cache import cached_result
+import asyncio
+import os
+
+def _authors(author) -> Optional[str]:
+    # scholarly gives a list of names for some results and a string for others
+    return ", ".join(author) if isinstance(author, list) else author
+
 
 class SearchScholarInput(BaseModel):
     query: str = Field(..., description="Search query for academic publications")
@@ -13,21 +24,37 @@ class SearchScholar(BaseTool):
     args_schema: Type[BaseModel] = SearchScholarInput
 
     def _run(self, query: str) -> str:
+        # A refresh only wants what was published since the report it updates.
+        since = refresh_since()
+        if since is None:
+            return tool_output(run_sync(self._arun(query=query)))
+        return tool_output(run_sync(self._arun(query=query, since=since)))
+
+    @cached_result
+    async def _arun(self, query: str, since: Optional[int] = None) -> Union[Publications, str]:
         try:
-            # Add a delay to avoid rate limiting
-            time.sleep(1)
-            
-            search_gen = scholarly.search_pubs(query)
+            # Add a delay to avoid rate limiting (awaited, so it holds no thread)
+            await asyncio.sleep(float(os.getenv("SCHOLAR_REQUEST_DELAY", "1")))
+            # scholarly has no async API; it runs on the shared blocking pool.
+            return await run_blocking(self._search, query, since)
+        except Exception as e:
+            # Return a clear error message but don't raise an exception
+            return f"Search failed: {str(e)}. Please try again with a different query."
+
+    def _search(self, query: str, since: Optional[int] = None) -> Union[Publications, str]:
+        try:
+            search_gen = scholarly.search_pubs(query, year_low=since)
             results = []
             
-            for _ in range(3):  # get top 3 results
+            # get top 3 results, or only the best one when the run is short of time
+            while len(results) < (1 if running_late() else 3):
                 try:
                     pub = next(search_gen)
                     bib = pub.get("bib", {})
-                    title = bib.get("title", "No title")
-                    author = bib.get("author", "Unknown authors")
-                    year = bib.get("pub_year", "N/A")
-                    results.append(f"{title} ({year}) - {author}")
+                    if since is not None and str(bib.get("pub_year", "")).isdigit() and int(bib["pub_year"]) < since:
+                        continue  # Scholar's year filter is loose
+                    results.append(Publication(title=bib.get("title", "No title"), year=bib.get("pub_year"),
+                                               authors=_authors(bib.get("author"))))
                 except StopIteration:
                     break  # No more results
                 except Exception as e:
@@ -36,7 +63,7 @@ class SearchScholar(BaseTool):
             if not results:
                 return "No results found for the query."
             
-            return "Top results:\n• " + "\n• ".join(results)
+            return Publications(query=query, items=results)
             
         except Exception as e:
             # Return a clear error message but don't raise an exception
@@ -1,8 +1,15 @@
 import os
-import requests
+import re
 from crewai.tools import BaseTool
 from typing import Type
 from pydantic import BaseModel, Field
+from aria.aio import run_sync
+from aria.api_testing import EndpointUnavailable
+from aria.hedging import hedged_request_async
+from aria.tools.cache import DEGRADED_PREFIX, cached_result
+
+# Sentences kept by the local fallback summary.
+FALLBACK_SENTENCES = 5
 
 class SummarizerInput(BaseModel):
     text: str = Field(..., description="The text to summarize.")
@@ -13,15 +20,25 @@ class SummarizerTool(BaseTool):
     args_schema: Type[BaseModel] = SummarizerInput
 
     def _run(self, text: str) -> str:
+        return run_sync(self._arun(text=text))
+
+    @cached_result
+    async def _arun(self, text: str) -> str:
         api_key = os.getenv("HF_API_KEY")
         if not api_key:
             return "Error: HuggingFace API key not set (HF_API_KEY)."
 
-        response = requests.post(
-            "https://api-inference.huggingface.co/models/facebook/bart-large-cnn",
-            headers={"Authorization": f"Bearer {api_key}"},
-            json={"inputs": text}
-        )
+        try:
+            response = await hedged_request_async(
+                "huggingface_summarizer", "POST",
+                os.getenv("HF_SUMMARIZER_URL", "https://api-inference.huggingface.co/models/facebook/bart-large-cnn"),
+                headers={"Authorization": f"Bearer {api_key}"},
+                json={"inputs": text}
+            )
+        except EndpointUnavailable as e:
+            # Extractive fallback: the leading sentences of the input.
+            sentences = re.split(r"(?<=[.!?])\s+", text.strip())
+            return f"{DEGRADED_PREFIX} ({e}):\nSummary:\n" + " ".join(sentences[:FALLBACK_SENTENCES])
         if response.status_code != 200:
             return f"Error {response.status_code}: {response.text}"
 
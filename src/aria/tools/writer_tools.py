@@ -1,8 +1,11 @@
 import os
-import requests
 from crewai.tools import BaseTool
 from typing import Type
 from pydantic import BaseModel, Field
+from aria.aio import run_sync
+from aria.api_testing import EndpointUnavailable
+from aria.hedging import hedged_request_async
+from aria.tools.cache import DEGRADED_PREFIX, cached_result
 
 class WriterInput(BaseModel):
     content: str = Field(..., description="The structured summary to turn into a detailed report.")
@@ -13,6 +16,10 @@ class WriterTool(BaseTool):
     args_schema: Type[BaseModel] = WriterInput
 
     def _run(self, content: str) -> str:
+        return run_sync(self._arun(content=content))
+
+    @cached_result
+    async def _arun(self, content: str) -> str:
         api_key = os.getenv("HF_API_KEY")
         if not api_key:
             return "Error: Please set HF_API_KEY in your environment."
@@ -22,11 +29,16 @@ class WriterTool(BaseTool):
             "inputs": f"Turn the following structured notes into a professional markdown report:\n\n{content}"
         }
 
-        response = requests.post(
-            "https://api-inference.huggingface.co/models/mistralai/Mixtral-8x7B-Instruct-v0.1",
-            headers=headers,
-            json=payload
-        )
+        try:
+            response = await hedged_request_async(
+                "huggingface_writer", "POST",
+                os.getenv("HF_WRITER_URL", "https://api-inference.huggingface.co/models/mistralai/Mixtral-8x7B-Instruct-v0.1"),
+                headers=headers,
+                json=payload
+            )
+        except EndpointUnavailable as e:
+            # The notes themselves, so the writer agent can draft the report without the model.
+            return f"{DEGRADED_PREFIX} ({e}):\n\n# Research Report\n\n{content}\n\n---\n_End of Report_"
 
         if response.status_code != 200:
             return f"Error {response.status_code}: {response.text}"
@@ -0,0 +1,36 @@
+"""
+Token usage and cost accounting for crew runs.
+"""
+
+import os
+from typing import Any, Dict
+
+# USD per 1K tokens; defaults match gpt-4o-mini list prices.
+PROMPT_COST_PER_1K = float(os.getenv("ARIA_PROMPT_COST_PER_1K", "0.00015"))
+COMPLETION_COST_PER_1K = float(os.getenv("ARIA_COMPLETION_COST_PER_1K", "0.0006"))
+
+_FIELDS = ("total_tokens", "prompt_tokens", "cached_prompt_tokens", "completion_tokens", "successful_requests")
+
+
+def usage_dict(token_usage: Any) -> Dict[str, int]:
+    """Plain dict from crewAI's UsageMetrics (or a dict / None)."""
+    if token_usage is None:
+        return {field: 0 for field in _FIELDS}
+    if isinstance(token_usage, dict):
+        return {field: int(token_usage.get(field, 0) or 0) for field in _FIELDS}
+    return {field: int(getattr(token_usage, field, 0) or 0) for field in _FIELDS}
+
+
+def estimate_cost(usage: Dict[str, int]) -> float:
+    """Estimated USD cost of `usage` at the configured per-1K token prices."""
+    return round(
+        usage.get("prompt_tokens", 0) / 1000.0 * PROMPT_COST_PER_1K
+        + usage.get("completion_tokens", 0) / 1000.0 * COMPLETION_COST_PER_1K,
+        6,
+    )
+
+
+def add_usage(total: Dict[str, int], usage: Dict[str, int]) -> Dict[str, int]:
+    for field in _FIELDS:
+        total[field] = total.get(field, 0) + usage.get(field, 0)
+    return total
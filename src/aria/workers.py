@@ -0,0 +1,313 @@
+"""
+Multi-process crew execution.
+
+With ARIA_WORKERS > 0 the API process only coordinates: every crew run is sent
+to one of a fixed set of worker processes, so CPU-heavy work (LanguageTool
+result processing, markdown assembly, token counting) no longer competes with
+request handling for the GIL.
+
+Workers are pre-forked from a forkserver that has already imported crewAI and
+the crew module, and each worker warms up before taking jobs: it builds the
+crew template once (YAML configs, LLM and tool clients), loads the tokenizer
+and starts the shared LanguageTool client.
+
+A supervisor thread per worker slot feeds jobs over a pipe. A worker that dies
+is respawned and its in-flight job fails with WorkerCrashed. A worker whose
+RSS exceeds ARIA_WORKER_MAX_RSS_MB, or that has run ARIA_WORKER_MAX_JOBS jobs,
+is recycled between jobs.
+"""
+
+import contextlib
+import logging
+import multiprocessing
+import os
+import queue
+import signal
+import threading
+import time
+from concurrent.futures import Future
+from typing import Any, Callable, Dict, List, Optional
+
+import psutil
+
+from aria.batch import CrewResult, kickoff_crew
+
+logger = logging.getLogger(__name__)
+
+WORKERS = int(os.getenv("ARIA_WORKERS", "0"))
+MAX_RSS_MB = float(os.getenv("ARIA_WORKER_MAX_RSS_MB", "1024"))
+MAX_JOBS = int(os.getenv("ARIA_WORKER_MAX_JOBS", "0"))
+START_METHOD = os.getenv("ARIA_WORKER_START_METHOD", "forkserver")
+
+# How often an idle or busy slot checks that its worker is still alive.
+POLL_INTERVAL = 0.5
+
+
+class WorkerCrashed(RuntimeError):
+    """The worker process died while running a job."""
+
+
+def run_crew(inputs: Dict[str, Any]) -> CrewResult:
+    """Default job: run the crew and return a picklable result."""
+    return kickoff_crew(inputs)
+
+
+def preload_crew() -> None:
+    """Warm a worker: crew template, tokenizer and tool clients."""
+    from aria.crew import Aria
+    from aria.tokens import count_tokens
+
+    Aria().crew()
+    count_tokens("warm up")
+    try:
+        from aria.tools.review_tools import shared_language_tool
+
+        shared_language_tool(os.getenv("LANGUAGETOOL_URL") or None)
+    except Exception as e:
+        logger.warning("Worker %d could not start LanguageTool: %s", os.getpid(), e)
+
+
+def _worker_main(conn, target: Callable[[Dict[str, Any]], Any], preload: Optional[Callable[[], None]]) -> None:
+    # Ctrl+C reaches the whole process group; the pool decides when workers stop.
+    signal.signal(signal.SIGINT, signal.SIG_IGN)
+    if preload is not None:
+        preload()
+    conn.send(("ready", os.getpid()))
+    while True:
+        try:
+            job = conn.recv()
+        except EOFError:
+            break
+        if job is None:
+            break
+        try:
+            conn.send(("ok", target(job)))
+        except Exception as e:
+            conn.send(("error", f"{type(e).__name__}: {e}"))
+
+
+class _Worker:
+    """Parent-side handle of one worker process."""
+
+    def __init__(self, ctx, target, preload):
+        self.conn, child_conn = ctx.Pipe()
+        self.process = ctx.Process(target=_worker_main, args=(child_conn, target, preload), daemon=True)
+        self.process.start()
+        child_conn.close()
+        self.jobs = 0
+
+    @property
+    def pid(self) -> Optional[int]:
+        return self.process.pid
+
+    def alive(self) -> bool:
+        return self.process.is_alive()
+
+    def receive(self, stop: threading.Event) -> Optional[tuple]:
+        """Next message from the worker, or None if it died (or the pool stopped)."""
+        while not stop.is_set():
+            try:
+                if self.conn.poll(POLL_INTERVAL):
+                    return self.conn.recv()
+            except (EOFError, OSError):
+                return None
+            if not self.alive():
+                return None
+        return None
+
+    def rss_mb(self) -> float:
+        try:
+            return psutil.Process(self.pid).memory_info().rss / (1024 * 1024)
+        except (psutil.Error, TypeError):
+            return 0.0
+
+    def close(self, timeout: float = 10.0) -> None:
+        try:
+            self.conn.send(None)
+        except (OSError, ValueError):
+            pass
+        self.process.join(timeout)
+        if self.process.is_alive():
+            self.process.terminate()
+            self.process.join(timeout)
+        self.conn.close()
+
+
+class WorkerPool:
+    """Fixed-size pool of pre-forked crew workers with automatic respawn."""
+
+    def __init__(self, workers: int = WORKERS or 2, max_rss_mb: float = MAX_RSS_MB, max_jobs: int = MAX_JOBS,
+                 start_method: str = START_METHOD, target: Callable[[Dict[str, Any]], Any] = run_crew,
+                 preload: Optional[Callable[[], None]] = preload_crew):
+        if workers < 1:
+            raise ValueError("A worker pool needs at least one worker.")
+        self.size = workers
+        self.max_rss_mb = max_rss_mb
+        self.max_jobs = max_jobs
+        self.target = target
+        self.preload = preload
+        self._ctx = multiprocessing.get_context(start_method)
+        if start_method == "forkserver":
+            # Imported once in the forkserver, inherited by every worker fork.
+            self._ctx.set_forkserver_preload(["aria.crew", "aria.workers"])
+        self._jobs: "queue.Queue[Optional[tuple]]" = queue.Queue()
+        self._stop = threading.Event()
+        self._lock = threading.Lock()
+        self._slots: List[threading.Thread] = []
+        self._workers: Dict[int, _Worker] = {}
+        self._busy = 0
+        self.completed = 0
+        self.failed = 0
+        self.restarts = 0
+        self.recycled = 0
+        # Optional ResourceMonitor: attributes each job's CPU/RSS to its worker process.
+        self.job_monitor = None
+
+    def start(self, wait_ready: bool = True) -> "WorkerPool":
+        ready = [threading.Event() for _ in range(self.size)]
+        for index in range(self.size):
+            slot = threading.Thread(target=self._slot_loop, args=(index, ready[index]),
+                                    name=f"aria-worker-slot-{index}", daemon=True)
+            slot.start()
+            self._slots.append(slot)
+        if wait_ready:
+            for event in ready:
+                event.wait()
+        logger.info("Started %d crew workers (%s)", self.size, self._ctx.get_start_method())
+        return self
+
+    def _spawn(self, index: int) -> Optional[_Worker]:
+        while not self._stop.is_set():
+            worker = _Worker(self._ctx, self.target, self.preload)
+            message = worker.receive(self._stop)
+            if message and message[0] == "ready":
+                with self._lock:
+                    self._workers[index] = worker
+                return worker
+            logger.error("Crew worker %s failed to start (exit code %s), retrying",
+                         worker.pid, worker.process.exitcode)
+            worker.close(timeout=1)
+            time.sleep(1)
+        return None
+
+    def _slot_loop(self, index: int, ready: threading.Event) -> None:
+        worker = self._spawn(index)
+        ready.set()
+        while worker is not None and not self._stop.is_set():
+            try:
+                job = self._jobs.get(timeout=POLL_INTERVAL)
+            except queue.Empty:
+                if not worker.alive():
+                    logger.warning("Idle crew worker %s died (exit code %s), respawning",
+                                   worker.pid, worker.process.exitcode)
+                    with self._lock:
+                        self.restarts += 1
+                    worker = self._replace(index, worker, restart=True)
+                continue
+            if job is None:
+                break
+            inputs, future = job
+            if not future.set_running_or_notify_cancel():
+                continue
+            worker = self._execute(index, worker, inputs, future)
+        if worker is not None:
+            worker.close()
+
+    def _execute(self, index: int, worker: _Worker, inputs: Dict[str, Any], future: Future) -> Optional[_Worker]:
+        with self._lock:
+            self._busy += 1
+        tracking = (self.job_monitor.track_job(f"{inputs.get('topic', 'job')}@{worker.pid}", worker.pid)
+                    if self.job_monitor is not None else contextlib.nullcontext())
+        try:
+            with tracking:
+                worker.conn.send(inputs)
+                message = worker.receive(self._stop)
+        except (OSError, ValueError):
+            message = None
+        finally:
+            with self._lock:
+                self._busy -= 1
+
+        if message is None:
+            with self._lock:
+                self.failed += 1
+                self.restarts += 1
+            future.set_exception(WorkerCrashed(
+                f"Crew worker {worker.pid} exited with code {worker.process.exitcode} while running the job"))
+            logger.warning("Crew worker %s died mid-job, respawning", worker.pid)
+            return self._replace(index, worker, restart=True)
+
+        status, payload = message
+        worker.jobs += 1
+        rss = worker.rss_mb()
+        recycle = None
+        if self.max_rss_mb and rss > self.max_rss_mb:
+            recycle = f"RSS {rss:.0f} MB over {self.max_rss_mb:.0f} MB limit"
+        elif self.max_jobs and worker.jobs >= self.max_jobs:
+            recycle = f"after {worker.jobs} jobs"
+        # Counters are updated before the caller sees the result.
+        with self._lock:
+            if status == "ok":
+                self.completed += 1
+            else:
+                self.failed += 1
+            if recycle:
+                self.recycled += 1
+        if status == "ok":
+            future.set_result(payload)
+        else:
+            future.set_exception(RuntimeError(payload))
+
+        if recycle:
+            logger.info("Recycling crew worker %s: %s", worker.pid, recycle)
+            return self._replace(index, worker)
+        return worker
+
+    def _replace(self, index: int, worker: _Worker, restart: bool = False) -> Optional[_Worker]:
+        worker.close(timeout=1 if restart else 10)
+        return self._spawn(index)
+
+    def submit(self, inputs: Dict[str, Any]) -> Future:
+        if self._stop.is_set():
+            raise RuntimeError("Worker pool is shut down.")
+        future: Future = Future()
+        self._jobs.put((inputs, future))
+        return future
+
+    def run(self, inputs: Dict[str, Any], timeout: Optional[float] = None) -> Any:
+        """Run `inputs` on a worker and wait for the result."""
+        return self.submit(inputs).result(timeout)
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            workers = list(self._workers.values())
+            stats = {
+                "workers": self.size,
+                "busy": self._busy,
+                "queued": self._jobs.qsize(),
+                "completed": self.completed,
+                "failed": self.failed,
+                "restarts": self.restarts,
+                "recycled": self.recycled,
+            }
+        stats["alive"] = sum(1 for w in workers if w.alive())
+        stats["rss_mb"] = {str(w.pid): round(w.rss_mb(), 1) for w in workers if w.alive()}
+        return stats
+
+    def shutdown(self, timeout: float = 30.0) -> None:
+        """Stop taking jobs, let running ones finish and stop the workers."""
+        for _ in self._slots:
+            self._jobs.put(None)
+        deadline = time.monotonic() + timeout
+        for slot in self._slots:
+            slot.join(max(0.0, deadline - time.monotonic()))
+        self._stop.set()
+        # Fail anything still queued behind the shutdown markers.
+        while True:
+            try:
+                job = self._jobs.get_nowait()
+            except queue.Empty:
+                break
+            if job is not None and job[1].set_running_or_notify_cancel():
+                job[1].set_exception(RuntimeError("Worker pool shut down before the job ran."))
+        logger.info("Crew workers stopped")
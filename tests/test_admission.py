@@ -0,0 +1,117 @@
+"""
+Tests for admission control and weighted fair queuing of crew runs.
+"""
+
+import sys
+import threading
+import time
+import unittest
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).parent.parent / "src"))
+
+from aria.admission import BATCH, INTERACTIVE, AdmissionController, AdmissionRejected, _parse_weights
+from aria.deadline import Deadline
+
+
+class TestAdmission(unittest.TestCase):
+    """Rejection on queue depth and estimated wait, with Retry-After."""
+
+    def test_rejects_when_queue_full(self):
+        controller = AdmissionController(capacity=1, max_queue=0, estimated_run_seconds=30,
+                                         lane_weights={}, client_weights={})
+        controller.acquire("a")
+        with self.assertRaises(AdmissionRejected) as ctx:
+            controller.acquire("b")
+        self.assertEqual(ctx.exception.retry_after, 30)
+        controller.release()
+        controller.acquire("b")
+        self.assertEqual(controller.stats()["rejected"], 1)
+
+    def test_rejects_when_estimated_wait_too_long(self):
+        controller = AdmissionController(capacity=2, max_queue=100, max_wait_seconds=10,
+                                         estimated_run_seconds=60, lane_weights={}, client_weights={})
+        controller.acquire("a")
+        controller.acquire("a")
+        self.assertEqual(controller.estimated_wait(), 30)
+        with self.assertRaises(AdmissionRejected) as ctx:
+            controller.check()
+        self.assertEqual(ctx.exception.retry_after, 30)
+
+    def test_has_room_only_with_a_free_slot(self):
+        controller = AdmissionController(capacity=1, lane_weights={}, client_weights={})
+        self.assertTrue(controller.has_room())
+        controller.acquire("a")
+        self.assertFalse(controller.has_room())
+        controller.release()
+        controller.pause("memory pressure")
+        self.assertFalse(controller.has_room())
+
+    def test_duration_estimate_follows_observed_runs(self):
+        controller = AdmissionController(capacity=1, estimated_run_seconds=100)
+        for _ in range(20):
+            controller.acquire("a")
+            controller.release(10)
+        self.assertLess(controller.stats()["avg_run_seconds"], 12)
+
+    def test_deadline_bounds_the_wait(self):
+        controller = AdmissionController(capacity=1, estimated_run_seconds=60, lane_weights={}, client_weights={})
+        controller.acquire("a")
+        with self.assertRaisesRegex(AdmissionRejected, "deadline"):
+            controller.acquire("b", deadline=Deadline.after(30))
+        controller.avg_run_seconds = 0.1
+        started = time.monotonic()
+        with self.assertRaisesRegex(AdmissionRejected, "Deadline reached while waiting"):
+            controller.acquire("b", admit=False, deadline=Deadline.after(0.2))
+        self.assertLess(time.monotonic() - started, 1)
+        self.assertEqual(controller.stats()["waiting"], {})
+        controller.release()
+        with self.assertRaisesRegex(AdmissionRejected, "Deadline reached"):
+            controller.acquire("b", deadline=Deadline(time.time() - 1))
+        controller.acquire("b", deadline=Deadline.after(30))
+        self.assertEqual(controller.stats()["rejected"], 3)
+
+    def test_parse_weights(self):
+        self.assertEqual(_parse_weights("key-a:2, key-b:0.5,"), {"key-a": 2.0, "key-b": 0.5})
+
+
+class TestFairQueuing(unittest.TestCase):
+    """Priority lanes and per-client fairness among waiting runs."""
+
+    def run_order(self, controller, requests):
+        """Queue `requests` behind a busy slot and return the order they were served in."""
+        controller.acquire("holder")
+        order, threads = [], []
+        for client, lane in requests:
+            def run(client=client, lane=lane):
+                controller.acquire(client, lane, admit=False)
+                order.append(client)
+                controller.release()
+            thread = threading.Thread(target=run)
+            thread.start()
+            threads.append(thread)
+            time.sleep(0.01)  # enqueue in a known order
+        controller.release()
+        for thread in threads:
+            thread.join(5)
+        return order
+
+    def test_flooding_client_does_not_starve_others(self):
+        controller = AdmissionController(capacity=1, lane_weights={}, client_weights={})
+        order = self.run_order(controller, [("flood", BATCH)] * 6 + [("small", BATCH)] * 2)
+        self.assertLessEqual(order.index("small"), 1)
+        self.assertLessEqual(len(order) - 1 - order[::-1].index("small"), 3)
+
+    def test_interactive_lane_outranks_batch(self):
+        controller = AdmissionController(capacity=1, lane_weights={INTERACTIVE: 4, BATCH: 1}, client_weights={})
+        order = self.run_order(controller, [("batch", BATCH)] * 4 + [("user", INTERACTIVE)] * 2)
+        self.assertEqual(order[:3].count("user"), 2)
+
+    def test_api_key_weights(self):
+        controller = AdmissionController(capacity=1, lane_weights={}, client_weights={"gold": 3})
+        order = self.run_order(controller, [("basic", BATCH)] * 4 + [("gold", BATCH)] * 4)
+        self.assertEqual(order[:5].count("gold"), 4)
+
+
+if __name__ == "__main__":
+    unittest.main()
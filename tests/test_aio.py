@@ -0,0 +1,143 @@
+"""
+Tests for the shared tool event loop and the native async tools.
+"""
+
+import asyncio
+import os
+import sys
+import threading
+import time
+import unittest
+from pathlib import Path
+from unittest import mock
+
+sys.path.insert(0, str(Path(__file__).parent.parent / "src"))
+sys.path.insert(0, str(Path(__file__).parent.parent))
+
+from aria import aio, api_testing
+from aria.api_testing import EndpointUnavailable, endpoint_guard, guarded_request_async
+from aria.tools.cache import ToolResultCache, active_cache, cache_key, cached_result, use_cache
+from benchmarks.fakes import FakeUpstreamServer
+
+
+class AsyncTool:
+    name = "Async Tool"
+
+    def __init__(self):
+        self.calls = []
+
+    @cached_result
+    async def _arun(self, query: str) -> str:
+        self.calls.append(query)
+        await asyncio.sleep(0.05)
+        return f"result for {query}"
+
+
+class TestSharedLoop(unittest.TestCase):
+
+    def test_submit_runs_in_the_callers_context(self):
+        async def current_cache():
+            return active_cache()
+
+        cache = ToolResultCache()
+        with use_cache(cache):
+            future = aio.submit(current_cache())
+        self.assertIs(future.result(5), cache)
+        self.assertIsNone(aio.run_sync(current_cache()))
+
+    def test_run_sync_refuses_the_loop_thread(self):
+        async def nested():
+            inner = asyncio.sleep(0)
+            with self.assertRaises(RuntimeError):
+                aio.run_sync(inner)
+            return aio.in_loop_thread()
+
+        self.assertTrue(aio.run_sync(nested()))
+
+    def test_run_blocking_keeps_the_loop_free(self):
+        release = threading.Event()
+
+        async def both():
+            blocked = asyncio.ensure_future(aio.run_blocking(release.wait, 5))
+            await asyncio.sleep(0.01)
+            self.assertFalse(blocked.done())
+            release.set()
+            return await blocked
+
+        self.assertTrue(aio.run_sync(both()))
+
+
+class TestAsyncCache(unittest.TestCase):
+
+    def test_concurrent_identical_calls_share_one_upstream_call(self):
+        tool, cache = AsyncTool(), ToolResultCache()
+
+        async def many():
+            return await asyncio.gather(*(tool._arun(query=q) for q in ["LLM", "llm ", "other", "llm"]))
+
+        with use_cache(cache):
+            results = aio.run_sync(many())
+        self.assertEqual(results[:2], ["result for LLM", "result for LLM"])
+        self.assertEqual(sorted(tool.calls), ["LLM", "other"])
+        self.assertEqual((cache.hits, cache.misses), (2, 2))
+
+    def test_sync_caller_waits_for_async_owner(self):
+        tool, cache = AsyncTool(), ToolResultCache()
+        with use_cache(cache):
+            owner = aio.submit(tool._arun(query="llm"))
+            time.sleep(0.01)
+            waiter = cache.get_or_call(cache_key(tool.name, (), {"query": "llm"}), lambda: "unused")
+        self.assertEqual((owner.result(5), waiter), ("result for llm", "result for llm"))
+        self.assertEqual(tool.calls, ["llm"])
+
+
+class TestAsyncTools(unittest.TestCase):
+    """The real tools against the local upstream stand-in."""
+
+    @classmethod
+    def setUpClass(cls):
+        cls.server = FakeUpstreamServer(latency=0.2).start()
+
+    @classmethod
+    def tearDownClass(cls):
+        cls.server.stop()
+
+    def setUp(self):
+        api_testing._guards.clear()
+
+    def test_hundreds_of_calls_in_flight(self):
+        from aria.tools.fact_check_tool import FactCheckerTool
+
+        tool = FactCheckerTool()
+
+        async def check_all():
+            return await asyncio.gather(*(tool._arun(statement=f"claim {i}") for i in range(200)))
+
+        env = {"RAPIDAPI_KEY": "key", "FACT_CHECK_API_URL": f"{self.server.url}/news/search"}
+        with mock.patch.dict(os.environ, env):
+            started = time.monotonic()
+            results = aio.run_sync(check_all())
+            elapsed = time.monotonic() - started
+        self.assertTrue(all(str(result).startswith("Fact-check results for 'claim") for result in results))
+        # 200 calls of 200 ms each overlap on the loop instead of taking 40 s in turn.
+        self.assertLess(elapsed, 5)
+
+    def test_sync_shim_and_degraded_fallback(self):
+        from aria.tools.summarizer import SummarizerTool
+
+        env = {"HF_API_KEY": "key", "HF_SUMMARIZER_URL": f"{self.server.url}/hf/summarize"}
+        with mock.patch.dict(os.environ, env):
+            self.assertTrue(SummarizerTool()._run(text="Some text.").startswith("Summary:\n"))
+            endpoint_guard("huggingface_summarizer").breaker.opened_at = time.monotonic()
+            self.assertIn("circuit open", SummarizerTool()._run(text="Some text."))
+
+    def test_async_request_failures(self):
+        with self.assertRaises(EndpointUnavailable):
+            aio.run_sync(guarded_request_async("closed", "GET", "http://127.0.0.1:9/"))
+        self.assertEqual(endpoint_guard("closed").breaker.failures, 1)
+        self.assertEqual(aio.run_sync(guarded_request_async("api", "GET", f"{self.server.url}/missing")).status_code,
+                         404)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,116 @@
+"""
+Tests for endpoint guards: adaptive timeouts and the tools' fast-fail path.
+"""
+
+import os
+import sys
+import time
+import unittest
+from pathlib import Path
+from unittest.mock import Mock, patch
+
+import requests
+
+sys.path.insert(0, str(Path(__file__).parent.parent / "src"))
+
+from aria import api_testing
+from aria.api_testing import (AdaptiveTimeout, CircuitBreaker, EndpointUnavailable, endpoint_guard,
+                              endpoint_states, guarded_request)
+from aria.tools.cache import DEGRADED_PREFIX, is_cacheable
+
+
+class FakeResponse:
+    def __init__(self, status_code=200, payload=None):
+        self.status_code = status_code
+        self._payload = payload
+        self.text = ""
+
+    def json(self):
+        return self._payload
+
+
+class TestAdaptiveTimeout(unittest.TestCase):
+
+    def test_ceiling_until_enough_samples(self):
+        timeout = AdaptiveTimeout(ceiling=30, floor=1, margin=2)
+        for _ in range(5):
+            timeout.observe(0.5)
+        self.assertEqual(timeout.timeout(), 30)
+
+    def test_follows_p99_within_bounds(self):
+        timeout = AdaptiveTimeout(ceiling=30, floor=1, margin=2)
+        for i in range(100):
+            timeout.observe(4.0 if i == 99 else 1.0)
+        self.assertEqual(timeout.timeout(), 8.0)
+        for _ in range(200):
+            timeout.observe(0.01)
+        self.assertEqual(timeout.timeout(), 1)
+
+    def test_half_open_trial(self):
+        breaker = CircuitBreaker(failure_threshold=1, recovery_timeout=0.05)
+        breaker.record_failure()
+        self.assertFalse(breaker.allow())
+        time.sleep(0.06)
+        self.assertEqual(breaker.state, "half_open")
+        self.assertTrue(breaker.allow())
+        self.assertFalse(breaker.allow())
+        breaker.record_success()
+        self.assertEqual(breaker.state, "closed")
+
+
+class TestGuardedRequests(unittest.TestCase):
+    """Failing upstreams open the breaker and tools fall back immediately."""
+
+    def setUp(self):
+        api_testing._guards.clear()
+
+    def test_open_circuit_fails_fast(self):
+        with patch.object(api_testing.requests, "request", side_effect=requests.ConnectionError("down")) as request:
+            for _ in range(api_testing.CIRCUIT_BREAKER_THRESHOLD):
+                with self.assertRaises(EndpointUnavailable):
+                    guarded_request("flaky", "GET", "http://flaky")
+            with self.assertRaisesRegex(EndpointUnavailable, "circuit open"):
+                guarded_request("flaky", "GET", "http://flaky")
+        self.assertEqual(request.call_count, api_testing.CIRCUIT_BREAKER_THRESHOLD)
+        self.assertEqual(endpoint_states()["flaky"]["circuit"]["state"], "open")
+
+    def test_server_errors_count_client_errors_do_not(self):
+        with patch.object(api_testing.requests, "request", return_value=FakeResponse(404)):
+            self.assertEqual(guarded_request("api", "GET", "http://api").status_code, 404)
+        with patch.object(api_testing.requests, "request", return_value=FakeResponse(503)):
+            with self.assertRaises(EndpointUnavailable):
+                guarded_request("api", "GET", "http://api")
+        self.assertEqual(endpoint_guard("api").breaker.failures, 1)
+
+    def test_unexpected_error_ends_the_half_open_trial(self):
+        breaker = endpoint_guard("api").breaker
+        breaker.opened_at = time.monotonic() - breaker.recovery_timeout
+        with patch.object(api_testing.requests, "request", side_effect=TypeError("bad argument")):
+            with self.assertRaises(TypeError):
+                guarded_request("api", "GET", "http://api")
+        self.assertEqual((breaker.state, breaker.failures), ("half_open", 0))
+        with patch.object(api_testing.requests, "request", return_value=FakeResponse(200)):
+            guarded_request("api", "GET", "http://api")
+        self.assertEqual(breaker.state, "closed")
+        breaker.opened_at = time.monotonic() - breaker.recovery_timeout
+        with self.assertRaises(KeyboardInterrupt):
+            breaker.call(Mock(side_effect=KeyboardInterrupt))
+        self.assertTrue(breaker.allow())
+
+    def test_summarizer_degrades_without_network(self):
+        from aria.tools.summarizer import SummarizerTool
+
+        endpoint_guard("huggingface_summarizer").breaker.opened_at = time.monotonic()
+        text = " ".join(f"Sentence {i}." for i in range(10))
+        with patch.dict(os.environ, {"HF_API_KEY": "key"}), \
+                patch.object(api_testing.requests, "request") as request:
+            result = SummarizerTool()._run(text=text)
+        request.assert_not_called()
+        self.assertTrue(result.startswith(DEGRADED_PREFIX))
+        self.assertIn("Sentence 4.", result)
+        self.assertNotIn("Sentence 5.", result)
+        self.assertFalse(is_cacheable(result))
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,90 @@
+"""
+Tests for spilling task outputs to disk and the per-run memory cap.
+"""
+
+import sys
+import tempfile
+import unittest
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).parent.parent / "src"))
+
+from aria.artifacts import CAP_MARKER, RunArtifacts, release_memoized
+
+
+class TestRunArtifacts(unittest.TestCase):
+
+    def setUp(self):
+        self.root = tempfile.mkdtemp()
+        self.artifacts = RunArtifacts(root=Path(self.root), cap_mb=1)
+
+    def tearDown(self):
+        self.artifacts.close()
+
+    def test_spill_replaces_output_with_reference(self):
+        text = "## Findings\n" + "- a finding\n" * 500
+        reference = self.artifacts.spill("research_task", text)
+        self.assertLess(len(reference), 100)
+        self.assertTrue(self.artifacts.is_reference(reference))
+        self.assertEqual(self.artifacts.load(reference), text)
+        self.assertEqual(self.artifacts.report()["spilled_outputs"], 1)
+        self.assertEqual(self.artifacts.report()["spilled_bytes"], len(text))
+
+    def test_other_text_is_not_resolved(self):
+        other = RunArtifacts(root=Path(self.root))
+        reference = other.spill("research_task", "from another run")
+        self.assertEqual(self.artifacts.load(reference), reference)
+        self.assertEqual(self.artifacts.load("plain output"), "plain output")
+        other.close()
+
+    def test_context_is_cut_at_the_cap(self):
+        older = self.artifacts.spill("research_task", "o" * 800_000)
+        newer = self.artifacts.spill("fact_check_task", "n" * 400_000)
+        old_text, new_text = self.artifacts.load_context("summarize_task", [older, newer])
+        # The newest output is loaded whole; the older one gets what is left.
+        self.assertEqual(new_text, "n" * 400_000)
+        self.assertTrue(old_text.endswith(CAP_MARKER))
+        self.assertEqual(len(old_text) - len(CAP_MARKER), 1024 * 1024 - 400_000)
+        self.assertEqual(self.artifacts.report()["capped_tasks"], ["summarize_task"])
+
+    def test_peak_counts_context_and_output(self):
+        reference = self.artifacts.spill("research_task", "r" * 1000)
+        self.artifacts.load_context("fact_check_task", [reference])
+        self.artifacts.spill("fact_check_task", "f" * 300)
+        self.assertEqual(self.artifacts.report()["peak_bytes"], 1300)
+
+    def test_close_removes_the_run_directory(self):
+        self.artifacts.spill("research_task", "text")
+        self.assertTrue(self.artifacts.directory.exists())
+        self.artifacts.close()
+        self.assertFalse(self.artifacts.directory.exists())
+
+
+class TestReleaseMemoized(unittest.TestCase):
+
+    def test_drops_only_the_given_instance(self):
+        def memoize(func):
+            cache = {}
+
+            def memoized(*args, **kwargs):
+                key = (args, tuple(kwargs.items()))
+                if key not in cache:
+                    cache[key] = func(*args, **kwargs)
+                return cache[key]
+
+            memoized.cache = cache
+            return memoized
+
+        class Crew:
+            @memoize
+            def build(self):
+                return object()
+
+        first, second = Crew(), Crew()
+        first.build(), second.build()
+        release_memoized(first)
+        self.assertEqual([key[0][0] for key in Crew.build.cache], [second])
+
+
+if __name__ == "__main__":
+    unittest.main()
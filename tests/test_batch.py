@@ -0,0 +1,146 @@
+"""
+Tests for batch runs and the shared tool result cache.
+"""
+
+import sys
+import threading
+import time
+import unittest
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).parent.parent / "src"))
+
+from aria.batch import BatchRunner
+from aria.tools.cache import ToolResultCache, active_cache, cached_result, prefetch_tool, use_cache
+
+
+class FakeTool:
+    name = "Fake Tool"
+
+    def __init__(self):
+        self.calls = 0
+
+    @cached_result
+    def _run(self, query: str) -> str:
+        self.calls += 1
+        time.sleep(0.01)
+        return "Error: upstream down" if query == "broken" else f"result for {query}"
+
+
+class TestToolResultCache(unittest.TestCase):
+    """Single-flight caching keyed on tool name and normalised arguments."""
+
+    def test_pass_through_without_active_cache(self):
+        tool = FakeTool()
+        tool._run(query="llm")
+        tool._run(query="llm")
+        self.assertEqual(tool.calls, 2)
+        self.assertIsNone(active_cache())
+
+    def test_normalised_hits(self):
+        tool, cache = FakeTool(), ToolResultCache()
+        with use_cache(cache):
+            tool._run(query="Large  Language Models")
+            self.assertEqual(tool._run(query="large language models "), "result for Large  Language Models")
+        self.assertEqual(tool.calls, 1)
+        self.assertEqual(cache.stats()["hits"], 1)
+
+    def test_errors_are_not_cached(self):
+        tool, cache = FakeTool(), ToolResultCache()
+        with use_cache(cache):
+            tool._run(query="broken")
+            tool._run(query="broken")
+        self.assertEqual(tool.calls, 2)
+
+    def test_concurrent_identical_calls_share_one_upstream_call(self):
+        tool, cache = FakeTool(), ToolResultCache()
+
+        def call():
+            with use_cache(cache):
+                tool._run(query="llm")
+
+        threads = [threading.Thread(target=call) for _ in range(8)]
+        for t in threads:
+            t.start()
+        for t in threads:
+            t.join()
+        self.assertEqual(tool.calls, 1)
+        self.assertEqual(cache.stats()["hits"], 7)
+
+    def test_prefetched_results_are_counted_when_used(self):
+        tool, cache = FakeTool(), ToolResultCache()
+        self.assertTrue(prefetch_tool(cache, tool, query="LLM agents"))
+        self.assertFalse(prefetch_tool(cache, tool, query="llm agents"))
+        self.assertTrue(prefetch_tool(cache, tool, query="unused"))
+        self.assertTrue(prefetch_tool(cache, tool, query="broken"))
+        with use_cache(cache):
+            self.assertEqual(tool._run(query="llm  agents"), "result for LLM agents")
+            tool._run(query="llm agents")
+        stats = cache.stats()
+        self.assertEqual(tool.calls, 3)
+        self.assertEqual((stats["prefetched"], stats["prefetch_hits"], stats["hits"], stats["misses"]), (3, 1, 2, 0))
+        self.assertEqual(stats["entries"], 2)
+
+
+class FakeOutput:
+    def __init__(self, topic):
+        self.raw = f"# Report on {topic}"
+        self.token_usage = {"total_tokens": 1500, "prompt_tokens": 1000, "completion_tokens": 500}
+
+
+class TestBatchRunner(unittest.TestCase):
+    """Scheduling, streaming order and cost reporting."""
+
+    def test_streams_topics_then_summary(self):
+        tool = FakeTool()
+
+        def kickoff(inputs):
+            tool._run(query="shared query")
+            if inputs["topic"] == "bad":
+                raise RuntimeError("boom")
+            return FakeOutput(inputs["topic"])
+
+        runner = BatchRunner(["a", "b", "a", "bad", "c"], workers=3, kickoff=kickoff)
+        events = list(runner.run())
+
+        topics = [e for e in events if e["event"] == "topic"]
+        self.assertEqual(sorted(e["topic"] for e in topics), ["a", "b", "bad", "c"])
+        self.assertEqual([e["completed"] for e in topics], [1, 2, 3, 4])
+        summary = events[-1]
+        self.assertEqual(summary["event"], "summary")
+        self.assertEqual((summary["succeeded"], summary["failed"]), (3, 1))
+        self.assertEqual(summary["usage"]["total_tokens"], 4500)
+        self.assertGreater(summary["cost_usd"], 0)
+        self.assertEqual(len(summary["per_topic"]), 4)
+        self.assertEqual(tool.calls, 1)
+        self.assertEqual(summary["shared_tool_cache"]["hits"], 3)
+
+    def test_closing_the_stream_does_not_wait_for_running_topics(self):
+        release = threading.Event()
+        started = []
+
+        def kickoff(inputs):
+            started.append(inputs["topic"])
+            if inputs["topic"] != "fast":
+                release.wait(5)
+            return FakeOutput(inputs["topic"])
+
+        runner = BatchRunner(["fast", "slow", "queued 1", "queued 2"], workers=2, kickoff=kickoff)
+        events = runner.run()
+        self.assertEqual(next(events)["topic"], "fast")
+        began = time.perf_counter()
+        events.close()
+        self.assertLess(time.perf_counter() - began, 1.0)
+        release.set()
+        time.sleep(0.1)
+        self.assertNotIn("queued 2", started)
+
+    def test_rejects_empty_and_oversized_batches(self):
+        with self.assertRaises(ValueError):
+            BatchRunner(["  "])
+        with self.assertRaises(ValueError):
+            BatchRunner([f"topic {i}" for i in range(1000)])
+
+
+if __name__ == "__main__":
+    unittest.main()
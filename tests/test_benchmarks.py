@@ -0,0 +1,78 @@
+"""
+Tests for the benchmark regression gate.
+"""
+
+import sys
+import unittest
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).parent.parent))
+
+from benchmarks.fakes import FixtureServer
+from benchmarks.gate import compare, percentile
+
+
+class TestPercentile(unittest.TestCase):
+    """Nearest-rank percentile used for latency reporting."""
+
+    def test_empty(self):
+        self.assertEqual(percentile([], 99), 0.0)
+
+    def test_nearest_rank(self):
+        values = list(range(1, 101))
+        self.assertEqual(percentile(values, 50), 50)
+        self.assertEqual(percentile(values, 95), 95)
+        self.assertEqual(percentile(values, 99), 99)
+        self.assertEqual(percentile([7.0], 99), 7.0)
+
+
+class TestRegressionGate(unittest.TestCase):
+    """compare() flags metrics that moved the wrong way past the tolerance."""
+
+    baseline = {"p95_ms": 1000.0, "throughput_rps": 2.0, "peak_rss_mb": 300.0}
+
+    def test_within_tolerance(self):
+        current = {"p95_ms": 1050.0, "throughput_rps": 1.9, "peak_rss_mb": 310.0}
+        self.assertEqual(compare(current, self.baseline, tolerance=0.10), [])
+
+    def test_latency_regression(self):
+        current = dict(self.baseline, p95_ms=1300.0)
+        regressions = compare(current, self.baseline, tolerance=0.10)
+        self.assertEqual(len(regressions), 1)
+        self.assertTrue(regressions[0].startswith("p95_ms"))
+
+    def test_throughput_drop_is_regression(self):
+        current = dict(self.baseline, throughput_rps=1.0)
+        self.assertEqual(len(compare(current, self.baseline, tolerance=0.10)), 1)
+
+    def test_improvement_is_not_regression(self):
+        current = {"p95_ms": 500.0, "throughput_rps": 4.0, "peak_rss_mb": 200.0}
+        self.assertEqual(compare(current, self.baseline, tolerance=0.10), [])
+
+    def test_absolute_floor(self):
+        # 2ms -> 4ms is +100% but below the 5ms floor.
+        self.assertEqual(compare({"p50_ms": 4.0}, {"p50_ms": 2.0}, tolerance=0.10), [])
+
+
+class TestFixtureServer(unittest.TestCase):
+    """Recorded LanguageTool matches are tiled across multi-page reports."""
+
+    def setUp(self):
+        self.server = FixtureServer()
+
+    def tearDown(self):
+        self.server.stop()
+
+    def test_matches_scale_with_pages(self):
+        recorded = self.server.languagetool
+        page = recorded["text_length"]
+        stride = page + len(FixtureServer.PAGE_SEPARATOR)
+        one = self.server._tiled_check(page)["matches"]
+        three = self.server._tiled_check(stride * 2 + page)["matches"]
+        self.assertEqual(len(one), len(recorded["matches"]))
+        self.assertEqual(len(three), 3 * len(one))
+        self.assertEqual(three[-1]["offset"], one[-1]["offset"] + 2 * stride)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,104 @@
+"""
+Tests for near-duplicate claim elimination before fact checking.
+"""
+
+import sys
+import unittest
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).parent.parent / "src"))
+
+from aria.claims import ClaimDeduplicator, claim_index, claim_tokens, cluster_claims, dedup_claims, shared_verdicts
+from aria.tools.cache import ToolResultCache, cached_result, use_cache
+
+RESEARCH = """## Findings
+- Mixture-of-experts models reduce inference cost.
+- LLMs are increasingly multimodal.
+- Inference cost is reduced by mixture of experts models.
+- GPT-4 was trained on 13 trillion tokens.
+- GPT-4 was trained on 2 trillion tokens.
+- More and more LLMs are multimodal
+- Small language models run on phones.
+- Quantised small models run offline on phones and laptops."""
+
+
+class FakeFactChecker:
+    name = "Fact Checker"
+
+    def __init__(self):
+        self.checked = []
+
+    @shared_verdicts
+    @cached_result
+    def _run(self, statement: str) -> str:
+        self.checked.append(statement)
+        return f"Fact-check results for '{statement}': confirmed"
+
+
+class TestClustering(unittest.TestCase):
+
+    def test_restatements_cluster_and_numbers_do_not(self):
+        claims = [line for line in RESEARCH.splitlines() if line.startswith("-")]
+        self.assertEqual(cluster_claims(claims, 0.6), [[0, 2], [1, 5], [3], [4], [6], [7]])
+        self.assertEqual(cluster_claims(claims, 0.4), [[0, 2], [1, 5], [3], [4], [6, 7]])
+
+    def test_negated_claims_do_not_cluster(self):
+        claims = ["Sparse attention improves long-context accuracy.",
+                  "Sparse attention does not improve long-context accuracy.",
+                  "Sparse attention doesn't improve long-context accuracy.",
+                  "Sparse attention improves long context accuracy"]
+        self.assertEqual(cluster_claims(claims, 0.6), [[0, 3], [1, 2]])
+
+    def test_tokens_ignore_bullets_case_and_endings(self):
+        self.assertEqual(claim_tokens("1. Costs REDUCED"), claim_tokens("- cost reduces"))
+
+    def test_dedup_keeps_the_first_of_each_cluster(self):
+        text, clusters = dedup_claims(RESEARCH, 0.6)
+        self.assertNotIn("Inference cost is reduced", text)
+        self.assertIn("## Findings", text)
+        self.assertEqual(clusters, [["Mixture-of-experts models reduce inference cost.",
+                                     "Inference cost is reduced by mixture of experts models."],
+                                    ["LLMs are increasingly multimodal.", "More and more LLMs are multimodal"]])
+
+
+class TestDeduplicator(unittest.TestCase):
+
+    def test_only_configured_tasks(self):
+        dedup = ClaimDeduplicator.from_tasks_config(
+            {"fact_check_task": {"dedup_claims": True}, "summarize_task": {"context_budget": 10}}, threshold=0.4)
+        self.assertEqual(dedup.dedupe("summarize_task", [RESEARCH]), [RESEARCH])
+        [context] = dedup.dedupe("fact_check_task", [RESEARCH])
+        self.assertEqual(context.count("\n- "), 5)
+        self.assertEqual(dedup.last_stats["fact_check_task"], {"claims": 8, "kept": 5})
+
+    def test_verdicts_are_copied_within_a_cache(self):
+        checker, cache = FakeFactChecker(), ToolResultCache()
+        dedup = ClaimDeduplicator(["fact_check_task"], threshold=0.6)
+        with use_cache(cache):
+            dedup.dedupe("fact_check_task", [RESEARCH])
+            checker._run(statement="Mixture-of-experts models reduce inference cost.")
+            copied = checker._run(statement="Inference cost is reduced by mixture of experts models.")
+            checker._run(statement="mixture of experts models reduce the inference cost")
+            checker._run(statement="Small language models run on phones.")
+        self.assertEqual(checker.checked, ["Mixture-of-experts models reduce inference cost.",
+                                           "Small language models run on phones."])
+        self.assertTrue(copied.startswith("Same claim as 'Mixture-of-experts models reduce inference cost.'"))
+        self.assertEqual(claim_index(cache).copied, 2)
+
+    def test_verdict_is_not_copied_to_the_opposite_claim(self):
+        checker = FakeFactChecker()
+        with use_cache(ToolResultCache()):
+            checker._run(statement="Sparse attention improves long-context accuracy.")
+            result = checker._run(statement="Sparse attention does not improve long-context accuracy.")
+        self.assertEqual(len(checker.checked), 2)
+        self.assertFalse(result.startswith("Same claim as"))
+
+    def test_no_sharing_without_a_cache(self):
+        checker = FakeFactChecker()
+        checker._run(statement="LLMs are multimodal.")
+        checker._run(statement="LLMs are multimodal!")
+        self.assertEqual(len(checker.checked), 2)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,93 @@
+"""
+Tests for inter-task context compaction.
+"""
+
+import sys
+import unittest
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).parent.parent / "src"))
+
+from aria.context import DIVIDER, ContextCompactor, clean_lines, fit_to_budget
+from aria.tokens import count_tokens
+
+
+RESEARCH = """Thought: I now can give a great answer
+Final Answer: - LLMs are increasingly multimodal.
+- Mixture of Experts models reduce inference cost.
+- LLMs are increasingly multimodal!
+```
+- Small language models run on phones.
+```"""
+
+REPORT = "\n".join(
+    ["# Report", ""]
+    + [f"Paragraph {i} explains a finding in detail. It then adds supporting evidence and caveats." for i in range(200)]
+)
+
+
+class TestCleanLines(unittest.TestCase):
+    """Boilerplate and duplicate removal."""
+
+    def test_strips_boilerplate_and_duplicates(self):
+        lines = clean_lines(RESEARCH, set())
+        self.assertEqual(lines, [
+            "- LLMs are increasingly multimodal.",
+            "- Mixture of Experts models reduce inference cost.",
+            "- Small language models run on phones.",
+        ])
+
+    def test_seen_is_shared_across_outputs(self):
+        seen = set()
+        clean_lines("- Small language models run on phones.", seen)
+        self.assertNotIn("- Small language models run on phones.", clean_lines(RESEARCH, seen))
+
+    def test_headings_are_never_deduplicated(self):
+        self.assertEqual(clean_lines("## Findings\n\n## Findings", set()), ["## Findings", "", "## Findings"])
+
+
+class TestFitToBudget(unittest.TestCase):
+    """Progressive shortening."""
+
+    def test_under_budget_untouched(self):
+        lines = ["short line"]
+        self.assertEqual(fit_to_budget(lines, 100), lines)
+
+    def test_first_sentence_then_truncate(self):
+        lines = REPORT.splitlines()
+        fitted = fit_to_budget(lines, 300)
+        self.assertLessEqual(count_tokens("\n".join(fitted)), 300 + len(fitted))
+        self.assertEqual(fitted[0], "# Report")
+        self.assertEqual(fitted[2], "Paragraph 0 explains a finding in detail.")
+        self.assertEqual(fitted[-1], "[…]")
+
+
+class TestContextCompactor(unittest.TestCase):
+    """Budgets per task."""
+
+    def test_no_budget_passes_through(self):
+        compactor = ContextCompactor({}, enabled=True)
+        self.assertEqual(compactor.compact("summarize_task", [RESEARCH, REPORT]), RESEARCH + DIVIDER + REPORT)
+
+    def test_disabled_passes_through(self):
+        compactor = ContextCompactor({"summarize_task": 10}, enabled=False)
+        self.assertEqual(compactor.compact("summarize_task", [RESEARCH]), RESEARCH)
+
+    def test_budget_is_respected_and_logged(self):
+        compactor = ContextCompactor({"review_report_task": 500}, enabled=True)
+        context = compactor.compact("review_report_task", [RESEARCH, REPORT])
+        stats = compactor.last_stats["review_report_task"]
+        self.assertLess(stats["after"], stats["before"])
+        self.assertLessEqual(stats["after"], 500 * 1.1)
+        self.assertIn("# Report", context)
+
+    def test_from_tasks_config(self):
+        compactor = ContextCompactor.from_tasks_config({
+            "research_task": {"description": "x"},
+            "fact_check_task": {"description": "y", "context_budget": 1500},
+        })
+        self.assertEqual(compactor.budgets, {"fact_check_task": 1500})
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,174 @@
+"""
+Tests for end-to-end run deadlines and partial results.
+"""
+
+import json
+import os
+import sys
+import time
+import unittest
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).parent.parent / "src"))
+sys.path.insert(0, str(Path(__file__).parent.parent))
+
+os.environ.setdefault("CREWAI_DISABLE_TELEMETRY", "true")
+os.environ.setdefault("OTEL_SDK_DISABLED", "true")
+
+from crewai import Agent, Task
+from crewai.llms.base_llm import BaseLLM
+
+from aria import aio, api_testing
+from aria.api_testing import EndpointUnavailable, endpoint_guard, guarded_request_async
+from aria.crew import CompactingCrew
+from aria.deadline import (LATE_NOTE, Deadline, DeadlineExceeded, current_deadline, running_late, split_deadline,
+                           use_deadline, with_deadline)
+from aria.routed_llm import RoutedLLM
+from aria.routing import RoutingPolicy
+from benchmarks.fakes import FakeUpstreamServer
+
+
+class SlowLLM(BaseLLM):
+    """Answers every call after `delay` seconds (or times out), keeping the prompts it saw."""
+
+    def __init__(self, delay: float = 0.0):
+        super().__init__(model="slow")
+        self.delay = delay
+        self.timeout = 30.0
+        self.additional_params = {}
+        self.prompts = []
+
+    def call(self, messages, tools=None, callbacks=None, available_functions=None, from_task=None, from_agent=None):
+        self.prompts.append(messages if isinstance(messages, str) else messages[-1]["content"])
+        if self.delay > self.timeout:
+            time.sleep(self.timeout)
+            raise TimeoutError(f"no answer within {self.timeout:.2f}s")
+        time.sleep(self.delay)
+        return f"Final Answer: output {len(self.prompts)}"
+
+
+def pipeline(llm: BaseLLM, min_times=None) -> CompactingCrew:
+    agent = Agent(role="Analyst", goal="Answer", backstory="Quick.", llm=RoutedLLM(RoutingPolicy("analyst", ["slow"]),
+                                                                                   {"slow": llm}), max_retry_limit=0)
+    tasks = [Task(name=name, description=f"Do the {name}.", expected_output="Text.", agent=agent)
+             for name in ("research", "write", "review")]
+    return CompactingCrew(agents=[agent], tasks=tasks, task_min_times=min_times or {})
+
+
+class TestDeadline(unittest.TestCase):
+
+    def test_time_left(self):
+        deadline = Deadline.after(10)
+        self.assertAlmostEqual(deadline.remaining(), 10, delta=0.1)
+        self.assertEqual(deadline.clip(3), 3)
+        self.assertLessEqual(deadline.clip(60), 10)
+        self.assertFalse(deadline.late())
+        self.assertTrue(Deadline(time.time() + 1, started=time.time() - 9).late())
+        with self.assertRaises(DeadlineExceeded):
+            Deadline(time.time() - 1).check("the review")
+
+    def test_travels_with_the_inputs(self):
+        deadline = Deadline.after(5)
+        inputs = json.loads(json.dumps(with_deadline({"topic": "AI"}, deadline)))
+        inputs, received = split_deadline(inputs)
+        self.assertEqual(inputs, {"topic": "AI"})
+        self.assertEqual((received.started, received.at), (deadline.started, deadline.at))
+        self.assertEqual(split_deadline({"topic": "AI"}), ({"topic": "AI"}, None))
+
+    def test_context(self):
+        late = Deadline(time.time() + 1, started=time.time() - 9)
+        with use_deadline(late):
+            self.assertIs(current_deadline(), late)
+            self.assertTrue(running_late())
+        self.assertIsNone(current_deadline())
+
+
+class TestDeadlineRequests(unittest.TestCase):
+
+    @classmethod
+    def setUpClass(cls):
+        cls.server = FakeUpstreamServer(latency=2.0).start()
+
+    @classmethod
+    def tearDownClass(cls):
+        cls.server.stop()
+
+    def setUp(self):
+        api_testing._guards.clear()
+
+    def test_request_stops_at_the_deadline(self):
+        started = time.monotonic()
+        with use_deadline(Deadline.after(0.3)):
+            with self.assertRaises(EndpointUnavailable):
+                aio.run_sync(guarded_request_async("slow", "GET", f"{self.server.url}/news/search"))
+        self.assertLess(time.monotonic() - started, 1.5)
+        # The deadline cut it short, not the endpoint.
+        self.assertEqual(endpoint_guard("slow").breaker.failures, 0)
+
+    def test_no_request_after_the_deadline(self):
+        with use_deadline(Deadline(time.time() - 1)):
+            with self.assertRaisesRegex(EndpointUnavailable, "deadline"):
+                aio.run_sync(guarded_request_async("slow", "GET", f"{self.server.url}/news/search"))
+        self.assertEqual(self.server.requests_served, 0)
+
+    def test_deadline_leaves_the_half_open_trial_to_the_next_call(self):
+        breaker = endpoint_guard("slow").breaker
+        breaker.opened_at = time.monotonic() - breaker.recovery_timeout
+        url = f"{self.server.url}/news/search"
+        with use_deadline(Deadline(time.time() - 1)):
+            with self.assertRaisesRegex(EndpointUnavailable, "deadline"):
+                aio.run_sync(guarded_request_async("slow", "GET", url))
+        with use_deadline(Deadline.after(0.3)):
+            with self.assertRaises(EndpointUnavailable):
+                aio.run_sync(guarded_request_async("slow", "GET", url))
+        self.assertEqual(breaker.state, "half_open")
+        self.assertTrue(breaker.allow())
+
+
+class TestDeadlineLLM(unittest.TestCase):
+
+    def test_llm_timeout_is_cut_to_the_deadline(self):
+        slow = SlowLLM()
+        llm = RoutedLLM(RoutingPolicy("writer", ["slow"]), {"slow": slow})
+        with use_deadline(Deadline.after(5)):
+            llm.call("Write.")
+        self.assertLessEqual(slow.timeout, 5)
+        self.assertEqual(slow.additional_params["max_retries"], 0)
+        llm.call("Write.")
+        self.assertEqual(slow.timeout, 30.0)
+        with use_deadline(Deadline(time.time() - 1)):
+            with self.assertRaises(DeadlineExceeded):
+                llm.call("Write.")
+        self.assertEqual(len(slow.prompts), 2)
+
+
+class TestPartialRuns(unittest.TestCase):
+
+    def test_run_returns_the_last_output_at_its_deadline(self):
+        crew = pipeline(SlowLLM(delay=0.4))
+        with use_deadline(Deadline.after(0.6)):
+            output = crew.kickoff()
+        self.assertEqual(output.raw, "output 1")
+        self.assertTrue(crew.partial)
+        self.assertEqual(crew.skipped_tasks, ["write", "review"])
+
+    def test_late_run_skips_optional_tasks_and_asks_for_brevity(self):
+        llm = SlowLLM()
+        crew = pipeline(llm, min_times={"review": 30})
+        with use_deadline(Deadline(time.time() + 20, started=time.time() - 100)):
+            output = crew.kickoff()
+        self.assertEqual(output.raw, "output 2")
+        self.assertFalse(crew.partial)
+        self.assertEqual(crew.skipped_tasks, ["review"])
+        self.assertIn(LATE_NOTE, llm.prompts[0])
+
+    def test_other_failures_are_raised(self):
+        crew = pipeline(SlowLLM(delay=-1))
+        with use_deadline(Deadline.after(60)):
+            with self.assertRaises(ValueError):
+                crew.kickoff()
+        self.assertFalse(crew.partial)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,206 @@
+"""
+Tests for the process-wide LLM governor.
+"""
+
+import sys
+import tempfile
+import threading
+import time
+import unittest
+from pathlib import Path
+from unittest import mock
+
+sys.path.insert(0, str(Path(__file__).parent.parent / "src"))
+
+from crewai.llms.base_llm import BaseLLM
+
+from aria import hedging, routed_llm
+from aria.deadline import Deadline, DeadlineExceeded, use_deadline
+from aria.governor import LLMGovernor, ModelLimits, SQLiteGovernorState, use_flow
+from aria.routed_llm import RoutedLLM
+from aria.routing import RoutingPolicy
+
+
+class RateLimitError(Exception):
+    status_code = 429
+
+
+class ServiceUnavailableError(Exception):
+    status_code = 503
+
+
+class LimitedLLM(BaseLLM):
+    """Answers with 429 (or `error`) to the first `rejections` calls."""
+
+    def __init__(self, rejections: int = 0, error: type = RateLimitError):
+        super().__init__(model="limited")
+        self.rejections = rejections
+        self.error = error
+        self.additional_params = {}
+
+    def call(self, messages, tools=None, callbacks=None, available_functions=None, from_task=None, from_agent=None):
+        if self.rejections:
+            self.rejections -= 1
+            raise self.error("429 Too Many Requests" if self.error is RateLimitError else "503 Service Unavailable")
+        return "answer"
+
+
+class SlowFirstLLM(BaseLLM):
+    """The first call takes half a second, later ones return at once."""
+
+    def __init__(self):
+        super().__init__(model="slow")
+        self.calls = 0
+        self.additional_params = {}
+
+    def call(self, messages, tools=None, callbacks=None, available_functions=None, from_task=None, from_agent=None):
+        self.calls += 1
+        if self.calls == 1:
+            time.sleep(0.5)
+        return f"answer {self.calls}"
+
+
+def queued(governor: LLMGovernor, model: str, n: int) -> None:
+    """Wait until `n` calls are waiting for `model`."""
+    while len(governor._queues.get(model, [])) < n:
+        time.sleep(0.005)
+
+
+class TestGovernor(unittest.TestCase):
+
+    def test_in_flight_limit(self):
+        governor = LLMGovernor(limits={}, default=ModelLimits(max_in_flight=2, tpm=0))
+        running, peak, lock = [0], [0], threading.Lock()
+
+        def call():
+            with governor.slot("gpt", 10):
+                with lock:
+                    running[0] += 1
+                    peak[0] = max(peak[0], running[0])
+                time.sleep(0.05)
+                with lock:
+                    running[0] -= 1
+
+        threads = [threading.Thread(target=call) for _ in range(6)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        stats = governor.stats()["models"]["gpt"]
+        self.assertEqual(peak[0], 2)
+        self.assertEqual((stats["calls"], stats["in_flight"]), (6, 0))
+        self.assertGreaterEqual(stats["waited"], 3)
+        self.assertGreater(stats["max_queued_s"], 0.05)
+
+    def test_tokens_per_minute(self):
+        # 6000 tokens per minute = 100 per second.
+        governor = LLMGovernor(limits={}, default=ModelLimits(max_in_flight=0, tpm=6000))
+        with governor.slot("gpt", 6000) as slot:
+            slot.used = 100
+        # The unused reservation came back.
+        self.assertLess(governor.acquire("gpt", 5000).queued_s, 0.05)
+        started = time.monotonic()
+        governor.acquire("gpt", 950)
+        self.assertAlmostEqual(time.monotonic() - started, 0.5, delta=0.2)
+
+    def test_runs_take_turns(self):
+        governor = LLMGovernor(limits={}, default=ModelLimits(max_in_flight=1, tpm=0))
+        order = []
+
+        def call(flow: str):
+            with use_flow(flow), governor.slot("gpt", 100):
+                order.append(flow)
+
+        blocker = governor.acquire("gpt", 100)
+        threads = []
+        for n, flow in enumerate(["busy"] * 5 + ["quiet"]):
+            threads.append(threading.Thread(target=call, args=(flow,)))
+            threads[-1].start()
+            queued(governor, "gpt", n + 1)
+        governor.release(blocker, 100)
+        for thread in threads:
+            thread.join()
+        self.assertLessEqual(order.index("quiet"), 1)
+
+    def test_rate_limit_holds_every_call(self):
+        governor = LLMGovernor(limits={}, default=ModelLimits(max_in_flight=4, tpm=0))
+        governor.rate_limited("gpt", retry_after=0.3)
+        started = time.monotonic()
+        governor.acquire("gpt", 10)
+        self.assertGreaterEqual(time.monotonic() - started, 0.25)
+        self.assertEqual(governor.stats()["models"]["gpt"]["rate_limited"], 1)
+
+    def test_waiting_stops_at_the_deadline(self):
+        governor = LLMGovernor(limits={}, default=ModelLimits(max_in_flight=1, tpm=0))
+        governor.acquire("gpt", 10)
+        with use_deadline(Deadline.after(0.2)):
+            with self.assertRaises(DeadlineExceeded):
+                governor.acquire("gpt", 10)
+        self.assertEqual(governor._queues["gpt"], [])
+        self.assertEqual(governor.stats()["models"]["gpt"]["timed_out"], 1)
+
+    def test_limits_shared_between_processes(self):
+        with tempfile.TemporaryDirectory() as directory:
+            path = str(Path(directory) / "governor.db")
+            limits = {"gpt": ModelLimits(max_in_flight=1, tpm=0)}
+            first = LLMGovernor(SQLiteGovernorState(path), limits)
+            second = LLMGovernor(SQLiteGovernorState(path), limits)
+            slot = first.acquire("gpt", 10)
+            threading.Timer(0.2, first.release, args=(slot, 10)).start()
+            started = time.monotonic()
+            second.release(second.acquire("gpt", 10), 10)
+            self.assertGreaterEqual(time.monotonic() - started, 0.15)
+            self.assertEqual(second.stats()["models"]["gpt"]["in_flight"], 0)
+
+
+class TestGovernedLLM(unittest.TestCase):
+
+    def test_429_is_retried_once_the_model_cooled_down(self):
+        governor = LLMGovernor(limits={}, default=ModelLimits(max_in_flight=2, tpm=0))
+        llm = LimitedLLM(rejections=1)
+        routed = RoutedLLM(RoutingPolicy("writer", ["limited"]), {"limited": llm})
+        with mock.patch.object(routed_llm, "llm_governor", lambda: governor), \
+                mock.patch("aria.governor.RATE_LIMIT_COOLDOWN_S", 0.2):
+            self.assertEqual(routed.call("Write."), "answer")
+        self.assertEqual(llm.additional_params["max_retries"], 0)
+        calls = routed.policy.calls
+        self.assertEqual([(c["reason"], c["ok"]) for c in calls], [("primary", False), ("retry", True)])
+        self.assertGreaterEqual(calls[1]["queued_s"], 0.15)
+        stats = governor.stats()["models"]["limited"]
+        self.assertEqual((stats["rate_limited"], stats["in_flight"]), (1, 0))
+        self.assertGreater(stats["tokens_last_minute"], 0)
+
+    def test_retries_are_bounded(self):
+        governor = LLMGovernor(limits={}, default=ModelLimits(max_in_flight=2, tpm=0))
+        routed = RoutedLLM(RoutingPolicy("writer", ["limited"]), {"limited": LimitedLLM(rejections=5)})
+        with mock.patch.object(routed_llm, "llm_governor", lambda: governor), \
+                mock.patch("aria.governor.RATE_LIMIT_COOLDOWN_S", 0.01), mock.patch("aria.governor.LLM_RETRIES", 2):
+            with self.assertRaises(RateLimitError):
+                routed.call("Write.")
+        self.assertEqual(len(routed.policy.calls), 3)
+
+    def test_transient_error_is_retried_after_a_backoff(self):
+        llm = LimitedLLM(rejections=1, error=ServiceUnavailableError)
+        routed = RoutedLLM(RoutingPolicy("writer", ["limited"]), {"limited": llm})
+        with mock.patch.object(routed_llm, "llm_governor", lambda: None), \
+                mock.patch("aria.governor.RETRY_BACKOFF_S", 0.01):
+            self.assertEqual(routed.call("Write."), "answer")
+        self.assertEqual([c["ok"] for c in routed.policy.calls], [False, True])
+
+    def test_hedge_needs_a_free_slot(self):
+        for max_in_flight, expected in ((1, "answer 1"), (2, "answer 2")):
+            governor = LLMGovernor(limits={}, default=ModelLimits(max_in_flight=max_in_flight, tpm=0))
+            llm = SlowFirstLLM()
+            routed = RoutedLLM(RoutingPolicy("writer", ["slow"]), {"slow": llm})
+            with mock.patch.object(routed_llm, "llm_governor", lambda: governor), \
+                    mock.patch.object(routed_llm, "HEDGE_LLM", True), \
+                    mock.patch.object(routed_llm, "llm_delay", lambda model: 0.05), \
+                    mock.patch.object(hedging, "budget", hedging.HedgeBudget(ratio=1.0, burst=5)):
+                self.assertEqual(routed.call("Write."), expected)
+            time.sleep(0.6)
+            stats = governor.stats()["models"]["slow"]
+            self.assertEqual((stats["calls"], stats["in_flight"]), (max_in_flight, 0))
+            self.assertEqual(llm.calls, max_in_flight)
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,74 @@
+"""
+Tests for the cached deep health check and the /healthz and /readyz probes.
+"""
+
+import sys
+import unittest
+from pathlib import Path
+from unittest.mock import patch
+
+from fastapi.testclient import TestClient
+
+sys.path.insert(0, str(Path(__file__).parent.parent / "src"))
+
+from aria import main
+from aria.health import CachedDeepHealthCheck, HealthChecker
+
+
+class CountingChecker(HealthChecker):
+    def __init__(self, config_dir=None):
+        super().__init__(config_dir)
+        self.runs = 0
+
+    def check_upstreams(self):
+        self.runs += 1
+        return {"summary": {"overall_status": "healthy"}, "results": {}}
+
+
+class TestCachedDeepHealthCheck(unittest.TestCase):
+
+    def test_served_from_cache(self):
+        checker = CountingChecker()
+        cached = CachedDeepHealthCheck(interval=3600, checker=checker)
+        self.assertIsNone(cached.latest())
+        cached.start()
+        self.assertTrue(cached.wait_ready(10))
+        for _ in range(5):
+            body, code = cached.latest()
+        cached.stop()
+        self.assertEqual(checker.runs, 1)
+        self.assertEqual(code, 200)
+        self.assertTrue(body["configs_valid"])
+        self.assertIn("age_s", body)
+
+    def test_invalid_config_is_unhealthy(self):
+        body, code = CountingChecker(config_dir="/nonexistent").deep_health_check()
+        self.assertEqual((body["status"], code), ("unhealthy", 503))
+
+
+class TestProbes(unittest.TestCase):
+    """Probes answer from process state and the cache, never the crew."""
+
+    def setUp(self):
+        self.client = TestClient(main.app)
+
+    def test_healthz(self):
+        response = self.client.get("/healthz")
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.json()["status"], "healthy")
+
+    def test_readyz_follows_cached_deep_check(self):
+        cached = CachedDeepHealthCheck(interval=3600, checker=CountingChecker())
+        with patch.object(main, "deep_health", cached):
+            self.assertEqual(self.client.get("/readyz").status_code, 503)
+            cached.refresh()
+            self.assertEqual(self.client.get("/readyz").json(), {"status": "ready"})
+            cached.checker.config_dir = Path("/nonexistent")
+            cached.refresh()
+            response = self.client.get("/readyz")
+        self.assertEqual(response.status_code, 503)
+        self.assertIn("Missing config file", response.json()["reasons"][0])
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -17,22 +17,39 @@ from pathlib import Path
 from unittest.mock import patch, MagicMock, mock_open
 from io import StringIO
 
-# Add the src directory to the path for testing
-sys.path.insert(0, str(Path(__file__).parent))
+# Add the src directory to the path for testing (modules live in src/aria)
+sys.path.insert(0, str(Path(__file__).parent.parent / "src"))
+sys.path.insert(0, str(Path(__file__).parent.parent / "src" / "aria"))
 
-# Import modules to test
+# Import modules to test; each one separately so a missing module only
+# affects its own tests
 try:
     from health import HealthChecker, health_check, deep_health_check
+except ImportError as e:
+    print(f"Warning: Could not import health: {e}")
+try:
     from robust_startup import RobustAria, initialize_aria
+except ImportError as e:
+    print(f"Warning: Could not import robust_startup: {e}")
+try:
     from error_handling import (
         AriaError, StartupError, ConfigurationError, 
         ErrorTracker, setup_aria_error_handling
     )
+except ImportError as e:
+    print(f"Warning: Could not import error_handling: {e}")
+try:
     from monitoring import ResourceMonitor, ApplicationMetricsCollector, ComprehensiveMonitor
+except ImportError as e:
+    print(f"Warning: Could not import monitoring: {e}")
+try:
     from validation import EnvironmentValidator, ConfigurationValidator, ComprehensiveValidator
+except ImportError as e:
+    print(f"Warning: Could not import validation: {e}")
+try:
     from api_testing import APIConnectivityTester, TimeoutHandler, CircuitBreaker
 except ImportError as e:
-    print(f"Warning: Could not import all modules for testing: {e}")
+    print(f"Warning: Could not import api_testing: {e}")
 
 
 class TestHealthChecker(unittest.TestCase):
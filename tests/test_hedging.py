@@ -0,0 +1,92 @@
+"""
+Tests for hedged LLM and tool requests.
+"""
+
+import asyncio
+import sys
+import threading
+import time
+import unittest
+from pathlib import Path
+from unittest import mock
+
+sys.path.insert(0, str(Path(__file__).parent.parent / "src"))
+
+from aria import aio, hedging
+from aria.hedging import HedgeBudget, hedged, hedged_async
+
+
+class SlowFirstCall:
+    """The first call takes `slow` seconds, later ones `fast`."""
+
+    def __init__(self, slow: float = 0.5, fast: float = 0.01, fail_first: bool = False):
+        self.slow, self.fast, self.fail_first = slow, fast, fail_first
+        self.calls = 0
+        self._lock = threading.Lock()
+
+    def next_delay(self):
+        with self._lock:
+            self.calls += 1
+            return self.calls, self.slow if self.calls == 1 else self.fast
+
+    def __call__(self):
+        attempt, delay = self.next_delay()
+        time.sleep(delay)
+        if self.fail_first and attempt == 1:
+            raise RuntimeError("first attempt failed")
+        return f"attempt {attempt}"
+
+    async def coroutine(self):
+        attempt, delay = self.next_delay()
+        await asyncio.sleep(delay)
+        return f"attempt {attempt}"
+
+
+class TestHedging(unittest.TestCase):
+
+    def setUp(self):
+        hedging._stats.clear()
+        patcher = mock.patch.object(hedging, "budget", HedgeBudget(ratio=1.0, burst=5))
+        self.budget = patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def test_fast_call_is_not_hedged(self):
+        call = SlowFirstCall(slow=0.01)
+        self.assertEqual(hedged("llm:fast", call, delay=0.2), "attempt 1")
+        self.assertEqual((call.calls, hedging.hedging_stats()["hedged"]), (1, 0))
+
+    def test_slow_call_is_hedged_and_the_first_response_wins(self):
+        call = SlowFirstCall(slow=0.5)
+        started = time.monotonic()
+        self.assertEqual(hedged("llm:slow", call, delay=0.05), "attempt 2")
+        self.assertLess(time.monotonic() - started, 0.4)
+        time.sleep(0.6)
+        stats = hedging.hedging_stats()["endpoints"]["llm:slow"]
+        self.assertEqual((stats["calls"], stats["hedged"], stats["hedge_wins"]), (1, 1, 1))
+        self.assertGreater(stats["saved_s"], 0.3)
+
+    def test_failed_primary_loses_to_the_hedge(self):
+        call = SlowFirstCall(slow=0.2, fail_first=True)
+        self.assertEqual(hedged("llm:flaky", call, delay=0.05), "attempt 2")
+
+    def test_budget_caps_hedges(self):
+        budget = HedgeBudget(ratio=0.5, burst=1)
+        with mock.patch.object(hedging, "budget", budget):
+            results = [hedged("llm:capped", SlowFirstCall(slow=0.1), delay=0.01) for _ in range(4)]
+        # Two calls earn one hedge.
+        self.assertEqual(results, ["attempt 1", "attempt 2", "attempt 1", "attempt 2"])
+        self.assertEqual(budget.denied, 2)
+
+    def test_no_delay_means_no_hedge(self):
+        call = SlowFirstCall(slow=0.05)
+        self.assertEqual(hedged("llm:new", call, delay=None), "attempt 1")
+        self.assertEqual(call.calls, 1)
+
+    def test_async_hedge(self):
+        call = SlowFirstCall(slow=0.5)
+        self.assertEqual(aio.run_sync(hedged_async("hf", call.coroutine, delay=0.05)), "attempt 2")
+        self.assertEqual(hedging.hedging_stats()["hedge_wins"], 1)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,136 @@
+"""
+Tests for the indexed run history.
+"""
+
+import sys
+import tempfile
+import time
+import unittest
+from pathlib import Path
+from unittest import mock
+
+from fastapi.testclient import TestClient
+
+sys.path.insert(0, str(Path(__file__).parent.parent / "src"))
+
+from aria import main
+from aria.admission import AdmissionController
+from aria.batch import CrewResult
+from aria.history import RunHistory, match_query
+
+
+def result(report, tokens=100):
+    tasks = [
+        {"name": "research_task", "agent": "Researcher", "started_at": 1.0, "finished_at": 3.0,
+         "duration_s": 2.0, "output": "findings"},
+        {"name": "summarize_task", "agent": "Summarizer", "started_at": 3.0, "finished_at": 4.5,
+         "duration_s": 1.5, "output": report,
+         "llm_calls": [{"at": 3.5, "model": "gpt-4o-mini", "reason": "primary", "latency_s": 1.2, "ok": True}]},
+    ]
+    return CrewResult(report, {"total_tokens": tokens, "prompt_tokens": tokens, "successful_requests": 2},
+                      {"peak_bytes": 42}, tasks)
+
+
+class TestRunHistory(unittest.TestCase):
+
+    def setUp(self):
+        self.tmp = tempfile.TemporaryDirectory()
+        self.history = RunHistory(str(Path(self.tmp.name) / "history.db"), reuse_hours=1)
+
+    def tearDown(self):
+        self.tmp.cleanup()
+
+    def record(self, topic, report="report", error=None, finished_at=None):
+        finished_at = finished_at or time.time()
+        return self.history.record({"topic": topic, "current_year": "2026"}, finished_at - 5, finished_at,
+                                   result=None if error else result(report), error=error)
+
+    def test_get_returns_inputs_usage_and_tasks(self):
+        run_id = self.record("Quantum sensing", "## Quantum sensing report")
+        run = self.history.get(run_id)
+        self.assertEqual(run["status"], "success")
+        self.assertEqual(run["inputs"], {"topic": "Quantum sensing", "current_year": "2026"})
+        self.assertEqual(run["usage"]["total_tokens"], 100)
+        self.assertEqual(run["total_tokens"], 100)
+        self.assertEqual(run["duration_s"], 5.0)
+        self.assertEqual(run["memory"], {"peak_bytes": 42})
+        self.assertEqual(run["report"], "## Quantum sensing report")
+        self.assertEqual([(t["name"], t["agent"], t["duration_s"]) for t in run["tasks"]],
+                         [("research_task", "Researcher", 2.0), ("summarize_task", "Summarizer", 1.5)])
+        self.assertIsNone(run["tasks"][0]["llm_calls"])
+        self.assertEqual(run["tasks"][1]["llm_calls"][0]["model"], "gpt-4o-mini")
+        self.assertIsNone(self.history.get("missing"))
+
+    def test_failed_runs_are_recorded(self):
+        run_id = self.record("Broken", error="LLM unavailable")
+        run = self.history.get(run_id)
+        self.assertEqual((run["status"], run["error"], run["report"], run["tasks"]),
+                         ("error", "LLM unavailable", None, []))
+
+    def test_list_pages_newest_first(self):
+        ids = [self.record(f"topic {i}") for i in range(7)]
+        seen, cursor = [], None
+        while True:
+            page = self.history.list_runs(limit=3, before=cursor)
+            seen += [run["run_id"] for run in page["runs"]]
+            cursor = page["next_cursor"]
+            if cursor is None:
+                break
+        self.assertEqual(seen, ids[::-1])
+        self.assertNotIn("report", self.history.list_runs()["runs"][0])
+
+    def test_list_filters_by_topic_and_status(self):
+        self.record("Edge AI")
+        self.record("  edge   AI ")
+        self.record("Edge AI", error="boom")
+        self.record("Other")
+        self.assertEqual(len(self.history.list_runs(topic="EDGE ai")["runs"]), 3)
+        self.assertEqual(len(self.history.list_runs(topic="edge ai", status="success")["runs"]), 2)
+
+    def test_search_ranks_and_ignores_query_syntax(self):
+        self.record("Solar cells", "Perovskite solar cells reach new efficiency records. " * 3)
+        self.record("Batteries", "Solid-state batteries; perovskite mentioned once.")
+        self.record("Fusion", "Tokamak confinement.")
+        hits = self.history.search("perovskite")["runs"]
+        self.assertEqual([hit["topic"] for hit in hits], ["Solar cells", "Batteries"])
+        self.assertIn("**Perovskite**", hits[0]["snippet"])
+        self.assertEqual(len(self.history.search("perov*")["runs"]), 2)
+        self.assertEqual(self.history.search('solid-state "batteries" (')["runs"][0]["topic"], "Batteries")
+        self.assertEqual(self.history.search("!!!")["runs"], [])
+
+    def test_warm_reuses_recent_successful_runs_only(self):
+        self.record("LLM agents", "old", finished_at=time.time() - 7200)
+        self.assertIsNone(self.history.warm("LLM agents"))
+        run_id = self.record("LLM agents", "recent")
+        self.record("LLM agents", error="boom")
+        warm = self.history.warm("llm  AGENTS")
+        self.assertEqual((warm["run_id"], warm["report"]), (run_id, "recent"))
+        self.assertEqual(self.history.stats()["reused"], 1)
+
+    def test_reused_runs_take_no_admission_slot(self):
+        self.record("Quantum sensing", "## Quantum sensing report")
+        admission = AdmissionController(capacity=1)
+        admission.pause("memory pressure")
+        with mock.patch.object(main, "run_history", self.history), mock.patch.object(main, "admission", admission):
+            client = TestClient(main.app)
+            response = client.post("/run-crew", json={"topic": "quantum  sensing"})
+            self.assertEqual((response.status_code, response.json()["report"]), (200, "## Quantum sensing report"))
+            self.assertEqual(client.post("/run-crew", json={"topic": "Quantum sensing", "fresh": True}).status_code,
+                             429)
+        self.assertEqual(admission.stats()["admitted"], 0)
+
+    def test_reuse_can_be_disabled(self):
+        history = RunHistory(str(Path(self.tmp.name) / "other.db"), reuse_hours=0)
+        history.record({"topic": "x"}, 0, time.time(), result=result("r"))
+        self.assertIsNone(history.warm("x"))
+
+
+class TestMatchQuery(unittest.TestCase):
+
+    def test_words_are_quoted(self):
+        self.assertEqual(match_query('graph "neural" nets*'), '"graph" AND "neural" AND "nets"*')
+        self.assertEqual(match_query("state-of-the-art"), '"state" "of" "the" "art"')
+
+
+if __name__ == "__main__":
+    unittest.main()
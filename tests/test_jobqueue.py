@@ -0,0 +1,200 @@
+"""
+Tests for the distributed job queue and its SQLite backend.
+"""
+
+import sqlite3
+import sys
+import tempfile
+import threading
+import time
+import unittest
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).parent.parent / "src"))
+
+from aria.admission import AdmissionRejected
+from aria.jobqueue import (FAILED, QUEUED, RUNNING, SUCCEEDED, QueueConsumer, SQLiteJobQueue,
+                           backend_from_url)
+
+
+class Output:
+    def __init__(self, raw):
+        self.raw = raw
+        self.token_usage = {"total_tokens": 7}
+
+
+class TestSQLiteJobQueue(unittest.TestCase):
+    """Leasing, heartbeats and reclaiming of jobs from lost nodes."""
+
+    def setUp(self):
+        self.tmp = tempfile.TemporaryDirectory()
+        self.path = str(Path(self.tmp.name) / "jobs.db")
+        self.queue = SQLiteJobQueue(self.path)
+
+    def tearDown(self):
+        self.tmp.cleanup()
+
+    def test_result_visible_from_another_node(self):
+        job_id = self.queue.enqueue({"topic": "AI"})
+        job = self.queue.claim("node-a")
+        self.assertEqual((job.id, job.status, job.attempts), (job_id, RUNNING, 1))
+        self.assertIsNone(self.queue.claim("node-b"))
+        self.assertTrue(self.queue.complete(job_id, job.lease, {"report": "done"}))
+
+        other_node = SQLiteJobQueue(self.path)
+        job = other_node.get(job_id)
+        self.assertEqual((job.status, job.result), (SUCCEEDED, {"report": "done"}))
+
+    def test_expired_lease_is_reclaimed_and_stale_result_discarded(self):
+        job_id = self.queue.enqueue({"topic": "AI"})
+        stale = self.queue.claim("crashed", lease_seconds=0.05)
+        time.sleep(0.1)
+        job = self.queue.claim("survivor")
+        self.assertEqual((job.id, job.node, job.attempts), (job_id, "survivor", 2))
+        self.assertFalse(self.queue.heartbeat(job_id, stale.lease))
+        self.assertFalse(self.queue.complete(job_id, stale.lease, {"report": "stale"}))
+        self.assertTrue(self.queue.heartbeat(job_id, job.lease))
+        self.assertNotIn("lease", job.to_dict())
+
+    def test_stale_claim_on_the_same_node_cannot_finish_the_job(self):
+        job_id = self.queue.enqueue({"topic": "AI"})
+        stale = self.queue.claim("node-a", lease_seconds=0.05)
+        time.sleep(0.1)
+        job = self.queue.claim("node-a")
+        self.assertNotEqual(job.lease, stale.lease)
+        self.assertFalse(self.queue.fail(job_id, stale.lease, "stale attempt"))
+        self.assertEqual(self.queue.get(job_id).status, RUNNING)
+        self.assertTrue(self.queue.complete(job_id, job.lease, {"report": "done"}))
+
+    def test_gives_up_after_max_attempts(self):
+        job_id = self.queue.enqueue({"topic": "AI"}, max_attempts=1)
+        self.queue.claim("crashed", lease_seconds=0.05)
+        time.sleep(0.1)
+        self.assertIsNone(self.queue.claim("survivor"))
+        self.assertEqual(self.queue.get(job_id).status, FAILED)
+
+    def test_each_job_claimed_once_under_contention(self):
+        for i in range(20):
+            self.queue.enqueue({"topic": f"t{i}"})
+        claimed, lock = [], threading.Lock()
+
+        def node(name):
+            queue = SQLiteJobQueue(self.path)
+            while True:
+                job = queue.claim(name)
+                if job is None:
+                    return
+                with lock:
+                    claimed.append(job.id)
+
+        threads = [threading.Thread(target=node, args=(f"node-{i}",)) for i in range(4)]
+        for t in threads:
+            t.start()
+        for t in threads:
+            t.join()
+        self.assertEqual(len(claimed), 20)
+        self.assertEqual(len(set(claimed)), 20)
+
+    def test_backend_from_url(self):
+        self.assertIsInstance(backend_from_url(f"sqlite:///{self.path}"), SQLiteJobQueue)
+        with self.assertRaises(ValueError):
+            backend_from_url("redis://localhost:6379/0")
+
+
+class TestQueueConsumer(unittest.TestCase):
+    """Consumers on several nodes drain a shared queue."""
+
+    def test_nodes_share_the_queue(self):
+        with tempfile.TemporaryDirectory() as tmp:
+            path = str(Path(tmp) / "jobs.db")
+            queue = SQLiteJobQueue(path)
+            ids = [queue.enqueue({"topic": "bad" if i == 3 else f"t{i}"}) for i in range(8)]
+
+            def run(payload):
+                if payload["topic"] == "bad":
+                    raise RuntimeError("boom")
+                time.sleep(0.02)
+                return Output(f"report on {payload['topic']}")
+
+            consumers = [QueueConsumer(SQLiteJobQueue(path), run, node=f"node-{i}", concurrency=2,
+                                       lease_seconds=0.3, poll_interval=0.01).start() for i in range(2)]
+            deadline = time.monotonic() + 20
+            while queue.stats()[QUEUED] + queue.stats()[RUNNING] and time.monotonic() < deadline:
+                time.sleep(0.02)
+            for consumer in consumers:
+                consumer.stop()
+
+            self.assertEqual(queue.stats(), {QUEUED: 0, RUNNING: 0, SUCCEEDED: 7, FAILED: 1})
+            self.assertEqual(queue.get(ids[0]).result["report"], "report on t0")
+            self.assertIn("boom", queue.get(ids[3]).error)
+            self.assertEqual(sum(c.processed for c in consumers), 8)
+
+    def test_heartbeat_errors_are_retried(self):
+        with tempfile.TemporaryDirectory() as tmp:
+            queue = SQLiteJobQueue(str(Path(tmp) / "jobs.db"))
+            job_id = queue.enqueue({"topic": "AI"})
+            beats = []
+            heartbeat = queue.heartbeat
+
+            def flaky_heartbeat(*args):
+                beats.append(args)
+                if len(beats) == 1:
+                    raise sqlite3.OperationalError("database is locked")
+                return heartbeat(*args)
+
+            queue.heartbeat = flaky_heartbeat
+            consumer = QueueConsumer(queue, lambda payload: time.sleep(0.5) or Output("done"), lease_seconds=0.3)
+            consumer.process(queue.claim(consumer.node, 0.3))
+            self.assertGreaterEqual(len(beats), 3)
+            self.assertEqual(queue.get(job_id).status, SUCCEEDED)
+
+
+    def test_consumer_survives_a_failed_result_write(self):
+        with tempfile.TemporaryDirectory() as tmp:
+            queue = SQLiteJobQueue(str(Path(tmp) / "jobs.db"))
+            first, second = queue.enqueue({"topic": "first"}), queue.enqueue({"topic": "second"})
+            complete, writes = queue.complete, []
+
+            def flaky_complete(*args):
+                writes.append(args[0])
+                if len(writes) == 1:
+                    raise sqlite3.OperationalError("database is locked")
+                return complete(*args)
+
+            queue.complete = flaky_complete
+            consumer = QueueConsumer(queue, lambda payload: Output(payload["topic"]), lease_seconds=0.3,
+                                     poll_interval=0.01).start()
+            deadline = time.monotonic() + 20
+            while queue.stats()[SUCCEEDED] < 2 and time.monotonic() < deadline:
+                time.sleep(0.02)
+            consumer.stop()
+            self.assertEqual(writes[:2], [first, second])
+            # The lost result is produced again once the lease on the first job expires.
+            self.assertEqual((queue.get(first).status, queue.get(second).status), (SUCCEEDED, SUCCEEDED))
+            self.assertEqual(queue.get(first).attempts, 2)
+
+    def test_rejected_jobs_go_back_to_the_queue(self):
+        with tempfile.TemporaryDirectory() as tmp:
+            queue = SQLiteJobQueue(str(Path(tmp) / "jobs.db"))
+            job_id = queue.enqueue({"topic": "AI"}, max_attempts=1)
+            runs, room = [], threading.Event()
+
+            def run(payload):
+                runs.append(payload)
+                if len(runs) == 1:
+                    raise AdmissionRejected("Run shed under memory pressure (95%).", 1)
+                return Output("done")
+
+            consumer = QueueConsumer(queue, run, poll_interval=0.01, ready=room.is_set).start()
+            time.sleep(0.1)
+            self.assertEqual((runs, queue.get(job_id).status), ([], QUEUED))
+            room.set()
+            deadline = time.monotonic() + 20
+            while queue.get(job_id).status != SUCCEEDED and time.monotonic() < deadline:
+                time.sleep(0.02)
+            consumer.stop()
+            job = queue.get(job_id)
+            self.assertEqual((job.status, job.attempts, len(runs)), (SUCCEEDED, 1, 2))
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,135 @@
+"""
+Tests for load-aware throttling driven by the resource monitor.
+"""
+
+import sys
+import tempfile
+import threading
+import time
+import unittest
+from pathlib import Path
+from unittest import mock
+
+sys.path.insert(0, str(Path(__file__).parent.parent / "src"))
+
+from aria.admission import BATCH, INTERACTIVE, AdmissionController, AdmissionRejected
+from aria import monitoring
+from aria.monitoring import ComprehensiveMonitor, ResourceMonitor, ResourceSnapshot, container_memory
+
+
+def snapshot(memory=10.0, cpu=10.0):
+    return ResourceSnapshot(timestamp=time.time(), cpu_percent=cpu, memory_percent=memory, rss_mb=100.0,
+                            memory_limit_mb=2048.0, open_connections=0)
+
+
+class TestThrottling(unittest.TestCase):
+
+    def setUp(self):
+        self.admission = AdmissionController(capacity=1, lane_weights={}, client_weights={})
+        self.monitor = ComprehensiveMonitor(self.admission, ResourceMonitor(collection_interval=1),
+                                            memory_high=80, memory_critical=90, cpu_high=95)
+
+    def queue_waiter(self, lane):
+        outcome = {}
+
+        def run():
+            try:
+                self.admission.acquire(lane, lane, admit=False)
+                outcome["granted"] = True
+                self.admission.release()
+            except AdmissionRejected as e:
+                outcome["rejected"] = e.reason
+
+        thread = threading.Thread(target=run)
+        thread.start()
+        time.sleep(0.05)
+        return thread, outcome
+
+    def test_pauses_with_hysteresis(self):
+        self.monitor.evaluate(snapshot(memory=85))
+        with self.assertRaisesRegex(AdmissionRejected, "memory at 85%"):
+            self.admission.check()
+        self.monitor.evaluate(snapshot(memory=78))  # below high, not below high - margin
+        self.assertIsNotNone(self.admission.paused)
+        self.monitor.evaluate(snapshot(memory=70))
+        self.assertIsNone(self.admission.paused)
+        self.admission.check()
+
+    def test_memory_pause_holds_waiters_until_resume(self):
+        self.admission.acquire("holder")
+        self.monitor.evaluate(snapshot(memory=85))
+        thread, outcome = self.queue_waiter(INTERACTIVE)
+        self.admission.release()
+        time.sleep(0.05)
+        self.assertEqual(outcome, {})
+        self.monitor.evaluate(snapshot())
+        thread.join(5)
+        self.assertEqual(outcome, {"granted": True})
+
+    def test_sustained_cpu_rejects_new_runs_only(self):
+        self.admission.acquire("holder")
+        thread, outcome = self.queue_waiter(INTERACTIVE)
+        self.monitor.evaluate(snapshot(cpu=100))
+        self.assertIsNone(self.admission.paused)  # one busy sample is not sustained load
+        for _ in range(2):
+            self.monitor.evaluate(snapshot(cpu=100))
+        with self.assertRaisesRegex(AdmissionRejected, "CPU"):
+            self.admission.check()
+        self.admission.release()
+        thread.join(5)
+        self.assertEqual(outcome, {"granted": True})
+
+    def test_critical_memory_sheds_waiting_batch_runs(self):
+        self.admission.acquire("holder")
+        batch, batch_outcome = self.queue_waiter(BATCH)
+        interactive, interactive_outcome = self.queue_waiter(INTERACTIVE)
+        self.monitor.evaluate(snapshot(memory=95))
+        batch.join(5)
+        self.assertIn("memory pressure", batch_outcome["rejected"])
+        self.assertEqual(self.monitor.shed_runs, 1)
+        self.monitor.evaluate(snapshot())
+        self.admission.release()
+        interactive.join(5)
+        self.assertEqual(interactive_outcome, {"granted": True})
+
+
+class TestResourceMonitor(unittest.TestCase):
+
+    def test_job_attribution(self):
+        monitor = ResourceMonitor(collection_interval=1)
+        with monitor.track_job("busy") as usage:
+            monitor.sample()
+            end = time.process_time() + 0.05
+            while time.process_time() < end:
+                pass
+        self.assertGreater(usage.cpu_seconds, 0)
+        self.assertGreater(usage.peak_rss_mb, 0)
+        self.assertEqual(monitor.get_summary()["recent_jobs"][0]["job"], "busy")
+
+
+class TestContainerMemory(unittest.TestCase):
+
+    def read(self, files):
+        with tempfile.TemporaryDirectory() as root:
+            for name, text in files.items():
+                path = Path(root) / name
+                path.parent.mkdir(parents=True, exist_ok=True)
+                path.write_text(text)
+            with mock.patch.object(monitoring, "CGROUP_ROOT", Path(root)):
+                return container_memory()
+
+    def test_inactive_page_cache_is_not_counted(self):
+        mb = 1024 * 1024
+        self.assertEqual(self.read({"memory.current": f"{400 * mb}\n", "memory.max": f"{512 * mb}\n",
+                                    "memory.stat": f"anon {100 * mb}\ninactive_file {250 * mb}\n"}),
+                         (150 * mb, 512 * mb))
+        self.assertEqual(self.read({"memory/memory.usage_in_bytes": f"{400 * mb}",
+                                    "memory/memory.limit_in_bytes": f"{512 * mb}",
+                                    "memory/memory.stat": f"inactive_file {10 * mb}\n"
+                                                          f"total_inactive_file {300 * mb}\n"}),
+                         (100 * mb, 512 * mb))
+        self.assertEqual(self.read({"memory.current": f"{400 * mb}", "memory.max": "max"}), (400 * mb, None))
+
+
+if __name__ == "__main__":
+    unittest.main()
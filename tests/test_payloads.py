@@ -0,0 +1,141 @@
+"""
+Tests for typed tool results and task payloads.
+"""
+
+import os
+import sys
+import unittest
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).parent.parent / "src"))
+
+os.environ.setdefault("CREWAI_DISABLE_TELEMETRY", "true")
+os.environ.setdefault("OTEL_SDK_DISABLED", "true")
+
+from crewai import Agent, Task
+from crewai.llms.base_llm import BaseLLM
+
+from aria.claims import ClaimDeduplicator, shared_verdicts
+from aria.crew import CompactingCrew
+from aria.payloads import (Claim, Evidence, Findings, PayloadBuilder, Publication, Publications, Source, Summary,
+                           tool_output, use_tool_records)
+from aria.tools.cache import ToolResultCache, cached_result, use_cache
+
+RESEARCH = """Thought: I now know the final answer
+Final Answer: Here is what I found about edge AI.
+- Edge AI runs models on local devices.
+- Edge AI reduces latency for real-time applications.
+Overall the field is growing quickly."""
+
+REUTERS = Source(title="Edge AI cuts latency", provider="Reuters", url="https://example.com/edge")
+
+
+class EvidenceTool:
+    name = "Evidence Tool"
+
+    @shared_verdicts
+    @cached_result
+    def _run(self, statement: str):
+        return Evidence(statement=statement, sources=[REUTERS])
+
+
+class ScriptedLLM(BaseLLM):
+    """Answers the calls of a run in turn, keeping the prompts it saw."""
+
+    def __init__(self, answers):
+        super().__init__(model="scripted")
+        self.answers = list(answers)
+        self.prompts = []
+
+    def call(self, messages, tools=None, callbacks=None, available_functions=None, from_task=None, from_agent=None):
+        self.prompts.append(messages if isinstance(messages, str) else messages[-1]["content"])
+        return self.answers.pop(0)
+
+
+class TestPayloads(unittest.TestCase):
+
+    def test_findings_keep_the_bullets(self):
+        findings = Findings.parse(RESEARCH)
+        self.assertEqual([claim.text for claim in findings.claims],
+                         ["Edge AI runs models on local devices.", "Edge AI reduces latency for real-time applications."])
+        self.assertEqual(findings.render(), "Claims:\n- Edge AI runs models on local devices.\n"
+                                            "- Edge AI reduces latency for real-time applications.\n"
+                                            "Notes:\nHere is what I found about edge AI.\n"
+                                            "Overall the field is growing quickly.")
+        self.assertIsNone(Findings.parse("Final Answer: nothing to list"))
+
+    def test_findings_keep_sources_and_notes(self):
+        findings = Findings.parse("""Final Answer:
+- Edge AI runs models on local devices
+  such as phones and cameras.
+  Source: Edge AI survey (Reuters) https://example.com/edge
+- Edge AI reduces latency for real-time applications.
+https://example.com/latency
+
+Removed: "Edge AI needs no power" - no source confirms it.""")
+        self.assertEqual([(claim.text, claim.details) for claim in findings.claims], [
+            ("Edge AI runs models on local devices", ["such as phones and cameras.",
+                                                      "Source: Edge AI survey (Reuters) https://example.com/edge"]),
+            ("Edge AI reduces latency for real-time applications.", ["https://example.com/latency"]),
+        ])
+        self.assertEqual(findings.notes, ['Removed: "Edge AI needs no power" - no source confirms it.'])
+        self.assertIn("- Edge AI runs models on local devices\n  such as phones and cameras.\n"
+                      "  Source: Edge AI survey (Reuters) https://example.com/edge\n", findings.render())
+        wrapped = Findings.parse("- Edge AI runs models\non local devices.\n- Edge AI cuts latency.")
+        self.assertEqual([claim.text for claim in wrapped.claims],
+                         ["Edge AI runs models on local devices.", "Edge AI cuts latency."])
+
+    def test_summary_sections(self):
+        summary = Summary.parse("Final Answer: ## Latency\n- Local inference\nNo round trip.\n## Cost\n- Less cloud")
+        self.assertEqual([(s.heading, s.points) for s in summary.sections],
+                         [("Latency", ["Local inference", "No round trip."]), ("Cost", ["Less cloud"])])
+        self.assertEqual(summary.render(), "## Latency\n- Local inference\n- No round trip.\n## Cost\n- Less cloud")
+
+    def test_duplicate_claims_merge_their_sources(self):
+        bbc = Source(title="Edge", provider="BBC", url="https://example.com/bbc")
+        findings = Findings(claims=[Claim(text="Edge AI reduces latency.", sources=[REUTERS]),
+                                    Claim(text="Edge AI reduced latency", sources=[bbc]),
+                                    Claim(text="Edge AI runs on phones.")])
+        deduper = ClaimDeduplicator(["fact_check"])
+        [kept] = deduper.dedupe("fact_check", [findings])
+        self.assertEqual([claim.text for claim in kept.claims], ["Edge AI reduces latency.", "Edge AI runs on phones."])
+        self.assertEqual(kept.claims[0].sources, [REUTERS, bbc])
+        self.assertEqual(deduper.last_stats["fact_check"], {"claims": 3, "kept": 2})
+
+    def test_builder_adds_what_the_tools_returned(self):
+        builder = PayloadBuilder({"research": "findings"})
+        publications = Publications(query="edge ai", items=[Publication(title="Edge AI Survey", year="2025")])
+        with use_tool_records(builder.records):
+            builder.records.task = "research"
+            self.assertTrue(tool_output(publications).startswith("Top results:\n• Edge AI Survey (2025)"))
+            tool_output(Evidence(statement="Edge AI lowers latency for real-time applications", sources=[REUTERS]))
+        findings = builder.build("research", RESEARCH)
+        self.assertEqual(findings.publications, publications.items)
+        self.assertEqual([claim.sources for claim in findings.claims], [[], [REUTERS]])
+        self.assertIn("[Reuters https://example.com/edge]", findings.render())
+        self.assertIsNone(builder.build("write", RESEARCH))
+
+    def test_copied_verdicts_stay_records(self):
+        tool = EvidenceTool()
+        with use_cache(ToolResultCache()) as cache:
+            ClaimDeduplicator(["check"]).dedupe("check", ["- Edge AI reduces latency.\n- Edge AI reduced latency"])
+            copied = tool._run(statement="Edge AI reduced latency")
+        self.assertEqual((copied.statement, copied.same_as), ("Edge AI reduced latency", "Edge AI reduces latency."))
+        self.assertTrue(str(copied).startswith("Same claim as 'Edge AI reduces latency.'; verdict copied.\n"))
+        self.assertEqual(cache.misses, 1)
+
+    def test_next_task_gets_the_rendered_payload(self):
+        llm = ScriptedLLM([RESEARCH, "Final Answer: done"])
+        agent = Agent(role="Analyst", goal="Answer", backstory="Quick.", llm=llm)
+        tasks = [Task(name=name, description=f"Do the {name}.", expected_output="Text.", agent=agent)
+                 for name in ("research", "write")]
+        crew = CompactingCrew(agents=[agent], tasks=tasks, payload_builder=PayloadBuilder({"research": "findings"}))
+        crew.kickoff()
+        self.assertIsInstance(tasks[0].output.pydantic, Findings)
+        self.assertIn("Claims:\n- Edge AI runs models on local devices.", llm.prompts[1])
+        self.assertIn("Notes:\nHere is what I found about edge AI.\nOverall the field is growing quickly.",
+                      llm.prompts[1])
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,74 @@
+"""
+Tests for speculative prefetch of tool results at run start.
+"""
+
+import sys
+import threading
+import unittest
+from pathlib import Path
+from unittest import mock
+
+sys.path.insert(0, str(Path(__file__).parent.parent / "src"))
+
+from aria import prefetch
+from aria.tools.cache import ToolResultCache, cached_result, use_cache
+
+
+class SlowTool:
+    name = "Slow Tool"
+
+    def __init__(self):
+        self.calls = []
+        self.release = threading.Event()
+
+    @cached_result
+    def _run(self, query: str) -> str:
+        self.calls.append(query)
+        self.release.wait(5)
+        return f"result for {query}"
+
+
+class TestSpeculativeCalls(unittest.TestCase):
+
+    def test_queries_come_from_the_run_inputs(self):
+        with mock.patch.multiple(prefetch, SCHOLAR_QUERIES="{topic}|{topic} {current_year}|{missing}|{TOPIC}",
+                                 FACT_CHECK_QUERIES="{topic}"):
+            calls = prefetch.speculative_calls({"topic": "Edge AI", "current_year": "2026"})
+        self.assertEqual([(tool.name, kwargs) for tool, kwargs in calls], [
+            ("Scholar Search", {"query": "Edge AI"}),
+            ("Scholar Search", {"query": "Edge AI 2026"}),
+            ("Fact Checker", {"statement": "Edge AI"}),
+        ])
+
+
+class TestPrefetch(unittest.TestCase):
+
+    def test_agent_call_joins_the_prefetch_in_flight(self):
+        tool, cache = SlowTool(), ToolResultCache()
+        with mock.patch.object(prefetch, "speculative_calls",
+                               return_value=[(tool, {"query": "edge ai"}), (tool, {"query": "unused"})]):
+            run = prefetch.start_prefetch({"topic": "Edge AI"}, cache)
+        while len(tool.calls) < 2:
+            threading.Event().wait(0.01)
+        threading.Timer(0.05, tool.release.set).start()
+        with use_cache(cache):
+            self.assertEqual(tool._run(query="Edge AI"), "result for edge ai")
+        report = run.finish()
+        self.assertEqual(tool.calls, ["edge ai", "unused"])
+        self.assertEqual((report["issued"], report["used"]), (2, 1))
+
+    def test_totals(self):
+        with mock.patch.dict(prefetch._totals, {"runs": 0, "issued": 0, "used": 0}):
+            prefetch.record_prefetch({"issued": 3, "used": 1})
+            prefetch.record_prefetch({"issued": 1, "used": 1})
+            prefetch.record_prefetch(None)
+            stats = prefetch.prefetch_stats()
+        self.assertEqual((stats["runs"], stats["issued"], stats["used"], stats["hit_rate"]), (2, 4, 2, 0.5))
+
+    def test_disabled(self):
+        with mock.patch.object(prefetch, "PREFETCH", False):
+            self.assertIsNone(prefetch.start_prefetch({"topic": "Edge AI"}, ToolResultCache()))
+
+
+if __name__ == "__main__":
+    unittest.main()
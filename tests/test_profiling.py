@@ -0,0 +1,91 @@
+"""
+Tests for on-demand profiling of crew runs.
+"""
+
+import json
+import pstats
+import sys
+import tempfile
+import threading
+import time
+import unittest
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).parent.parent / "src"))
+
+from aria.profiling import (CPROFILE, SAMPLING, ProfilingControl, RunProfiler, SamplingProfiler, split_profile,
+                            with_profile)
+
+
+def busy(seconds: float) -> int:
+    total, end = 0, time.perf_counter() + seconds
+    while time.perf_counter() < end:
+        total += sum(range(100))
+    return total
+
+
+class TestRunProfiler(unittest.TestCase):
+
+    def test_cprofile_writes_pstats(self):
+        with tempfile.TemporaryDirectory() as directory:
+            with RunProfiler(CPROFILE, Path(directory) / "run") as profiler:
+                busy(0.05)
+            stats = pstats.Stats(profiler.result["path"])
+            self.assertTrue(any(name == "busy" for _, _, name in stats.stats))
+        self.assertEqual(profiler.result["mode"], CPROFILE)
+        self.assertTrue(any("busy" in row["function"] for row in profiler.result["top"]))
+
+    def test_sampling_writes_collapsed_stacks(self):
+        with tempfile.TemporaryDirectory() as directory:
+            with RunProfiler(SAMPLING, Path(directory)) as profiler:
+                busy(0.2)
+            lines = Path(profiler.result["path"]).read_text().splitlines()
+        self.assertGreater(profiler.result["samples"], 5)
+        self.assertTrue(all(line.rsplit(" ", 1)[1].isdigit() for line in lines))
+        self.assertTrue(any("busy (test_profiling.py" in line for line in lines))
+        self.assertEqual(profiler.result["share"]["python"], 1.0)
+
+    def test_sampler_follows_one_thread(self):
+        stop = threading.Event()
+        other = threading.Thread(target=stop.wait)
+        other.start()
+        sampler = SamplingProfiler(other.ident, interval_s=0.005).start()
+        busy(0.1)
+        sampler.stop()
+        stop.set()
+        other.join()
+        self.assertGreater(sampler.samples, 0)
+        self.assertFalse(any("busy" in stack for stack in sampler.stacks))
+
+    def test_unknown_mode(self):
+        with self.assertRaises(ValueError):
+            RunProfiler("perf", Path("."))
+
+
+class TestProfilingRequests(unittest.TestCase):
+
+    def test_mode_travels_with_the_inputs(self):
+        inputs = json.loads(json.dumps(with_profile({"topic": "AI"}, SAMPLING)))
+        self.assertEqual(split_profile(inputs), ({"topic": "AI"}, SAMPLING))
+        plain = {"topic": "AI"}
+        self.assertIs(with_profile(plain, None), plain)
+        self.assertEqual(split_profile({"topic": "AI"}), ({"topic": "AI"}, None))
+        with self.assertRaises(ValueError):
+            with_profile({"topic": "AI"}, "perf")
+
+    def test_armed_for_the_next_runs(self):
+        control = ProfilingControl()
+        self.assertIsNone(control.take())
+        control.arm(CPROFILE, runs=2)
+        self.assertEqual([control.take(), control.take(), control.take()], [CPROFILE, CPROFILE, None])
+        self.assertIsNone(control.status()["armed"])
+        control.arm(SAMPLING, runs=5)
+        control.arm(None)
+        self.assertEqual((control.status()["armed"], control.take()), (None, None))
+        control.record("edge ai", {"mode": SAMPLING, "path": "/tmp/profile.collapsed"})
+        control.record("no profile", None)
+        self.assertEqual([entry["topic"] for entry in control.status()["recent"]], ["edge ai"])
+
+
+if __name__ == "__main__":
+    unittest.main()
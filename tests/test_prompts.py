@@ -0,0 +1,94 @@
+"""
+Tests for precompiled prompt templates and the stable prompt layout.
+"""
+
+import os
+import sys
+import unittest
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).parent.parent / "src"))
+
+os.environ.setdefault("CREWAI_DISABLE_TELEMETRY", "true")
+os.environ.setdefault("OTEL_SDK_DISABLED", "true")
+
+import yaml
+from crewai import Agent, Task
+from crewai.llms.base_llm import BaseLLM
+from crewai.utilities.string_utils import interpolate_only
+
+from aria.crew import CompactingCrew
+from aria.prompts import (PrefixTokenCache, compile_template, message_tokens, prefix_cache, stable_prompt_file,
+                          use_prompt_stats)
+from aria.tokens import count_tokens
+
+CONFIG = Path(__file__).parent.parent / "src" / "aria" / "config"
+
+
+class RecordingLLM(BaseLLM):
+    """Answers every call at once, keeping the messages it was sent."""
+
+    def __init__(self):
+        super().__init__(model="recording")
+        self.calls = []
+
+    def call(self, messages, tools=None, callbacks=None, available_functions=None, from_task=None, from_agent=None):
+        self.calls.append(list(messages))
+        return "Final Answer: done"
+
+
+class TestPromptTemplates(unittest.TestCase):
+
+    def test_render_matches_crewai(self):
+        inputs = {"topic": "Edge AI", "current_year": 2026}
+        for name in ("agents.yaml", "tasks.yaml"):
+            for config in yaml.safe_load((CONFIG / name).read_text(encoding="utf-8")).values():
+                for text in config.values():
+                    if isinstance(text, str):
+                        self.assertEqual(compile_template(text).render(inputs), interpolate_only(text, inputs))
+        template = compile_template('Research {topic} as of {current_year}; keep {"json": 1}.')
+        self.assertEqual((template.parts[0], template.slots), ("Research ", ("topic", "current_year")))
+        self.assertIs(compile_template(template.text), template)
+        with self.assertRaises(KeyError):
+            template.render({"topic": "Edge AI"})
+
+    def test_crew_renders_every_kickoff_from_the_templates(self):
+        llm = RecordingLLM()
+        agent = Agent(role="{topic} Researcher", goal="Research {topic}", backstory="You research.", llm=llm)
+        task = Task(description="Research {topic} in {current_year}.", expected_output="Notes on {topic}.",
+                    agent=agent)
+        for topic in ("Edge AI", "Quantum sensing"):
+            CompactingCrew(agents=[agent], tasks=[task], prompt_file=stable_prompt_file()).kickoff(
+                inputs={"topic": topic, "current_year": "2026"})
+        self.assertEqual((agent.role, task.description),
+                         ("Quantum sensing Researcher", "Research Quantum sensing in 2026."))
+        (first_system, first_task), (second_system, _) = llm.calls
+        # Same system prompt for both topics; the role and goal come with the task.
+        self.assertEqual(first_system, second_system)
+        self.assertNotIn("Edge AI", first_system["content"])
+        self.assertIn("You are Edge AI Researcher. Your personal goal is: Research Edge AI", first_task["content"])
+        with self.assertRaises(ValueError):
+            CompactingCrew(agents=[agent], tasks=[task]).kickoff(inputs={"current_year": "2026"})
+
+
+class TestPrefixTokens(unittest.TestCase):
+
+    def test_static_prefixes_are_tokenized_once(self):
+        cache = PrefixTokenCache(maxsize=2)
+        for text in ("You research.", "You write.", "You research.", "You review.", "You write."):
+            self.assertEqual(cache.count(text), count_tokens(text))
+        self.assertEqual(cache.stats(), {"entries": 2, "lookups": 5, "hits": 1, "hit_rate": 0.2})
+
+    def test_message_tokens_use_the_cache_for_system_messages(self):
+        messages = [{"role": "system", "content": "You check facts. " * 20},
+                    {"role": "user", "content": "Verify: Edge AI cuts latency."}]
+        with use_prompt_stats() as stats:
+            first, second = message_tokens(messages), message_tokens(messages)
+        self.assertEqual(first, sum(count_tokens(message["content"]) for message in messages))
+        self.assertEqual((second, stats["prefix_lookups"], stats["prefix_hits"]), (first, 2, 1))
+        self.assertGreaterEqual(prefix_cache.hits, 1)
+        self.assertEqual(message_tokens("Verify this."), count_tokens("Verify this."))
+
+
+if __name__ == "__main__":
+    unittest.main()
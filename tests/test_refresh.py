@@ -0,0 +1,202 @@
+"""
+Tests for incremental refreshes of earlier reports.
+"""
+
+import json
+import os
+import sys
+import tempfile
+import time
+import unittest
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).parent.parent / "src"))
+
+os.environ.setdefault("CREWAI_DISABLE_TELEMETRY", "true")
+os.environ.setdefault("OTEL_SDK_DISABLED", "true")
+
+from crewai import Agent, Task
+from crewai.llms.base_llm import BaseLLM
+
+from aria.batch import CrewResult
+from aria.crew import CompactingCrew
+from aria.history import RunHistory
+from aria.payloads import Claim, Findings, PayloadBuilder
+from aria.refresh import (Baseline, ReportRefresher, VerifiedClaim, merge_sections, split_refresh, split_sections,
+                          with_refresh)
+
+REPORT = """# Edge AI
+
+Edge AI moves inference out of the data centre.
+
+## Devices
+Edge AI runs models on local devices such as phones and cameras.
+
+## Latency
+Edge AI cuts latency for real-time applications like driving.
+
+## Conclusion
+The field is growing quickly.
+"""
+
+DEVICES = "Edge AI runs models on local devices."
+LATENCY = "Edge AI reduces latency for real-time applications."
+NO_LATENCY = "Edge AI does not reduce latency for real-time applications."
+RESEARCH = f"""Thought: I now know the final answer
+Final Answer: New since the last report:
+- {DEVICES}
+- {LATENCY}"""
+
+ROLES = {"research": "research", "verify": "verify", "write": "sections"}
+
+
+def baseline(*claims, age_days=1.0):
+    verified_at = time.time() - age_days * 86400.0
+    return Baseline(run_id="run-1", finished_at=verified_at, since="2025", report=REPORT,
+                    claims=[VerifiedClaim(text=text, verified_at=verified_at) for text in claims])
+
+
+class ScriptedLLM(BaseLLM):
+    """Answers the calls of a run in turn, keeping the prompts it saw."""
+
+    def __init__(self, answers):
+        super().__init__(model="scripted")
+        self.answers = list(answers)
+        self.prompts = []
+
+    def call(self, messages, tools=None, callbacks=None, available_functions=None, from_task=None, from_agent=None):
+        self.prompts.append(messages if isinstance(messages, str) else messages[-1]["content"])
+        return self.answers.pop(0)
+
+
+class TestSections(unittest.TestCase):
+
+    def test_split_by_the_repeated_heading_level(self):
+        sections = split_sections(REPORT)
+        self.assertEqual([heading for heading, _ in sections], ["", "Devices", "Latency", "Conclusion"])
+        self.assertTrue(sections[0][1].startswith("# Edge AI"))
+        self.assertEqual(split_sections("Just text."), [("", "Just text.")])
+
+    def test_merge_replaces_and_adds_before_the_conclusion(self):
+        merged = merge_sections(REPORT, "## latency\nLatency is now under 5 ms.\n\n## Chips\nNew NPUs ship.")
+        self.assertEqual([heading for heading, _ in split_sections(merged)],
+                         ["", "Devices", "latency", "Chips", "Conclusion"])
+        self.assertIn("Latency is now under 5 ms.", merged)
+        self.assertNotIn("like driving", merged)
+        unheaded = merge_sections(REPORT, "NPUs ship in laptops.")
+        self.assertIn("## Recent Developments\n\nNPUs ship in laptops.\n\n## Conclusion", unheaded)
+
+
+class TestReportRefresher(unittest.TestCase):
+
+    def test_only_new_and_expired_claims_are_verified(self):
+        old = baseline(DEVICES, age_days=90)
+        old.claims.append(VerifiedClaim(text="Edge AI chips use 10 W.", verified_at=time.time()))
+        refresher = ReportRefresher(ROLES, old)
+        findings = Findings(claims=[Claim(text=DEVICES), Claim(text=LATENCY), Claim(text="Edge AI chips use 10 W")])
+        [upstream] = refresher.filter_upstream("verify", [findings])
+        self.assertEqual([claim.text for claim in upstream.claims], [LATENCY, DEVICES])
+        self.assertEqual(refresher.to_verify, 2)
+        # The fact checker confirms the new claim but no longer the expired one.
+        refresher.finished("verify", "", Findings(claims=[Claim(text=LATENCY)]))
+        self.assertEqual([claim.text for claim in refresher.new_claims], [LATENCY])
+        self.assertEqual([claim.text for claim in refresher.dropped], [DEVICES])
+        self.assertEqual([claim["text"] for claim in refresher.verified_claims()], ["Edge AI chips use 10 W.", LATENCY])
+        self.assertEqual([heading for heading, _ in refresher.affected_sections()], ["Devices", "Latency"])
+        stats = refresher.stats()
+        self.assertEqual((stats["carried_claims"], stats["new_claims"], stats["dropped_claims"]), (1, 1, 1))
+        context = refresher.context("write", "Summary.")
+        self.assertTrue(context.startswith("Summary.\n\n"))
+        self.assertIn(f"no longer confirmed:\n- {DEVICES}", context)
+
+    def test_nothing_new_skips_the_rest(self):
+        refresher = ReportRefresher(ROLES, baseline(DEVICES, LATENCY))
+        refresher.filter_upstream("verify", [Findings(claims=[Claim(text=DEVICES), Claim(text=LATENCY)])])
+        self.assertIsNone(refresher.skip("research"))
+        self.assertIn("run-1", refresher.skip("verify"))
+        self.assertTrue(refresher.stats()["unchanged"])
+
+    def test_without_a_baseline_claims_are_collected(self):
+        refresher = ReportRefresher(ROLES)
+        self.assertEqual(refresher.context("research", "ctx"), "ctx")
+        self.assertEqual(refresher.finished("verify", f"Final Answer:\n- {LATENCY}"), f"Final Answer:\n- {LATENCY}")
+        self.assertEqual([claim["text"] for claim in refresher.verified_claims()], [LATENCY])
+        self.assertIsNone(refresher.stats())
+        with self.assertRaises(ValueError):
+            ReportRefresher({"write": "rewrite"})
+
+    def test_baseline_travels_with_the_inputs(self):
+        old = baseline(DEVICES)
+        inputs = json.loads(json.dumps(with_refresh({"topic": "Edge AI"}, old)))
+        self.assertEqual(split_refresh(inputs), ({"topic": "Edge AI"}, old))
+        plain = {"topic": "Edge AI"}
+        self.assertIs(with_refresh(plain, None), plain)
+        self.assertEqual(split_refresh(plain), (plain, None))
+
+    def test_history_keeps_the_claims_of_the_latest_run(self):
+        with tempfile.TemporaryDirectory() as directory:
+            history = RunHistory(str(Path(directory) / "history.db"), reuse_hours=0)
+            claims = [{"text": LATENCY, "sources": [], "verified_at": time.time()}]
+            history.record({"topic": "Edge AI", "current_year": "2025"}, 1.0, 2.0, result=CrewResult(REPORT, None))
+            history.record({"topic": "edge  ai", "current_year": "2025"}, 3.0, 4.0,
+                           result=CrewResult(REPORT, None, claims=claims))
+            history.record({"topic": "Edge AI"}, 5.0, 6.0, error="LLM unavailable")
+            old = Baseline.from_run(history.latest("EDGE AI"))
+            self.assertIsNone(history.warm("Edge AI"))
+            self.assertIsNone(history.latest("Quantum"))
+        self.assertEqual((old.since, old.report, old.claims[0].text), ("2025", REPORT, LATENCY))
+
+
+class TestRefreshRun(unittest.TestCase):
+
+    def run_crew(self, old, answers):
+        llm = ScriptedLLM(answers)
+        agent = Agent(role="Analyst", goal="Answer", backstory="Quick.", llm=llm)
+        tasks = [Task(name=name, description=f"Do the {name}.", expected_output="Text.", agent=agent)
+                 for name in ("research", "verify", "write")]
+        crew = CompactingCrew(agents=[agent], tasks=tasks, refresher=ReportRefresher(ROLES, old),
+                              payload_builder=PayloadBuilder({"research": "findings", "verify": "findings"}))
+        return crew, crew.kickoff(), llm
+
+    def test_unchanged_topic_returns_the_earlier_report(self):
+        crew, output, llm = self.run_crew(baseline(DEVICES, LATENCY), [RESEARCH])
+        self.assertEqual(output.raw, REPORT)
+        self.assertEqual(crew.skipped_tasks, ["verify", "write"])
+        self.assertFalse(crew.partial)
+        self.assertIn("published in 2025 or later", llm.prompts[0])
+
+    def test_new_claim_rewrites_its_section(self):
+        crew, output, llm = self.run_crew(baseline(DEVICES), [
+            RESEARCH,
+            f"Final Answer:\n- {LATENCY}",
+            "Final Answer: ## Latency\nEdge AI reduces latency below 5 ms for real-time applications.",
+        ])
+        self.assertIn(f"- {LATENCY}", llm.prompts[1])
+        self.assertNotIn(f"- {DEVICES}", llm.prompts[1])
+        self.assertIn("## Latency\nEdge AI cuts latency", llm.prompts[2])
+        self.assertNotIn("## Devices", llm.prompts[2])
+        self.assertEqual([heading for heading, _ in split_sections(output.raw)],
+                         ["", "Devices", "Latency", "Conclusion"])
+        self.assertIn("below 5 ms", output.raw)
+        self.assertEqual(crew.refresher.stats()["updated_sections"], ["Latency"])
+        self.assertEqual(len(crew.refresher.verified_claims()), 2)
+
+
+    def test_contradicting_claim_is_verified_and_replaces_the_old_one(self):
+        crew, output, llm = self.run_crew(baseline(DEVICES, LATENCY), [
+            f"Final Answer:\n- {DEVICES}\n- {NO_LATENCY}",
+            f"Final Answer:\n- {NO_LATENCY}",
+            "Final Answer: ## Latency\nEdge AI no longer cuts latency once models are offloaded.",
+        ])
+        self.assertIn(f"- {NO_LATENCY}", llm.prompts[1])
+        self.assertNotIn(f"- {DEVICES}", llm.prompts[1])
+        self.assertIn(f"no longer confirmed:\n- {LATENCY}", llm.prompts[2])
+        self.assertIn("## Latency\nEdge AI cuts latency", llm.prompts[2])
+        self.assertIn("no longer cuts latency", output.raw)
+        self.assertNotIn("Edge AI cuts latency", output.raw)
+        self.assertEqual([claim["text"] for claim in crew.refresher.verified_claims()], [DEVICES, NO_LATENCY])
+        stats = crew.refresher.stats()
+        self.assertEqual((stats["new_claims"], stats["dropped_claims"], stats["unchanged"]), (1, 1, False))
+
+if __name__ == "__main__":
+    unittest.main()
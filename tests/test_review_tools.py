@@ -0,0 +1,125 @@
+"""
+Tests for the streaming report reviewer.
+"""
+
+import os
+import re
+import sys
+import tempfile
+import threading
+import unittest
+from pathlib import Path
+from unittest import mock
+
+sys.path.insert(0, str(Path(__file__).parent.parent / "src"))
+
+os.environ.setdefault("CREWAI_DISABLE_TELEMETRY", "true")
+os.environ.setdefault("OTEL_SDK_DISABLED", "true")
+
+from language_tool_python.match import Match
+from language_tool_python.utils import correct
+
+from aria.artifacts import RunArtifacts, use_run_artifacts
+from aria.tools import review_tools
+from aria.tools.review_tools import ReviewerTool, apply_matches, sections
+
+PAGE = """# Edge AI
+
+Edge AI runs runs models on local devices.
+
+## Latency
+Latency drops drops for real-time applications.
+"""
+
+
+class RepeatChecker:
+    """Flags repeated words, like LanguageTool's ENGLISH_WORD_REPEAT_RULE; keeps the texts it was sent."""
+
+    def __init__(self):
+        self.texts = []
+
+    def check(self, text):
+        self.texts.append(text)
+        return [Match({"message": "Possible typo: you repeated a word", "replacements": [{"value": m.group(1)}],
+                       "offset": m.start(), "length": m.end() - m.start(), "context": {"text": text, "offset": 0},
+                       "rule": {"id": "ENGLISH_WORD_REPEAT_RULE", "issueType": "duplication",
+                                "category": {"id": "MISC"}}}, text)
+                for m in re.finditer(r"\b(\w+) \1\b", text)]
+
+
+class TestReviewerTool(unittest.TestCase):
+
+    def setUp(self):
+        self.tmp = tempfile.TemporaryDirectory()
+        self.path = Path(self.tmp.name) / "report_corrected.md"
+        self.checker = RepeatChecker()
+        patcher = mock.patch.object(ReviewerTool, "language_tool", self.checker)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def tearDown(self):
+        self.tmp.cleanup()
+
+    def test_sections_cover_the_text_and_end_before_headings(self):
+        text = "\n".join([PAGE] * 20)
+        bounds = list(sections(text, max_chars=300))
+        self.assertEqual("".join(text[start:end] for start, end in bounds), text)
+        self.assertTrue(all(end - start <= 300 for start, end in bounds))
+        self.assertTrue(all(text.startswith("#", start) for start, _ in bounds))
+        self.assertEqual(list(sections("x" * 25, max_chars=10)), [(0, 10), (10, 20), (20, 25)])
+
+    def test_matches_applied_like_language_tool(self):
+        matches = self.checker.check(PAGE)
+        self.assertEqual(apply_matches(PAGE, matches), (correct(PAGE, matches), 2))
+
+    def test_corrected_report_streamed_to_the_output_file(self):
+        report = "\n".join([PAGE] * 50)
+        with mock.patch.object(review_tools, "CHUNK_CHARS", 500), mock.patch.object(review_tools, "MAX_PATCHES", 3):
+            answer = ReviewerTool(output_file=str(self.path))._run(report)
+        self.assertEqual(self.path.read_text(encoding="utf-8"), report.replace("runs runs", "runs")
+                         .replace("drops drops", "drops"))
+        self.assertGreater(len(self.checker.texts), 10)
+        self.assertLessEqual(max(map(len, self.checker.texts)), 500)
+        self.assertIn("100 corrections applied", answer)
+        self.assertIn('- line 3: "runs runs" → "runs" (ENGLISH_WORD_REPEAT_RULE)\n'
+                      '- line 6: "drops drops" → "drops" (ENGLISH_WORD_REPEAT_RULE)\n'
+                      '- line 10: "runs runs" → "runs" (ENGLISH_WORD_REPEAT_RULE)\n'
+                      '- … and 97 more', answer)
+        self.assertIn("ENGLISH_WORD_REPEAT_RULE: Possible typo: you repeated a word (×100)", answer)
+        # The answer lists corrections; the report is not repeated.
+        self.assertLess(len(answer), 1000)
+
+    def test_failed_check_leaves_no_partial_file(self):
+        self.checker.check = mock.Mock(side_effect=ConnectionError("LanguageTool down"))
+        answer = ReviewerTool(output_file=str(self.path))._run(PAGE)
+        self.assertEqual(answer, "Error during review: LanguageTool down")
+        self.assertEqual(list(Path(self.tmp.name).iterdir()), [])
+
+    def test_concurrent_runs_write_to_their_own_directories(self):
+        runs = [RunArtifacts(root=Path(self.tmp.name)) for _ in range(2)]
+        reports = [PAGE.replace("Edge AI", f"Edge AI {i}") * 40 for i in range(len(runs))]
+        answers = [None] * len(runs)
+
+        def review(i):
+            with use_run_artifacts(runs[i]):
+                runs[i].spill("write_report_task", reports[i])
+                answers[i] = ReviewerTool()._run(reports[i])
+
+        threads = [threading.Thread(target=review, args=(i,)) for i in range(len(runs))]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        for run, report, answer in zip(runs, reports, answers):
+            run.close()
+            path = run.directory / "report_corrected.md"
+            self.assertIn(f"written to {path}", answer)
+            # The spilled task output is gone; the corrected report is kept.
+            self.assertEqual(list(run.directory.iterdir()), [path])
+            self.assertEqual(path.read_text(encoding="utf-8"), report.replace("runs runs", "runs")
+                             .replace("drops drops", "drops"))
+            self.assertEqual(run.report()["outputs"], [str(path)])
+
+
+if __name__ == "__main__":
+    unittest.main()
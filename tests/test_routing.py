@@ -0,0 +1,119 @@
+"""
+Tests for per-agent model routing with latency-aware fallback.
+"""
+
+import sys
+import unittest
+from pathlib import Path
+from unittest import mock
+
+sys.path.insert(0, str(Path(__file__).parent.parent / "src"))
+
+from crewai.llms.base_llm import BaseLLM
+
+from aria import routing
+from aria.routed_llm import RoutedLLM
+from aria.routing import RoutingPolicy, model_stats, record_routing
+
+
+class FakeLLM(BaseLLM):
+    def __init__(self, model: str, fail: bool = False):
+        super().__init__(model=model)
+        self.fail = fail
+        self.calls = 0
+
+    def call(self, messages, tools=None, callbacks=None, available_functions=None, from_task=None, from_agent=None):
+        self.calls += 1
+        if self.fail:
+            raise RuntimeError(f"{self.model} is down")
+        return f"answer from {self.model}"
+
+
+def observe(model: str, seconds: float, n: int = 10, ok: bool = True) -> None:
+    for _ in range(n):
+        model_stats(model).observe(seconds, ok)
+
+
+class TestRoutingPolicy(unittest.TestCase):
+
+    def setUp(self):
+        routing._stats.clear()
+        self.policy = RoutingPolicy("fact_checker", ["big", "small"], p95_threshold_s=2.0, max_error_rate=0.5)
+
+    def test_primary_until_it_is_slow(self):
+        self.assertEqual(self.policy.choose(), ("big", "primary", ""))
+        observe("big", 1.0, n=3)
+        observe("big", 5.0, n=3)
+        model, reason, detail = self.policy.choose()
+        self.assertEqual((model, reason), ("small", "slow"))
+        self.assertIn("big p95 5.0s > 2s", detail)
+
+    def test_failing_model_is_skipped(self):
+        observe("big", 0.5, n=4)
+        observe("big", 0.5, n=6, ok=False)
+        self.assertEqual(self.policy.choose()[:2], ("small", "errors"))
+
+    def test_token_budget(self):
+        policy = RoutingPolicy("summarizer", ["big", "small"], token_budget=100)
+        policy.record("big", "primary", "", 0.1, ok=True, tokens=150)
+        self.assertEqual(policy.choose()[:2], ("small", "budget"))
+        self.assertEqual([call["model"] for call in policy.calls], ["big"])
+
+    def test_all_degraded_picks_the_fastest(self):
+        observe("big", 9.0)
+        observe("small", 4.0)
+        self.assertEqual(self.policy.choose()[:2], ("small", "fastest"))
+
+    def test_slow_samples_age_out(self):
+        observe("big", 9.0)
+        with mock.patch.object(routing.time, "monotonic", return_value=routing.time.monotonic() + routing.WINDOW_S + 1):
+            self.assertEqual(self.policy.choose()[:2], ("big", "primary"))
+
+    def test_config(self):
+        policy = RoutingPolicy.from_config("writer", {"fallbacks": ["gpt-4o-mini", "default"], "token_budget": 10},
+                                           default_model="gpt-4o")
+        self.assertEqual((policy.models, policy.token_budget), (["gpt-4o", "gpt-4o-mini"], 10))
+
+    def test_cheap_model_is_the_default_unless_configured(self):
+        routing_config = {"primary": "cheap", "fallbacks": ["default"]}
+        policy = RoutingPolicy.from_config("reviewer", routing_config, default_model="local/llama")
+        self.assertEqual(policy.models, ["local/llama"])
+        with mock.patch.object(routing, "CHEAP_MODEL", "gpt-4o-mini"):
+            policy = RoutingPolicy.from_config("reviewer", routing_config, default_model="gpt-4o")
+        self.assertEqual(policy.models, ["gpt-4o-mini", "gpt-4o"])
+
+
+class TestRoutedLLM(unittest.TestCase):
+
+    def setUp(self):
+        routing._stats.clear()
+
+    def test_failed_call_moves_to_the_next_model(self):
+        big, small = FakeLLM("big", fail=True), FakeLLM("small")
+        llm = RoutedLLM(RoutingPolicy("reviewer", ["big", "small"]), {"big": big, "small": small})
+        llm.stop = ["\nObservation:"]
+        self.assertEqual(llm.call("Review this report."), "answer from small")
+        self.assertEqual(small.stop, ["\nObservation:"])
+        self.assertEqual([(c["model"], c["reason"], c["ok"]) for c in llm.policy.calls],
+                         [("big", "primary", False), ("small", "failover", True)])
+        self.assertGreater(llm.policy.tokens["small"], 0)
+
+    def test_last_failure_is_raised(self):
+        llm = RoutedLLM(RoutingPolicy("reviewer", ["big"]), {"big": FakeLLM("big", fail=True)})
+        with self.assertRaisesRegex(RuntimeError, "big is down"):
+            llm.call("Review this report.")
+
+    def test_totals(self):
+        calls = [{"model": "big", "reason": "primary", "ok": True, "latency_s": 1.0},
+                 {"model": "small", "reason": "slow", "ok": False, "latency_s": 0.5, "queued_s": 0.2}]
+        totals = {"calls": 0, "models": {}, "reasons": routing.Counter()}
+        with mock.patch.object(routing, "_totals", totals):
+            record_routing([{"name": "task", "llm_calls": calls}, {"name": "plain task"}])
+            stats = routing.routing_stats()
+        self.assertEqual((stats["calls"], stats["reasons"]), (2, {"primary": 1, "slow": 1}))
+        self.assertEqual(stats["models"]["small"], {"calls": 1, "errors": 1, "mean_latency_s": 0.5,
+                                                    "mean_queued_s": 0.2})
+
+
+if __name__ == "__main__":
+    unittest.main()
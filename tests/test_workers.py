@@ -0,0 +1,118 @@
+"""
+Tests for the multi-process crew worker pool.
+"""
+
+import os
+import sys
+import time
+import unittest
+import uuid
+from pathlib import Path
+from unittest import mock
+
+sys.path.insert(0, str(Path(__file__).parent.parent / "src"))
+
+from aria.batch import BatchRunner
+from aria.tools.cache import active_cache, cached_result, with_cache
+from aria.workers import CrewResult, WorkerCrashed, WorkerPool, run_crew
+
+PRELOADED = {}
+
+
+def preload():
+    PRELOADED["pid"] = os.getpid()
+
+
+def job(inputs):
+    topic = inputs["topic"]
+    if topic == "crash":
+        os._exit(3)
+    if topic == "fail":
+        raise ValueError("bad topic")
+    # Proves the job ran in a preloaded worker, not in the API process.
+    return CrewResult(f"{topic} by {os.getpid()} preloaded={PRELOADED.get('pid') == os.getpid()}",
+                      {"total_tokens": 10, "prompt_tokens": 8, "completion_tokens": 2})
+
+
+class SearchTool:
+    name = "Search"
+
+    @cached_result
+    def _run(self, query: str) -> str:
+        return f"{query} {uuid.uuid4().hex}"
+
+
+class SearchingCrew:
+    """Looks up one query every topic shares and one of its own."""
+
+    def kickoff(self, inputs):
+        shared, _ = SearchTool()._run(query="shared"), SearchTool()._run(query=inputs["topic"])
+        return mock.Mock(raw=shared, token_usage={"total_tokens": 1})
+
+
+class SearchingAria:
+    def crew(self):
+        return SearchingCrew()
+
+
+class TestWorkerPool(unittest.TestCase):
+    """Jobs run in preloaded worker processes; dead workers are respawned."""
+
+    def setUp(self):
+        self.pool = WorkerPool(2, max_rss_mb=0, start_method="fork", target=job, preload=preload).start()
+
+    def tearDown(self):
+        self.pool.shutdown(timeout=10)
+
+    def test_jobs_run_in_preloaded_workers(self):
+        results = [self.pool.submit({"topic": f"t{i}"}) for i in range(6)]
+        raws = [future.result(timeout=30).raw for future in results]
+        self.assertTrue(all("preloaded=True" in raw for raw in raws))
+        self.assertNotIn(str(os.getpid()), " ".join(raws))
+        stats = self.pool.stats()
+        self.assertEqual((stats["completed"], stats["alive"]), (6, 2))
+
+    def test_job_errors_are_raised_in_the_caller(self):
+        with self.assertRaisesRegex(RuntimeError, "ValueError: bad topic"):
+            self.pool.run({"topic": "fail"}, timeout=30)
+        self.assertEqual(self.pool.stats()["restarts"], 0)
+
+    def test_crashed_worker_is_respawned(self):
+        with self.assertRaises(WorkerCrashed):
+            self.pool.run({"topic": "crash"}, timeout=30)
+        self.assertIn("preloaded=True", self.pool.run({"topic": "after"}, timeout=30).raw)
+        deadline = time.monotonic() + 30
+        while self.pool.stats()["alive"] < 2 and time.monotonic() < deadline:
+            time.sleep(0.05)
+        stats = self.pool.stats()
+        self.assertEqual((stats["restarts"], stats["alive"]), (1, 2))
+
+    def test_workers_recycled_after_max_jobs(self):
+        self.pool.max_jobs = 1
+        for i in range(3):
+            self.pool.run({"topic": f"t{i}"}, timeout=30)
+        self.assertEqual(self.pool.stats()["recycled"], 3)
+
+    def test_batch_runner_uses_pool(self):
+        events = list(BatchRunner(["a", "b", "c"], workers=3, kickoff=self.pool.run).run())
+        summary = events[-1]
+        self.assertEqual(summary["succeeded"], 3)
+        self.assertEqual(summary["usage"]["total_tokens"], 30)
+
+
+    def test_batch_cache_is_shared_within_each_worker(self):
+        with mock.patch("aria.crew.Aria", SearchingAria), mock.patch("aria.batch.start_prefetch", return_value=None):
+            pool = WorkerPool(2, max_rss_mb=0, start_method="fork", target=run_crew).start()
+        try:
+            topics = [f"t{i}" for i in range(8)]
+            events = list(BatchRunner(topics, workers=4,
+                                      kickoff=lambda inputs: pool.run(with_cache(inputs, active_cache()))).run())
+        finally:
+            pool.shutdown(timeout=10)
+        reports = {event["report"] for event in events if event["event"] == "topic"}
+        self.assertEqual(events[-1]["succeeded"], 8)
+        # One upstream call per worker process, not per topic.
+        self.assertLessEqual(len(reports), 2)
+
+if __name__ == "__main__":
+    unittest.main()